@@ -6,6 +6,7 @@ from controllers.apiv3 import api_status_controller as asc
 from controllers.apiv3 import api_district_controller as adc
 from controllers.apiv3 import api_event_controller as aec
 from controllers.apiv3 import api_match_controller as amc
+from controllers.apiv3 import api_matchstats_controller as amsc
 from controllers.apiv3 import api_team_controller as atc
 
 # Ensure that APIv3 routes include OPTIONS method for CORS preflight compatibility
@@ -82,6 +83,8 @@ app = webapp2.WSGIApplication([
         aec.ApiEventTeamsController, methods=['GET', 'OPTIONS']),
     webapp2.Route(r'/api/v3/event/<event_key:>/teams/<model_type:(simple|keys)>',
         aec.ApiEventTeamsController, methods=['GET', 'OPTIONS']),
+    webapp2.Route(r'/api/v3/event/<event_key:>/teams/statuses',
+        aec.ApiEventTeamsStatusesController, methods=['GET', 'OPTIONS']),
     webapp2.Route(r'/api/v3/event/<event_key:>/matches',
         aec.ApiEventMatchesController, methods=['GET', 'OPTIONS']),
     webapp2.Route(r'/api/v3/event/<event_key:>/matches/<model_type:(simple|keys)>',
@@ -93,6 +96,9 @@ app = webapp2.WSGIApplication([
         amc.ApiMatchController, methods=['GET', 'OPTIONS']),
     webapp2.Route(r'/api/v3/match/<match_key:>/<model_type:(simple)>',
         amc.ApiMatchController, methods=['GET', 'OPTIONS']),
+    # Season-wide Matchstats
+    webapp2.Route(r'/api/v3/matchstats/<year:([0-9]+)>',
+        amsc.ApiYearMatchstatsController, methods=['GET', 'OPTIONS']),
     # District List
     webapp2.Route(r'/api/v3/districts/<year:([0-9]+)>',
         adc.ApiDistrictListController, methods=['GET', 'OPTIONS']),
@@ -6,6 +6,7 @@ import tba_config
 from controllers.admin.admin_cron_controller import AdminPostEventTasksDo, AdminCreateDistrictTeamsEnqueue, AdminCreateDistrictTeamsDo
 from controllers.datafeed_controller import EventListEnqueue, EventDetailsEnqueue
 from controllers.datafeed_controller import EventListGet, EventDetailsGet, TeamDetailsGet
+from controllers.datafeed_controller import TeamDetailsRollingEnqueue, TeamDetailsBatchGet
 
 
 app = webapp2.WSGIApplication([('/backend-tasks/enqueue/event_list/([0-9]*)', EventListEnqueue),
@@ -13,6 +14,8 @@ app = webapp2.WSGIApplication([('/backend-tasks/enqueue/event_list/([0-9]*)', Ev
                                ('/backend-tasks/get/event_list/([0-9]*)', EventListGet),
                                ('/backend-tasks/get/event_details/(.*)', EventDetailsGet),
                                ('/backend-tasks/get/team_details/(.*)', TeamDetailsGet),
+                               ('/backend-tasks/enqueue/team_details_rolling', TeamDetailsRollingEnqueue),
+                               ('/backend-tasks/get/team_details_batch/([0-9]+)/([0-9]+)', TeamDetailsBatchGet),
                                ('/backend-tasks/do/post_event_tasks/(.*)', AdminPostEventTasksDo),
                                ('/backend-tasks/enqueue/rebuild_district_teams/([0-9]+)', AdminCreateDistrictTeamsEnqueue),
                                ('/backend-tasks/do/rebuild_district_teams/([0-9]+)', AdminCreateDistrictTeamsDo),
@@ -6,12 +6,17 @@ from controllers.admin.admin_cron_controller import AdminCreateDistrictsEnqueue,
     AdminCreateDistrictsDo
 from controllers.backup_controller import TbaCSVBackupTeamsDo
 from controllers.cron_controller import YearInsightsEnqueue, YearInsightsDo, OverallInsightsEnqueue, OverallInsightsDo, TypeaheadCalcEnqueue, TypeaheadCalcDo
+from controllers.cron_controller import YearMatchstatsEnqueue, YearMatchstatsDo, TeamYearStatsEnqueue, TeamYearStatsDo
 
 
 app = webapp2.WSGIApplication([('/backend-tasks-b2/math/enqueue/overallinsights/(.*)', OverallInsightsEnqueue),
                                ('/backend-tasks-b2/math/do/overallinsights/(.*)', OverallInsightsDo),
                                ('/backend-tasks-b2/math/enqueue/insights/(.*)/([0-9]*)', YearInsightsEnqueue),
                                ('/backend-tasks-b2/math/do/insights/(.*)/([0-9]*)', YearInsightsDo),
+                               ('/backend-tasks-b2/math/enqueue/year_matchstats/([0-9]*)', YearMatchstatsEnqueue),
+                               ('/backend-tasks-b2/math/do/year_matchstats/([0-9]*)', YearMatchstatsDo),
+                               ('/backend-tasks-b2/math/enqueue/team_year_stats/([0-9]*)', TeamYearStatsEnqueue),
+                               ('/backend-tasks-b2/math/do/team_year_stats/([0-9]*)', TeamYearStatsDo),
                                ('/backend-tasks-b2/math/enqueue/typeaheadcalc', TypeaheadCalcEnqueue),
                                ('/backend-tasks-b2/math/do/typeaheadcalc', TypeaheadCalcDo),
                                ('/backend-tasks-b2/do/csv_backup_teams', TbaCSVBackupTeamsDo),
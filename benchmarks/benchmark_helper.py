@@ -0,0 +1,235 @@
+import cPickle
+import datetime
+import json
+import os
+import resource
+import sys
+import time
+import traceback
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+sys.path.insert(1, ROOT_PATH)
+sys.path.insert(1, os.path.join(ROOT_PATH, 'lib'))
+
+
+def setup_sdk(sdk_path, datastore_path=None):
+    """
+    Puts the App Engine SDK on sys.path and activates a testbed, backed by
+    the dev_appserver datastore file at datastore_path or kept in memory
+    Returns the activated testbed
+    """
+    sys.path.insert(0, sdk_path)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+    from google.appengine.ext import testbed
+    tb = testbed.Testbed()
+    tb.activate()
+    if datastore_path:
+        tb.init_datastore_v3_stub(datastore_file=datastore_path, use_sqlite=True)
+    else:
+        tb.init_datastore_v3_stub()
+    tb.init_memcache_stub()
+    return tb
+
+
+def build_synthetic_event(event_key, year, teams, matches_per_team, rand):
+    """
+    Returns a list of quals Matches with scores and 2016 style score
+    breakdowns drawn from a per-team power rating
+    """
+    from google.appengine.ext import ndb
+    from models.event import Event
+    from models.match import Match
+
+    powers = dict((team, rand.gauss(20, 8)) for team in teams)
+    num_matches = len(teams) * matches_per_team / 6
+
+    matches = []
+    queue = []
+    for match_number in xrange(1, num_matches + 1):
+        # Draw six distinct teams, refilling with a fresh shuffle as needed
+        match_teams = []
+        while len(match_teams) < 6:
+            if not queue:
+                queue = list(teams)
+                rand.shuffle(queue)
+            team = queue.pop()
+            if team in match_teams:
+                queue.insert(0, team)
+            else:
+                match_teams.append(team)
+
+        alliances = {}
+        for alliance_color, alliance_teams in [('red', match_teams[:3]), ('blue', match_teams[3:])]:
+            alliances[alliance_color] = {
+                'teams': alliance_teams,
+                'score': int(sum(powers[team] for team in alliance_teams) + rand.gauss(0, 10)),
+            }
+
+        matches.append(Match(
+            id=Match.renderKeyName(event_key, 'qm', 1, match_number),
+            event=ndb.Key(Event, event_key),
+            year=year,
+            comp_level='qm',
+            set_number=1,
+            match_number=match_number,
+            alliances_json=json.dumps(alliances),
+            score_breakdown_json=json.dumps(build_synthetic_score_breakdown(rand)),
+        ))
+    return matches
+
+
+def build_synthetic_score_breakdown(rand):
+    score_breakdown = {}
+    for alliance_color in ['red', 'blue']:
+        score_breakdown[alliance_color] = {
+            'autoPoints': rand.randint(0, 40),
+            'autoBouldersLow': rand.randint(0, 2),
+            'autoBouldersHigh': rand.randint(0, 2),
+            'teleopBouldersLow': rand.randint(0, 6),
+            'teleopBouldersHigh': rand.randint(0, 10),
+            'position1crossings': rand.randint(0, 2),
+            'position2crossings': rand.randint(0, 2),
+            'position3crossings': rand.randint(0, 2),
+            'position4crossings': rand.randint(0, 2),
+            'position5crossings': rand.randint(0, 2),
+            'teleopDefensesBreached': rand.random() < 0.4,
+            'teleopTowerCaptured': rand.random() < 0.2,
+        }
+    return score_breakdown
+
+
+def build_synthetic_season(year, num_teams, teams_per_event, matches_per_team, rand):
+    teams = ['frc{}'.format(i + 1) for i in xrange(num_teams)]
+    matches = []
+    # Every team attends two events so the season is one connected problem
+    for attendance in xrange(2):
+        shuffled = list(teams)
+        rand.shuffle(shuffled)
+        for i in xrange(0, num_teams, teams_per_event):
+            event_key = '{}synth{}'.format(year, len(matches))
+            matches += build_synthetic_event(event_key, year, shuffled[i:i + teams_per_event], matches_per_team, rand)
+    return matches
+
+
+def build_event(event_key, event_type_enum=None):
+    from consts.event_type import EventType
+    from models.event import Event
+
+    year = int(event_key[:4])
+    return Event(
+        id=event_key,
+        event_short=event_key[4:],
+        event_type_enum=EventType.REGIONAL if event_type_enum is None else event_type_enum,
+        start_date=datetime.datetime(year, 3, 1),
+        end_date=datetime.datetime(year, 3, 3),
+        year=year,
+        official=True,
+    )
+
+
+def load_recorded_event(path, rand, synthesize_breakdowns=True):
+    """
+    Loads an event and its Matches from a test_data fixture, given either as an
+    appengine_fixture_loader list or a plain list of Match dicts.
+    Unless synthesize_breakdowns is False, played matches without a score
+    breakdown get a synthetic one so every engine can run on them.
+    Returns (event, matches)
+    """
+    from google.appengine.ext import ndb
+    from models.event import Event
+    from models.match import Match
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    event = None
+    matches = []
+    for entry in data:
+        if entry['__kind__'] == 'Event':
+            event = build_event(entry['__id__'], entry['event_type_enum'])
+        elif entry['__kind__'] == 'Match':
+            score_breakdown_json = entry.get('score_breakdown_json')
+            if not score_breakdown_json and synthesize_breakdowns:
+                score_breakdown_json = json.dumps(build_synthetic_score_breakdown(rand))
+            matches.append(Match(
+                id=entry['__id__'],
+                event=ndb.Key(Event, entry['event']),
+                year=entry['year'],
+                comp_level=entry['comp_level'],
+                set_number=entry['set_number'],
+                match_number=entry['match_number'],
+                alliances_json=entry['alliances_json'],
+                score_breakdown_json=score_breakdown_json,
+            ))
+
+    if event is None:
+        event = build_event(matches[0].event.id())
+    return event, matches
+
+
+def unplay_matches(matches, played_fraction):
+    """
+    Clears scores of quals matches past the played fraction to simulate an event in progress
+    """
+    qual_matches = sorted([match for match in matches if match.comp_level == 'qm'], key=lambda match: match.match_number)
+    for match in qual_matches[int(round(len(qual_matches) * played_fraction)):]:
+        match.alliances['red']['score'] = -1
+        match.alliances['blue']['score'] = -1
+        match.alliances_json = json.dumps(match.alliances)
+        match._winning_alliance = None
+
+
+def run_isolated(fn, *args):
+    """
+    Runs fn(*args) in a forked child so its wall time and peak memory can be
+    measured without interference from earlier runs.
+    Returns (result, seconds, peak memory growth in MB)
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            start_maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.time()
+            result = fn(*args)
+            elapsed = time.time() - start
+            peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_maxrss
+            payload = cPickle.dumps((result, elapsed, peak_kb, None), cPickle.HIGHEST_PROTOCOL)
+        except Exception:
+            payload = cPickle.dumps((None, 0, 0, traceback.format_exc()), cPickle.HIGHEST_PROTOCOL)
+        with os.fdopen(write_fd, 'wb') as f:
+            f.write(payload)
+        os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as f:
+        payload = f.read()
+    os.waitpid(pid, 0)
+
+    result, elapsed, peak_kb, error = cPickle.loads(payload)
+    if error is not None:
+        raise RuntimeError(error)
+    return result, elapsed, peak_kb / 1024.0
+
+
+def max_abs_diff(a, b):
+    """
+    Largest absolute difference between the numbers in two nested dicts/lists/tuples
+    """
+    if isinstance(a, dict):
+        diff = 0
+        for key, value in a.items():
+            diff = max(diff, max_abs_diff(value, b[key]))
+        return diff
+    if isinstance(a, (list, tuple)):
+        diff = 0
+        for value1, value2 in zip(a, b):
+            diff = max(diff, max_abs_diff(value1, value2))
+        return diff
+    if a is None or isinstance(a, (bool, basestring)):
+        return 0
+    return abs(float(a) - float(b))
@@ -0,0 +1,270 @@
+#!/usr/bin/python
+import optparse
+import os
+import random
+
+USAGE = """%prog -s SDK_PATH
+Benchmarks every matchstats and ixOPR engine, PredictionHelper.get_match_predictions and
+PredictionHelper.get_ranking_predictions on synthetic events (24, 40, 64 and
+80 teams) and on recorded events from test_data. Each engine runs in its own
+forked process and reports wall time, peak memory growth and the largest
+absolute difference from the first (reference) engine.
+MatchstatsHelper.get_last_event_stats is stubbed with synthetic prior stats,
+so no datastore or memcache data is needed.
+
+SDK_PATH    Path to the SDK installation"""
+
+
+from benchmark_helper import ROOT_PATH, build_event, build_synthetic_event, load_recorded_event, max_abs_diff, run_isolated, setup_sdk, unplay_matches
+
+SYNTHETIC_TEAM_COUNTS = [24, 40, 64, 80]
+RECORDED_EVENTS = [
+    'test_data/fixtures/2016nytr_event_team_status.json',
+    'test_data/fixtures/2016casj.json',
+    'test_data/2016cama_no_surrogate.json',
+]
+
+
+def _stat_types():
+    from helpers.matchstats_helper import MatchstatsHelper
+    return MatchstatsHelper.DEFAULT_STATS + MatchstatsHelper.YEAR_STATS[2016]
+
+
+def legacy_engine(matches):
+    from helpers.matchstats_helper import MatchstatsHelper
+
+    team_list, team_id_map = MatchstatsHelper.build_team_mapping(matches)
+    Minv = MatchstatsHelper.build_Minv_matrix(matches, team_id_map, played_only=True)
+    stats = {}
+    for stat_type in _stat_types():
+        stats[stat_type] = MatchstatsHelper.calc_stat(matches, team_list, team_id_map, Minv, stat_type)
+    return stats
+
+
+def sparse_direct_engine(matches):
+    from helpers.matchstats_helper import MatchstatsHelper
+
+    team_list, team_id_map = MatchstatsHelper.build_team_mapping(matches)
+    return MatchstatsHelper.calc_stats(matches, team_list, team_id_map, _stat_types())
+
+
+def incremental_engine(matches):
+    """
+    Replays the played quals matches one at a time, the way a live event is updated
+    """
+    from helpers.matchstats_helper import MatchstatsHelper
+
+    played = sorted([match for match in matches if match.comp_level == 'qm' and match.has_been_played], key=lambda match: match.match_number)
+    scores = [(match.alliances['red']['score'], match.alliances['blue']['score']) for match in played]
+    for match in played:
+        match.alliances['red']['score'] = -1
+        match.alliances['blue']['score'] = -1
+
+    stats, state = {}, None
+    for match, (red_score, blue_score) in zip(played, scores):
+        match.alliances['red']['score'] = red_score
+        match.alliances['blue']['score'] = blue_score
+        stats, state = MatchstatsHelper.calculate_matchstats_incremental(matches, 2016, state)
+
+    stat_types = _stat_types()
+    return dict((stat_type, values) for stat_type, values in stats.items() if stat_type in stat_types)
+
+
+def conjugate_gradient_engine(matches):
+    from helpers.matchstats_helper import MatchstatsHelper
+
+    stat_types = _stat_types()
+    team_list, team_id_map = MatchstatsHelper.build_team_mapping(matches)
+    n = len(team_list)
+    alliance_teams, alliances = MatchstatsHelper.build_alliance_incidence(matches, team_id_map, played_only=True)
+    alliance_values = MatchstatsHelper.build_alliance_values(alliances)
+    S = MatchstatsHelper.build_rhs_matrix(alliance_teams, MatchstatsHelper.build_stat_matrix(alliance_values, stat_types, 2016), n)
+    X, _ = MatchstatsHelper.solve_normal_equations_cg(alliance_teams, S, n)
+    return MatchstatsHelper._build_stats_dict(team_list, stat_types, X)
+
+
+def _ixopr_inputs(matches):
+    from helpers.match_helper import MatchHelper
+    from helpers.matchstats_helper import MatchstatsHelper
+
+    qual_matches = MatchHelper.organizeMatches(matches)['qm']
+    team_list, team_id_map = MatchstatsHelper.build_team_mapping(qual_matches)
+    last_event_stats = MatchstatsHelper.get_last_event_stats(team_list, qual_matches[0].event)
+    return qual_matches, team_list, team_id_map, last_event_stats
+
+
+def legacy_ixoprs_engine(matches):
+    """
+    ixOPRs the way get_match_predictions computed them before
+    PredictionHelper.calc_ixoprs: every stat and pass rebuilds s from all matches
+    """
+    from helpers.matchstats_helper import MatchstatsHelper
+    from helpers.prediction_helper import PredictionHelper
+    from helpers.prediction_models import PredictionModel2016
+
+    qual_matches, team_list, team_id_map, last_event_stats = _ixopr_inputs(matches)
+    Minv = MatchstatsHelper.build_Minv_matrix(qual_matches, team_id_map)
+    init_stats_default = dict((stat, 0) for stat in PredictionModel2016.STATS)
+    score_sum = 0
+    all_ixoprs_list = []
+    for i, match in enumerate(qual_matches):
+        all_ixoprs = {}
+        for stat in PredictionModel2016.STATS:
+            all_ixoprs[stat] = MatchstatsHelper.calc_stat(
+                qual_matches, team_list, team_id_map, Minv, stat,
+                init_stats=last_event_stats,
+                init_stats_default=init_stats_default[stat],
+                limit_matches=i)
+        for _ in xrange(PredictionHelper.IXOPR_REFINEMENT_PASSES):
+            for stat in PredictionModel2016.STATS:
+                all_ixoprs[stat] = MatchstatsHelper.calc_stat(
+                    qual_matches, team_list, team_id_map, Minv, stat,
+                    init_stats=all_ixoprs,
+                    init_stats_default=init_stats_default[stat],
+                    limit_matches=i)
+        all_ixoprs_list.append(all_ixoprs)
+
+        if match.has_been_played and match.score_breakdown:
+            for alliance_color in ['red', 'blue']:
+                score_sum += match.alliances[alliance_color]['score']
+        init_stats_default['oprs'] = float(score_sum) / (i + 1) / 6
+    return all_ixoprs_list
+
+
+def ixoprs_engine(matches):
+    from helpers.prediction_helper import PredictionHelper
+    from helpers.prediction_models import PredictionModel2016
+
+    return PredictionHelper.calc_ixoprs(*_ixopr_inputs(matches), stats=PredictionModel2016.STATS)
+
+
+def match_predictions_engine(matches):
+    from helpers.match_helper import MatchHelper
+    from helpers.prediction_helper import PredictionHelper
+
+    qual_matches = MatchHelper.organizeMatches(matches)['qm']
+    return PredictionHelper.get_match_predictions(qual_matches)
+
+
+def ranking_predictions_engine(matches, match_predictions, samples, seed):
+    from helpers.match_helper import MatchHelper
+    from helpers.prediction_helper import PredictionHelper
+
+    qual_matches = MatchHelper.organizeMatches(matches)['qm']
+    return PredictionHelper.get_ranking_predictions(qual_matches, match_predictions, n=samples, seed=seed)
+
+
+MATCHSTATS_ENGINES = [
+    ('legacy pinv', legacy_engine),
+    ('sparse direct', sparse_direct_engine),
+    ('incremental', incremental_engine),
+    ('conjugate gradient', conjugate_gradient_engine),
+]
+
+IXOPR_ENGINES = [
+    ('legacy ixOPR', legacy_ixoprs_engine),
+    ('incremental ixOPR', ixoprs_engine),
+]
+
+PREDICTION_ENGINES = [
+    ('match predictions', match_predictions_engine),
+]
+
+
+def stub_last_event_stats(events_matches, rand):
+    """
+    Replaces get_last_event_stats with synthetic stats from a previous event
+    for about half of each event's teams
+    """
+    from helpers.matchstats_helper import MatchstatsHelper
+
+    last_event_stats = {}
+    for event, matches in events_matches:
+        team_list, _ = MatchstatsHelper.build_team_mapping(matches)
+        stats = dict((stat_type, {}) for stat_type in _stat_types())
+        for team in team_list:
+            if rand.random() < 0.5:
+                for stat_type in stats.keys():
+                    stats[stat_type][team] = rand.gauss(20, 8)
+        last_event_stats[event.key.id()] = stats
+
+    MatchstatsHelper.get_last_event_stats = classmethod(
+        lambda cls, team_list, event_key: last_event_stats.get(event_key.id(), {}))
+
+
+def print_result(engine_name, elapsed, peak_mb, diff):
+    print "  {:<22} {:8.3f}s {:8.1f}MB  max abs diff {}".format(
+        engine_name, elapsed, peak_mb, '-' if diff is None else '{:.3g}'.format(diff))
+
+
+def run_engines(engines, *args):
+    reference = None
+    for engine_name, engine in engines:
+        result, elapsed, peak_mb = run_isolated(engine, *args)
+        diff = None
+        if reference is None:
+            reference = result
+        else:
+            diff = max_abs_diff(reference, result)
+        print_result(engine_name, elapsed, peak_mb, diff)
+    return reference
+
+
+def run_case(name, event, matches, ranking_samples, seed):
+    from helpers.matchstats_helper import MatchstatsHelper
+
+    team_list, _ = MatchstatsHelper.build_team_mapping(matches)
+    qual_matches = [match for match in matches if match.comp_level == 'qm']
+    print "{}: {} teams, {} quals matches ({} played)".format(
+        name, len(team_list), len(qual_matches), len([match for match in qual_matches if match.has_been_played]))
+
+    run_engines(MATCHSTATS_ENGINES, matches)
+    run_engines(IXOPR_ENGINES, matches)
+    match_predictions, _, _ = run_engines(PREDICTION_ENGINES, matches)
+    result, elapsed, peak_mb = run_isolated(ranking_predictions_engine, matches, match_predictions, ranking_samples, seed)
+    print_result('ranking predictions', elapsed, peak_mb, None)
+
+
+def main(sdk_path, seed, matches_per_team, played_fraction, ranking_samples):
+    tb = setup_sdk(sdk_path)
+    rand = random.Random(seed)
+
+    cases = []
+    for num_teams in SYNTHETIC_TEAM_COUNTS:
+        for num_matches in matches_per_team:
+            event = build_event('2016synth{}x{}'.format(num_teams, num_matches))
+            teams = ['frc{}'.format(i + 1) for i in xrange(num_teams)]
+            matches = build_synthetic_event(event.key.id(), 2016, teams, num_matches, rand)
+            cases.append(("Synthetic {} teams x {} matches".format(num_teams, num_matches), event, matches))
+    for path in RECORDED_EVENTS:
+        event, matches = load_recorded_event(os.path.join(ROOT_PATH, path), rand)
+        cases.append(("Recorded {}".format(event.key.id()), event, matches))
+
+    for _, event, matches in cases:
+        event.put()
+        unplay_matches(matches, played_fraction)
+    stub_last_event_stats([(event, matches) for _, event, matches in cases], rand)
+
+    for name, event, matches in cases:
+        run_case(name, event, matches, ranking_samples, seed)
+
+    tb.deactivate()
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option("-s", "--sdk_path", type="string", default="/usr/local/google_appengine",
+                      help="path to load Google Appengine SDK from")
+    parser.add_option("--seed", type="int", default=0,
+                      help="random seed for synthetic events and ranking simulations")
+    parser.add_option("--matches_per_team", type="string", default="8,12",
+                      help="comma separated quals matches per team for synthetic events")
+    parser.add_option("--played_fraction", type="float", default=0.5,
+                      help="fraction of quals matches treated as played")
+    parser.add_option("--ranking_samples", type="int", default=1000,
+                      help="number of simulated events for ranking predictions")
+    options, args = parser.parse_args()
+
+    main(options.sdk_path, options.seed,
+         [int(num_matches) for num_matches in options.matches_per_team.split(',')],
+         options.played_fraction, options.ranking_samples)
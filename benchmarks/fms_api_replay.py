@@ -0,0 +1,470 @@
+#!/usr/bin/python
+import BaseHTTPServer
+import SocketServer
+import base64
+import bisect
+import calendar
+import copy
+import datetime
+import email.utils
+import hashlib
+import json
+import optparse
+import os
+import threading
+import time
+import urllib2
+import urlparse
+from collections import defaultdict
+
+USAGE = """%prog build TIMELINE [-e EVENT_KEY]
+       %prog record TIMELINE -e EVENT_KEY -u USERNAME -k AUTHKEY [-i INTERVAL] [-d DURATION]
+       %prog replay TIMELINE [-p PORT] [--speed SPEED] [--start START]
+A local stand-in for the FMS API v2.0 that replays an event's schedule,
+scores, rankings and alliances as they changed over the event.
+
+build     Builds TIMELINE from the recorded responses of a finished event in
+          test_data/fms_api. Each match's actual start time and score are
+          revealed as they would have been live, and 2016 rankings are
+          recomputed after every qual.
+record    Polls the real FMS API for EVENT_KEY every INTERVAL seconds for
+          DURATION seconds, adding each response that changed to TIMELINE.
+replay    Serves TIMELINE on localhost:PORT, with timeline time starting at
+          START seconds and running SPEED times faster than the wall clock.
+          Set DatafeedFMSAPI.FMS_API_DOMAIN to http://localhost:PORT to use it.
+          ETag/If-None-Match and Last-Modified/If-Modified-Since work like
+          the real API's, so conditional fetches get 304s.
+
+TIMELINE  Path to a timeline JSON file"""
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FMS_API_DOMAIN = 'https://frc-api.firstinspires.org'
+
+TIME_PATTERNS = ['%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S']
+SCORE_FIELDS = ['scoreRedFinal', 'scoreRedFoul', 'scoreRedAuto', 'scoreBlueFinal', 'scoreBlueFoul', 'scoreBlueAuto']
+
+# Built timelines, in seconds
+RESULTS_DELAY = 180  # From a match's actual start until its score is posted
+QUAL_SCHEDULE_LEAD = 3600  # Quals schedule is posted this long before the first match
+PLAYOFF_SCHEDULE_LEAD = 900  # Playoff matches are scheduled this long before they start
+ALLIANCES_LEAD = 1200  # Alliances are posted this long before the first playoff match
+
+
+def event_paths(year, event_code):
+    """
+    Returns {resource: path} for the FMS API v2.0 resources the datafeeds
+    poll during an event, matching DatafeedFMSAPI's URL patterns
+    """
+    return {
+        'qual_schedule': '/v2.0/{}/schedule/{}/qual/hybrid'.format(year, event_code),
+        'playoff_schedule': '/v2.0/{}/schedule/{}/playoff/hybrid'.format(year, event_code),
+        'qual_scores': '/v2.0/{}/scores/{}/qual'.format(year, event_code),
+        'playoff_scores': '/v2.0/{}/scores/{}/playoff'.format(year, event_code),
+        'rankings': '/v2.0/{}/rankings/{}'.format(year, event_code),
+        'alliances': '/v2.0/{}/alliances/{}'.format(year, event_code),
+    }
+
+
+class Timeline(object):
+    """
+    Every version of every response served during an event.
+    Times are seconds since epoch, the Unix time the timeline starts at.
+    """
+    def __init__(self, epoch=0):
+        self.epoch = epoch
+        self._versions = defaultdict(list)  # path: [(time, body)] in time order
+
+    @classmethod
+    def _normalize_path(cls, path):
+        parsed = urlparse.urlparse(path.lower())
+        query = '&'.join(sorted(parsed.query.split('&'))) if parsed.query else ''
+        return parsed.path.rstrip('/') + ('?' + query if query else '')
+
+    def add(self, t, path, body):
+        """
+        Adds a version of path's response from time t on, if it changed.
+        Versions must be added in time order. Returns True if it was added.
+        """
+        body = json.dumps(body, sort_keys=True, separators=(',', ':'))
+        versions = self._versions[self._normalize_path(path)]
+        if versions and versions[-1][1] == body:
+            return False
+        versions.append((t, body))
+        return True
+
+    def get(self, path, t):
+        """
+        Returns (time, body) of path's response at time t, or None if there
+        wasn't one yet
+        """
+        versions = self._versions.get(self._normalize_path(path))
+        if not versions:
+            return None
+        i = bisect.bisect_right(versions, (t, '\xff'))
+        return versions[i - 1] if i else None
+
+    @property
+    def change_times(self):
+        return sorted(set(t for versions in self._versions.values() for t, _ in versions))
+
+    @property
+    def start_time(self):
+        change_times = self.change_times
+        return change_times[0] if change_times else 0
+
+    @property
+    def end_time(self):
+        change_times = self.change_times
+        return change_times[-1] if change_times else 0
+
+    def save(self, filename):
+        responses = []
+        for path, versions in self._versions.items():
+            for t, body in versions:
+                responses.append({'time': t, 'path': path, 'body': json.loads(body)})
+        responses.sort(key=lambda response: (response['time'], response['path']))
+        with open(filename, 'w') as f:
+            json.dump({'epoch': self.epoch, 'responses': responses}, f)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'r') as f:
+            data = json.load(f)
+        timeline = cls(data['epoch'])
+        for response in sorted(data['responses'], key=lambda response: response['time']):
+            timeline.add(response['time'], response['path'], response['body'])
+        return timeline
+
+
+class WallClock(object):
+    """
+    Timeline time that runs speed times faster than the wall clock
+    """
+    def __init__(self, speed=1.0, start=0.0):
+        self.speed = speed
+        self.start = start
+        self._started = time.time()
+
+    def __call__(self):
+        return self.start + (time.time() - self._started) * self.speed
+
+
+class ManualClock(object):
+    """
+    Timeline time that only moves when now is set
+    """
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class ReplayRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        if 'Authorization' not in self.headers:
+            self._respond(401, body='{"Message":"Authorization has been denied for this request."}')
+            return
+
+        version = server.timeline.get(self.path, server.clock())
+        if version is None:
+            self._respond(404, body='{"Message":"No data"}')
+            return
+
+        version_time, body = version
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        modified = int(server.timeline.epoch + version_time)
+        headers = {
+            'ETag': etag,
+            'Last-Modified': email.utils.formatdate(modified, usegmt=True),
+            'Content-Type': 'application/json',
+        }
+
+        if_none_match = self.headers.get('If-None-Match')
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_none_match is not None:
+            not_modified = etag in [tag.strip() for tag in if_none_match.split(',')]
+        elif if_modified_since is not None:
+            since = email.utils.parsedate_tz(if_modified_since)
+            not_modified = since is not None and modified <= email.utils.mktime_tz(since)
+        else:
+            not_modified = False
+
+        if not_modified:
+            self._respond(304, headers=headers)
+        else:
+            self._respond(200, headers=headers, body=body)
+
+    def _respond(self, status_code, headers={}, body=''):
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.status_counts[status_code] += 1
+            self.server.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class ReplayServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Serves a timeline's responses as of clock() on localhost.
+    Port 0 picks a free port.
+    """
+    daemon_threads = True
+
+    def __init__(self, timeline, clock, port=0, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, ('localhost', port), ReplayRequestHandler)
+        self.timeline = timeline
+        self.clock = clock
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.status_counts = defaultdict(int)  # status code: responses
+        self.bytes_sent = 0
+
+    @property
+    def url(self):
+        return 'http://localhost:{}'.format(self.server_port)
+
+    def start(self):
+        """
+        Serves from a background thread
+        """
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _parse_time(time_string):
+    for pattern in TIME_PATTERNS:
+        try:
+            return datetime.datetime.strptime(time_string, pattern)
+        except ValueError:
+            pass
+    raise ValueError("Unknown time format: {}".format(time_string))
+
+
+def _load_recording(filename, key):
+    if not os.path.exists(filename):
+        return []
+    with open(filename, 'r') as f:
+        return json.load(f)[key] or []
+
+
+def _build_rankings_2016(played_quals, scores_by_number):
+    """
+    Returns an FMS API rankings response computed from played quals, with
+    2016's sort orders: ranking score, auto, scale/challenge, goals, defense
+    """
+    teams = defaultdict(lambda: defaultdict(int))
+    for match in played_quals:
+        alliance_scores = {'red': match['scoreRedFinal'], 'blue': match['scoreBlueFinal']}
+        breakdowns = dict((alliance['alliance'].lower(), alliance) for alliance in scores_by_number.get(match['matchNumber'], {}).get('Alliances', []))
+        for team in match['Teams']:
+            if team['teamNumber'] is None or team['surrogate']:
+                continue
+            color = 'red' if team['station'].startswith('Red') else 'blue'
+            other_color = 'blue' if color == 'red' else 'red'
+            breakdown = breakdowns.get(color, {})
+            record = teams[team['teamNumber']]
+            record['matchesPlayed'] += 1
+            if team['dq']:
+                record['dq'] += 1
+                continue
+            if alliance_scores[color] > alliance_scores[other_color]:
+                record['wins'] += 1
+                record['rp'] += 2
+            elif alliance_scores[color] < alliance_scores[other_color]:
+                record['losses'] += 1
+            else:
+                record['ties'] += 1
+                record['rp'] += 1
+            record['rp'] += int(bool(breakdown.get('teleopDefensesBreached'))) + int(bool(breakdown.get('teleopTowerCaptured')))
+            record['auto'] += breakdown.get('autoPoints', 0)
+            record['scale_challenge'] += breakdown.get('teleopScalePoints', 0) + breakdown.get('teleopChallengePoints', 0)
+            record['goals'] += breakdown.get('autoBoulderPoints', 0) + breakdown.get('teleopBoulderPoints', 0)
+            record['defense'] += breakdown.get('autoCrossingPoints', 0) + breakdown.get('teleopCrossingPoints', 0)
+
+    rankings = []
+    for team_number, record in teams.items():
+        rankings.append({
+            'teamNumber': team_number,
+            'sortOrder1': round(float(record['rp']) / record['matchesPlayed'], 2),
+            'sortOrder2': record['auto'],
+            'sortOrder3': record['scale_challenge'],
+            'sortOrder4': record['goals'],
+            'sortOrder5': record['defense'],
+            'sortOrder6': 0,
+            'wins': record['wins'],
+            'losses': record['losses'],
+            'ties': record['ties'],
+            'qualAverage': 0,
+            'dq': record['dq'],
+            'matchesPlayed': record['matchesPlayed'],
+        })
+    rankings.sort(key=lambda ranking: [-ranking['sortOrder{}'.format(i)] for i in xrange(1, 6)] + [ranking['teamNumber']])
+    for rank, ranking in enumerate(rankings, 1):
+        ranking['rank'] = rank
+    return {'Rankings': rankings}
+
+
+def build_timeline(event_key, recordings_path=None):
+    """
+    Builds a timeline from the recorded responses of a finished event,
+    like test_data/fms_api/2016_nyny_hybrid_schedule_qual.json.
+    Timeline time 0 is the first qual's actual start, in event local time.
+    Rankings are only built for 2016.
+    """
+    year, event_code = int(event_key[:4]), event_key[4:]
+    if recordings_path is None:
+        recordings_path = os.path.join(ROOT_PATH, 'test_data', 'fms_api')
+    prefix = os.path.join(recordings_path, '{}_{}_'.format(year, event_code))
+    qual_schedule = _load_recording(prefix + 'hybrid_schedule_qual.json', 'Schedule')
+    playoff_schedule = _load_recording(prefix + 'hybrid_schedule_playoff.json', 'Schedule')
+    qual_scores = dict((score['matchNumber'], score) for score in _load_recording(prefix + 'qual_breakdown.json', 'MatchScores'))
+    playoff_scores = dict((score['matchNumber'], score) for score in _load_recording(prefix + 'playoff_breakdown.json', 'MatchScores'))
+    alliances = _load_recording(prefix + 'alliances.json', 'Alliances')
+    if not qual_schedule:
+        raise ValueError("No recorded quals schedule for {} in {}".format(event_key, recordings_path))
+
+    start = min(_parse_time(match['actualStartTime']) for match in qual_schedule if match['actualStartTime'])
+
+    def seconds(time_string):
+        return (_parse_time(time_string) - start).total_seconds() if time_string else None
+
+    matches = [('qual', match, seconds(match['actualStartTime'])) for match in qual_schedule] + \
+        [('playoff', match, seconds(match['actualStartTime'])) for match in playoff_schedule]
+    played_times = [actual_time for level, match, actual_time in matches if actual_time is not None]
+    last_qual_result = max([actual_time for level, match, actual_time in matches if level == 'qual' and actual_time is not None]) + RESULTS_DELAY
+    first_playoff = min([actual_time for level, match, actual_time in matches if level == 'playoff' and actual_time is not None] or [None])
+    alliances_time = max(last_qual_result, first_playoff - ALLIANCES_LEAD) if first_playoff is not None else last_qual_result
+
+    # When each match is listed in the schedule
+    scheduled_times = []
+    for level, match, actual_time in matches:
+        if level == 'qual':
+            scheduled_times.append(-QUAL_SCHEDULE_LEAD)
+        elif match['startTime']:
+            scheduled_times.append(max(seconds(match['startTime']) - PLAYOFF_SCHEDULE_LEAD, alliances_time))
+        elif actual_time is not None:
+            scheduled_times.append(max(actual_time - PLAYOFF_SCHEDULE_LEAD, alliances_time))
+        else:
+            scheduled_times.append(alliances_time)
+
+    change_times = set(scheduled_times + played_times + [t + RESULTS_DELAY for t in played_times] + [alliances_time])
+    paths = event_paths(year, event_code)
+    timeline = Timeline(epoch=calendar.timegm(start.timetuple()))
+    for t in sorted(change_times):
+        schedules = {'qual': [], 'playoff': []}
+        scores = {'qual': [], 'playoff': []}
+        for (level, match, actual_time), scheduled_time in zip(matches, scheduled_times):
+            if scheduled_time > t:
+                continue
+            match = copy.deepcopy(match)
+            if actual_time is None or actual_time > t:
+                match['actualStartTime'] = None
+            if actual_time is None or actual_time + RESULTS_DELAY > t:
+                for field in SCORE_FIELDS:
+                    match[field] = None
+            else:
+                score = (qual_scores if level == 'qual' else playoff_scores).get(match['matchNumber'])
+                if score is not None:
+                    scores[level].append(score)
+            schedules[level].append(match)
+
+        timeline.add(t, paths['qual_schedule'], {'Schedule': schedules['qual']})
+        timeline.add(t, paths['playoff_schedule'], {'Schedule': schedules['playoff']})
+        timeline.add(t, paths['qual_scores'], {'MatchScores': scores['qual']})
+        timeline.add(t, paths['playoff_scores'], {'MatchScores': scores['playoff']})
+        timeline.add(t, paths['alliances'], {'Alliances': alliances if t >= alliances_time else []})
+        if year == 2016:
+            played_quals = [match for match in schedules['qual'] if match['scoreRedFinal'] is not None]
+            timeline.add(t, paths['rankings'], _build_rankings_2016(played_quals, qual_scores))
+
+    return timeline
+
+
+def record_timeline(filename, event_key, username, authkey, interval, duration):
+    """
+    Polls the real FMS API, adding each changed response to the timeline
+    in filename. Saves after every poll, so it can be stopped at any time.
+    """
+    year, event_code = int(event_key[:4]), event_key[4:]
+    timeline = Timeline.load(filename) if os.path.exists(filename) else Timeline(epoch=time.time())
+    headers = {'Authorization': 'Basic {}'.format(base64.b64encode('{}:{}'.format(username, authkey)))}
+
+    stop_time = time.time() + duration
+    while time.time() < stop_time:
+        for path in sorted(event_paths(year, event_code).values()):
+            try:
+                body = json.load(urllib2.urlopen(urllib2.Request(FMS_API_DOMAIN + path, headers=headers), timeout=10))
+            except urllib2.HTTPError, e:
+                print "{} {}".format(e.code, path)
+                continue
+            except Exception, e:
+                print "Failed {}: {}".format(path, e)
+                continue
+            t = time.time() - timeline.epoch
+            if timeline.add(t, path, body):
+                print "{:.0f}s {} changed".format(t, path)
+        timeline.save(filename)
+        time.sleep(interval)
+
+
+def main(command, filename, options):
+    if command == 'build':
+        timeline = build_timeline(options.event_key)
+        timeline.save(filename)
+        print "Built {} with {} changes over {:.1f} hours".format(
+            filename, len(timeline.change_times), (timeline.end_time - timeline.start_time) / 3600)
+    elif command == 'record':
+        record_timeline(filename, options.event_key, options.username, options.authkey, options.interval, options.duration)
+    else:
+        timeline = Timeline.load(filename)
+        start = timeline.start_time if options.start is None else options.start
+        server = ReplayServer(timeline, WallClock(options.speed, start), port=options.port, verbose=options.verbose)
+        print "Replaying {} on {} at {}x from {:.0f}s".format(filename, server.url, options.speed, start)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option("-e", "--event_key", type="string", default="2016nyny",
+                      help="event to build or record")
+    parser.add_option("-u", "--username", type="string", default=None,
+                      help="FMS API username, for recording")
+    parser.add_option("-k", "--authkey", type="string", default=None,
+                      help="FMS API authorization key, for recording")
+    parser.add_option("-i", "--interval", type="float", default=30,
+                      help="seconds between recording polls")
+    parser.add_option("-d", "--duration", type="float", default=3 * 24 * 3600,
+                      help="seconds to record for")
+    parser.add_option("-p", "--port", type="int", default=8765,
+                      help="port to serve on")
+    parser.add_option("--speed", type="float", default=1.0,
+                      help="timeline seconds per wall clock second")
+    parser.add_option("--start", type="float", default=None,
+                      help="timeline time to start replaying at, defaults to the first response")
+    parser.add_option("-v", "--verbose", action="store_true", default=False,
+                      help="log every request")
+    options, args = parser.parse_args()
+    if len(args) != 2 or args[0] not in ('build', 'record', 'replay'):
+        parser.error("Expected build, record or replay and a TIMELINE")
+    if args[0] == 'record' and not (options.username and options.authkey):
+        parser.error("Recording needs --username and --authkey")
+
+    main(args[0], args[1], options)
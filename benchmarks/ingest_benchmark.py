@@ -0,0 +1,284 @@
+#!/usr/bin/python
+import datetime
+import optparse
+import os
+import time
+from collections import defaultdict
+
+USAGE = """%prog -s SDK_PATH [-t TIMELINE] [-e EVENT_KEY] [-z TIMEZONE_ID] [-i POLL_INTERVAL]
+Replays an event through a local FMS API stand-in (fms_api_replay.py) and
+drives the FMSAPIMatchesGet, FMSAPIEventRankingsGet and FMSAPIEventAlliancesGet
+handlers against it every POLL_INTERVAL seconds of event time, like the
+datafeed crons do live. After each poll the post-update-hooks and
+cache-clearing queues are run inline, with the response and query caches on.
+Reports per-stage latency (poll, parse, merge, write, notify, invalidate),
+datastore ops and cache clears per played match, and conditional fetch hits.
+Tasks those hooks enqueue elsewhere (push notifications, Firebase, math) are
+counted but not run.
+
+SDK_PATH    Path to the SDK installation
+TIMELINE    Timeline recorded or built with fms_api_replay.py. Defaults to one
+            built from EVENT_KEY's recordings in test_data/fms_api."""
+
+
+from benchmark_helper import ROOT_PATH, build_event, setup_sdk
+from fms_api_replay import ManualClock, ReplayServer, Timeline, build_timeline
+
+STAGES = ['poll', 'parse', 'merge', 'write', 'notify', 'invalidate']
+HOOK_QUEUES = [('notify', 'post-update-hooks'), ('invalidate', 'cache-clearing')]
+CACHE_KINDS = set(['CachedQueryResult', 'CachedResponse'])
+
+
+class StageTimer(object):
+    """
+    Charges wall time to the innermost running stage, so nested stages
+    (like parse inside poll) aren't counted twice
+    """
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self._stack = []
+        self._mark = None
+
+    @property
+    def current(self):
+        return self._stack[-1] if self._stack else None
+
+    def _charge(self):
+        now = time.time()
+        if self._stack:
+            self.totals[self._stack[-1]] += now - self._mark
+        self._mark = now
+
+    def enter(self, stage):
+        self._charge()
+        self._stack.append(stage)
+
+    def exit(self):
+        self._charge()
+        self._stack.pop()
+
+    def wrap(self, stage, fn):
+        def wrapped(*args, **kwargs):
+            self.enter(stage)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.exit()
+        return wrapped
+
+    def reset(self):
+        totals = self.totals
+        self.totals = defaultdict(float)
+        return totals
+
+
+class ApiCallCounter(object):
+    """
+    Counts datastore ops by stage, and cache clears: deleted
+    CachedQueryResults and CachedResponses, and memcache deletes other than
+    ndb's own. Install hook as an apiproxy pre-call hook.
+    """
+    def __init__(self, timer):
+        self.timer = timer
+        self.datastore_ops = defaultdict(int)  # (stage, call): entities or calls
+        self.cache_clears = 0
+
+    def hook(self, service, call, request, response):
+        if service == 'datastore_v3':
+            if call in ('Get', 'Delete'):
+                count = request.key_size()
+            elif call == 'Put':
+                count = request.entity_size()
+            else:
+                count = 1
+            self.datastore_ops[(self.timer.current, call)] += count
+            if call == 'Delete':
+                self.cache_clears += len([key for key in request.key_list() if key.path().element_list()[-1].type() in CACHE_KINDS])
+        elif service == 'memcache' and call == 'Delete':
+            self.cache_clears += len([item for item in request.item_list() if not item.key().startswith('NDB')])
+
+
+def instrument(timer):
+    """
+    Wraps the pipeline's entry points so the timer knows which stage is running
+    """
+    from datafeeds.datafeed_fms_api import DatafeedFMSAPI
+    from datafeeds.parsers.fms_api.fms_api_event_alliances_parser import FMSAPIEventAlliancesParser
+    from datafeeds.parsers.fms_api.fms_api_event_rankings_parser import FMSAPIEventRankingsParser, FMSAPIEventRankings2Parser
+    from datafeeds.parsers.fms_api.fms_api_match_parser import FMSAPIHybridScheduleParser, FMSAPIMatchDetailsParser
+    from helpers.manipulator_base import ManipulatorBase
+
+    for name in ['getMatches', 'getEventRankings', 'getEventAlliances']:
+        setattr(DatafeedFMSAPI, name, timer.wrap('poll', DatafeedFMSAPI.__dict__[name]))
+    for parser_class in [FMSAPIHybridScheduleParser, FMSAPIMatchDetailsParser, FMSAPIEventRankingsParser,
+                         FMSAPIEventRankings2Parser, FMSAPIEventAlliancesParser]:
+        parser_class.parse = timer.wrap('parse', parser_class.__dict__['parse'])
+    ManipulatorBase.findOrSpawn = classmethod(timer.wrap('merge', ManipulatorBase.__dict__['findOrSpawn'].__func__))
+    ManipulatorBase.createOrUpdate = classmethod(timer.wrap('write', ManipulatorBase.__dict__['createOrUpdate'].__func__))
+
+
+def run_hook_queues(taskqueue_stub, timer):
+    """
+    Runs the post-update-hooks and cache-clearing queues until both are
+    empty, including tasks they add to each other.
+    Returns the number of tasks run.
+    """
+    from google.appengine.ext import deferred
+    from google.appengine.ext import ndb
+
+    tasks_run = 0
+    while True:
+        ran = False
+        for stage, queue_name in HOOK_QUEUES:
+            tasks = taskqueue_stub.get_filtered_tasks(queue_names=[queue_name])
+            taskqueue_stub.FlushQueue(queue_name)
+            for task in tasks:
+                ndb.get_context().clear_cache()
+                timer.enter(stage)
+                try:
+                    deferred.run(task.payload)
+                finally:
+                    timer.exit()
+                tasks_run += 1
+                ran = True
+        if not ran:
+            return tasks_run
+
+
+def flush_downstream_queues(taskqueue_stub):
+    """
+    Drops tasks in every other queue. Returns {queue name: tasks dropped}.
+    """
+    hook_queue_names = set(queue_name for _, queue_name in HOOK_QUEUES)
+    dropped = {}
+    for queue in taskqueue_stub.GetQueues():
+        if queue['name'] in hook_queue_names:
+            continue
+        num_tasks = len(taskqueue_stub.get_filtered_tasks(queue_names=[queue['name']]))
+        if num_tasks:
+            dropped[queue['name']] = num_tasks
+            taskqueue_stub.FlushQueue(queue['name'])
+    return dropped
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0
+
+
+def main(sdk_path, timeline_path, event_key, timezone_id, poll_interval):
+    tb = setup_sdk(sdk_path)
+    os.environ.setdefault('DEFAULT_VERSION_HOSTNAME', 'localhost:8080')
+    import webapp2
+    from google.appengine.api import apiproxy_stub_map
+    from google.appengine.ext import ndb
+    from google.appengine.ext import testbed
+    tb.init_taskqueue_stub(root_path=ROOT_PATH)
+    tb.init_urlfetch_stub()
+    taskqueue_stub = tb.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+
+    import tba_config
+    from controllers.datafeed_controller import FMSAPIEventAlliancesGet, FMSAPIEventRankingsGet, FMSAPIMatchesGet
+    from datafeeds.datafeed_fms_api import DatafeedFMSAPI
+    from models.match import Match
+    from models.sitevar import Sitevar
+
+    # Production caching, so cache clears happen
+    tba_config.CONFIG['database_query_cache'] = True
+    tba_config.CONFIG['response_cache'] = True
+
+    if timeline_path:
+        timeline = Timeline.load(timeline_path)
+    else:
+        timeline = build_timeline(event_key)
+    clock = ManualClock(timeline.start_time)
+    server = ReplayServer(timeline, clock).start()
+    DatafeedFMSAPI.FMS_API_DOMAIN = server.url
+
+    # Within a day, so post-update hooks send notifications
+    event = build_event(event_key)
+    event.timezone_id = timezone_id
+    event.start_date = datetime.datetime.now() - datetime.timedelta(days=1)
+    event.end_date = datetime.datetime.now() + datetime.timedelta(days=1)
+    event.put()
+    Sitevar(id='fmsapi.secrets', contents={'username': 'benchmark', 'authkey': 'benchmark'}).put()
+
+    timer = StageTimer()
+    counter = ApiCallCounter(timer)
+    instrument(timer)
+    apiproxy_stub_map.apiproxy.GetPreCallHooks().Append('ingest_benchmark', counter.hook)
+
+    app = webapp2.WSGIApplication([
+        ('/tasks/get/fmsapi_matches/(.*)', FMSAPIMatchesGet),
+        ('/tasks/get/fmsapi_event_rankings/(.*)', FMSAPIEventRankingsGet),
+        ('/tasks/get/fmsapi_event_alliances/(.*)', FMSAPIEventAlliancesGet),
+    ])
+    urls = ['/tasks/get/fmsapi_matches/{}'.format(event_key),
+            '/tasks/get/fmsapi_event_rankings/{}'.format(event_key),
+            '/tasks/get/fmsapi_event_alliances/{}'.format(event_key)]
+
+    print "Replaying {} from {:.1f}h to {:.1f}h, polling every {}s on {}".format(
+        event_key, timeline.start_time / 3600, timeline.end_time / 3600, poll_interval, server.url)
+    round_totals = []
+    tasks_run = 0
+    downstream_tasks = defaultdict(int)
+    t = timeline.start_time
+    while t <= timeline.end_time + poll_interval:
+        clock.now = t
+        for url in urls:
+            ndb.get_context().clear_cache()
+            response = webapp2.Request.blank(url, headers=[('X-Appengine-Taskname', 'ingest_benchmark')]).get_response(app)
+            if response.status_int != 200:
+                print "{} returned {} at {:.0f}s".format(url, response.status_int, t)
+        tasks_run += run_hook_queues(taskqueue_stub, timer)
+        for queue_name, num_tasks in flush_downstream_queues(taskqueue_stub).items():
+            downstream_tasks[queue_name] += num_tasks
+        round_totals.append(timer.reset())
+        t += poll_interval
+    server.stop()
+
+    played_matches = len([match for match in Match.query(Match.event == event.key).fetch() if match.has_been_played])
+    per_match = float(max(played_matches, 1))
+    print "{} poll rounds, {} played matches, {} hook tasks run".format(len(round_totals), played_matches, tasks_run)
+    print "FMS API responses: {}, {:.1f} MB sent".format(
+        ', '.join('{} x{}'.format(status, count) for status, count in sorted(server.status_counts.items())),
+        server.bytes_sent / 1e6)
+    print
+
+    print "{:<12}{:>12}{:>12}{:>12}{:>12}{:>14}".format('Stage', 'Total (s)', 'Mean (ms)', 'p95 (ms)', 'Max (ms)', 'Per match (ms)')
+    for stage in STAGES:
+        values = [totals.get(stage, 0) for totals in round_totals]
+        print "{:<12}{:>12.2f}{:>12.2f}{:>12.2f}{:>12.2f}{:>14.2f}".format(
+            stage, sum(values), 1000 * sum(values) / len(values), 1000 * percentile(values, 0.95), 1000 * max(values),
+            1000 * sum(values) / per_match)
+    print
+
+    ops_by_stage = defaultdict(int)
+    ops_by_call = defaultdict(int)
+    for (stage, call), count in counter.datastore_ops.items():
+        ops_by_stage[stage] += count
+        ops_by_call[call] += count
+    print "Datastore ops per match: {:.1f}".format(sum(ops_by_call.values()) / per_match)
+    print "  by stage: {}".format(', '.join('{} {:.1f}'.format(stage, ops_by_stage[stage] / per_match) for stage in STAGES + [None] if ops_by_stage[stage]))
+    print "  by call: {}".format(', '.join('{} {:.1f}'.format(call, count / per_match) for call, count in sorted(ops_by_call.items())))
+    print "Cache clears per match: {:.1f}".format(counter.cache_clears / per_match)
+    print "Downstream tasks per match: {}".format(', '.join('{} {:.1f}'.format(queue_name, count / per_match) for queue_name, count in sorted(downstream_tasks.items())))
+
+    tb.deactivate()
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option("-s", "--sdk_path", type="string", default="/usr/local/google_appengine",
+                      help="path to load Google Appengine SDK from")
+    parser.add_option("-t", "--timeline", type="string", default=None,
+                      help="timeline to replay, instead of building one from test_data")
+    parser.add_option("-e", "--event_key", type="string", default="2016nyny",
+                      help="event the timeline is for")
+    parser.add_option("-z", "--timezone_id", type="string", default="America/New_York",
+                      help="the event's timezone, for match times")
+    parser.add_option("-i", "--poll_interval", type="int", default=60,
+                      help="seconds of event time between polls")
+    options, args = parser.parse_args()
+
+    main(options.sdk_path, options.timeline, options.event_key, options.timezone_id, options.poll_interval)
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+import optparse
+import random
+import time
+
+USAGE = """%prog -s SDK_PATH
+Benchmarks the MatchstatsHelper sparse normal equation engine against the
+legacy dense pinv engine on synthetic 80 team championship divisions and
+synthetic season-wide problems with 3000+ teams.
+
+SDK_PATH    Path to the SDK installation"""
+
+
+from benchmark_helper import build_synthetic_event, build_synthetic_season, max_abs_diff, setup_sdk
+
+
+def legacy_stats(matches, team_list, team_id_map, stat_types):
+    from helpers.matchstats_helper import MatchstatsHelper
+
+    Minv = MatchstatsHelper.build_Minv_matrix(matches, team_id_map, played_only=True)
+    stats = {}
+    for stat_type in stat_types:
+        stats[stat_type] = MatchstatsHelper.calc_stat(matches, team_list, team_id_map, Minv, stat_type)
+    return stats
+
+
+def run_case(name, matches, stat_types, run_legacy):
+    from helpers.matchstats_helper import MatchstatsHelper
+
+    team_list, team_id_map = MatchstatsHelper.build_team_mapping(matches)
+    print "{}: {} teams, {} matches, {} stats".format(name, len(team_list), len(matches), len(stat_types))
+
+    start = time.time()
+    stats = MatchstatsHelper.calc_stats(matches, team_list, team_id_map, stat_types)
+    print "  sparse cholesky: {:.3f}s".format(time.time() - start)
+
+    if run_legacy:
+        start = time.time()
+        old_stats = legacy_stats(matches, team_list, team_id_map, stat_types)
+        print "  legacy pinv:     {:.3f}s".format(time.time() - start)
+        print "  max abs diff:    {:.3g}".format(max_abs_diff(stats, old_stats))
+
+
+def main(sdk_path, seed, legacy_season):
+    tb = setup_sdk(sdk_path)
+
+    from helpers.matchstats_helper import MatchstatsHelper
+    stat_types = MatchstatsHelper.DEFAULT_STATS + MatchstatsHelper.YEAR_STATS[2016]
+
+    rand = random.Random(seed)
+    division_teams = ['frc{}'.format(i + 1) for i in xrange(80)]
+    division = build_synthetic_event('2016synth', 2016, division_teams, 10, rand)
+    run_case("80 team division", division, stat_types, True)
+
+    season = build_synthetic_season(2016, 3200, 40, 12, rand)
+    run_case("Season-wide", season, stat_types, legacy_season)
+
+    tb.deactivate()
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option("-s", "--sdk_path", type="string", default="/usr/local/google_appengine",
+                      help="path to load Google Appengine SDK from")
+    parser.add_option("--seed", type="int", default=0,
+                      help="random seed for synthetic events")
+    parser.add_option("--legacy_season", action="store_true", default=False,
+                      help="also run the legacy pinv engine on the season-wide problem (slow)")
+    options, args = parser.parse_args()
+
+    main(options.sdk_path, options.seed, options.legacy_season)
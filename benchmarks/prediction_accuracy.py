@@ -0,0 +1,133 @@
+#!/usr/bin/python
+import json
+import multiprocessing
+import optparse
+import random
+import time
+
+USAGE = """%prog -s SDK_PATH -y YEAR [-d DATASTORE_PATH] [FIXTURE ...]
+Replays match predictions for every event of a season and writes an accuracy
+report: Brier score, win/loss accuracy, calibration buckets, bonus ranking
+point Brier scores and the residual variances to tune each model's
+DEFAULT_VARIANCES with.
+
+The season is read once from a dev_appserver datastore file, or from
+test_data style fixtures when no datastore is given. Model states (and
+their prior event stats) are built up front, then events are fanned out
+over a process pool. Workers don't touch the datastore.
+
+SDK_PATH        Path to the SDK installation
+YEAR            Season to evaluate
+DATASTORE_PATH  dev_appserver datastore file holding the season's events and matches
+FIXTURE         Event fixture files to load instead of a datastore"""
+
+
+from benchmark_helper import load_recorded_event, setup_sdk
+
+# Events to evaluate, filled in before the pool forks so workers inherit them
+# {event_key: (event, quals matches, model state)}
+_SEASON = {}
+
+
+def load_season(year, official_only):
+    """
+    Reads the season's events and matches with one query each and builds
+    every event's model state
+    """
+    from helpers.match_helper import MatchHelper
+    from helpers.matchstats_helper import MatchstatsHelper
+    from helpers.prediction_helper import PredictionHelper
+    from models.event import Event
+    from models.match import Match
+
+    events = Event.query(Event.year == year).fetch()
+    matches_by_event = {}
+    for match in Match.query(Match.year == year).fetch():
+        matches_by_event.setdefault(match.event.id(), []).append(match)
+
+    model = PredictionHelper.get_prediction_model(year)
+    season = {}
+    for event in events:
+        if official_only and not event.official:
+            continue
+        qual_matches = MatchHelper.organizeMatches(matches_by_event.get(event.key.id(), []))['qm']
+        if not qual_matches:
+            continue
+        team_list, _ = MatchstatsHelper.build_team_mapping(qual_matches)
+        model_state = PredictionHelper.build_model_state(model, year, team_list, event.key)
+        season[event.key.id()] = (event, qual_matches, model_state)
+    return season
+
+
+def evaluate_event(event_key):
+    from helpers.prediction_evaluation_helper import PredictionEvaluationHelper
+    from helpers.prediction_helper import PredictionHelper
+
+    start = time.time()
+    event, qual_matches, model_state = _SEASON[event_key]
+    predictions, _, model_state = PredictionHelper.get_match_predictions(qual_matches, model_state, event=event)
+    evaluation = PredictionEvaluationHelper.evaluate_match_predictions(qual_matches, predictions, model_state)
+    return event_key, evaluation, time.time() - start
+
+
+def main(sdk_path, year, datastore_path, fixtures, processes, official_only, output):
+    tb = setup_sdk(sdk_path, datastore_path)
+
+    from helpers.prediction_evaluation_helper import PredictionEvaluationHelper
+
+    rand = random.Random(0)
+    for path in fixtures:
+        event, matches = load_recorded_event(path, rand, synthesize_breakdowns=False)
+        event.put()
+        for match in matches:
+            match.put()
+
+    start = time.time()
+    _SEASON.update(load_season(year, official_only))
+    print "Loaded {} events in {:.1f}s".format(len(_SEASON), time.time() - start)
+
+    start = time.time()
+    pool = multiprocessing.Pool(processes)
+    results = pool.map(evaluate_event, sorted(_SEASON.keys()))
+    pool.close()
+    pool.join()
+    print "Evaluated {} events in {:.1f}s ({:.1f}s of work)".format(
+        len(results), time.time() - start, sum(elapsed for _, _, elapsed in results))
+
+    report = {
+        'year': year,
+        'overall': PredictionEvaluationHelper.summarize(
+            PredictionEvaluationHelper.merge_evaluations([evaluation for _, evaluation, _ in results])),
+        'events': {},
+    }
+    for event_key, evaluation, _ in results:
+        summary = PredictionEvaluationHelper.summarize(evaluation)
+        report['events'][event_key] = dict((key, summary[key]) for key in ['matches', 'brier', 'wl_accuracy'])
+
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    overall = report['overall']
+    print "{} matches: brier {}, wl_accuracy {}. Report written to {}".format(
+        overall['matches'], overall['brier'], overall['wl_accuracy'], output)
+
+    tb.deactivate()
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option("-s", "--sdk_path", type="string", default="/usr/local/google_appengine",
+                      help="path to load Google Appengine SDK from")
+    parser.add_option("-y", "--year", type="int", default=2016,
+                      help="season to evaluate")
+    parser.add_option("-d", "--datastore_path", type="string", default=None,
+                      help="dev_appserver datastore file to read the season from")
+    parser.add_option("-p", "--processes", type="int", default=multiprocessing.cpu_count(),
+                      help="number of worker processes")
+    parser.add_option("--all_events", action="store_true", default=False,
+                      help="include unofficial events")
+    parser.add_option("-o", "--output", type="string", default=None,
+                      help="report path, defaults to prediction_accuracy_YEAR.json")
+    options, args = parser.parse_args()
+
+    main(options.sdk_path, options.year, options.datastore_path, args, options.processes,
+         not options.all_events, options.output or 'prediction_accuracy_{}.json'.format(options.year))
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+import logging
+import optparse
+import os
+import time
+
+USAGE = """%prog [-n ITERATIONS]
+Benchmarks parse throughput of the table-driven usfirst HTML parsers with
+the BeautifulSoup and lxml table backends on the pages in
+test_data/usfirst_html, and checks that both backends parse the same."""
+
+
+from benchmark_helper import ROOT_PATH
+
+from datafeeds.html_table_backends import BeautifulSoupTableBackend, LxmlTableBackend, etree
+from datafeeds.parser_base import ParserBase
+from datafeeds.usfirst_alliances_parser import UsfirstAlliancesParser
+from datafeeds.usfirst_event_awards_parser import UsfirstEventAwardsParser
+from datafeeds.usfirst_event_awards_parser_02 import UsfirstEventAwardsParser_02
+from datafeeds.usfirst_event_awards_parser_03_04 import UsfirstEventAwardsParser_03_04
+from datafeeds.usfirst_event_rankings_parser import UsfirstEventRankingsParser
+from datafeeds.usfirst_match_schedule_parser import UsfirstMatchScheduleParser
+from datafeeds.usfirst_matches_parser import UsfirstMatchesParser
+from datafeeds.usfirst_matches_parser_2002 import UsfirstMatchesParser2002
+from datafeeds.usfirst_matches_parser_2003 import UsfirstMatchesParser2003
+
+
+PARSER_PAGES = [
+    (UsfirstAlliancesParser, ['matches_2014curie', 'matches_2014test']),
+    (UsfirstEventRankingsParser, ['rankings_2012ct', 'rankings_2012ct_bad', 'rankings_2014casj']),
+    (UsfirstMatchesParser, ['matches_2012ct', 'matches_2013cama', 'matches_2013casd',
+                            'matches_2013pahat_incomplete', 'matches_2014test']),
+    (UsfirstMatchScheduleParser, ['match_schedule_2013casj_elim', 'match_schedule_2013casj_qual',
+                                  'match_schedule_2014cmp_elim']),
+    (UsfirstMatchesParser2002, ['matches_2002sj', 'matches_2002tx', 'matches_2002va']),
+    (UsfirstMatchesParser2003, ['matches_2003cmp', 'matches_2003sj']),
+    (UsfirstEventAwardsParser, ['awards_2007cmp', 'awards_2007galileo', 'awards_2007sj', 'awards_2009gl',
+                                'awards_2010sac', 'awards_2011cmp', 'awards_2012cmp', 'awards_2012galileo',
+                                'awards_2012gl', 'awards_2012sj', 'awards_2013cmp']),
+    (UsfirstEventAwardsParser_02, ['awards_2002sj']),
+    (UsfirstEventAwardsParser_03_04, ['awards_2003cmp', 'awards_2003sj', 'awards_2004sj']),
+]
+
+
+def time_parse(parser, html, backend, iterations):
+    """
+    Returns the fastest of iterations parses, in seconds, and the parse result
+    """
+    ParserBase.TABLE_BACKEND = backend
+    best = None
+    for _ in xrange(iterations):
+        start = time.time()
+        result = parser.parse(html)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main(iterations):
+    if etree is None:
+        print "lxml isn't installed"
+        return
+    logging.disable(logging.CRITICAL)  # The parsers warn about every unscored match
+
+    print "{:<32} {:<36} {:>7} {:>9} {:>9} {:>8}  {}".format(
+        "Parser", "Page", "KB", "BS3 ms", "lxml ms", "Speedup", "Same")
+    total_bytes = 0
+    total_times = {BeautifulSoupTableBackend: 0, LxmlTableBackend: 0}
+    pages = 0
+    differing = 0
+    for parser, page_names in PARSER_PAGES:
+        for page_name in page_names:
+            with open(os.path.join(ROOT_PATH, 'test_data', 'usfirst_html', 'usfirst_event_{}.html'.format(page_name)), 'r') as f:
+                html = f.read()
+            soup_time, soup_result = time_parse(parser, html, BeautifulSoupTableBackend, iterations)
+            lxml_time, lxml_result = time_parse(parser, html, LxmlTableBackend, iterations)
+            same = soup_result == lxml_result
+            print "{:<32} {:<36} {:>7.1f} {:>9.1f} {:>9.1f} {:>7.1f}x  {}".format(
+                parser.__name__, page_name, len(html) / 1024.0, soup_time * 1000, lxml_time * 1000,
+                soup_time / lxml_time, "yes" if same else "NO")
+
+            total_bytes += len(html)
+            total_times[BeautifulSoupTableBackend] += soup_time
+            total_times[LxmlTableBackend] += lxml_time
+            pages += 1
+            differing += 0 if same else 1
+
+    print
+    for backend in [BeautifulSoupTableBackend, LxmlTableBackend]:
+        print "{:<28} {:>8.1f} pages/s {:>8.2f} MB/s".format(
+            backend.__name__, pages / total_times[backend], total_bytes / total_times[backend] / 1024 / 1024)
+    print "Speedup: {:.1f}x".format(total_times[BeautifulSoupTableBackend] / total_times[LxmlTableBackend])
+    print "Pages parsed differently: {}".format(differing)
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    parser.add_option("-n", "--iterations", type="int", default=5,
+                      help="parses per page and backend, the fastest is reported")
+    options, args = parser.parse_args()
+
+    main(options.iterations)
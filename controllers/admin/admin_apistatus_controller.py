@@ -4,6 +4,8 @@ from google.appengine.ext.webapp import template
 
 from controllers.api.api_status_controller import ApiStatusController
 from controllers.base_controller import LoggedInHandler
+from helpers.fms_api_health_helper import FMSAPIHealthHelper
+from helpers.notification_sender import NotificationSender
 from models.sitevar import Sitevar
 
 
@@ -29,6 +31,10 @@ class AdminApiStatus(LoggedInHandler):
             'ios_latest_version': ios_status.get('latest_app_version', -1) if ios_status else -1,
             'ios_min_version': ios_status.get('min_app_version', -1) if ios_status else -1,
             'enable_trustedapi': trusted_sitevar.contents['enabled'],
+            'fmsapi_health': FMSAPIHealthHelper.get_metrics(),
+            'fmsapi_health_failures_to_down': FMSAPIHealthHelper.FAILURES_TO_DOWN,
+            'fmsapi_health_successes_to_up': FMSAPIHealthHelper.SUCCESSES_TO_UP,
+            'webhook_metrics': NotificationSender.get_all_webhook_metrics(),
         })
 
         path = os.path.join(os.path.dirname(__file__), '../../templates/admin/apistatus.html')
@@ -134,13 +134,10 @@ class AdminWebhooksClearEnqueue(LoggedInHandler):
 class AdminWebhooksClear(LoggedInHandler):
     def get(self):
         webhooks = MobileClient.query(MobileClient.client_type == ClientType.WEBHOOK).fetch()
-        failures = []
-
         notification = PingNotification()._render_webhook()
 
-        for key in webhooks:
-            if not NotificationSender.send_webhook(notification, [(key.messaging_id, key.secret)]):
-                failures.append(key.key)
+        invalid_urls = set(NotificationSender.send_webhooks(notification, [(key.messaging_id, key.secret) for key in webhooks]))
+        failures = [key.key for key in webhooks if key.messaging_id in invalid_urls]
 
         count = len(failures)
         if failures:
@@ -9,6 +9,7 @@ from database.event_query import EventQuery, EventListQuery
 from database.event_details_query import EventDetailsQuery
 from database.match_query import EventMatchesQuery
 from database.team_query import EventTeamsQuery
+from models.event_team_statuses import EventTeamStatuses
 
 
 class ApiEventListController(ApiBaseController):
@@ -77,6 +78,27 @@ class ApiEventTeamsController(ApiBaseController):
         return json.dumps(teams, ensure_ascii=True, indent=2, sort_keys=True)
 
 
+class ApiEventTeamsStatusesController(ApiBaseController):
+    CACHE_VERSION = 0
+    CACHE_HEADER_LENGTH = 61
+
+    def __init__(self, *args, **kw):
+        super(ApiEventTeamsStatusesController, self).__init__(*args, **kw)
+        self._cache_expiration = 61
+
+    def _track_call(self, event_key):
+        self._track_call_defer('event/teams/statuses', event_key)
+
+    def _render(self, event_key):
+        event_team_statuses = EventTeamStatuses.get_by_id(event_key)
+        if event_team_statuses is None:
+            return json.dumps({})
+
+        self._last_modified = event_team_statuses.updated
+        self._etag = event_team_statuses.etag
+        return json.dumps(event_team_statuses.statuses, ensure_ascii=True, separators=(',', ':'), sort_keys=True)
+
+
 class ApiEventMatchesController(ApiBaseController):
     CACHE_VERSION = 0
     CACHE_HEADER_LENGTH = 61
@@ -0,0 +1,16 @@
+import json
+
+from controllers.apiv3.api_base_controller import ApiBaseController
+from database.matchstats_query import YearMatchstatsQuery
+
+
+class ApiYearMatchstatsController(ApiBaseController):
+    CACHE_VERSION = 0
+    CACHE_HEADER_LENGTH = 60 * 60
+
+    def _track_call(self, year):
+        self._track_call_defer('matchstats/year', year)
+
+    def _render(self, year):
+        year_matchstats, self._last_modified = YearMatchstatsQuery(int(year)).fetch(dict_version=3, return_updated=True)
+        return json.dumps(year_matchstats, ensure_ascii=True, indent=2, sort_keys=True)
@@ -31,6 +31,7 @@ class CacheableHandler(webapp2.RequestHandler):
         super(CacheableHandler, self).__init__(*args, **kw)
         self._cache_expiration = 0
         self._last_modified = None  # A datetime object
+        self._etag = None  # A string identifying the rendered version
         self._user_bundle = UserBundle()
         self._is_admin = self._user_bundle.is_current_user_admin
         if not hasattr(self, '_partial_cache_key'):
@@ -70,6 +71,8 @@ class CacheableHandler(webapp2.RequestHandler):
             self._set_cache_header_length(self.CACHE_HEADER_LENGTH)
             self.template_values["render_time"] = datetime.datetime.now()
             rendered = self._render(*args, **kw)
+            if self._etag is not None:
+                self.response.headers['ETag'] = '"{}"'.format(self._etag)
             if self._has_been_modified_since(self._last_modified):
                 self.response.out.write(self._add_admin_bar(rendered))
                 self._write_cache(self.response)
@@ -86,6 +89,18 @@ class CacheableHandler(webapp2.RequestHandler):
                 return None
 
     def _has_been_modified_since(self, datetime):
+        etag = self.response.headers.get('ETag')  # Also restored from cached responses
+        if_none_match = self.request.headers.get('If-None-Match')
+        if etag and if_none_match:
+            # If-None-Match takes precedence over If-Modified-Since
+            if datetime is not None:
+                self.response.headers['Last-Modified'] = format_date_time(mktime(datetime.timetuple()))
+            if etag in [tag.strip().replace('W/', '', 1) for tag in if_none_match.split(',')]:
+                self.response.set_status(304)
+                return False
+            else:
+                return True
+
         if datetime is None:
             return True
 
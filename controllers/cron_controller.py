@@ -1,4 +1,5 @@
 import datetime
+import hashlib
 import logging
 import os
 import json
@@ -11,7 +12,6 @@ from google.appengine.ext import webapp
 from google.appengine.ext.webapp import template
 
 from consts.district_type import DistrictType
-from consts.event_type import EventType
 
 from database.district_query import DistrictsInYearQuery
 from database.event_query import DistrictEventsQuery
@@ -26,6 +26,7 @@ from helpers.event_team_manipulator import EventTeamManipulator
 from helpers.event_team_status_helper import EventTeamStatusHelper
 from helpers.event_team_repairer import EventTeamRepairer
 from helpers.event_team_updater import EventTeamUpdater
+from helpers.insights_accumulator_helper import InsightsAccumulatorHelper
 from helpers.insights_helper import InsightsHelper
 from helpers.match_helper import MatchHelper
 from helpers.matchstats_helper import MatchstatsHelper
@@ -35,10 +36,14 @@ from helpers.prediction_helper import PredictionHelper
 from helpers.insight_manipulator import InsightManipulator
 from helpers.team_manipulator import TeamManipulator
 from helpers.match_manipulator import MatchManipulator
+from helpers.year_matchstats_manipulator import YearMatchstatsManipulator
 
 from models.district import District
+from models.district_rankings_state import DistrictRankingsState
 from models.event import Event
 from models.event_details import EventDetails
+from models.event_matchstats_state import EventMatchstatsState
+from models.year_matchstats import YearMatchstats
 from models.event_team import EventTeam
 from models.match import Match
 from models.team import Team
@@ -152,29 +157,43 @@ class EventTeamUpdateEnqueue(webapp.RequestHandler):
 class EventMatchstatsDo(webapp.RequestHandler):
     """
     Calculates match stats (OPR/DPR/CCWM) for an event
-    Calculates predictions for an event
+    Calculates predictions for an event, reusing the model state stored with its previous predictions
+    Live events update their matchstats incrementally from the stored EventMatchstatsState,
+    other events rebuild it from scratch so late corrections are picked up
     """
     def get(self, event_key):
         event = Event.get_by_id(event_key)
-        matchstats_dict = MatchstatsHelper.calculate_matchstats(event.matches, event.year)
+        old_matchstats_state = EventMatchstatsState.get_by_id(event_key)
+        old_alliance_rows = old_matchstats_state.alliance_rows if old_matchstats_state else None
+
+        matchstats_dict, matchstats_state = MatchstatsHelper.calculate_matchstats_incremental(
+            event.matches, event.year, old_matchstats_state if event.within_a_day else None)
+        if matchstats_state is not None:
+            matchstats_state.put()
+
+            # Refresh season-wide stats once quals are done, and again whenever a played quals match changes
+            qual_matches = [match for match in event.matches if match.comp_level == 'qm']
+            if (event.official and qual_matches and all(match.has_been_played for match in qual_matches) and
+                    matchstats_state.alliance_rows != old_alliance_rows):
+                alliance_rows_hash = hashlib.md5(json.dumps(matchstats_state.alliance_rows, sort_keys=True)).hexdigest()
+                try:
+                    taskqueue.add(
+                        name='year_matchstats_{}_{}'.format(event_key, alliance_rows_hash),
+                        target='backend-tasks-b2',
+                        url='/backend-tasks-b2/math/do/year_matchstats/{}'.format(event.year),
+                        method='GET')
+                except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+                    pass
         if any([v != {} for v in matchstats_dict.values()]):
             pass
         else:
             logging.warn("Matchstat calculation for {} failed!".format(event_key))
             matchstats_dict = None
 
-        predictions_dict = None
-        if event.year == 2016:
-            organized_matches = MatchHelper.organizeMatches(event.matches)
-            match_predictions, match_prediction_stats = PredictionHelper.get_match_predictions(organized_matches['qm'])
-            ranking_predictions, ranking_prediction_stats = PredictionHelper.get_ranking_predictions(organized_matches['qm'], match_predictions)
-
-            predictions_dict = {
-                'match_predictions': match_predictions,
-                'match_prediction_stats': match_prediction_stats,
-                'ranking_predictions': ranking_predictions,
-                'ranking_prediction_stats': ranking_prediction_stats
-            }
+        old_event_details = EventDetails.get_by_id(event_key)
+        organized_matches = MatchHelper.organizeMatches(event.matches)
+        predictions_dict = PredictionHelper.get_predictions(
+            organized_matches['qm'], old_event_details.predictions if old_event_details else None)
 
         event_details = EventDetails(
             id=event_key,
@@ -218,6 +237,86 @@ class EventMatchstatsEnqueue(webapp.RequestHandler):
         self.response.out.write(template.render(path, template_values))
 
 
+class YearMatchstatsEnqueue(webapp.RequestHandler):
+    """
+    Enqueues season-wide Matchstats calculation for a year
+    """
+    def get(self, year):
+        taskqueue.add(
+            target='backend-tasks-b2',
+            url='/backend-tasks-b2/math/do/year_matchstats/{}'.format(year),
+            method='GET')
+
+        self.response.out.write("Enqueued year matchstats for: {}".format(year))
+
+
+class YearMatchstatsDo(webapp.RequestHandler):
+    """
+    Calculates season-wide match stats (OPR/DPR/CCWM) across all official events in a year
+    """
+    def get(self, year):
+        year = int(year)
+        events = Event.query(Event.year == year, Event.official == True).fetch()
+        event_states = ndb.get_multi([ndb.Key(EventMatchstatsState, event.key.id()) for event in events])
+
+        # Build missing states once so later refreshes don't need to load matches
+        new_states = []
+        for i, (event, event_state) in enumerate(zip(events, event_states)):
+            if event_state is not None or event.start_date is None or event.future:
+                continue
+            if any(match.comp_level == 'qm' and match.has_been_played for match in event.matches):
+                _, event_state = MatchstatsHelper.calculate_matchstats_incremental(event.matches, year)
+            elif event.past:
+                # Nothing was played, so store an empty state to not load its matches every night.
+                # EventMatchstatsDo replaces it if matches are added later.
+                event_state = EventMatchstatsState(id=event.key.id(), alliance_rows={})
+            if event_state is not None:
+                new_states.append(event_state)
+                event_states[i] = event_state
+        ndb.put_multi(new_states)
+
+        year_matchstats = MatchstatsHelper.calculate_year_matchstats(
+            year, event_states, YearMatchstats.get_by_id(str(year)))
+        if year_matchstats is not None:
+            YearMatchstatsManipulator.createOrUpdate(year_matchstats)
+
+        if 'X-Appengine-Taskname' not in self.request.headers:  # Only write out if not in taskqueue
+            self.response.out.write("Finished calculating year matchstats for {} from {} events".format(
+                year, len(year_matchstats.event_keys) if year_matchstats else 0))
+
+
+class TeamYearStatsEnqueue(webapp.RequestHandler):
+    """
+    Enqueues rebuilding the TeamYearStats index for a year
+    """
+    def get(self, year):
+        taskqueue.add(
+            target='backend-tasks-b2',
+            url='/backend-tasks-b2/math/do/team_year_stats/{}'.format(year),
+            method='GET')
+
+        self.response.out.write("Enqueued team year stats for: {}".format(year))
+
+
+class TeamYearStatsDo(webapp.RequestHandler):
+    """
+    Rebuilds the per-year TeamYearStats index from every event's matchstats in a year
+    """
+    def get(self, year):
+        events = Event.query(Event.year == int(year)).fetch()
+        events_details = ndb.get_multi([ndb.Key(EventDetails, event.key.id()) for event in events])
+
+        events_matchstats = []
+        for event, event_details in zip(events, events_details):
+            if event_details and event_details.matchstats:
+                events_matchstats.append((event, event_details.matchstats))
+        changed = MatchstatsHelper.update_team_year_stats(events_matchstats)
+
+        if 'X-Appengine-Taskname' not in self.request.headers:  # Only write out if not in taskqueue
+            self.response.out.write("Updated {} team year stats from {} events".format(
+                len(changed), len(events_matchstats)))
+
+
 class FinalMatchesRepairDo(webapp.RequestHandler):
     """
     Repairs zero-indexed final matches
@@ -288,9 +387,15 @@ class YearInsightsDo(webapp.RequestHandler):
 
         insights = None
         if kind == 'matches':
-            insights = InsightsHelper.doMatchInsights(year)
+            # Also checks the running totals that match updates apply deltas to
+            match_contributions = {}
+            insights = InsightsHelper.doMatchInsights(year, match_contributions)
+            InsightsAccumulatorHelper.check_state(year, match_contributions)
         elif kind == 'awards':
-            insights = InsightsHelper.doAwardInsights(year)
+            # Overall award insights merge each year's partial instead of re-reading every year's Insights
+            award_partial = {}
+            insights = InsightsHelper.doAwardInsights(year, award_partial)
+            InsightsAccumulatorHelper.set_award_partial(year, award_partial)
 
         if insights != None:
             InsightManipulator.createOrUpdate(insights)
@@ -308,6 +413,22 @@ class YearInsightsDo(webapp.RequestHandler):
         self.get()
 
 
+class MatchInsightsUpdateDo(webapp.RequestHandler):
+    """
+    Renders a year's match insights from the running totals match updates
+    apply deltas to. Year specific insights are left to YearInsightsDo.
+    """
+
+    def get(self, year):
+        year = int(year)
+
+        insights = InsightsHelper.doMatchInsightsFromState(year, InsightsAccumulatorHelper.get_state(year))
+        InsightManipulator.createOrUpdate(insights)
+
+        if 'X-Appengine-Taskname' not in self.request.headers:  # Only write out if not in taskqueue
+            self.response.out.write("Updated {} match insights for {}".format(len(insights), year))
+
+
 class OverallInsightsEnqueue(webapp.RequestHandler):
     """
     Enqueues Overall Insights calculation for a given kind.
@@ -440,21 +561,28 @@ class TypeaheadCalcDo(webapp.RequestHandler):
 
 class DistrictPointsCalcEnqueue(webapp.RequestHandler):
     """
-    Enqueues calculation of district points for all district events for a given year
+    Enqueues calculation of district points for all district events for a given year,
+    batched into one task per district week
     """
 
     def get(self, year):
+        year = int(year)
         all_event_keys = []
+        district_weeks = set()
         for district_type_enum in DistrictType.type_names.keys():
             if district_type_enum == DistrictType.NO_DISTRICT:
                 continue
 
-            year = int(year)
+            events = Event.query(Event.year == year, Event.event_district_enum == district_type_enum).fetch()
+            for event in events:
+                all_event_keys.append(event.key)
+                if event.week is None:
+                    taskqueue.add(url='/tasks/math/do/district_points_calc/{}'.format(event.key.id()), method='GET')
+                else:
+                    district_weeks.add((event.event_district_key, event.week))
 
-            event_keys = Event.query(Event.year == year, Event.event_district_enum == district_type_enum).fetch(None, keys_only=True)
-            all_event_keys += event_keys
-            for event_key in event_keys:
-                taskqueue.add(url='/tasks/math/do/district_points_calc/{}'.format(event_key.id()), method='GET')
+        for district_key, week in sorted(district_weeks):
+            taskqueue.add(url='/tasks/math/do/district_week_points_calc/{}/{}'.format(district_key, week), method='GET')
 
         self.response.out.write("Enqueued for: {}".format([event_key.id() for event_key in all_event_keys]))
 
@@ -482,7 +610,29 @@ class DistrictPointsCalcDo(webapp.RequestHandler):
             self.response.out.write(event.district_points)
 
         # Enqueue task to update rankings
-        taskqueue.add(url='/tasks/math/do/district_rankings_calc/{}'.format(event.district_key.id()), method='GET')
+        taskqueue.add(url='/tasks/math/do/district_rankings_calc/{}?event_key={}'.format(event.district_key.id(), event_key), method='GET')
+
+
+class DistrictWeekPointsCalcDo(webapp.RequestHandler):
+    """
+    Calculates district points for all events of a district in one week
+    """
+
+    def get(self, district_key, week):
+        week = int(week)
+        events = [event for event in DistrictEventsQuery(district_key).fetch() if event.week == week]
+        events_points = DistrictHelper.calculate_events_points(events)
+
+        EventDetailsManipulator.createOrUpdate([
+            EventDetails(id=event_key, district_points=district_points)
+            for event_key, district_points in events_points.items()])
+
+        if 'X-Appengine-Taskname' not in self.request.headers:  # Only write out if not in taskqueue
+            self.response.out.write("Calculated district points for: {}".format(sorted(events_points.keys())))
+
+        # Enqueue task to update rankings
+        if events_points:
+            taskqueue.add(url='/tasks/math/do/district_rankings_calc/{}'.format(district_key), method='GET')
 
 
 class DistrictRankingsCalcEnqueue(webapp.RequestHandler):
@@ -502,42 +652,41 @@ class DistrictRankingsCalcEnqueue(webapp.RequestHandler):
 class DistrictRankingsCalcDo(webapp.RequestHandler):
     """
     Calculates district rankings for a district year
+    With an event_key param, applies just that event's district points to the stored DistrictRankingsState
     """
 
     def get(self, district_key):
         district = District.get_by_id(district_key)
         if not district:
             self.response.out.write("District {} does not exist!".format(district_key))
+            return
 
-        events_future = DistrictEventsQuery(district_key).fetch_async()
-        teams_future = DistrictTeamsQuery(district_key).fetch_async()
+        rankings_state = None
+        event_key = self.request.get('event_key')
+        if event_key:
+            rankings_state = DistrictRankingsState.get_by_id(district_key)
 
-        events = events_future.get_result()
-        for event in events:
+        if rankings_state is not None:
+            event = Event.get_by_id(event_key)
             event.prep_details()
-        EventHelper.sort_events(events)
-        team_totals = DistrictHelper.calculate_rankings(events, teams_future, district.year)
-
-        rankings = []
-        current_rank = 1
-        for key, points in team_totals:
-            point_detail = {}
-            point_detail["rank"] = current_rank
-            point_detail["team_key"] = key
-            point_detail["event_points"] = []
-            for event, event_points in points["event_points"]:
-                event_points['event_key'] = event.key.id()
-                event_points['district_cmp'] = True if event.event_type_enum == EventType.DISTRICT_CMP else False
-                point_detail["event_points"].append(event_points)
-
-            point_detail["rookie_bonus"] = points.get("rookie_bonus", 0)
-            point_detail["point_total"] = points["point_total"]
-            rankings.append(point_detail)
-            current_rank += 1
-
-        if rankings:
-            district.rankings = rankings
-            DistrictManipulator.createOrUpdate(district)
+            state_changed = DistrictHelper.update_rankings_state(rankings_state, event)
+        else:
+            events_future = DistrictEventsQuery(district_key).fetch_async()
+            teams_future = DistrictTeamsQuery(district_key).fetch_async()
+
+            events = events_future.get_result()
+            for event in events:
+                event.prep_details()
+            rankings_state = DistrictHelper.build_rankings_state(district_key, events, teams_future, district.year)
+            state_changed = True
+
+        if state_changed:
+            rankings_state.put()
+
+            rankings = DistrictHelper.render_rankings(rankings_state)
+            if rankings and rankings != district.rankings:
+                district.rankings = rankings
+                DistrictManipulator.createOrUpdate(district)
 
         if 'X-Appengine-Taskname' not in self.request.headers:  # Only write out if not in taskqueue
             self.response.out.write("Finished calculating rankings for: {}".format(district_key))
@@ -558,14 +707,24 @@ class EventTeamStatusCalcEnqueue(webapp.RequestHandler):
 
 class EventTeamStatusCalcDo(webapp.RequestHandler):
     """
-    Calculates event team statuses for all teams at an event
+    Calculates event team statuses for all teams at an event in one pass
     """
     def get(self, event_key):
         event = Event.get_by_id(event_key)
         event_teams = EventTeam.query(EventTeam.event==event.key).fetch()
+        statuses = EventTeamStatusHelper.generate_event_team_statuses(
+            event, [event_team.team.id() for event_team in event_teams])
+
+        # Only write the EventTeams whose status changed
+        changed_event_teams = []
         for event_team in event_teams:
-            event_team.status = EventTeamStatusHelper.generate_team_at_event_status(event_team.team.id(), event)
-        EventTeamManipulator.createOrUpdate(event_teams)
+            status = statuses[event_team.team.id()]
+            if status != event_team.status:
+                event_team.status = status
+                changed_event_teams.append(event_team)
+        if changed_event_teams:
+            EventTeamManipulator.createOrUpdate(changed_event_teams)
+        EventTeamStatusHelper.update_event_team_statuses(event_key, statuses)
 
         if 'X-Appengine-Taskname' not in self.request.headers:  # Only write out if not in taskqueue
             self.response.out.write("Finished calculating event team statuses for: {}".format(event_key))
@@ -22,6 +22,7 @@ from helpers.event_details_manipulator import EventDetailsManipulator
 from helpers.event_team_manipulator import EventTeamManipulator
 from helpers.match_manipulator import MatchManipulator
 from helpers.match_helper import MatchHelper
+from helpers.poll_schedule_helper import PollScheduleHelper
 from helpers.award_manipulator import AwardManipulator
 from helpers.team_manipulator import TeamManipulator
 from helpers.district_team_manipulator import DistrictTeamManipulator
@@ -149,7 +150,9 @@ class FMSAPIEventAlliancesGet(webapp.RequestHandler):
             id=event_key,
             alliance_selections=alliance_selections
         )
-        EventDetailsManipulator.createOrUpdate(event_details)
+        if alliance_selections is not None:
+            EventDetailsManipulator.createOrUpdate(event_details)
+            df.save_validators()
 
         template_values = {'alliance_selections': alliance_selections,
                            'event_name': event_details.key.id()}
@@ -167,6 +170,7 @@ class FMSAPIEventRankingsEnqueue(webapp.RequestHandler):
         if when == "now":
             events = EventHelper.getEventsWithinADay()
             events = filter(lambda e: e.official, events)
+            events = PollScheduleHelper.events_to_poll(events, 'rankings')
         else:
             event_keys = Event.query(Event.official == True).filter(Event.year == int(when)).fetch(500, keys_only=True)
             events = ndb.get_multi(event_keys)
@@ -200,7 +204,9 @@ class FMSAPIEventRankingsGet(webapp.RequestHandler):
             rankings=rankings,
             rankings2=rankings2
         )
-        EventDetailsManipulator.createOrUpdate(event_details)
+        if rankings is not None or rankings2 is not None:
+            EventDetailsManipulator.createOrUpdate(event_details)
+            df.save_validators()
 
         template_values = {'rankings': rankings,
                            'event_name': event_details.key.id()}
@@ -218,6 +224,7 @@ class FMSAPIMatchesEnqueue(webapp.RequestHandler):
         if when == "now":
             events = EventHelper.getEventsWithinADay()
             events = filter(lambda e: e.official, events)
+            events = PollScheduleHelper.events_to_poll(events, 'matches')
         else:
             event_keys = Event.query(Event.official == True).filter(Event.year == int(when)).fetch(500, keys_only=True)
             events = ndb.get_multi(event_keys)
@@ -245,6 +252,8 @@ class FMSAPIMatchesGet(webapp.RequestHandler):
         df = DatafeedFMSAPI('v2.0')
 
         new_matches = MatchManipulator.createOrUpdate(df.getMatches(event_key))
+        df.save_validators()
+        logging.info("Saved {} upstream bytes with conditional requests".format(df.bytes_saved))
 
         template_values = {
             'matches': new_matches,
@@ -276,36 +285,84 @@ class FMSAPIMatchesGet(webapp.RequestHandler):
 #         self.response.out.write("Reload with ?offset=%s to enqueue more." % (offset + len(teams)))
 
 
-# class TeamDetailsRollingEnqueue(webapp.RequestHandler):
-#     """
-#     Handles enqueing updates to individual teams
-#     Enqueues a certain fraction of teams so that all teams will get updated
-#     every PERIOD days.
-#     """
-#     PERIOD = 14  # a particular team will be updated every PERIOD days
+class TeamDetailsRollingEnqueue(webapp.RequestHandler):
+    """
+    Handles enqueing updates to all teams, in batches of team numbers.
+    Each batch's team details are fetched concurrently in one task.
+    """
+    BATCH_SIZE = 500  # team numbers per batch
 
-#     def get(self):
-#         now_epoch = time.mktime(datetime.datetime.now().timetuple())
-#         bucket_num = int((now_epoch / (60 * 60 * 24)) % self.PERIOD)
+    def get(self):
+        highest_team_key = Team.query().order(-Team.team_number).fetch(1, keys_only=True)[0]
+        highest_team_num = int(highest_team_key.id()[3:])
 
-#         highest_team_key = Team.query().order(-Team.team_number).fetch(1, keys_only=True)[0]
-#         highest_team_num = int(highest_team_key.id()[3:])
-#         bucket_size = int(highest_team_num / (self.PERIOD)) + 1
+        for min_team in xrange(0, highest_team_num + 1, self.BATCH_SIZE):
+            taskqueue.add(
+                queue_name='datafeed',
+                target='backend-tasks',
+                url='/backend-tasks/get/team_details_batch/{}/{}'.format(min_team, min_team + self.BATCH_SIZE),
+                method='GET')
 
-#         min_team = bucket_num * bucket_size
-#         max_team = min_team + bucket_size
-#         team_keys = Team.query(Team.team_number >= min_team, Team.team_number < max_team).fetch(1000, keys_only=True)
+        if 'X-Appengine-Taskname' not in self.request.headers:  # Only write out if not in taskqueue
+            self.response.out.write("Enqueued team detail batches of {} team numbers up to {}".format(self.BATCH_SIZE, highest_team_num))
 
-#         teams = ndb.get_multi(team_keys)
-#         for team in teams:
-#             taskqueue.add(
-#                 queue_name='datafeed',
-#                 url='/tasks/get/fmsapi_team_details/' + team.key_name,
-#                 method='GET')
 
-#         # FIXME omg we're just writing out? -fangeugene 2013 Nov 6
-#         self.response.out.write("Bucket number {} out of {}<br>".format(bucket_num, self.PERIOD))
-#         self.response.out.write("{} team gets have been enqueued in the interval [{}, {}).".format(len(teams), min_team, max_team))
+class TeamDetailsBatchGet(webapp.RequestHandler):
+    """
+    Fetches team details for teams in [min_team, max_team), like TeamDetailsGet
+    FMSAPI should be trusted over FIRSTElasticSearch
+    Teams FMSAPI doesn't return get their own TeamDetailsGet task, which falls back to FIRSTElasticSearch
+    """
+    def get(self, min_team, max_team):
+        existing_teams = Team.query(Team.team_number >= int(min_team), Team.team_number < int(max_team)).fetch()
+
+        fms_df = DatafeedFMSAPI('v2.0')
+        df2 = DatafeedFIRSTElasticSearch()
+        year = datetime.date.today().year
+        fms_details = fms_df.getTeamDetailsMulti(year, [team.key.id() for team in existing_teams])
+
+        found_teams = [team for team in existing_teams if fms_details.get(team.key.id())]
+        elasticsearch_teams = df2.getTeamDetailsMulti(found_teams)
+
+        teams = []
+        district_teams = []
+        robots = []
+        for existing_team in found_teams:
+            team, district_team, robot = fms_details[existing_team.key.id()]
+            elasticsearch_team = elasticsearch_teams.get(existing_team.key.id())
+            if team:
+                teams.append(TeamManipulator.mergeModels(team, elasticsearch_team))
+            elif elasticsearch_team:
+                teams.append(elasticsearch_team)
+            if district_team:
+                district_teams.append(district_team)
+            if robot:
+                robots.append(robot)
+
+        TeamManipulator.createOrUpdate(teams)
+        RobotManipulator.createOrUpdate(robots)
+
+        # Clean up junk district teams of teams FMSAPI returned, like TeamDetailsGet
+        found_team_keys = set(team.key.id() for team in found_teams)
+        district_team_keys = set(district_team.key for district_team in district_teams)
+        keys_to_delete = set()
+        for dt_key in DistrictTeam.query(DistrictTeam.year == year).fetch(keys_only=True):
+            if dt_key.id().split('_')[1] in found_team_keys and dt_key not in district_team_keys:
+                keys_to_delete.add(dt_key)
+        DistrictTeamManipulator.delete_keys(keys_to_delete)
+        DistrictTeamManipulator.createOrUpdate(district_teams)
+
+        missing_teams = [team for team in existing_teams if team.key.id() not in found_team_keys]
+        for team in missing_teams:
+            taskqueue.add(
+                queue_name='datafeed',
+                target='backend-tasks',
+                url='/backend-tasks/get/team_details/' + team.key.id(),
+                method='GET')
+
+        if 'X-Appengine-Taskname' not in self.request.headers:  # Only write out if not in taskqueue
+            self.response.out.write("Updated {} of {} teams in [{}, {}), enqueued {} teams FMSAPI didn't return".format(
+                len(teams), len(existing_teams), min_team, max_team, len(missing_teams)))
 
 
 class TeamDetailsGet(webapp.RequestHandler):
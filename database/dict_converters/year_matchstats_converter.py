@@ -0,0 +1,23 @@
+from database.dict_converters.converter_base import ConverterBase
+
+
+class YearMatchstatsConverter(ConverterBase):
+    SUBVERSIONS = {  # Increment every time a change to the dict is made
+        3: 0,
+    }
+
+    @classmethod
+    def convert(cls, year_matchstats, dict_version):
+        CONVERTERS = {
+            3: cls.yearMatchstatsConverter_v3,
+        }
+        return CONVERTERS[dict_version](year_matchstats)
+
+    @classmethod
+    def yearMatchstatsConverter_v3(cls, year_matchstats):
+        year_matchstats_dict = {
+            'events': year_matchstats.event_keys if year_matchstats else None,
+            'stats': year_matchstats.stats if year_matchstats else None,
+        }
+
+        return year_matchstats_dict
@@ -2,6 +2,7 @@ from database.award_query import EventAwardsQuery, TeamAwardsQuery, TeamYearAwar
 from database.district_query import DistrictsInYearQuery, DistrictHistoryQuery
 from database.event_query import EventQuery, EventListQuery, DistrictEventsQuery, TeamEventsQuery, TeamYearEventsQuery
 from database.event_details_query import EventDetailsQuery
+from database.matchstats_query import YearMatchstatsQuery
 from database.match_query import MatchQuery, EventMatchesQuery, TeamEventMatchesQuery, TeamYearMatchesQuery
 from database.media_query import TeamSocialMediaQuery, TeamYearMediaQuery, EventTeamsMediasQuery, EventTeamsPreferredMediasQuery
 from database.robot_query import TeamRobotsQuery
@@ -200,3 +201,13 @@ def district_updated(affected_refs):
         queries_and_keys.append(DistrictHistoryQuery(abbrev))
 
     return queries_and_keys
+
+
+def year_matchstats_updated(affected_refs):
+    years = filter(None, affected_refs['year'])
+
+    queries_and_keys = []
+    for year in years:
+        queries_and_keys.append(YearMatchstatsQuery(year))
+
+    return queries_and_keys
@@ -0,0 +1,17 @@
+from google.appengine.ext import ndb
+
+from database.database_query import DatabaseQuery
+from database.dict_converters.year_matchstats_converter import YearMatchstatsConverter
+from models.year_matchstats import YearMatchstats
+
+
+class YearMatchstatsQuery(DatabaseQuery):
+    CACHE_VERSION = 0
+    CACHE_KEY_FORMAT = 'year_matchstats_{}'  # (year)
+    DICT_CONVERTER = YearMatchstatsConverter
+
+    @ndb.tasklet
+    def _query_async(self):
+        year = self._query_args[0]
+        year_matchstats = yield YearMatchstats.get_by_id_async(str(year))
+        raise ndb.Return(year_matchstats)
@@ -3,6 +3,7 @@ import json
 import logging
 
 from google.appengine.api import urlfetch
+from google.appengine.ext import ndb
 
 from consts.event_type import EventType
 from datafeeds.datafeed_base import DatafeedBase
@@ -14,6 +15,8 @@ from parsers.first_elasticsearch.first_elasticsearch_team_details_parser import
 
 
 class DatafeedFIRSTElasticSearch(object):
+    MAX_IN_FLIGHT = 10  # Concurrent fetches in _parse_pool
+
     def __init__(self):
         URL_BASE = 'http://es01.usfirst.org'
         self.EVENT_LIST_URL_PATTERN = URL_BASE + '/events/_search?size=1000&source={"query":{"query_string":{"query":"(event_type:FRC)%%20AND%%20(event_season:%s)"}}}'  # (year)
@@ -42,6 +45,40 @@ class DatafeedFIRSTElasticSearch(object):
             logging.warning('URLFetch for %s failed; Error code %s' % (url, result.status_code))
             return []
 
+    @ndb.tasklet
+    def _parse_async(self, url, parser):
+        try:
+            rpc = urlfetch.create_rpc(deadline=5)
+            result = yield urlfetch.make_fetch_call(rpc, url)
+        except Exception, e:
+            logging.error("URLFetch failed for: {}".format(url))
+            logging.info(e)
+            raise ndb.Return([])
+
+        if result.status_code == 200:
+            raise ndb.Return(parser.parse(json.loads(result.content)))
+        else:
+            logging.warning('URLFetch for %s failed; Error code %s' % (url, result.status_code))
+            raise ndb.Return([])
+
+    @ndb.toplevel
+    def _parse_pool(self, urls_and_parsers):
+        """
+        Parses many URLs, keeping up to MAX_IN_FLIGHT fetches going at a time.
+        Returns results in the same order.
+        """
+        results = [[] for _ in urls_and_parsers]
+        remaining = list(reversed(list(enumerate(urls_and_parsers))))
+
+        @ndb.tasklet
+        def worker():
+            while remaining:
+                i, (url, parser) = remaining.pop()
+                results[i] = yield self._parse_async(url, parser)
+
+        yield [worker() for _ in xrange(min(self.MAX_IN_FLIGHT, len(urls_and_parsers)))]
+        raise ndb.Return(results)
+
     def getEventList(self, year):
         events = self._parse(self.EVENT_LIST_URL_PATTERN % (year), FIRSTElasticSearchEventListParser(year))
         return events
@@ -66,3 +103,17 @@ class DatafeedFIRSTElasticSearch(object):
             return None
 
         return self._parse(self.TEAM_DETAILS_URL_PATTERN % (team.first_tpid), FIRSTElasticSearchTeamDetailsParser(team.first_tpid_year))[0]
+
+    def getTeamDetailsMulti(self, teams):
+        """
+        Returns {team key name: Team, or None if it couldn't be fetched}
+        """
+        teams_with_tpid = [team for team in teams if team.first_tpid is not None and team.first_tpid_year is not None]
+        results = self._parse_pool([
+            (self.TEAM_DETAILS_URL_PATTERN % (team.first_tpid), FIRSTElasticSearchTeamDetailsParser(team.first_tpid_year))
+            for team in teams_with_tpid])
+
+        team_details = dict((team.key.id(), None) for team in teams)
+        for team, result in zip(teams_with_tpid, results):
+            team_details[team.key.id()] = result[0] if result else None
+        return team_details
@@ -1,13 +1,16 @@
 import base64
 import json
 import logging
+import time
 
+from google.appengine.api import memcache
 from google.appengine.api import urlfetch
 from google.appengine.ext import ndb
 
 from consts.event_type import EventType
-from controllers.api.api_status_controller import ApiStatusController
 from datafeeds.datafeed_base import DatafeedBase
+from helpers.fms_api_health_helper import FMSAPIHealthHelper
+from helpers.rate_limit_helper import RateLimitHelper
 
 from models.event_team import EventTeam
 from models.sitevar import Sitevar
@@ -17,10 +20,18 @@ from parsers.fms_api.fms_api_event_alliances_parser import FMSAPIEventAlliancesP
 from parsers.fms_api.fms_api_event_list_parser import FMSAPIEventListParser
 from parsers.fms_api.fms_api_event_rankings_parser import FMSAPIEventRankingsParser, FMSAPIEventRankings2Parser
 from parsers.fms_api.fms_api_match_parser import FMSAPIHybridScheduleParser, FMSAPIMatchDetailsParser
-from parsers.fms_api.fms_api_team_details_parser import FMSAPITeamDetailsParser
+from parsers.fms_api.fms_api_team_details_parser import FMSAPITeamDetailsParser, FMSAPITeamDetailsPageParser
 
 
 class DatafeedFMSAPI(object):
+    FMS_API_DOMAIN = 'https://frc-api.firstinspires.org'  # Point at benchmarks/fms_api_replay.py to replay a recorded event
+
+    NOT_MODIFIED = object()  # Returned by conditional parses that got a 304
+
+    # Pooled fetches
+    MAX_IN_FLIGHT = 10
+    RATE_LIMIT = 10  # Pooled requests per second, shared by every instance
+
     EVENT_SHORT_EXCEPTIONS = {
         'arc': 'archimedes',
         'cars': 'carson',
@@ -71,12 +82,12 @@ class DatafeedFMSAPI(object):
         fms_api_authkey = fms_api_secrets.contents['authkey']
         self._fms_api_authtoken = base64.b64encode('{}:{}'.format(fms_api_username, fms_api_authkey))
 
-        self._is_down_sitevar = Sitevar.get_by_id('apistatus.fmsapi_down')
-        if not self._is_down_sitevar:
-            self._is_down_sitevar = Sitevar(id="apistatus.fmsapi_down", description="Is FMSAPI down?")
+        self._fetch_futures = {}  # (url, conditional): fetch future
+        self._pending_validators = {}  # url: validators of the parsed response
+        self._bytes_saved_by_url = {}  # url: size of the response a 304 replaced
 
         if version == 'v1.0':
-            FMS_API_URL_BASE = 'https://frc-api.firstinspires.org/api/v1.0'
+            FMS_API_URL_BASE = self.FMS_API_DOMAIN + '/api/v1.0'
             self.FMS_API_AWARDS_URL_PATTERN = FMS_API_URL_BASE + '/awards/%s/%s'  # (year, event_short)
             self.FMS_API_HYBRID_SCHEDULE_QUAL_URL_PATTERN = FMS_API_URL_BASE + '/schedule/%s/%s/qual/hybrid'  # (year, event_short)
             self.FMS_API_HYBRID_SCHEDULE_PLAYOFF_URL_PATTERN = FMS_API_URL_BASE + '/schedule/%s/%s/playoff/hybrid'  # (year, event_short)
@@ -86,7 +97,7 @@ class DatafeedFMSAPI(object):
             self.FMS_API_EVENT_LIST_URL_PATTERN = FMS_API_URL_BASE + '/events/season=%s'
             self.FMS_API_EVENTTEAM_LIST_URL_PATTERN = FMS_API_URL_BASE + '/teams/?season=%s&eventCode=%s&page=%s'  # (year, eventCode, page)
         elif version == 'v2.0':
-            FMS_API_URL_BASE = 'https://frc-api.firstinspires.org/v2.0'
+            FMS_API_URL_BASE = self.FMS_API_DOMAIN + '/v2.0'
             self.FMS_API_AWARDS_URL_PATTERN = FMS_API_URL_BASE + '/%s/awards/%s'  # (year, event_short)
             self.FMS_API_HYBRID_SCHEDULE_QUAL_URL_PATTERN = FMS_API_URL_BASE + '/%s/schedule/%s/qual/hybrid'  # (year, event_short)
             self.FMS_API_HYBRID_SCHEDULE_PLAYOFF_URL_PATTERN = FMS_API_URL_BASE + '/%s/schedule/%s/playoff/hybrid'  # (year, event_short)
@@ -104,42 +115,132 @@ class DatafeedFMSAPI(object):
         return self.EVENT_SHORT_EXCEPTIONS.get(event_short, event_short)
 
     @ndb.tasklet
-    def _parse_async(self, url, parser):
+    def _fetch_async(self, url, conditional):
+        """
+        Fetches a URL, sending the validators from the last time it was
+        fetched and saved if conditional
+        """
         headers = {
             'Authorization': 'Basic {}'.format(self._fms_api_authtoken),
             'Cache-Control': 'no-cache, max-age=10',
             'Pragma': 'no-cache',
         }
+        if conditional:
+            validators = yield ndb.get_context().memcache_get(self._validators_cache_key(url))
+            if validators:
+                if validators.get('etag'):
+                    headers['If-None-Match'] = validators['etag']
+                if validators.get('last_modified'):
+                    headers['If-Modified-Since'] = validators['last_modified']
+        else:
+            validators = None
+
+        start_time = time.time()
         try:
             rpc = urlfetch.create_rpc(deadline=10)
             result = yield urlfetch.make_fetch_call(rpc, url, headers=headers)
         except Exception, e:
             logging.error("URLFetch failed for: {}".format(url))
             logging.info(e)
+            FMSAPIHealthHelper.record_response(time.time() - start_time)
+            raise ndb.Return((None, None))
+
+        FMSAPIHealthHelper.record_response(time.time() - start_time, result.status_code)
+        raise ndb.Return((result, validators))
+
+    def _coalesced_fetch_async(self, url, conditional):
+        """
+        Identical fetches made with this datafeed share one request
+        """
+        fetch_key = (url, conditional)
+        if fetch_key not in self._fetch_futures:
+            self._fetch_futures[fetch_key] = self._fetch_async(url, conditional)
+        return self._fetch_futures[fetch_key]
+
+    @ndb.tasklet
+    def _parse_async(self, url, parser, conditional=False):
+        """
+        Returns the parsed response, or None if the fetch failed.
+        If conditional, returns NOT_MODIFIED if the response hasn't changed
+        since the URL's validators were last saved.
+        """
+        result, validators = yield self._coalesced_fetch_async(url, conditional)
+        if result is None:
             raise ndb.Return(None)
 
-        old_status = self._is_down_sitevar.contents
         if result.status_code == 200:
-            self._is_down_sitevar.contents = False
-            self._is_down_sitevar.put()
-            ApiStatusController.clear_cache_if_needed(old_status, self._is_down_sitevar.contents)
-            raise ndb.Return(parser.parse(json.loads(result.content)))
-        elif result.status_code % 100 == 5:
-            # 5XX error - something is wrong with the server
-            logging.warning('URLFetch for %s failed; Error code %s' % (url, result.status_code))
-            self._is_down_sitevar.contents = True
-            self._is_down_sitevar.put()
-            ApiStatusController.clear_cache_if_needed(old_status, self._is_down_sitevar.contents)
-            raise ndb.Return(None)
+            parsed = parser.parse(json.loads(result.content))
+            self._bytes_saved_by_url.pop(url, None)  # Refetched after a 304
+            self._pending_validators[url] = {
+                'etag': result.headers.get('ETag'),
+                'last_modified': result.headers.get('Last-Modified'),
+                'size': len(result.content),
+            }
+            raise ndb.Return(parsed)
+        elif result.status_code == 304 and conditional:
+            # validators is None if none were saved, but upstream may still answer with a 304
+            self._bytes_saved_by_url[url] = validators.get('size', 0) if validators else 0
+            logging.info("{} not modified, saved {} bytes".format(url, self._bytes_saved_by_url[url]))
+            raise ndb.Return(self.NOT_MODIFIED)
         else:
             logging.warning('URLFetch for %s failed; Error code %s' % (url, result.status_code))
             raise ndb.Return(None)
 
+    @property
+    def bytes_saved(self):
+        """
+        Upstream bytes not downloaded thanks to 304s
+        """
+        return sum(self._bytes_saved_by_url.values())
+
+    @classmethod
+    def _validators_cache_key(cls, url):
+        return 'fmsapi_validators:{}'.format(url)
+
+    def save_validators(self):
+        """
+        Remembers the ETag and Last-Modified of every response parsed by this
+        datafeed, so the next conditional fetch of the same URLs can get a 304.
+        Call once the parsed data has been merged, so a failed merge is refetched.
+        """
+        if self._pending_validators:
+            memcache.set_multi(dict(
+                (self._validators_cache_key(url), validators) for url, validators in self._pending_validators.items()
+                if validators['etag'] or validators['last_modified']))
+            self._pending_validators = {}
+
     @ndb.toplevel
-    def _parse(self, url, parser):
-        result = yield self._parse_async(url, parser)
+    def _parse(self, url, parser, conditional=False):
+        result = yield self._parse_async(url, parser, conditional)
         raise ndb.Return(result)
 
+    @ndb.toplevel
+    def _parse_multi(self, urls_and_parsers, conditional=False):
+        results = yield [self._parse_async(url, parser, conditional) for url, parser in urls_and_parsers]
+        raise ndb.Return(results)
+
+    @ndb.toplevel
+    def _parse_pool(self, urls_and_parsers):
+        """
+        Parses many URLs, keeping up to MAX_IN_FLIGHT fetches going at a time
+        under the shared RATE_LIMIT. Returns results in the same order.
+        """
+        if not urls_and_parsers:
+            raise ndb.Return([])
+
+        results = [None] * len(urls_and_parsers)
+        remaining = list(reversed(list(enumerate(urls_and_parsers))))
+
+        @ndb.tasklet
+        def worker():
+            while remaining:
+                i, (url, parser) = remaining.pop()
+                yield RateLimitHelper.acquire_async('fmsapi', self.RATE_LIMIT)
+                results[i] = yield self._parse_async(url, parser)
+
+        yield [worker() for _ in xrange(min(self.MAX_IN_FLIGHT, len(urls_and_parsers)))]
+        raise ndb.Return(results)
+
     def getAwards(self, event):
         awards = []
         if event.event_type_enum == EventType.CMP_DIVISION and event.year >= 2015:  # 8 subdivisions from 2015+ have awards listed under 4 divisions
@@ -159,7 +260,9 @@ class DatafeedFMSAPI(object):
         year = int(event_key[:4])
         event_short = event_key[4:]
 
-        alliances = self._parse(self.FMS_API_EVENT_ALLIANCES_URL_PATTERN % (year, self._get_event_short(event_short)), FMSAPIEventAlliancesParser())
+        alliances = self._parse(self.FMS_API_EVENT_ALLIANCES_URL_PATTERN % (year, self._get_event_short(event_short)), FMSAPIEventAlliancesParser(), conditional=True)
+        if alliances is self.NOT_MODIFIED:
+            return None
         return alliances
 
     def getMatches(self, event_key):
@@ -168,28 +271,37 @@ class DatafeedFMSAPI(object):
 
         hs_parser = FMSAPIHybridScheduleParser(year, event_short)
         detail_parser = FMSAPIMatchDetailsParser(year, event_short)
-        qual_matches_future = self._parse_async(self.FMS_API_HYBRID_SCHEDULE_QUAL_URL_PATTERN % (year, self._get_event_short(event_short)), hs_parser)
-        playoff_matches_future = self._parse_async(self.FMS_API_HYBRID_SCHEDULE_PLAYOFF_URL_PATTERN % (year, self._get_event_short(event_short)), hs_parser)
-        qual_details_future = self._parse_async(self.FMS_API_MATCH_DETAILS_QUAL_URL_PATTERN % (year, self._get_event_short(event_short)), detail_parser)
-        playoff_details_future = self._parse_async(self.FMS_API_MATCH_DETAILS_PLAYOFF_URL_PATTERN % (year, self._get_event_short(event_short)), detail_parser)
+        urls_and_parsers = [
+            (self.FMS_API_HYBRID_SCHEDULE_QUAL_URL_PATTERN % (year, self._get_event_short(event_short)), hs_parser),
+            (self.FMS_API_HYBRID_SCHEDULE_PLAYOFF_URL_PATTERN % (year, self._get_event_short(event_short)), hs_parser),
+            (self.FMS_API_MATCH_DETAILS_QUAL_URL_PATTERN % (year, self._get_event_short(event_short)), detail_parser),
+            (self.FMS_API_MATCH_DETAILS_PLAYOFF_URL_PATTERN % (year, self._get_event_short(event_short)), detail_parser),
+        ]
+        results = self._parse_multi(urls_and_parsers, conditional=True)
+
+        not_modified = [result is self.NOT_MODIFIED for result in results]
+        if not any(result is not None and not is_not_modified for result, is_not_modified in zip(results, not_modified)):
+            return []  # Nothing new to merge
+        if any(not_modified):
+            # Schedules and details are merged together, so refetch the ones that didn't change
+            refetched = iter(self._parse_multi(
+                [url_and_parser for url_and_parser, is_not_modified in zip(urls_and_parsers, not_modified) if is_not_modified]))
+            results = [refetched.next() if is_not_modified else result for result, is_not_modified in zip(results, not_modified)]
+        qual_matches, playoff_matches, qual_details, playoff_details = results
 
         matches_by_key = {}
-        qual_matches = qual_matches_future.get_result()
         if qual_matches is not None:
             for match in qual_matches:
                 matches_by_key[match.key.id()] = match
-        playoff_matches = playoff_matches_future.get_result()
         if playoff_matches is not None:
             for match in playoff_matches:
                 matches_by_key[match.key.id()] = match
 
-        qual_details = qual_details_future.get_result()
         qual_details_items = qual_details.items() if qual_details is not None else []
-        playoff_details = playoff_details_future.get_result()
         playoff_details_items = playoff_details.items() if playoff_details is not None else []
         for match_key, match_details in qual_details_items + playoff_details_items:
             if match_key in matches_by_key:
-                matches_by_key[match_key].score_breakdown_json = json.dumps(match_details)
+                matches_by_key[match_key].score_breakdown = match_details
 
         return matches_by_key.values()
 
@@ -197,8 +309,14 @@ class DatafeedFMSAPI(object):
         year = int(event_key[:4])
         event_short = event_key[4:]
 
-        rankings = self._parse(self.FMS_API_EVENT_RANKINGS_URL_PATTERN % (year, self._get_event_short(event_short)), FMSAPIEventRankingsParser(year))
-        rankings2 = self._parse(self.FMS_API_EVENT_RANKINGS_URL_PATTERN % (year, self._get_event_short(event_short)), FMSAPIEventRankings2Parser(year))
+        # Both parsers share one fetch
+        rankings_url = self.FMS_API_EVENT_RANKINGS_URL_PATTERN % (year, self._get_event_short(event_short))
+        rankings, rankings2 = self._parse_multi([
+            (rankings_url, FMSAPIEventRankingsParser(year)),
+            (rankings_url, FMSAPIEventRankings2Parser(year)),
+        ], conditional=True)
+        if rankings is self.NOT_MODIFIED:
+            return None, None
         return rankings, rankings2
 
     def getTeamDetails(self, year, team_key):
@@ -210,6 +328,18 @@ class DatafeedFMSAPI(object):
         else:
             return None
 
+    # Returns a dict of team key: (team, districtteam, robot), or None if the team wasn't found
+    def getTeamDetailsMulti(self, year, team_keys):
+        results = self._parse_pool([
+            (self.FMS_API_TEAM_DETAILS_URL_PATTERN % (year, team_key[3:]), FMSAPITeamDetailsParser(year))
+            for team_key in team_keys])
+
+        team_details = {}
+        for team_key, result in zip(team_keys, results):
+            models = result[0] if result else None
+            team_details[team_key] = models[0] if models else None
+        return team_details
+
     # Returns a tuple: (list(Event), list(District))
     def getEventList(self, year):
         events, districts = self._parse(self.FMS_API_EVENT_LIST_URL_PATTERN % (year), FMSAPIEventListParser(year))
@@ -222,17 +352,20 @@ class DatafeedFMSAPI(object):
         if event_code == 'cmp':  # Don't add cmp teams because FIRST serves all Championship teams under Einstein
             return []
 
-        parser = FMSAPITeamDetailsParser(year)
-        models = []  # will be list of tuples (team, districtteam, robot) model
-        for page in range(1, 9):  # Ensure this won't loop forever. 8 pages should be more than enough
-            url = self.FMS_API_EVENTTEAM_LIST_URL_PATTERN % (year, event_code, page)
-            result = self._parse(url, parser)
-            if result is None:
-                break
-            partial_models, more_pages = result
-            models.extend(partial_models)
-
-            if not more_pages:
-                break
+        # Fetch the first page to find out how many there are, then fetch the rest at once
+        parser = FMSAPITeamDetailsPageParser(year)
+        result = self._parse(self.FMS_API_EVENTTEAM_LIST_URL_PATTERN % (year, event_code, 1), parser)
+        if result is None:
+            return []
+        models, total_pages = result
+        total_pages = min(total_pages, 8)  # Ensure this won't fan out too far. 8 pages should be more than enough
+
+        results = self._parse_pool([
+            (self.FMS_API_EVENTTEAM_LIST_URL_PATTERN % (year, event_code, page), parser)
+            for page in xrange(2, total_pages + 1)])
+        for result in results:
+            if result is not None:
+                partial_models, _ = result
+                models.extend(partial_models)
 
         return models
@@ -0,0 +1,144 @@
+import logging
+import re
+
+from BeautifulSoup import BeautifulSoup, Comment, NavigableString, ProcessingInstruction, UnicodeDammit
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+class BeautifulSoupTableBackend(object):
+    """
+    Parses the whole page into a BeautifulSoup 3 tree. Pure Python.
+    """
+    @classmethod
+    def find_tables(cls, html, indexes):
+        soup = BeautifulSoup(html, convertEntities=BeautifulSoup.HTML_ENTITIES)
+        return soup.findAll('table')
+
+
+class LxmlTag(object):
+    """
+    Wraps an lxml element in the part of BeautifulSoup 3's Tag interface the
+    usfirst parsers use: name, contents, string and findAll(name).
+    Strings are NavigableStrings, with whitespace-only ones collapsed the way
+    BeautifulSoup does, so ParserBase._recurseUntilString returns the same.
+    """
+    PRESERVE_WHITESPACE_TAGS = BeautifulSoup.PRESERVE_WHITESPACE_TAGS
+    STRIP_ASCII_SPACES = BeautifulSoup.STRIP_ASCII_SPACES
+
+    def __init__(self, element):
+        self._element = element
+        self._contents = None
+
+    @property
+    def name(self):
+        return self._element.tag
+
+    def _string(self, text, preserve_whitespace):
+        text = unicode(text)  # lxml returns ASCII-only text as str
+        if not preserve_whitespace and text.translate(self.STRIP_ASCII_SPACES) == '':
+            text = u'\n' if u'\n' in text else u' '
+        return NavigableString(text)
+
+    @property
+    def contents(self):
+        if self._contents is None:
+            element = self._element
+            preserve_whitespace = element.tag in self.PRESERVE_WHITESPACE_TAGS or \
+                any(ancestor.tag in self.PRESERVE_WHITESPACE_TAGS for ancestor in element.iterancestors())
+            contents = []
+            if element.text:
+                contents.append(self._string(element.text, preserve_whitespace))
+            for child in element:
+                if child.tag is etree.Comment:
+                    contents.append(Comment(unicode(child.text or u'')))
+                elif child.tag is etree.ProcessingInstruction:
+                    contents.append(ProcessingInstruction(unicode(child.target) + (u' ' + unicode(child.text) if child.text else u'')))
+                elif isinstance(child.tag, basestring):
+                    contents.append(LxmlTag(child))
+                if child.tail:
+                    contents.append(self._string(child.tail, preserve_whitespace))
+            self._contents = contents
+        return self._contents
+
+    @property
+    def string(self):
+        contents = self.contents
+        if len(contents) == 1 and isinstance(contents[0], NavigableString):
+            return contents[0]
+        return None
+
+    def findAll(self, name):
+        return [LxmlTag(element) for element in self._element.iterdescendants(name)]
+
+
+class LxmlTableBackend(object):
+    """
+    Streams the page through libxml2's HTML parser, which is C, and stops as
+    soon as the wanted tables have been parsed. Only those tables are wrapped
+    for the parsers. Falls back to BeautifulSoup if libxml2 can't find them.
+    """
+    CHUNK_SIZE = 16384
+    META_CHARSET_PATTERN = re.compile(r'<meta[^>]*charset[^>]*>', re.IGNORECASE)
+
+    @classmethod
+    def _to_unicode(cls, html):
+        """
+        Decodes the page the way BeautifulSoup does, so both see the same text.
+        Meta charsets are removed, or libxml2 would decode the text again.
+        """
+        if not isinstance(html, unicode):
+            html = UnicodeDammit(html, [None, None], smartQuotesTo=None, isHTML=True).unicode or u''
+        return cls.META_CHARSET_PATTERN.sub(u'', html)
+
+    @classmethod
+    def _stream_tables(cls, html, indexes):
+        wanted = set(indexes)
+        last_index = max(indexes)
+        parser = etree.HTMLPullParser(events=('start', 'end'), tag='table')
+        tables = []  # Document order, None for tables that aren't wanted
+        unfinished = {}  # element: index, for wanted tables still being parsed
+
+        position = 0
+        while position < len(html):
+            # Split before a tag so no text is split across chunks
+            end = html.find(u'<', position + cls.CHUNK_SIZE)
+            if end == -1:
+                end = len(html)
+            parser.feed(html[position:end])
+            position = end
+
+            for event, element in parser.read_events():
+                if event == 'start':
+                    if len(tables) in wanted:
+                        unfinished[element] = len(tables)
+                        tables.append(element)
+                    else:
+                        tables.append(None)
+                else:
+                    unfinished.pop(element, None)
+            if len(tables) > last_index and not unfinished:
+                return tables
+
+        parser.close()
+        for event, element in parser.read_events():
+            if event == 'start':
+                tables.append(element if len(tables) in wanted else None)
+        return tables
+
+    @classmethod
+    def find_tables(cls, html, indexes):
+        try:
+            tables = cls._stream_tables(cls._to_unicode(html), indexes)
+        except (etree.LxmlError, ValueError), e:
+            logging.info("lxml couldn't parse the page, falling back to BeautifulSoup: {}".format(e))
+            tables = []
+        if len(tables) <= max(indexes):
+            return BeautifulSoupTableBackend.find_tables(html, indexes)
+        return [LxmlTag(table) if table is not None else None for table in tables]
+
+
+DEFAULT_TABLE_BACKEND = LxmlTableBackend if etree is not None else BeautifulSoupTableBackend
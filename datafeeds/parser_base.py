@@ -2,6 +2,8 @@ import re
 from BeautifulSoup import NavigableString
 import HTMLParser
 
+from datafeeds.html_table_backends import DEFAULT_TABLE_BACKEND
+
 
 class ParserInputException(Exception):
     pass
@@ -12,6 +14,7 @@ class ParserBase(object):
     Provides a basic structure for parsing pages.
     Parsers are not allowed to return Model objects, only dictionaries.
     """
+    TABLE_BACKEND = DEFAULT_TABLE_BACKEND  # See datafeeds/html_table_backends.py
 
     @classmethod
     def parse(self, html):
@@ -20,6 +23,16 @@ class ParserBase(object):
         """
         raise NotImplementedError("No parse method!")
 
+    @classmethod
+    def _findTables(cls, html, indexes):
+        """
+        Returns the page's tables in document order, like
+        BeautifulSoup(html, convertEntities=BeautifulSoup.HTML_ENTITIES).findAll('table').
+        Only the tables at indexes are guaranteed to be there. Others may be
+        None, and the list may end after the last of indexes.
+        """
+        return cls.TABLE_BACKEND.find_tables(html, indexes)
+
     @classmethod
     def _recurseUntilString(self, node):
         """
@@ -73,3 +73,14 @@ class FMSAPITeamDetailsParser(object):
             ret_models.append((team, districtTeam, robot))
 
         return (ret_models, (current_page < total_pages))
+
+
+class FMSAPITeamDetailsPageParser(FMSAPITeamDetailsParser):
+    def parse(self, response):
+        """
+        Parse a page of team info from FMSAPI
+        Returns a tuple of: list of models (Team, DistrictTeam, Robot),
+        and the total number of pages, so the rest can be fetched at once
+        """
+        models, _ = super(FMSAPITeamDetailsPageParser, self).parse(response)
+        return (models, response['pageTotal'])
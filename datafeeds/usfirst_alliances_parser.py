@@ -1,8 +1,6 @@
 import json
 import logging
 
-from BeautifulSoup import BeautifulSoup
-
 from datafeeds.parser_base import ParserBase
 
 
@@ -12,9 +10,7 @@ class UsfirstAlliancesParser(ParserBase):
         """
         Parse the table that contains alliances.
         """
-        soup = BeautifulSoup(html, convertEntities=BeautifulSoup.HTML_ENTITIES)
-
-        tables = soup.findAll('table')
+        tables = self._findTables(html, [4])
 
         alliances = self.parseAlliances(tables[4])
 
@@ -2,8 +2,6 @@ import json
 import logging
 import re
 
-from BeautifulSoup import BeautifulSoup
-
 from consts.award_type import AwardType
 from datafeeds.parser_base import ParserBase
 from helpers.award_helper import AwardHelper
@@ -28,9 +26,8 @@ class UsfirstEventAwardsParser(ParserBase):
         """
         Parse the awards from USFIRST.
         """
-        html = html.decode('utf-8', 'ignore')  # Clean html before feeding itno BeautifulSoup
-        soup = BeautifulSoup(html, convertEntities=BeautifulSoup.HTML_ENTITIES)
-        table = soup.findAll('table')[2]
+        html = html.decode('utf-8', 'ignore')  # Clean html before parsing
+        table = self._findTables(html, [2])[2]
 
         awards_by_type = {}
         for tr in table.findAll('tr')[1:]:
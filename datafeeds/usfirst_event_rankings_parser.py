@@ -1,5 +1,3 @@
-from BeautifulSoup import BeautifulSoup
-
 from datafeeds.parser_base import ParserBase
 
 
@@ -12,11 +10,8 @@ class UsfirstEventRankingsParser(ParserBase):
         """
         Parse the rankings from USFIRST.
         """
-        soup = BeautifulSoup(html,
-                             convertEntities=BeautifulSoup.HTML_ENTITIES)
-
         rankings = []
-        tables = soup.findAll('table')
+        tables = self._findTables(html, [2])
         rankings_table = tables[2]
 
         for tr in rankings_table.findAll('tr'):
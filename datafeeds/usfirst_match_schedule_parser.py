@@ -1,8 +1,6 @@
 import json
 import logging
 
-from BeautifulSoup import BeautifulSoup
-
 from datafeeds.parser_base import ParserBase
 
 
@@ -12,10 +10,7 @@ class UsfirstMatchScheduleParser(ParserBase):
         """
         Parse the table that contains the match schedule
         """
-        soup = BeautifulSoup(html,
-                             convertEntities=BeautifulSoup.HTML_ENTITIES)
-
-        tables = soup.findAll('table')
+        tables = self._findTables(html, [2])
 
         matches = self.parseMatchResultList(tables[2])
 
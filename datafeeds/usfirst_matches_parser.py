@@ -1,8 +1,6 @@
 import json
 import logging
 
-from BeautifulSoup import BeautifulSoup
-
 from datafeeds.parser_base import ParserBase
 
 
@@ -13,9 +11,7 @@ class UsfirstMatchesParser(ParserBase):
         Parse the table that contains match results.
         """
         matches = []
-        soup = BeautifulSoup(html, convertEntities=BeautifulSoup.HTML_ENTITIES)
-
-        tables = soup.findAll('table')
+        tables = self._findTables(html, [2, 3])
 
         matches.extend(self.parseMatchResultList(tables[2]))
         matches.extend(self.parseMatchResultList(tables[3]))
@@ -199,6 +199,13 @@ class CacheClearer(object):
             cls._get_districtteams_cache_keys_and_controllers(district_keys, team_keys) + \
             cls._queries_to_cache_keys_and_controllers(get_affected_queries.team_updated(affected_refs))
 
+    @classmethod
+    def get_year_matchstats_cache_keys_and_controllers(cls, affected_refs):
+        """
+        Gets cache keys and controllers that reference this YearMatchstats
+        """
+        return cls._queries_to_cache_keys_and_controllers(get_affected_queries.year_matchstats_updated(affected_refs))
+
     @classmethod
     def _get_districtlist_cache_keys_and_controllers(cls, years):
         cache_keys_and_controllers = []
@@ -1,3 +1,4 @@
+import bisect
 import logging
 import heapq
 import math
@@ -14,7 +15,7 @@ from consts.event_type import EventType
 from helpers.event_helper import EventHelper
 
 from models.award import Award
-from models.district_team import DistrictTeam
+from models.district_rankings_state import DistrictRankingsState
 from models.match import Match
 
 
@@ -25,6 +26,9 @@ class DistrictHelper(object):
     2015: http://www.usfirst.org/sites/default/files/uploadedFiles/Robotics_Programs/FRC/Game_and_Season__Info/2015/FRC_District_Standard_Points_Ranking_System_2015%20Summary.pdf
     2016: https://firstfrc.blob.core.windows.net/frc2016manuals/AdminManual/FRC-2016-admin-manual.pdf
     """
+    QUAL_POINTS_ALPHA = 1.07
+    _qual_points_tables = {}  # {num_teams: qual points by rank}
+
     @classmethod
     def inverf(cls, x):
         if x > 0:
@@ -37,12 +41,44 @@ class DistrictHelper(object):
         y = s * math.sqrt((math.sqrt((((2 / (math.pi * a)) + ((math.log(1 - x**2)) / 2))**2) - ((math.log(1 - x**2)) / a))) - ((2 / (math.pi * a)) + (math.log(1 - x**2)) / 2))
         return y
 
+    @classmethod
+    def qual_points_table(cls, num_teams):
+        """
+        Returns the rank-based qual points (before the district CMP multiplier)
+        for an event with num_teams ranked teams, indexed by rank
+        Tables are computed once per team count
+        """
+        table = cls._qual_points_tables.get(num_teams)
+        if table is None:
+            table = [None] + [cls._qual_points(num_teams, rank) for rank in xrange(1, num_teams + 1)]
+            cls._qual_points_tables[num_teams] = table
+        return table
+
+    @classmethod
+    def _qual_points(cls, num_teams, rank):
+        alpha = cls.QUAL_POINTS_ALPHA
+        return int(np.ceil(cls.inverf(float(num_teams - 2 * rank + 2) / (alpha * num_teams)) * (
+            10.0 / cls.inverf(1.0 / alpha)) + 12))
+
     @classmethod
     def calculate_event_points(cls, event):
-        event.get_awards_async()
-        event.get_matches_async()
-        district_team_key_futures = DistrictTeam.query(DistrictTeam.district == event.event_district_enum, DistrictTeam.year == event.year).fetch_async(None, keys_only=True)
+        return cls.calculate_events_points([event])[event.key.id()]
 
+    @classmethod
+    def calculate_events_points(cls, events):
+        """
+        Returns {event_key: district_points} for several events, like all the
+        events of a district week, with every event's awards, matches and
+        details fetched concurrently up front
+        """
+        for event in events:
+            event.get_awards_async()
+            event.get_matches_async()
+            event.prep_details()
+        return dict((event.key.id(), cls._calculate_event_points(event)) for event in events)
+
+    @classmethod
+    def _calculate_event_points(cls, event):
         # Typically 3 for District CMP, 1 otherwise
         POINTS_MULTIPLIER = DistrictPointValues.DISTRICT_CMP_MULTIPLIER.get(event.year, DistrictPointValues.DISTRICT_CMP_MULIPLIER_DEFAULT) if event.event_type_enum == EventType.DISTRICT_CMP else DistrictPointValues.STANDARD_MULTIPLIER
 
@@ -59,14 +95,9 @@ class DistrictHelper(object):
                 'highest_qual_scores': [],
             }),
         }
-        single_district_points = district_points.copy()
 
         # match points
-        if event.year >= 2015:
-            # Switched to ranking-based points for 2015 and onward
-            cls.calc_rank_based_match_points(event, district_points, event.matches, POINTS_MULTIPLIER)
-        else:
-            cls.calc_wlt_based_match_points(district_points, event.matches, POINTS_MULTIPLIER)
+        cls.calc_match_points(event, district_points, POINTS_MULTIPLIER)
 
         # alliance points
         if event.alliance_selections:
@@ -101,20 +132,10 @@ class DistrictHelper(object):
             for team in award.team_list:
                 district_points['points'][team.id()]['award_points'] += point_value * POINTS_MULTIPLIER
 
-        # Filter out teams not in this district (only keep those with a DistrictTeam present for this district)
-        for district_team_future in ndb.get_multi_async(district_team_key_futures.get_result()):
-            district_team = district_team_future.get_result()
-            team_key = district_team.team.id()
-            if team_key in district_points['points']:
-                single_district_points['points'][team_key] = district_points['points'][team_key]
-            if team_key in district_points['tiebreakers']:
-                single_district_points['tiebreakers'][team_key] = district_points['tiebreakers'][team_key]
-
-        for team, point_breakdown in single_district_points['points'].items():
-            for p in point_breakdown.values():
-                single_district_points['points'][team]['total'] += p
+        for point_breakdown in district_points['points'].values():
+            point_breakdown['total'] = sum(value for key, value in point_breakdown.items() if key != 'total')
 
-        return single_district_points
+        return district_points
 
     @classmethod
     def calculate_rankings(cls, events, teams, year):
@@ -150,27 +171,188 @@ class DistrictHelper(object):
         for team in teams:
             if type(team) == ndb.tasklets.Future:
                 team = team.get_result()
-            bonus = None
-            if team.rookie_year == year:
-                bonus = 10
-            elif team.rookie_year == year - 1:
-                bonus = 5
+            bonus = cls._rookie_bonus(team, year)
             if bonus is not None:
                 team_totals[team.key.id()]['rookie_bonus'] = bonus
                 team_totals[team.key.id()]['point_total'] += bonus
 
-        team_totals = sorted(team_totals.items(),
-            key=lambda (_, totals): [
-                -totals['point_total'],
-                -totals['tiebreakers'][0],
-                -totals['tiebreakers'][1],
-                -totals['tiebreakers'][2],
-                -totals['tiebreakers'][3],
-                -totals['tiebreakers'][4]] + [-score for score in totals['tiebreakers'][5]]
-            )
+        team_totals = sorted(team_totals.items(), key=lambda (_, totals): cls._rankings_sort_key(totals))
 
         return team_totals
 
+    @classmethod
+    def _rankings_sort_key(cls, totals):
+        return [
+            -totals['point_total'],
+            -totals['tiebreakers'][0],
+            -totals['tiebreakers'][1],
+            -totals['tiebreakers'][2],
+            -totals['tiebreakers'][3],
+            -totals['tiebreakers'][4]] + [-score for score in totals['tiebreakers'][5]]
+
+    @classmethod
+    def _rookie_bonus(cls, team, year):
+        if team.rookie_year == year:
+            return 10
+        elif team.rookie_year == year - 1:
+            return 5
+        return None
+
+    @classmethod
+    def _event_sort_key(cls, event):
+        # Same order as EventHelper.sort_events, with the event key breaking ties
+        return [
+            EventHelper.distantFutureIfNoEndDate(event).isoformat(),
+            EventHelper.distantFutureIfNoStartDate(event).isoformat(),
+            event.key.id(),
+        ]
+
+    @classmethod
+    def _team_totals(cls, team_state):
+        """
+        Same aggregation as calculate_rankings, for one team's event entries
+        """
+        totals = {
+            'event_points': [],
+            'point_total': 0,
+            'tiebreakers': 5 * [0] + [[]],
+        }
+        for i, (_, event_key, district_cmp, points, tiebreakers) in enumerate(team_state['events']):
+            if i >= 2 and not district_cmp:
+                continue
+            if points is not None:
+                totals['event_points'].append([event_key, district_cmp, points])
+                totals['point_total'] += points['total']
+                totals['tiebreakers'][0] += points['elim_points']
+                totals['tiebreakers'][1] = max(points['elim_points'], totals['tiebreakers'][1])
+                totals['tiebreakers'][2] += points['alliance_points']
+                totals['tiebreakers'][3] = max(points['qual_points'], totals['tiebreakers'][3])
+            if tiebreakers is not None:
+                totals['tiebreakers'][4] += tiebreakers['qual_wins']
+                totals['tiebreakers'][5] = heapq.nlargest(3, tiebreakers['highest_qual_scores'] + totals['tiebreakers'][5])
+        if team_state['rookie_bonus'] is not None:
+            totals['point_total'] += team_state['rookie_bonus']
+        return totals
+
+    @classmethod
+    def _set_event_points(cls, rankings_state, event):
+        """
+        Replaces the entries of event's district points in rankings_state
+        Returns the set of teams whose entries changed
+        """
+        event_key = event.key.id()
+        district_points = event.district_points or {'points': {}, 'tiebreakers': {}}
+        sort_key = cls._event_sort_key(event)
+        district_cmp = event.event_type_enum == EventType.DISTRICT_CMP
+        new_teams = set(district_points['points'].keys()).union(set(district_points['tiebreakers'].keys()))
+
+        changed_teams = set()
+        for team_key in new_teams.union(rankings_state.event_teams.get(event_key, [])):
+            team_state = rankings_state.teams.setdefault(team_key, {'events': [], 'rookie_bonus': None, 'totals': None})
+            old_entries = team_state['events']
+            entries = [entry for entry in old_entries if entry[1] != event_key]
+            if team_key in new_teams:
+                entries.append([
+                    sort_key, event_key, district_cmp,
+                    district_points['points'].get(team_key), district_points['tiebreakers'].get(team_key)])
+                entries.sort(key=lambda entry: entry[0])
+            if entries != old_entries:
+                team_state['events'] = entries
+                changed_teams.add(team_key)
+
+        if new_teams:
+            rankings_state.event_teams[event_key] = sorted(new_teams)
+        elif event_key in rankings_state.event_teams:
+            del rankings_state.event_teams[event_key]
+        return changed_teams
+
+    @classmethod
+    def build_rankings_state(cls, district_key, events, teams, year):
+        """
+        Returns a DistrictRankingsState with every event's district points applied
+        events need their details prepped
+        """
+        rankings_state = DistrictRankingsState(id=district_key, teams={}, event_teams={}, order=[])
+
+        if type(teams) == ndb.tasklets.Future:
+            teams = teams.get_result()
+        for team in teams:
+            if type(team) == ndb.tasklets.Future:
+                team = team.get_result()
+            bonus = cls._rookie_bonus(team, year)
+            if bonus is not None:
+                rankings_state.teams[team.key.id()] = {'events': [], 'rookie_bonus': bonus, 'totals': None}
+
+        for event in events:
+            if event.district_points is not None:
+                cls._set_event_points(rankings_state, event)
+
+        for team_state in rankings_state.teams.values():
+            team_state['totals'] = cls._team_totals(team_state)
+        rankings_state.order = sorted(
+            rankings_state.teams.keys(),
+            key=lambda team_key: cls._rankings_sort_key(rankings_state.teams[team_key]['totals']) + [team_key])
+        return rankings_state
+
+    @classmethod
+    def update_rankings_state(cls, rankings_state, event):
+        """
+        Applies a change to one event's district points. Only the teams at the
+        event are re-aggregated, and only those whose totals moved are
+        re-sorted into the ranking.
+        Returns True if rankings_state changed
+        """
+        changed_teams = cls._set_event_points(rankings_state, event)
+
+        moved_teams = set()
+        for team_key in changed_teams:
+            team_state = rankings_state.teams[team_key]
+            if not team_state['events'] and team_state['rookie_bonus'] is None:
+                del rankings_state.teams[team_key]
+                moved_teams.add(team_key)
+                continue
+            totals = cls._team_totals(team_state)
+            if totals != team_state['totals']:
+                team_state['totals'] = totals
+                moved_teams.add(team_key)
+
+        if moved_teams:
+            order = [team_key for team_key in rankings_state.order if team_key not in moved_teams]
+            sort_keys = [cls._rankings_sort_key(rankings_state.teams[team_key]['totals']) + [team_key] for team_key in order]
+            for team_key in moved_teams:
+                if team_key not in rankings_state.teams:
+                    continue
+                sort_key = cls._rankings_sort_key(rankings_state.teams[team_key]['totals']) + [team_key]
+                i = bisect.bisect(sort_keys, sort_key)
+                sort_keys.insert(i, sort_key)
+                order.insert(i, team_key)
+            rankings_state.order = order
+
+        return bool(changed_teams)
+
+    @classmethod
+    def render_rankings(cls, rankings_state):
+        """
+        Returns District.rankings for rankings_state
+        """
+        rankings = []
+        for rank, team_key in enumerate(rankings_state.order, 1):
+            team_state = rankings_state.teams[team_key]
+            point_detail = {
+                'rank': rank,
+                'team_key': team_key,
+                'event_points': [],
+                'rookie_bonus': team_state['rookie_bonus'] or 0,
+                'point_total': team_state['totals']['point_total'],
+            }
+            for event_key, district_cmp, points in team_state['totals']['event_points']:
+                event_points = dict(points)
+                event_points['event_key'] = event_key
+                event_points['district_cmp'] = district_cmp
+                point_detail['event_points'].append(event_points)
+            rankings.append(point_detail)
+        return rankings
+
     @classmethod
     def calc_elim_match_points(cls, district_points, matches, POINTS_MULTIPLIER):
         elim_num_wins = defaultdict(lambda: defaultdict(int))
@@ -248,53 +430,60 @@ class DistrictHelper(object):
                     district_points['points'][team]['elim_points'] += points * POINTS_MULTIPLIER
 
     @classmethod
-    def calc_wlt_based_match_points(cls, district_points, matches, POINTS_MULTIPLIER):
+    def calc_match_points(cls, event, district_points, POINTS_MULTIPLIER):
         """
-        Calculates match district points based on team record (wins, losses, ties)
-        This algorithm was used prior to the 2015 season
+        Calculates match district points and qual tiebreakers in one pass over the event's matches
+        Before 2015, qual points are based on team record (wins, losses, ties).
+        2015 and onward, they are based on team ranking. See:
+        http://www.firstinspires.org/node/7616 and also
+        http://www.firstinspires.org/robotics/frc/blog/Admin-Manual-Section-7-and-the-FIRST-STRONGHOLD-Logo
         """
+        from helpers.match_helper import MatchHelper  # circular import issue
+
+        rank_based = event.year >= 2015
+        qual_scores = defaultdict(list)
         elim_matches = []
-        for match in matches:
-            if not match.has_been_played:
-                continue
+        for match in event.matches:
+            if match.comp_level == 'qm':
+                # Ranking-based years count every scheduled qual match towards the highest qual scores
+                if not match.has_been_played:
+                    if rank_based:
+                        for color in ['red', 'blue']:
+                            for team in match.alliances[color]['teams']:
+                                qual_scores[team].append(match.alliances[color]['score'])
+                    continue
 
-            if match.comp_level == 'qm':  # Qual match points
-                if match.winning_alliance == '':  # Match is a tie
-                    for team in match.team_key_names:
-                        district_points['points'][team]['qual_points'] += DistrictPointValues.MATCH_TIE * POINTS_MULTIPLIER
-                else:  # Somebody won the match
-                    for team in match.alliances[match.winning_alliance]['teams']:
-                        district_points['points'][team]['qual_points'] += DistrictPointValues.MATCH_WIN * POINTS_MULTIPLIER
-                        district_points['tiebreakers'][team]['qual_wins'] += 1
+                if not rank_based:
+                    if match.winning_alliance == '':  # Match is a tie
+                        for team in match.team_key_names:
+                            district_points['points'][team]['qual_points'] += DistrictPointValues.MATCH_TIE * POINTS_MULTIPLIER
+                    else:  # Somebody won the match
+                        for team in match.alliances[match.winning_alliance]['teams']:
+                            district_points['points'][team]['qual_points'] += DistrictPointValues.MATCH_WIN * POINTS_MULTIPLIER
+                            district_points['tiebreakers'][team]['qual_wins'] += 1
 
                 for color in ['red', 'blue']:
                     for team in match.alliances[color]['teams']:
-                        score = match.alliances[color]['score']
-                        district_points['tiebreakers'][team]['highest_qual_scores'] = heapq.nlargest(3, district_points['tiebreakers'][team]['highest_qual_scores'] + [score])
-            else:  # Elim match points
+                        qual_scores[team].append(match.alliances[color]['score'])
+            elif rank_based or match.has_been_played:
                 elim_matches.append(match)
-        cls.calc_elim_match_points(district_points, elim_matches, POINTS_MULTIPLIER)
 
-    @classmethod
-    def calc_rank_based_match_points(cls, event, district_points, matches, POINTS_MULTIPLIER):
-        """
-        Calculates match district points based on team ranking
-        This algorithm was introduced for the 2015 season and also used for 2016
-        See: http://www.firstinspires.org/node/7616 and also
-        http://www.firstinspires.org/robotics/frc/blog/Admin-Manual-Section-7-and-the-FIRST-STRONGHOLD-Logo
-        """
-        from helpers.match_helper import MatchHelper  # circular import issue
+        for team, scores in qual_scores.items():
+            district_points['tiebreakers'][team]['highest_qual_scores'] = heapq.nlargest(3, scores)
+
+        if not rank_based:
+            cls.calc_elim_match_points(district_points, elim_matches, POINTS_MULTIPLIER)
+            return
 
         # qual match points are calculated by rank
         if event.rankings and len(event.rankings) > 1:
             rankings = event.rankings[1:]  # skip title row
             num_teams = len(rankings)
-            alpha = 1.07
+            qual_points_table = cls.qual_points_table(num_teams)
             for row in rankings:
                 rank = int(row[0])
                 team = 'frc{}'.format(row[1])
-                qual_points = int(np.ceil(cls.inverf(float(num_teams - 2 * rank + 2) / (alpha * num_teams)) * (
-                10.0 / cls.inverf(1.0 / alpha)) + 12))
+                qual_points = qual_points_table[rank] if 1 <= rank <= num_teams else cls._qual_points(num_teams, rank)
                 district_points['points'][team]['qual_points'] = qual_points * POINTS_MULTIPLIER
         else:
             msg = "Event {} has no rankings for qual_points calculations!".format(event.key.id())
@@ -303,19 +492,9 @@ class DistrictHelper(object):
             else:
                 logging.info(msg)
 
-        matches = MatchHelper.organizeMatches(matches)
-
-        # qual match calculations. only used for tiebreaking
-        for match in matches['qm']:
-            for color in ['red', 'blue']:
-                for team in match.alliances[color]['teams']:
-                    score = match.alliances[color]['score']
-                    district_points['tiebreakers'][team]['highest_qual_scores'] = heapq.nlargest(3, district_points[
-                        'tiebreakers'][team]['highest_qual_scores'] + [score])
-
         # elim match point calculations
+        elim_matches = MatchHelper.organizeMatches(elim_matches)
         if event.year == 2015:
-            cls.calc_elim_match_points_2015(district_points, matches, POINTS_MULTIPLIER)
+            cls.calc_elim_match_points_2015(district_points, elim_matches, POINTS_MULTIPLIER)
         else:
-            elim_matches = matches.get('qf', []) + matches.get('sf', []) + matches.get('f', [])
-            cls.calc_elim_match_points(district_points, elim_matches, POINTS_MULTIPLIER)
+            cls.calc_elim_match_points(district_points, elim_matches['qf'] + elim_matches['sf'] + elim_matches['f'], POINTS_MULTIPLIER)
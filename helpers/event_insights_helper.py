@@ -6,116 +6,201 @@ from consts.event_type import EventType
 class EventInsightsHelper(object):
     @classmethod
     def calculate_event_insights(cls, matches, year):
+        accumulator = cls.new_insights_accumulator(year)
+        if accumulator is None:
+            return None
+
+        for match in matches:
+            cls.accumulate_insights(accumulator, match, year)
+        return cls.finalize_insights(accumulator, year)
+
+    @classmethod
+    def _insights_accumulators(cls, year):
+        """
+        Insights are built from accumulators so they can be fed one match at a
+        time and merged across events or weeks.
+        Returns (new, accumulate, merge, finalize) for the year, or None
+        """
         INSIGHTS_MAP = {
-            2016: cls.calculate_event_insights_2016
+            2016: (cls.new_accumulator_2016, cls.accumulate_2016, cls.merge_2016, cls.finalize_2016),
         }
+        return INSIGHTS_MAP.get(year)
 
-        if year in INSIGHTS_MAP:
-            return INSIGHTS_MAP[year](matches)
-        else:
+    @classmethod
+    def new_insights_accumulator(cls, year):
+        accumulators = cls._insights_accumulators(year)
+        if accumulators is None:
             return None
+        return accumulators[0]()
+
+    @classmethod
+    def accumulate_insights(cls, accumulator, match, year):
+        cls._insights_accumulators(year)[1](accumulator, match)
+
+    @classmethod
+    def merge_insights(cls, accumulator, other, year):
+        """
+        Adds other into accumulator
+        """
+        cls._insights_accumulators(year)[2](accumulator, other)
+
+    @classmethod
+    def finalize_insights(cls, accumulator, year):
+        return cls._insights_accumulators(year)[3](accumulator)
 
     @classmethod
     def calculate_event_insights_2016(cls, matches):
-        qual_matches = []
-        playoff_matches = []
-        for match in matches:
-            if match.comp_level == 'qm':
-                qual_matches.append(match)
-            else:
-                playoff_matches.append(match)
+        return cls.calculate_event_insights(matches, 2016)
+
+    @classmethod
+    def new_accumulator_2016(cls):
+        return {
+            'qual': cls._new_accumulator_2016_helper(),
+            'playoff': cls._new_accumulator_2016_helper(),
+        }
 
-        qual_insights = cls._calculate_event_insights_2016_helper(qual_matches)
-        playoff_insights = cls._calculate_event_insights_2016_helper(playoff_matches)
+    @classmethod
+    def accumulate_2016(cls, accumulator, match):
+        if match.comp_level == 'qm':
+            cls._accumulate_2016_helper(accumulator['qual'], match)
+        else:
+            cls._accumulate_2016_helper(accumulator['playoff'], match)
 
+    @classmethod
+    def merge_2016(cls, accumulator, other):
+        for level in ['qual', 'playoff']:
+            cls._merge_2016_helper(accumulator[level], other[level])
+
+    @classmethod
+    def finalize_2016(cls, accumulator):
         return {
-            'qual': qual_insights,
-            'playoff': playoff_insights,
+            'qual': cls._finalize_2016_helper(accumulator['qual']),
+            'playoff': cls._finalize_2016_helper(accumulator['playoff']),
         }
 
     @classmethod
-    def _calculate_event_insights_2016_helper(cls, matches):
-        # defenses
-        defense_opportunities = defaultdict(int)
-        defense_damaged = defaultdict(int)
-        breaches = 0
-
-        # towers
-        high_goals = 0
-        low_goals = 0
-        challenges = 0
-        scales = 0
-        captures = 0
-
-        # scores
-        winning_scores = 0
-        win_margins = 0
-        total_scores = 0
-        auto_scores = 0
-        crossing_scores = 0
-        boulder_scores = 0
-        tower_scores = 0
-        foul_scores = 0
-        high_score = [0, "", ""]  # score, match key, match name
-
-        finished_matches = 0
-        has_insights = False
-        for match in matches:
-            if not match.has_been_played:
-                continue
-
-            red_score = match.alliances['red']['score']
-            blue_score = match.alliances['blue']['score']
-            win_score = max(red_score, blue_score)
-
-            winning_scores += win_score
-            win_margins += (win_score - min(red_score, blue_score))
-            total_scores += red_score + blue_score
-
-            if win_score > high_score[0]:
-                high_score = [win_score, match.key_name, match.short_name]
-
-            for alliance_color in ['red', 'blue']:
-                try:
-                    alliance_breakdown = match.score_breakdown[alliance_color]
-
-                    auto_scores += alliance_breakdown['autoPoints']
-                    crossing_scores += alliance_breakdown['teleopCrossingPoints']
-                    boulder_scores += alliance_breakdown['teleopBoulderPoints']
-                    tower_scores += alliance_breakdown['teleopChallengePoints'] + alliance_breakdown['teleopScalePoints']
-                    foul_scores += alliance_breakdown['foulPoints']
-
-                    pos1 = 'LowBar'
-                    pos2 = alliance_breakdown['position2']
-                    pos3 = alliance_breakdown['position3']
-                    pos4 = alliance_breakdown['position4']
-                    pos5 = alliance_breakdown['position5']
-                    positions = [pos1, pos2, pos3, pos4, pos5]
-
-                    for pos_idx, pos in enumerate(positions):
-                        defense_opportunities[pos] += 1
-                        if alliance_breakdown['position{}crossings'.format(pos_idx + 1)] == 2:
-                            defense_damaged[pos] += 1
-
-                    breaches += 1 if alliance_breakdown['teleopDefensesBreached'] else 0
-                    high_goals += alliance_breakdown['autoBouldersHigh'] + alliance_breakdown['teleopBouldersHigh']
-                    low_goals += alliance_breakdown['autoBouldersLow'] + alliance_breakdown['teleopBouldersLow']
-                    captures += 1 if alliance_breakdown['teleopTowerCaptured'] else 0
-
-                    for tower_face in ['towerFaceA', 'towerFaceB', 'towerFaceC']:
-                        if alliance_breakdown[tower_face] == 'Challenged':
-                            challenges += 1
-                        elif alliance_breakdown[tower_face] == 'Scaled':
-                            scales += 1
-                    has_insights = True
-                except Exception, e:
-                    msg = "Event insights failed for {}".format(match.key.id())
-                    # event.get() below should be cheap since it's backed by context cache
-                    if match.event.get().event_type_enum in EventType.SEASON_EVENT_TYPES:
-                        logging.warning(msg)
-                    else:
-                        logging.info(msg)
-            finished_matches += 1
+    def _new_accumulator_2016_helper(cls):
+        return {
+            # defenses
+            'defense_opportunities': defaultdict(int),
+            'defense_damaged': defaultdict(int),
+            'breaches': 0,
+
+            # towers
+            'high_goals': 0,
+            'low_goals': 0,
+            'challenges': 0,
+            'scales': 0,
+            'captures': 0,
+
+            # scores
+            'winning_scores': 0,
+            'win_margins': 0,
+            'total_scores': 0,
+            'auto_scores': 0,
+            'crossing_scores': 0,
+            'boulder_scores': 0,
+            'tower_scores': 0,
+            'foul_scores': 0,
+            'high_score': [0, "", ""],  # score, match key, match name
+
+            'finished_matches': 0,
+            'has_insights': False,
+        }
+
+    @classmethod
+    def _accumulate_2016_helper(cls, acc, match):
+        if not match.has_been_played:
+            return
+
+        red_score = match.alliances['red']['score']
+        blue_score = match.alliances['blue']['score']
+        win_score = max(red_score, blue_score)
+
+        acc['winning_scores'] += win_score
+        acc['win_margins'] += (win_score - min(red_score, blue_score))
+        acc['total_scores'] += red_score + blue_score
+
+        if win_score > acc['high_score'][0]:
+            acc['high_score'] = [win_score, match.key_name, match.short_name]
+
+        for alliance_color in ['red', 'blue']:
+            try:
+                alliance_breakdown = match.score_breakdown[alliance_color]
+
+                acc['auto_scores'] += alliance_breakdown['autoPoints']
+                acc['crossing_scores'] += alliance_breakdown['teleopCrossingPoints']
+                acc['boulder_scores'] += alliance_breakdown['teleopBoulderPoints']
+                acc['tower_scores'] += alliance_breakdown['teleopChallengePoints'] + alliance_breakdown['teleopScalePoints']
+                acc['foul_scores'] += alliance_breakdown['foulPoints']
+
+                pos1 = 'LowBar'
+                pos2 = alliance_breakdown['position2']
+                pos3 = alliance_breakdown['position3']
+                pos4 = alliance_breakdown['position4']
+                pos5 = alliance_breakdown['position5']
+                positions = [pos1, pos2, pos3, pos4, pos5]
+
+                for pos_idx, pos in enumerate(positions):
+                    acc['defense_opportunities'][pos] += 1
+                    if alliance_breakdown['position{}crossings'.format(pos_idx + 1)] == 2:
+                        acc['defense_damaged'][pos] += 1
+
+                acc['breaches'] += 1 if alliance_breakdown['teleopDefensesBreached'] else 0
+                acc['high_goals'] += alliance_breakdown['autoBouldersHigh'] + alliance_breakdown['teleopBouldersHigh']
+                acc['low_goals'] += alliance_breakdown['autoBouldersLow'] + alliance_breakdown['teleopBouldersLow']
+                acc['captures'] += 1 if alliance_breakdown['teleopTowerCaptured'] else 0
+
+                for tower_face in ['towerFaceA', 'towerFaceB', 'towerFaceC']:
+                    if alliance_breakdown[tower_face] == 'Challenged':
+                        acc['challenges'] += 1
+                    elif alliance_breakdown[tower_face] == 'Scaled':
+                        acc['scales'] += 1
+                acc['has_insights'] = True
+            except Exception, e:
+                msg = "Event insights failed for {}".format(match.key.id())
+                # event.get() below should be cheap since it's backed by context cache
+                if match.event.get().event_type_enum in EventType.SEASON_EVENT_TYPES:
+                    logging.warning(msg)
+                else:
+                    logging.info(msg)
+        acc['finished_matches'] += 1
+
+    @classmethod
+    def _merge_2016_helper(cls, acc, other):
+        for key, value in other.items():
+            if key in {'defense_opportunities', 'defense_damaged'}:
+                for pos, count in value.items():
+                    acc[key][pos] += count
+            elif key == 'high_score':
+                if value[0] > acc[key][0]:
+                    acc[key] = value
+            elif key == 'has_insights':
+                acc[key] = acc[key] or value
+            else:
+                acc[key] += value
+
+    @classmethod
+    def _finalize_2016_helper(cls, acc):
+        defense_opportunities = acc['defense_opportunities']
+        defense_damaged = acc['defense_damaged']
+        breaches = acc['breaches']
+        high_goals = acc['high_goals']
+        low_goals = acc['low_goals']
+        challenges = acc['challenges']
+        scales = acc['scales']
+        captures = acc['captures']
+        winning_scores = acc['winning_scores']
+        win_margins = acc['win_margins']
+        total_scores = acc['total_scores']
+        auto_scores = acc['auto_scores']
+        crossing_scores = acc['crossing_scores']
+        boulder_scores = acc['boulder_scores']
+        tower_scores = acc['tower_scores']
+        foul_scores = acc['foul_scores']
+        high_score = acc['high_score']
+        finished_matches = acc['finished_matches']
+        has_insights = acc['has_insights']
 
         if not has_insights:
             return None
@@ -1,6 +1,8 @@
 import copy
 import numpy as np
 
+from collections import defaultdict
+
 from google.appengine.ext import ndb
 from google.appengine.ext.ndb.tasklets import Future
 
@@ -8,6 +10,7 @@ from helpers.match_helper import MatchHelper
 from helpers.rankings_helper import RankingsHelper
 from helpers.team_helper import TeamHelper
 from models.event_details import EventDetails
+from models.event_team_statuses import EventTeamStatuses
 from models.match import Match
 
 
@@ -21,89 +24,133 @@ class EventTeamStatusHelper(object):
         :param event: Event object
         :param matches: Organized matches (via MatchHelper.organizeMatches) from the event, optional
         """
+        return cls.generate_event_team_statuses(event, [team_key], matches)[team_key]
+
+    @classmethod
+    def generate_event_team_statuses(cls, event, team_keys, matches=None):
+        """
+        Generate team@event status dicts for many teams at once. Rankings,
+        alliances and matches are indexed once and shared by every team.
+        Returns a dict of team key: status
+        :param event: Event object
+        :param team_keys: Key names of the teams to generate statuses for
+        :param matches: Organized matches (via MatchHelper.organizeMatches) from the event, optional
+        """
         event_details = event.details
         if not matches:
             matches = event.matches
             matches = MatchHelper.organizeMatches(matches)
-        return copy.deepcopy({
-            'qual': cls._build_qual_info(team_key, event_details, matches, event.year),
-            'alliance': cls._build_alliance_info(team_key, event_details, matches),
-            'playoff': cls._build_playoff_info(team_key, event_details, matches, event.year)
-        })  # TODO: Results are getting mixed unless copied. 2017-02-03 -fangeugene
+
+        qual_infos = cls._build_qual_infos(event_details, matches, event.year)
+        alliances = cls._index_alliances(event_details, matches)
+
+        playoff_infos = {}  # id of alliance: playoff info, shared by the alliance's teams
+        statuses = {}
+        for team_key in team_keys:
+            alliance, number = alliances.get(team_key, (None, 0))
+            if id(alliance) not in playoff_infos:
+                playoff_infos[id(alliance)] = cls._build_playoff_info(alliance, matches, event.year)
+            statuses[team_key] = {
+                'qual': qual_infos.get(team_key),
+                'alliance': cls._build_alliance_info(team_key, event_details, alliance, number),
+                'playoff': copy.deepcopy(playoff_infos[id(alliance)]),
+            }
+        return statuses
+
+    @classmethod
+    @ndb.transactional
+    def update_event_team_statuses(cls, event_key, statuses):
+        """
+        Stores every team's status in the event's EventTeamStatuses document,
+        bumping its version if anything changed. Returns True if it changed.
+        :param event_key: Key name of the event
+        :param statuses: Dict of team key: status, from generate_event_team_statuses
+        """
+        event_team_statuses = EventTeamStatuses.get_by_id(event_key)
+        if event_team_statuses is None:
+            event_team_statuses = EventTeamStatuses(id=event_key, statuses={})
+        elif event_team_statuses.statuses == statuses:
+            return False
+
+        event_team_statuses.statuses = statuses
+        event_team_statuses.version += 1
+        event_team_statuses.put()
+        return True
 
     @classmethod
-    def _build_qual_info(cls, team_key, event_details, matches, year):
+    def _build_qual_infos(cls, event_details, matches, year):
+        """
+        Returns a dict of team key: qual info for every team in the rankings,
+        or in the qual matches if there are no rankings
+        """
+        qual_infos = {}
         if event_details and event_details.rankings2:
             rankings = event_details.rankings2
-
-            qual_info = None
+            sort_order_info = RankingsHelper.get_sort_order_info(event_details)
             for ranking in rankings:
-                if ranking['team_key'] == team_key:
-                    qual_info = {
-                        'rank': ranking['rank'],
-                        'matches_played': ranking['matches_played'],
-                        'dq': ranking['dq'],
-                        'record': ranking['record'],
-                        'qual_average': ranking['qual_average'],
-                    }
-                    break
-
-            if qual_info:
-                qual_info['total'] = len(rankings)
-                qual_info['ranking_sort_orders'] = RankingsHelper.get_sort_order_info(event_details)
-                for info, value in zip(qual_info['ranking_sort_orders'], ranking['sort_orders']):
-                    info['value'] = value
+                if ranking['team_key'] in qual_infos:
+                    continue
 
-            return qual_info
+                # Don't share any objects with the rankings or the sort order info
+                ranking_sort_orders = [dict(info) for info in sort_order_info]
+                for info, value in zip(ranking_sort_orders, ranking['sort_orders']):
+                    info['value'] = value
+                qual_infos[ranking['team_key']] = {
+                    'rank': ranking['rank'],
+                    'matches_played': ranking['matches_played'],
+                    'dq': ranking['dq'],
+                    'record': copy.deepcopy(ranking['record']),
+                    'qual_average': ranking['qual_average'],
+                    'total': len(rankings),
+                    'ranking_sort_orders': ranking_sort_orders,
+                }
         else:
             # Use matches as fallback
-            all_teams = set()
-            wins = 0
-            losses = 0
-            ties = 0
-            qual_score_sum = 0
-            matches_played = 0
+            team_records = defaultdict(lambda: {
+                'wins': 0,
+                'losses': 0,
+                'ties': 0,
+                'qual_score_sum': 0,
+                'matches_played': 0,
+            })
             for match in matches['qm']:
                 for color in ['red', 'blue']:
                     for team in match.alliances[color]['teams']:
-                        all_teams.add(team)
-                        if team == team_key and match.has_been_played and \
-                                team_key not in match.alliances[color]['surrogates']:
-                            matches_played += 1
+                        team_record = team_records[team]
+                        if match.has_been_played and team not in match.alliances[color]['surrogates']:
+                            team_record['matches_played'] += 1
 
                             if match.winning_alliance == color:
-                                wins += 1
+                                team_record['wins'] += 1
                             elif match.winning_alliance == '':
-                                ties += 1
+                                team_record['ties'] += 1
                             else:
-                                losses += 1
+                                team_record['losses'] += 1
 
-                            qual_score_sum += match.alliances[color]['score']
+                            team_record['qual_score_sum'] += match.alliances[color]['score']
 
-            qual_average = float(qual_score_sum) / matches_played if matches_played else 0
-
-            if team_key in all_teams:
-                return {
+            for team, team_record in team_records.items():
+                matches_played = team_record['matches_played']
+                qual_average = float(team_record['qual_score_sum']) / matches_played if matches_played else 0
+                qual_infos[team] = {
                     'rank': None,
                     'matches_played': matches_played,
                     'dq': None,
                     'record': {
-                        'wins': wins,
-                        'losses': losses,
-                        'ties': ties,
+                        'wins': team_record['wins'],
+                        'losses': team_record['losses'],
+                        'ties': team_record['ties'],
                     } if year != 2015 else None,
                     'qual_average': qual_average if year == 2015 else None,
-                    'total': len(all_teams),
+                    'total': len(team_records),
                     'ranking_sort_orders': None,
                 }
-            else:
-                return None
+        return qual_infos
 
     @classmethod
-    def _build_alliance_info(cls, team_key, event_details, matches):
+    def _build_alliance_info(cls, team_key, event_details, alliance, number):
         if not event_details or not event_details.alliance_selections:
             return None
-        alliance, number = cls._get_alliance(team_key, event_details, matches)
         if not alliance:
             return None
 
@@ -119,13 +166,12 @@ class EventTeamStatusHelper(object):
             'pick': pick,
             'name': alliance.get('name', "Alliance {}".format(number)),
             'number': number,
-            'backup': alliance.get('backup'),
+            'backup': copy.deepcopy(alliance.get('backup')),
         }
 
     @classmethod
-    def _build_playoff_info(cls, team_key, event_details, matches, year):
+    def _build_playoff_info(cls, alliance, matches, year):
         # Matches needs to be all playoff matches at the event, to properly account for backups
-        alliance, _ = cls._get_alliance(team_key, event_details, matches)
         complete_alliance = set(alliance['picks']) if alliance else set()
         if alliance and alliance.get('backup'):
             complete_alliance.add(alliance['backup']['in'])
@@ -204,21 +250,23 @@ class EventTeamStatusHelper(object):
         return status
 
     @classmethod
-    def _get_alliance(cls, team_key, event_details, matches):
+    def _index_alliances(cls, event_details, matches):
         """
-        Get the alliance number of the team
-        Returns 0 when the team is not on an alliance
+        Returns a dict of team key: (alliance, alliance number) for every
+        team on a playoff alliance. The alliance number is None when the
+        alliances come from matches. Teams not on an alliance are left out.
         """
+        alliances = {}
         if event_details and event_details.alliance_selections:
             for i, alliance in enumerate(event_details.alliance_selections):
                 alliance_number = i + 1
-                if team_key in alliance['picks']:
-                    return alliance, alliance_number
+                for team_key in alliance['picks']:
+                    alliances.setdefault(team_key, (alliance, alliance_number))
 
                 backup_info = alliance.get('backup') if alliance.get('backup') else {}
-                if team_key == backup_info.get('in', ""):
+                if backup_info.get('in'):
                     # If this team came in as a backup team
-                    return alliance, alliance_number
+                    alliances.setdefault(backup_info['in'], (alliance, alliance_number))
         else:
             # No event_details. Use matches to generate alliances.
             complete_alliances = []
@@ -235,11 +283,11 @@ class EventTeamStatusHelper(object):
                             complete_alliances.append(alliance)
 
             for complete_alliance in complete_alliances:
-                if team_key in complete_alliance:
-                    return {'picks': complete_alliance}, None  # Alliance number is unknown
+                alliance = {'picks': complete_alliance}
+                for team_key in complete_alliance:
+                    alliances.setdefault(team_key, (alliance, None))  # Alliance number is unknown
 
-        alliance_number = 0
-        return None, alliance_number  # Team didn't make it to elims
+        return alliances
 
     @classmethod
     def buildEventTeamStatus(cls, events, eventteams, team_filter):
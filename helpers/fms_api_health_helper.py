@@ -0,0 +1,106 @@
+import logging
+import time
+
+from google.appengine.api import memcache
+
+from controllers.api.api_status_controller import ApiStatusController
+from helpers.metrics_bucket_helper import MetricsBucketHelper
+from models.sitevar import Sitevar
+
+
+class FMSAPIHealthHelper(object):
+    """
+    Tracks FMS API health from the responses the datafeeds get, and keeps the
+    apistatus.fmsapi_down Sitevar up to date.
+    The Sitevar is only written when the state flips, which takes
+    FAILURES_TO_DOWN consecutive failures or SUCCESSES_TO_UP consecutive
+    successes, so a single blip doesn't flap the status.
+    Streaks and per-minute request, error and latency counters (see
+    MetricsBucketHelper) live in memcache, so they're shared by every instance.
+    """
+    FAILURES_TO_DOWN = 3
+    SUCCESSES_TO_UP = 2
+    STATE_REFRESH_SECONDS = 10  # How long an instance trusts its in-memory state
+
+    CACHE_KEY_PREFIX = 'fmsapi_health:'
+    FAILURES_KEY = 'consecutive_failures'
+    SUCCESSES_KEY = 'consecutive_successes'
+    IS_DOWN_KEY = 'is_down'
+
+    # In-memory state, per instance
+    _is_down = None
+    _is_down_checked = 0
+
+    @classmethod
+    def record_response(cls, latency, status_code=None):
+        """
+        Records an FMS API response.
+        5XXs and failed fetches (status_code None) count as failures,
+        200s and 304s as successes. Other responses only count as requests.
+        :param latency: Seconds the fetch took
+        :param status_code: HTTP status code, or None if the fetch failed
+        """
+        is_failure = status_code is None or status_code / 100 == 5
+        is_success = status_code in (200, 304)
+
+        streak_offsets = {}
+        if is_failure:
+            streak_offsets = {cls.FAILURES_KEY: 1, cls.SUCCESSES_KEY: 0}
+        elif is_success:
+            streak_offsets = {cls.FAILURES_KEY: 0, cls.SUCCESSES_KEY: 1}
+        counts = MetricsBucketHelper.record(
+            cls.CACHE_KEY_PREFIX, 1, 1 if is_failure else 0, latency, other_offsets=streak_offsets)
+        if not (is_failure or is_success):
+            return
+
+        # Break the other streak
+        streak_key, other_key = (cls.FAILURES_KEY, cls.SUCCESSES_KEY) if is_failure else (cls.SUCCESSES_KEY, cls.FAILURES_KEY)
+        if counts.get(other_key):
+            memcache.set(cls.CACHE_KEY_PREFIX + other_key, 0)
+
+        streak = counts.get(streak_key) or 0
+        is_down = cls.is_down()
+        if is_failure and not is_down and streak >= cls.FAILURES_TO_DOWN:
+            cls._set_is_down(True)
+        elif is_success and is_down and streak >= cls.SUCCESSES_TO_UP:
+            cls._set_is_down(False)
+
+    @classmethod
+    def is_down(cls):
+        now = time.time()
+        if cls._is_down is None or now - cls._is_down_checked > cls.STATE_REFRESH_SECONDS:
+            is_down = memcache.get(cls.CACHE_KEY_PREFIX + cls.IS_DOWN_KEY)
+            if is_down is None:
+                sitevar = Sitevar.get_by_id('apistatus.fmsapi_down')
+                is_down = bool(sitevar and sitevar.contents == True)
+                memcache.set(cls.CACHE_KEY_PREFIX + cls.IS_DOWN_KEY, is_down)
+            cls._is_down = is_down
+            cls._is_down_checked = now
+        return cls._is_down
+
+    @classmethod
+    def _set_is_down(cls, is_down):
+        sitevar = Sitevar.get_or_insert('apistatus.fmsapi_down', description="Is FMSAPI down?")
+        old_status = sitevar.contents
+        if old_status != is_down:
+            logging.warning("FMS API is {}".format("down" if is_down else "back up"))
+            sitevar.contents = is_down
+            sitevar.put()
+            ApiStatusController.clear_cache_if_needed(old_status, is_down)
+
+        memcache.set(cls.CACHE_KEY_PREFIX + cls.IS_DOWN_KEY, is_down)
+        cls._is_down = is_down
+        cls._is_down_checked = time.time()
+
+    @classmethod
+    def get_metrics(cls, minutes=15):
+        """
+        Returns request count, error rate and average latency over the last
+        few minutes, along with the current state
+        """
+        metrics = MetricsBucketHelper.get_metrics(cls.CACHE_KEY_PREFIX, minutes)
+        metrics.update({
+            'consecutive_failures': memcache.get(cls.CACHE_KEY_PREFIX + cls.FAILURES_KEY) or 0,
+            'is_down': cls.is_down(),
+        })
+        return metrics
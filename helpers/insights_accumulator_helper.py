@@ -0,0 +1,289 @@
+import hashlib
+import logging
+import time
+
+from collections import defaultdict
+
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+
+from models.insights_accumulator_shard import InsightsAccumulatorShard
+from models.match import Match
+
+
+class InsightsAccumulatorHelper(object):
+    """
+    Keeps sharded running totals for a year's match insights, so a match
+    update can be applied as a delta instead of recomputing the season.
+    Also keeps each year's award insights partial and their merge across
+    years, which overall award insights are rendered from.
+
+    A state is nested dicts of numbers, keyed by event key:
+    {'2016casj': {'score_sum': 1234, 'num_matches': 10,
+                  'elim_score_sum': 0, 'elim_num_matches': 0,
+                  'score_counts': {'85': 2, ...},  # played matches only
+                  'elim_score_counts': {...},
+                  'max_scores': {'85': {'2016casj_qm1': 1}, ...}},  # winning score: matches with it
+     ...}
+    Deltas have the same shape and states are summed key by key, so the
+    state doesn't depend on the order updates are applied in. Entries that
+    sum to zero are dropped.
+    Each match always goes to the same shard, which also keeps the
+    contribution it last added for the match. Updates re-read the match and
+    swap that contribution out in a transaction, so retried hooks and racing
+    writers can't count a match twice.
+    """
+    NUM_SHARDS = 10
+    MAX_MATCHES_PER_TRANSACTION = 24  # Plus the shard, under the 25 entity group limit
+    UPDATE_INTERVAL = 60  # seconds between insight renders for a year
+
+    @classmethod
+    def match_contribution(cls, match):
+        """
+        Returns a match's share of its event's running totals
+        """
+        alliances = match.alliances
+        # Same score normalization as Match.alliances
+        red_score = alliances['red']['score']
+        red_score = -1 if red_score is None else int(red_score)
+        blue_score = alliances['blue']['score']
+        blue_score = -1 if blue_score is None else int(blue_score)
+
+        is_elim = match.comp_level in Match.ELIM_LEVELS
+        totals = {
+            'score_sum': red_score + blue_score,
+            'num_matches': 1,
+        }
+        if is_elim:
+            totals['elim_score_sum'] = red_score + blue_score
+            totals['elim_num_matches'] = 1
+
+        max_score = max(red_score, blue_score)
+        if max_score >= 0:
+            totals['max_scores'] = {str(max_score): {match.key_name: 1}}
+
+        if red_score != -1 and blue_score != -1:  # Played
+            score_counts = {}
+            for score in [red_score, blue_score]:
+                score_counts[str(score)] = score_counts.get(str(score), 0) + 1
+            totals['score_counts'] = score_counts
+            if is_elim:
+                totals['elim_score_counts'] = dict(score_counts)
+
+        return {match.event.id(): totals}
+
+    @classmethod
+    def add_into(cls, state, delta, sign=1):
+        """
+        Adds sign * delta into state, dropping entries that become zero
+        """
+        for key, value in delta.items():
+            if isinstance(value, dict):
+                cls.add_into(state.setdefault(key, {}), value, sign)
+                if not state[key]:
+                    del state[key]
+            else:
+                state[key] = state.get(key, 0) + sign * value
+                if state[key] == 0:
+                    del state[key]
+        return state
+
+    @classmethod
+    def _shard_keys(cls, year):
+        return [ndb.Key(InsightsAccumulatorShard, '{}_matches_{}'.format(year, i)) for i in xrange(cls.NUM_SHARDS)]
+
+    @classmethod
+    def _match_shard_key(cls, year, match_key_name):
+        shard = int(hashlib.md5(match_key_name).hexdigest(), 16) % cls.NUM_SHARDS
+        return cls._shard_keys(year)[shard]
+
+    @classmethod
+    @ndb.transactional(xg=True)
+    def _apply_to_shard(cls, shard_key, match_keys):
+        """
+        Replaces each match's last applied contribution in the shard with the
+        one from its current version, or removes it if the match is gone.
+        Returns whether the shard changed.
+        """
+        entities = ndb.get_multi([shard_key] + match_keys)
+        shard, matches = entities[0], entities[1:]
+        if shard is None:
+            shard = InsightsAccumulatorShard(key=shard_key, state={}, contributions={})
+        if shard.contributions is None:
+            shard.contributions = {}
+
+        changed = False
+        for match_key, match in zip(match_keys, matches):
+            old_contribution = shard.contributions.get(match_key.id())
+            new_contribution = cls.match_contribution(match) if match is not None else None
+            if new_contribution == old_contribution:
+                continue
+            if old_contribution is not None:
+                cls.add_into(shard.state, old_contribution, sign=-1)
+                del shard.contributions[match_key.id()]
+            if new_contribution is not None:
+                cls.add_into(shard.state, new_contribution)
+                shard.contributions[match_key.id()] = new_contribution
+            changed = True
+        if changed:
+            shard.put()
+        return changed
+
+    @classmethod
+    def update_matches(cls, match_keys):
+        """
+        Brings the running totals up to date with the matches as they are
+        now in the datastore, and enqueues rendering the years that changed.
+        Matches that have been deleted are taken out.
+        """
+        match_keys_by_shard = defaultdict(list)
+        for match_key in set(match_keys):
+            year = int(match_key.id()[:4])
+            match_keys_by_shard[(year, cls._match_shard_key(year, match_key.id()))].append(match_key)
+
+        updated_years = set()
+        for (year, shard_key), shard_match_keys in match_keys_by_shard.items():
+            for i in xrange(0, len(shard_match_keys), cls.MAX_MATCHES_PER_TRANSACTION):
+                if cls._apply_to_shard(shard_key, shard_match_keys[i:i + cls.MAX_MATCHES_PER_TRANSACTION]):
+                    updated_years.add(year)
+        for year in updated_years:
+            cls.enqueue_update(year)
+
+    @classmethod
+    def enqueue_update(cls, year):
+        """
+        Updates within the same interval share one render task
+        """
+        try:
+            taskqueue.add(
+                name='match_insights_update_{}_{}'.format(year, int(time.time() / cls.UPDATE_INTERVAL)),
+                url='/tasks/math/do/match_insights_update/{}'.format(year),
+                countdown=cls.UPDATE_INTERVAL,
+                method='GET')
+        except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+            pass
+
+    @classmethod
+    def get_state(cls, year):
+        """
+        Returns the sum of a year's shards
+        """
+        state = {}
+        for shard in ndb.get_multi(cls._shard_keys(year)):
+            if shard is not None:
+                cls.add_into(state, shard.state)
+        return state
+
+    @classmethod
+    @ndb.transactional()
+    def _reset_shard(cls, shard_key, seen_contributions, new_contributions):
+        """
+        Sets each match's contribution in the shard to the one in
+        new_contributions, unless it's no longer the one in seen_contributions
+        because a match update swapped it since. Then rebuilds the shard's
+        state from its contributions.
+        :param seen_contributions: {match key name: contribution, or None} as read before new_contributions was built
+        :param new_contributions: {match key name: contribution, or None to remove it}
+        """
+        shard = shard_key.get()
+        if shard is None:
+            shard = InsightsAccumulatorShard(key=shard_key)
+        contributions = shard.contributions or {}
+        for match_key_name, contribution in new_contributions.items():
+            if contributions.get(match_key_name) != seen_contributions.get(match_key_name):
+                continue
+            if contribution is None:
+                contributions.pop(match_key_name, None)
+            else:
+                contributions[match_key_name] = contribution
+
+        state = {}
+        for contribution in contributions.values():
+            cls.add_into(state, contribution)
+        shard.contributions = contributions
+        shard.state = state
+        shard.put()
+
+    @classmethod
+    def check_state(cls, year, match_contributions):
+        """
+        Compares the shards against every match's contribution, and resets
+        the ones that have drifted, each in its own transaction. Matches that
+        differ are re-read, so ones updated since match_contributions was
+        built keep their current contribution. Returns True if they matched.
+        :param match_contributions: {match key name: contribution} for every match in the year
+        """
+        expected_contributions = defaultdict(dict)  # shard key: {match key name: contribution}
+        for match_key_name, contribution in match_contributions.items():
+            expected_contributions[cls._match_shard_key(year, match_key_name)][match_key_name] = contribution
+
+        shard_keys = cls._shard_keys(year)
+        matched = True
+        for shard_key, shard in zip(shard_keys, ndb.get_multi(shard_keys)):
+            expected = expected_contributions[shard_key]
+            expected_state = {}
+            for contribution in expected.values():
+                cls.add_into(expected_state, contribution)
+            seen = (shard.contributions or {}) if shard is not None else {}
+            if shard is not None and shard.state == expected_state and seen == expected:
+                continue
+
+            matched = False
+            differing_keys = [match_key_name for match_key_name in set(seen) | set(expected)
+                              if seen.get(match_key_name) != expected.get(match_key_name)]
+            matches = ndb.get_multi([ndb.Key(Match, match_key_name) for match_key_name in differing_keys], use_cache=False)
+            cls._reset_shard(
+                shard_key,
+                dict((match_key_name, seen.get(match_key_name)) for match_key_name in differing_keys),
+                dict((match_key_name, cls.match_contribution(match) if match is not None else None)
+                     for match_key_name, match in zip(differing_keys, matches)))
+
+        if not matched:
+            logging.warning("Match insights accumulators for {} drifted from a full recompute, reset them".format(year))
+        return matched
+
+    @classmethod
+    def _award_partial_key(cls, year):
+        """
+        Year 0 holds the merge of every year's partial, like overall Insights
+        """
+        return ndb.Key(InsightsAccumulatorShard, '{}_awards'.format(year))
+
+    @classmethod
+    @ndb.transactional(xg=True)
+    def set_award_partial(cls, year, partial):
+        """
+        Stores a year's award insights partial, and swaps it into the merge
+        of all years by subtracting the year's previous partial
+        """
+        old_partial, overall = ndb.get_multi([cls._award_partial_key(year), cls._award_partial_key(0)])
+        if overall is not None:
+            if old_partial is not None:
+                cls.add_into(overall.state, old_partial.state, sign=-1)
+            cls.add_into(overall.state, partial)
+            overall.put()
+        InsightsAccumulatorShard(key=cls._award_partial_key(year), state=partial).put()
+
+    @classmethod
+    def get_award_partials(cls, years):
+        """
+        Returns {year: award insights partial, or None if it hasn't been calculated}
+        """
+        partials = ndb.get_multi([cls._award_partial_key(year) for year in years])
+        return dict((year, partial.state if partial is not None else None) for year, partial in zip(years, partials))
+
+    @classmethod
+    def get_overall_award_partial(cls):
+        """
+        Returns the merge of all years' award insights partials, or None if
+        it hasn't been built yet
+        """
+        overall = cls._award_partial_key(0).get()
+        return overall.state if overall is not None else None
+
+    @classmethod
+    def set_overall_award_partial(cls, partial):
+        """
+        set_award_partial keeps this up to date once it exists
+        """
+        InsightsAccumulatorShard(key=cls._award_partial_key(0), state=partial).put()
@@ -6,6 +6,8 @@ from collections import defaultdict
 
 from google.appengine.ext import ndb
 
+import tba_config
+
 from consts.award_type import AwardType
 from consts.event_type import EventType
 
@@ -17,6 +19,7 @@ from models.match import Match
 from helpers.event_helper import EventHelper
 from helpers.event_helper import OFFSEASON_EVENTS_LABEL, PRESEASON_EVENTS_LABEL
 from helpers.event_insights_helper import EventInsightsHelper
+from helpers.insights_accumulator_helper import InsightsAccumulatorHelper
 
 
 class InsightsHelper(object):
@@ -24,39 +27,133 @@ class InsightsHelper(object):
     Helper for calculating insights and generating Insight objects
     """
 
+    MATCH_PAGE_SIZE = 500
+
     @classmethod
-    def doMatchInsights(self, year):
+    def doMatchInsights(self, year, match_contributions=None):
         """
         Calculate match insights for a given year. Returns a list of Insights.
+        Matches are streamed a page at a time into per-event accumulators,
+        so memory use doesn't grow with the number of matches in the season.
+        If match_contributions is given, every match's contribution is added
+        to it by key name, to check the running totals in
+        InsightsAccumulatorHelper against.
+        """
+        week_events = self._officialEventsByWeek(year)
+        event_accumulators = {}  # event key: (event order, event, accumulator)
+        for _, events in week_events:
+            for event in events:
+                event_accumulators[event.key.id()] = (len(event_accumulators), event, self._newMatchAccumulator(year))
+
+        # Skip the context cache so matches don't pile up in memory
+        query = Match.query(Match.year == year)
+        cursor = None
+        more = True
+        while more:
+            matches, cursor, more = query.fetch_page(
+                self.MATCH_PAGE_SIZE, start_cursor=cursor, use_cache=False, use_memcache=False)
+            for match in matches:
+                if match_contributions is not None:
+                    match_contributions[match.key_name] = InsightsAccumulatorHelper.match_contribution(match)
+                if match.event.id() not in event_accumulators:
+                    continue
+                event_order, event, accumulator = event_accumulators[match.event.id()]
+                self._accumulateMatch(accumulator, match, event, (event_order, match.key_name), year)
+
+        return self._calculateMatchInsights(
+            week_events, dict((event_key, accumulator) for event_key, (_, _, accumulator) in event_accumulators.items()), year)
+
+    @classmethod
+    def doMatchInsightsFromState(self, year, state):
+        """
+        Calculate match insights for a given year from the running totals kept
+        by InsightsAccumulatorHelper. Returns a list of Insights.
+        Year specific insights aren't kept as running totals and are left out.
+        """
+        week_events = self._officialEventsByWeek(year)
+
+        # Only each event's high score matches need to be fetched
+        highscore_match_keys = []
+        for _, events in week_events:
+            for event in events:
+                max_scores = state.get(event.key.id(), {}).get('max_scores')
+                if max_scores:
+                    highscore = max(int(score) for score in max_scores)
+                    highscore_match_keys += [ndb.Key(Match, key_name) for key_name in max_scores[str(highscore)]]
+        highscore_matches = dict((match.key_name, match) for match in ndb.get_multi(highscore_match_keys) if match is not None)
+
+        event_accumulators = {}  # event key: accumulator
+        for _, events in week_events:
+            for event in events:
+                totals = state.get(event.key.id(), {})
+                accumulator = self._newMatchAccumulator(year, year_specific=False)
+                for key in ['score_sum', 'num_matches', 'elim_score_sum', 'elim_num_matches']:
+                    accumulator[key] = totals.get(key, 0)
+                for key in ['score_counts', 'elim_score_counts']:
+                    for score, count in totals.get(key, {}).items():
+                        accumulator[key][int(score)] += count
+                if accumulator['score_counts']:
+                    accumulator['played_highscore'] = max(max(accumulator['score_counts']), 0)
+
+                max_scores = totals.get('max_scores')
+                if max_scores:
+                    accumulator['highscore'] = max(int(score) for score in max_scores)
+                    for key_name in max_scores[str(accumulator['highscore'])]:
+                        if key_name in highscore_matches:
+                            accumulator['highscore_matches'].append(
+                                ((len(event_accumulators), key_name), self._generateMatchData(highscore_matches[key_name], event)))
+                event_accumulators[event.key.id()] = accumulator
+
+        return self._calculateMatchInsights(week_events, event_accumulators, year, year_specific=False)
+
+    @classmethod
+    def _officialEventsByWeek(self, year):
+        """
+        Returns a list of tuples: (week, official events in that week)
+        Offseason and preseason weeks are left out
         """
-        # Only fetch from DB once
         official_events = Event.query(Event.year == year).order(Event.start_date).fetch(1000)
         events_by_week = EventHelper.groupByWeek(official_events)
-        week_event_matches = []  # Tuples of: (week, events) where events are tuples of (event, matches)
+        week_events = []
         for week, events in events_by_week.items():
             if week in {OFFSEASON_EVENTS_LABEL, PRESEASON_EVENTS_LABEL}:
                 continue
-            week_events = []
+            week_events.append((week, [event for event in events if event.official]))
+        return week_events
+
+    @classmethod
+    def _calculateMatchInsights(self, week_events, event_accumulators, year, year_specific=True):
+        """
+        Merges per-event accumulators into weeks and the whole year and
+        returns the match Insights
+        """
+        # Merge in event order, so ties resolve the same way as going through events one at a time
+        week_accumulators = []  # Tuples of: (week, accumulator)
+        for week, events in week_events:
+            week_accumulator = self._newMatchAccumulator(year, year_specific)
             for event in events:
-                if not event.official:
-                    continue
-                matches = event.matches
-                week_events.append((event, matches))
-            week_event_matches.append((week, week_events))
+                self._mergeMatchAccumulators(week_accumulator, event_accumulators[event.key.id()], year)
+            week_accumulators.append((week, week_accumulator))
+
+        overall_accumulator = self._newMatchAccumulator(year, year_specific)
+        for _, accumulator in week_accumulators:
+            self._mergeMatchAccumulators(overall_accumulator, accumulator, year)
 
         insights = []
-        insights += self._calculateHighscoreMatchesByWeek(week_event_matches, year)
-        insights += self._calculateHighscoreMatches(week_event_matches, year)
-        insights += self._calculateMatchAveragesByWeek(week_event_matches, year)
-        insights += self._calculateScoreDistribution(week_event_matches, year)
-        insights += self._calculateNumMatches(week_event_matches, year)
-        insights += self._calculateYearSpecific(week_event_matches, year)
+        insights += self._calculateHighscoreMatchesByWeek(week_accumulators, year)
+        insights += self._calculateHighscoreMatches(overall_accumulator, year)
+        insights += self._calculateMatchAveragesByWeek(week_accumulators, year)
+        insights += self._calculateScoreDistribution(overall_accumulator, year)
+        insights += self._calculateNumMatches(overall_accumulator, year)
+        insights += self._calculateYearSpecific(week_accumulators, overall_accumulator, year)
         return insights
 
     @classmethod
-    def doAwardInsights(self, year):
+    def doAwardInsights(self, year, partial=None):
         """
         Calculate award insights for a given year. Returns a list of Insights.
+        If partial is given, the year's counters for overall award insights
+        are added to it, see _calculateAwardPartial.
         """
         # Get all Blue Banner, Division Finalist, and Championship Finalist awards
         blue_banner_award_keys_future = Award.query(
@@ -81,6 +178,9 @@ class InsightsHelper(object):
         insights += self._calculateRegionalStats(award_futures, year)
         insights += self._calculateSuccessfulElimTeamups(award_futures, year)
 
+        if partial is not None:
+            InsightsAccumulatorHelper.add_into(partial, self._calculateAwardPartial(award_futures))
+
         return insights
 
     @classmethod
@@ -127,26 +227,90 @@ class InsightsHelper(object):
         return sorted(team_list, key=lambda team: int(team[3:]))  # Sort by team number
 
     @classmethod
-    def _calculateHighscoreMatchesByWeek(self, week_event_matches, year):
+    def _newMatchAccumulator(self, year, year_specific=True):
+        """
+        Running totals for a set of matches. Accumulators for disjoint sets
+        of matches can be merged with _mergeMatchAccumulators
+        """
+        return {
+            'highscore': 0,
+            'highscore_matches': [],  # tuples: sort key, match data (if there are ties)
+            'score_sum': 0,  # Includes unplayed matches, like the averages always have
+            'num_matches': 0,
+            'elim_score_sum': 0,
+            'elim_num_matches': 0,
+            'played_highscore': 0,
+            'score_counts': defaultdict(int),  # score: occurrences in played matches
+            'elim_score_counts': defaultdict(int),
+            'year_specific': EventInsightsHelper.new_insights_accumulator(year) if year_specific else None,
+        }
+
+    @classmethod
+    def _accumulateMatch(self, accumulator, match, event, sort_key, year):
+        """
+        Adds a match to an accumulator. sort_key orders tied high score matches
+        """
+        redScore = int(match.alliances['red']['score'])
+        blueScore = int(match.alliances['blue']['score'])
+
+        maxScore = max(redScore, blueScore)
+        if maxScore >= accumulator['highscore']:
+            if maxScore > accumulator['highscore']:
+                accumulator['highscore_matches'] = []
+            accumulator['highscore_matches'].append((sort_key, self._generateMatchData(match, event)))
+            accumulator['highscore'] = maxScore
+
+        accumulator['score_sum'] += redScore + blueScore
+        accumulator['num_matches'] += 1
+        if match.comp_level in Match.ELIM_LEVELS:
+            accumulator['elim_score_sum'] += redScore + blueScore
+            accumulator['elim_num_matches'] += 1
+
+        if match.has_been_played:
+            accumulator['played_highscore'] = max(accumulator['played_highscore'], redScore, blueScore)
+            accumulator['score_counts'][redScore] += 1
+            accumulator['score_counts'][blueScore] += 1
+            if match.comp_level in Match.ELIM_LEVELS:
+                accumulator['elim_score_counts'][redScore] += 1
+                accumulator['elim_score_counts'][blueScore] += 1
+
+        if accumulator['year_specific'] is not None:
+            EventInsightsHelper.accumulate_insights(accumulator['year_specific'], match, year)
+
+    @classmethod
+    def _mergeMatchAccumulators(self, accumulator, other, year):
+        """
+        Adds other into accumulator
+        """
+        if other['highscore'] > accumulator['highscore']:
+            accumulator['highscore'] = other['highscore']
+            accumulator['highscore_matches'] = list(other['highscore_matches'])
+        elif other['highscore'] == accumulator['highscore']:
+            accumulator['highscore_matches'] += other['highscore_matches']
+
+        for key in ['score_sum', 'num_matches', 'elim_score_sum', 'elim_num_matches']:
+            accumulator[key] += other[key]
+        accumulator['played_highscore'] = max(accumulator['played_highscore'], other['played_highscore'])
+        for key in ['score_counts', 'elim_score_counts']:
+            for score, count in other[key].items():
+                accumulator[key][score] += count
+
+        if accumulator['year_specific'] is not None:
+            EventInsightsHelper.merge_insights(accumulator['year_specific'], other['year_specific'], year)
+
+    @classmethod
+    def _sortedHighscoreMatches(self, accumulator):
+        return [match_data for _, match_data in sorted(accumulator['highscore_matches'], key=lambda pair: pair[0])]
+
+    @classmethod
+    def _calculateHighscoreMatchesByWeek(self, week_accumulators, year):
         """
         Returns an Insight where the data is a list of tuples:
         (week string, list of highest scoring matches)
         """
         highscore_matches_by_week = []  # tuples: week, list of matches (if there are ties)
-        for week, week_events in week_event_matches:
-            week_highscore_matches = []
-            highscore = 0
-            for event, matches in week_events:
-                for match in matches:
-                    redScore = int(match.alliances['red']['score'])
-                    blueScore = int(match.alliances['blue']['score'])
-                    maxScore = max(redScore, blueScore)
-                    if maxScore >= highscore:
-                        if maxScore > highscore:
-                            week_highscore_matches = []
-                        week_highscore_matches.append(self._generateMatchData(match, event))
-                        highscore = maxScore
-            highscore_matches_by_week.append((week, week_highscore_matches))
+        for week, accumulator in week_accumulators:
+            highscore_matches_by_week.append((week, self._sortedHighscoreMatches(accumulator)))
 
         insight = None
         if highscore_matches_by_week != []:
@@ -157,23 +321,11 @@ class InsightsHelper(object):
             return []
 
     @classmethod
-    def _calculateHighscoreMatches(self, week_event_matches, year):
+    def _calculateHighscoreMatches(self, accumulator, year):
         """
         Returns an Insight where the data is list of highest scoring matches
         """
-        highscore_matches = []  # list of matches (if there are ties)
-        highscore = 0
-        for _, week_events in week_event_matches:
-            for event, matches in week_events:
-                for match in matches:
-                    redScore = int(match.alliances['red']['score'])
-                    blueScore = int(match.alliances['blue']['score'])
-                    maxScore = max(redScore, blueScore)
-                    if maxScore >= highscore:
-                        if maxScore > highscore:
-                            highscore_matches = []
-                        highscore_matches.append(self._generateMatchData(match, event))
-                        highscore = maxScore
+        highscore_matches = self._sortedHighscoreMatches(accumulator)  # list of matches (if there are ties)
 
         insight = None
         if highscore_matches != []:
@@ -184,7 +336,7 @@ class InsightsHelper(object):
             return []
 
     @classmethod
-    def _calculateMatchAveragesByWeek(self, week_event_matches, year):
+    def _calculateMatchAveragesByWeek(self, week_accumulators, year):
         """
         Returns a list of Insights, one for all data and one for elim data
         The data for each Insight is a list of tuples:
@@ -192,27 +344,13 @@ class InsightsHelper(object):
         """
         match_averages_by_week = []  # tuples: week, average score
         elim_match_averages_by_week = []  # tuples: week, average score
-        for week, week_events in week_event_matches:
-            week_match_sum = 0
-            num_matches_by_week = 0
-            elim_week_match_sum = 0
-            elim_num_matches_by_week = 0
-            for _, matches in week_events:
-                for match in matches:
-                    redScore = int(match.alliances['red']['score'])
-                    blueScore = int(match.alliances['blue']['score'])
-                    week_match_sum += redScore + blueScore
-                    num_matches_by_week += 1
-                    if match.comp_level in Match.ELIM_LEVELS:
-                        elim_week_match_sum += redScore + blueScore
-                        elim_num_matches_by_week += 1
-
-            if num_matches_by_week != 0:
-                week_average = float(week_match_sum) / num_matches_by_week / 2
+        for week, accumulator in week_accumulators:
+            if accumulator['num_matches'] != 0:
+                week_average = float(accumulator['score_sum']) / accumulator['num_matches'] / 2
                 match_averages_by_week.append((week, week_average))
 
-            if elim_num_matches_by_week != 0:
-                elim_week_average = float(elim_week_match_sum) / elim_num_matches_by_week / 2
+            if accumulator['elim_num_matches'] != 0:
+                elim_week_average = float(accumulator['elim_score_sum']) / accumulator['elim_num_matches'] / 2
                 elim_match_averages_by_week.append((week, elim_week_average))
 
         insights = []
@@ -223,70 +361,43 @@ class InsightsHelper(object):
         return insights
 
     @classmethod
-    def _calculateScoreDistribution(self, week_event_matches, year):
+    def _normalizeScoreDistribution(self, score_counts, binAmount):
+        totalCount = float(sum(score_counts.values()))
+        score_distribution_normalized = {}
+        for score, amount in score_counts.items():
+            roundedScore = score - int(score % binAmount) + binAmount / 2  # Round off and then center in the bin
+            contribution = float(amount) * 100 / totalCount
+            if roundedScore in score_distribution_normalized:
+                score_distribution_normalized[roundedScore] += contribution
+            else:
+                score_distribution_normalized[roundedScore] = contribution
+        return score_distribution_normalized
+
+    @classmethod
+    def _calculateScoreDistribution(self, accumulator, year):
         """
         Returns a list of Insights, one for all data and one for elim data
         The data for each Insight is a dict:
         Key: Middle score of a bucketed range of scores, Value: % occurrence
         """
-        score_distribution = defaultdict(int)
-        elim_score_distribution = defaultdict(int)
-        overall_highscore = 0
-        for _, week_events in week_event_matches:
-            for _, matches in week_events:
-                for match in matches:
-                    if not match.has_been_played:
-                        continue
-                    redScore = int(match.alliances['red']['score'])
-                    blueScore = int(match.alliances['blue']['score'])
-
-                    overall_highscore = max(overall_highscore, redScore, blueScore)
-
-                    score_distribution[redScore] += 1
-                    score_distribution[blueScore] += 1
-
-                    if match.comp_level in Match.ELIM_LEVELS:
-                        elim_score_distribution[redScore] += 1
-                        elim_score_distribution[blueScore] += 1
+        binAmount = math.ceil(float(accumulator['played_highscore']) / 20)
 
         insights = []
-        if score_distribution != {}:
-            binAmount = math.ceil(float(overall_highscore) / 20)
-            totalCount = float(sum(score_distribution.values()))
-            score_distribution_normalized = {}
-            for score, amount in score_distribution.items():
-                roundedScore = score - int(score % binAmount) + binAmount / 2  # Round off and then center in the bin
-                contribution = float(amount) * 100 / totalCount
-                if roundedScore in score_distribution_normalized:
-                    score_distribution_normalized[roundedScore] += contribution
-                else:
-                    score_distribution_normalized[roundedScore] = contribution
+        if accumulator['score_counts']:
+            score_distribution_normalized = self._normalizeScoreDistribution(accumulator['score_counts'], binAmount)
             insights.append(self._createInsight(score_distribution_normalized, Insight.INSIGHT_NAMES[Insight.SCORE_DISTRIBUTION], year))
-        if elim_score_distribution != {}:
-            if binAmount is None:  # Use same binAmount from above if possible
-                binAmount = math.ceil(float(overall_highscore) / 20)
-            totalCount = float(sum(elim_score_distribution.values()))
-            elim_score_distribution_normalized = {}
-            for score, amount in elim_score_distribution.items():
-                roundedScore = score - int(score % binAmount) + binAmount / 2
-                contribution = float(amount) * 100 / totalCount
-                if roundedScore in elim_score_distribution_normalized:
-                    elim_score_distribution_normalized[roundedScore] += contribution
-                else:
-                    elim_score_distribution_normalized[roundedScore] = contribution
+        if accumulator['elim_score_counts']:
+            elim_score_distribution_normalized = self._normalizeScoreDistribution(accumulator['elim_score_counts'], binAmount)
             insights.append(self._createInsight(elim_score_distribution_normalized, Insight.INSIGHT_NAMES[Insight.ELIM_SCORE_DISTRIBUTION], year))
 
         return insights
 
     @classmethod
-    def _calculateNumMatches(self, week_event_matches, year):
+    def _calculateNumMatches(self, accumulator, year):
         """
         Returns an Insight where the data is the number of matches
         """
-        numMatches = 0
-        for _, week_events in week_event_matches:
-            for _, matches in week_events:
-                numMatches += len(matches)
+        numMatches = accumulator['num_matches']
 
         insight = None
         if numMatches != 0:
@@ -297,22 +408,20 @@ class InsightsHelper(object):
             return []
 
     @classmethod
-    def _calculateYearSpecific(self, week_event_matches, year):
+    def _calculateYearSpecific(self, week_accumulators, overall_accumulator, year):
         """
         Returns an Insight where the data contains year specific insights
         """
-        all_matches = []
+        if overall_accumulator['year_specific'] is None:
+            return []
+
         event_insights_by_week = []  # tuples: week, week_insights
-        for week, week_events in week_event_matches:
-            week_matches = []
-            for _, matches in week_events:
-                week_matches += matches
-                all_matches += matches
-            week_insights = EventInsightsHelper.calculate_event_insights(week_matches, year)
+        for week, accumulator in week_accumulators:
+            week_insights = EventInsightsHelper.finalize_insights(accumulator['year_specific'], year)
             if week_insights:
                 event_insights_by_week.append((week, week_insights))
 
-        total_insights = EventInsightsHelper.calculate_event_insights(all_matches, year)
+        total_insights = EventInsightsHelper.finalize_insights(overall_accumulator['year_specific'], year)
 
         insights = []
         if event_insights_by_week != []:
@@ -438,6 +547,47 @@ class InsightsHelper(object):
         else:
             return []
 
+    @classmethod
+    def _calculateAwardPartial(self, award_futures):
+        """
+        Returns the counters overall award insights are built from, as a dict
+        of dicts of numbers. Partials for different years merge by adding them
+        with InsightsAccumulatorHelper.add_into.
+        Key: counter, Value: dict of team key (or 'frcA,frcB' team pair): count
+        """
+        partial = {
+            'regional_winners': defaultdict(int),
+            'blue_banners': defaultdict(int),
+            'rca_winners': defaultdict(int),
+            'world_champions': defaultdict(int),
+            'successful_elim_teamups': defaultdict(int),
+        }
+        has_elim_teamups = False
+        for award_future in award_futures:
+            award = award_future.get_result()
+            team_key_names = [team_key.id() for team_key in award.team_list]
+            if award.award_type_enum in AwardType.BLUE_BANNER_AWARDS:
+                for team_key_name in team_key_names:
+                    partial['blue_banners'][team_key_name] += 1
+            if award.award_type_enum == AwardType.WINNER:
+                has_elim_teamups = True
+                for pair in itertools.combinations(team_key_names, 2):
+                    partial['successful_elim_teamups'][','.join(sorted(pair))] += 1
+                if award.event_type_enum == EventType.CMP_FINALS:
+                    for team_key_name in team_key_names:
+                        partial['world_champions'][team_key_name] += 1
+                elif award.event_type_enum not in EventType.CMP_EVENT_TYPES:
+                    for team_key_name in team_key_names:
+                        partial['regional_winners'][team_key_name] += 1
+            elif award.award_type_enum == AwardType.CHAIRMANS and award.event_type_enum in {EventType.REGIONAL, EventType.DISTRICT_CMP}:
+                for team_key_name in team_key_names:
+                    partial['rca_winners'][team_key_name] += 1
+
+        partial = dict((name, dict(counts)) for name, counts in partial.items() if counts)
+        if has_elim_teamups:
+            partial['years_with_elim_teamups'] = 1
+        return partial
+
     @classmethod
     def doOverallMatchInsights(self):
         """
@@ -460,52 +610,35 @@ class InsightsHelper(object):
     def doOverallAwardInsights(self):
         """
         Calculate award insights across all years. Returns a list of Insights.
+        Built from the merged per-year partials, see _calculateAwardPartial.
         """
         insights = []
 
-        year_regional_winners = Insight.query(Insight.name == Insight.INSIGHT_NAMES[Insight.REGIONAL_DISTRICT_WINNERS], Insight.year != 0).fetch(1000)
-        regional_winners = defaultdict(int)
-        for insight in year_regional_winners:
-            for number, team_list in insight.data:
-                for team in team_list:
-                    regional_winners[team] += number
-
-        year_blue_banners = Insight.query(Insight.name == Insight.INSIGHT_NAMES[Insight.BLUE_BANNERS], Insight.year != 0).fetch(1000)
-        blue_banners = defaultdict(int)
-        for insight in year_blue_banners:
-            for number, team_list in insight.data:
-                for team in team_list:
-                    blue_banners[team] += number
-
-        year_rca_winners = Insight.query(Insight.name == Insight.INSIGHT_NAMES[Insight.RCA_WINNERS], Insight.year != 0).fetch(1000)
-        rca_winners = defaultdict(int)
-        for insight in year_rca_winners:
-            for team in insight.data:
-                rca_winners[team] += 1
-
-        year_world_champions = Insight.query(Insight.name == Insight.INSIGHT_NAMES[Insight.WORLD_CHAMPIONS], Insight.year != 0).fetch(1000)
-        world_champions = defaultdict(int)
-        for insight in year_world_champions:
-            for team in insight.data:
-                world_champions[team] += 1
-
-        year_successful_elim_teamups = Insight.query(Insight.name == Insight.INSIGHT_NAMES[Insight.SUCCESSFUL_ELIM_TEAMUPS], Insight.year != 0).fetch(1000)
-        successful_elim_teamups = defaultdict(int)
-        for insight in year_successful_elim_teamups:
-            for teams in insight.data:
-                for pairs in itertools.combinations(teams, 2):
-                    successful_elim_teamups[tuple(sorted(pairs))] += 1
+        partial = InsightsAccumulatorHelper.get_overall_award_partial()
+        if partial is None:
+            # Build the merge once, calculating partials for years whose award insights predate them
+            partial = {}
+            for year, year_partial in InsightsAccumulatorHelper.get_award_partials(range(1992, tba_config.MAX_YEAR + 1)).items():
+                if year_partial is None:
+                    year_partial = {}
+                    self.doAwardInsights(year, year_partial)
+                    InsightsAccumulatorHelper.set_award_partial(year, year_partial)
+                InsightsAccumulatorHelper.add_into(partial, year_partial)
+            InsightsAccumulatorHelper.set_overall_award_partial(partial)
+
         successful_elim_teamups_sorted = defaultdict(list)
-        for teams, num_wins in successful_elim_teamups.items():
-            sorted_teams = sorted(teams, key=lambda team_key: int(team_key[3:]))
+        for pair, num_wins in partial.get('successful_elim_teamups', {}).items():
+            sorted_teams = sorted(pair.split(','), key=lambda team_key: int(team_key[3:]))
             successful_elim_teamups_sorted[num_wins].append(sorted_teams)
+        for teamups in successful_elim_teamups_sorted.values():
+            teamups.sort(key=lambda teams: [int(team_key[3:]) for team_key in teams])
         successful_elim_teamups_sorted = sorted(successful_elim_teamups_sorted.items(), key=lambda x: -x[0])
 
         # Sorting
-        regional_winners = self._sortTeamWinsDict(regional_winners)
-        blue_banners = self._sortTeamWinsDict(blue_banners)
-        rca_winners = self._sortTeamWinsDict(rca_winners)
-        world_champions = self._sortTeamWinsDict(world_champions)
+        regional_winners = self._sortTeamWinsDict(partial.get('regional_winners', {}))
+        blue_banners = self._sortTeamWinsDict(partial.get('blue_banners', {}))
+        rca_winners = self._sortTeamWinsDict(partial.get('rca_winners', {}))
+        world_champions = self._sortTeamWinsDict(partial.get('world_champions', {}))
 
         # Creating Insights
         if regional_winners:
@@ -520,7 +653,7 @@ class InsightsHelper(object):
         if world_champions:
             insights.append(self._createInsight(world_champions, Insight.INSIGHT_NAMES[Insight.WORLD_CHAMPIONS], 0))
 
-        if year_successful_elim_teamups:
+        if partial.get('years_with_elim_teamups'):
             insights.append(self._createInsight(successful_elim_teamups_sorted, Insight.INSIGHT_NAMES[Insight.SUCCESSFUL_ELIM_TEAMUPS], 0))
 
         return insights
@@ -7,6 +7,7 @@ from google.appengine.ext import ndb
 
 from helpers.cache_clearer import CacheClearer
 from helpers.firebase.firebase_pusher import FirebasePusher
+from helpers.insights_accumulator_helper import InsightsAccumulatorHelper
 from helpers.notification_helper import NotificationHelper
 from helpers.manipulator_base import ManipulatorBase
 
@@ -24,6 +25,12 @@ class MatchManipulator(ManipulatorBase):
         '''
         To run after the match has been deleted.
         '''
+        try:
+            InsightsAccumulatorHelper.update_matches([match.key for match in matches])
+        except Exception:
+            logging.error("Error updating match insights accumulators")
+            logging.error(traceback.format_exc())
+
         for match in matches:
             try:
                 FirebasePusher.delete_match(match)
@@ -34,14 +41,23 @@ class MatchManipulator(ManipulatorBase):
     def postUpdateHook(cls, matches, updated_attr_list, is_new_list):
         '''
         To run after the match has been updated.
+        Update match insights running totals from the stored matches
         Send push notifications to subscribed users
         Only if the match is part of an active event
         '''
+        insights_match_keys = [match.key for (match, updated_attrs, is_new) in zip(matches, updated_attr_list, is_new_list)
+                               if is_new or 'alliances_json' in updated_attrs]
+        try:
+            InsightsAccumulatorHelper.update_matches(insights_match_keys)
+        except Exception:
+            logging.error("Error updating match insights accumulators")
+            logging.error(traceback.format_exc())
+
         unplayed_match_events = []
         for (match, updated_attrs, is_new) in zip(matches, updated_attr_list, is_new_list):
             event = match.event.get()
             # Only continue if the event is currently happening
-            if event.within_a_day:
+            if event and event.within_a_day:
                 if match.has_been_played:
                     if is_new or 'alliances_json' in updated_attrs:
                         # There is a score update for this match, push a notification
@@ -107,6 +123,16 @@ class MatchManipulator(ManipulatorBase):
                 logging.error("Error enqueuing event_team_status for {}".format(event_key))
                 logging.error(traceback.format_exc())
 
+    @classmethod
+    def _parseJsonAttr(self, match, attr):
+        """
+        Score breakdowns are parsed through Match.score_breakdown, which keeps
+        the result, so each one is parsed at most once per match
+        """
+        if attr == 'score_breakdown_json':
+            return match.score_breakdown
+        return json.loads(getattr(match, attr))
+
     @classmethod
     def updateMerge(self, new_match, old_match, auto_union=True):
         """
@@ -160,10 +186,13 @@ class MatchManipulator(ManipulatorBase):
 
         for attr in json_attrs:
             if getattr(new_match, attr) is not None:
-                if (getattr(old_match, attr) is None) or (json.loads(getattr(new_match, attr)) != json.loads(getattr(old_match, attr))):
+                if (getattr(old_match, attr) is None) or (getattr(new_match, attr) != getattr(old_match, attr) and
+                                                          self._parseJsonAttr(new_match, attr) != self._parseJsonAttr(old_match, attr)):
                     setattr(old_match, attr, getattr(new_match, attr))
                     # changinging 'attr_json' doesn't clear lazy-loaded '_attr'
                     setattr(old_match, '_{}'.format(attr.replace('_json', '')), None)
+                    if attr == 'score_breakdown_json':
+                        old_match._score_breakdown = new_match._score_breakdown  # Reuse it if it's already parsed
                     old_match._updated_attrs.append(attr)
                     old_match.dirty = True
 
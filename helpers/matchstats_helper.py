@@ -8,17 +8,50 @@
 
 # x is OPR and should be n x 1
 
+# M is the normal matrix A'A of the sparse (alliances x teams) incidence matrix A,
+# so all stats can be solved together as [M][X]=[A'B] where B is (alliances x stats)
+
 from collections import defaultdict
 import numpy as np
 
 from google.appengine.api import memcache
+from google.appengine.ext import ndb
 
 from consts.event_type import EventType
-from database import event_query
+from models.event_matchstats_state import EventMatchstatsState
 from models.event_team import EventTeam
+from models.team_year_stats import TeamYearStats
+from models.year_matchstats import YearMatchstats
 
 
 class MatchstatsHelper(object):
+    # Singular values below RCOND * largest singular value are treated as zero
+    # (same cutoff as np.linalg.pinv)
+    RCOND = 1e-15
+    # Cholesky pivots below this fraction of the largest diagonal entry are
+    # treated as a rank deficient M
+    CHOLESKY_PIVOT_TOL = 1e-6
+    # Number of incremental updates before the incremental solver does a full
+    # resolve to bound numerical drift
+    RESOLVE_INTERVAL = 12
+    # Conjugate gradient stopping criteria for season-wide solves
+    CG_TOL = 1e-8
+    CG_MAX_ITERATIONS = 500
+
+    DEFAULT_STATS = ['oprs', 'dprs', 'ccwms']
+    YEAR_STATS = {
+        2016: ['2016autoPointsOPR', '2016crossingsOPR', '2016bouldersOPR'],
+    }
+
+    # Stats that are the sum of several score_breakdown fields
+    COMPONENT_STATS = {
+        '2016autoPointsOPR': ['autoPoints'],
+        '2016bouldersOPR': ['autoBouldersLow', 'autoBouldersHigh', 'teleopBouldersLow', 'teleopBouldersHigh'],
+        '2016crossingsOPR': ['position1crossings', 'position2crossings', 'position3crossings', 'position4crossings', 'position5crossings'],
+    }
+    # Every numeric score_breakdown field also gets a component OPR named like '2016autoPointsOPR'
+    COMPONENT_STAT_FORMAT = '{}{}OPR'  # (year, score_breakdown field)
+
     @classmethod
     def build_team_mapping(cls, matches):
         """
@@ -59,6 +92,252 @@ class MatchstatsHelper(object):
                         M[team1_id, team_id_map[team2[3:]]] += 1
         return np.linalg.pinv(M)
 
+    @classmethod
+    def build_alliance_incidence(cls, matches, team_id_map, played_only=False):
+        """
+        Returns (alliance_teams, alliances)
+        alliance_teams: A list of index arrays, one per alliance. Each array
+            holds the team_id_map indices of the teams on that alliance, so
+            together they are the nonzeros of the sparse (alliances x teams) matrix A
+        alliances: A list of (match, alliance_color) corresponding to each row of A
+        """
+        alliance_teams = []
+        alliances = []
+        for match in matches:
+            if match.comp_level != 'qm':  # only consider quals matches
+                continue
+            if played_only and not match.has_been_played:
+                continue
+            for alliance_color in ['red', 'blue']:
+                alliance_teams.append(np.array(
+                    [team_id_map[team[3:]] for team in match.alliances[alliance_color]['teams']], dtype=np.int64))
+                alliances.append((match, alliance_color))
+        return alliance_teams, alliances
+
+    @classmethod
+    def build_normal_matrix(cls, alliance_teams, n):
+        """
+        Returns M = A'A (n x n) without materializing A.
+        M[i, j] is the number of alliances teams i and j were on together.
+        """
+        # Group alliances by size so each group is a dense (alliances x size) index array
+        by_size = defaultdict(list)
+        for teams in alliance_teams:
+            by_size[len(teams)].append(teams)
+
+        M = np.zeros(n * n)
+        for size, group in by_size.items():
+            if size == 0:
+                continue
+            T = np.vstack(group)
+            flat_pairs = (T[:, :, np.newaxis] * n + T[:, np.newaxis, :]).ravel()
+            M += np.bincount(flat_pairs, minlength=n * n)
+        return M.reshape(n, n)
+
+    @classmethod
+    def build_rhs_matrix(cls, alliance_teams, B, n):
+        """
+        Returns A'B (n x k) given B (alliances x k), the per alliance value of each stat
+        """
+        if not alliance_teams:
+            return np.zeros([n, B.shape[1]])
+        sizes = np.array([len(teams) for teams in alliance_teams])
+        cols = np.concatenate(alliance_teams)
+        rows = np.repeat(np.arange(len(alliance_teams)), sizes)
+
+        S = np.zeros([n, B.shape[1]])
+        for k in xrange(B.shape[1]):
+            S[:, k] = np.bincount(cols, weights=B[rows, k], minlength=n)
+        return S
+
+    @classmethod
+    def build_alliance_values(cls, alliances):
+        """
+        Extracts everything the stats are built from in a single pass over the alliances.
+        Returns (scores, opponent_scores, field_ids, C)
+        scores, opponent_scores: Arrays with the score of each alliance and its opponent
+        field_ids: A dict of key: numeric score_breakdown field, value: column index in C
+        C: (alliances x fields) matrix of score_breakdown values. Missing fields are 0.
+        """
+        scores = np.zeros(len(alliances))
+        opponent_scores = np.zeros(len(alliances))
+        field_ids = {}
+        rows, cols, values = [], [], []
+        for r, (match, alliance_color) in enumerate(alliances):
+            opponent_color = 'blue' if alliance_color == 'red' else 'red'
+            scores[r] = match.alliances[alliance_color]['score']
+            opponent_scores[r] = match.alliances[opponent_color]['score']
+
+            if not match.score_breakdown or not match.score_breakdown.get(alliance_color):
+                continue
+            for field, value in match.score_breakdown[alliance_color].items():
+                if isinstance(value, (int, long, float)):  # Includes bools
+                    if field not in field_ids:
+                        field_ids[field] = len(field_ids)
+                    rows.append(r)
+                    cols.append(field_ids[field])
+                    values.append(value)
+
+        C = np.zeros([len(alliances), len(field_ids)])
+        if values:
+            C[np.array(rows), np.array(cols)] = values
+        return scores, opponent_scores, field_ids, C
+
+    @classmethod
+    def get_stat_types(cls, alliance_values, year):
+        """
+        Returns the stats to calculate: the default stats, the year specific
+        stats, and a component OPR for every numeric score_breakdown field.
+        """
+        stat_types = cls.DEFAULT_STATS + cls.YEAR_STATS.get(year, [])
+        _, _, field_ids, _ = alliance_values
+        for field in sorted(field_ids.keys()):
+            stat_type = cls.COMPONENT_STAT_FORMAT.format(year, field)
+            if stat_type not in stat_types:
+                stat_types.append(stat_type)
+        return stat_types
+
+    @classmethod
+    def get_component_fields(cls, stat_type):
+        """
+        Returns the score_breakdown fields summed into a component stat like
+        '2016bouldersOPR' or '2017autoFuelHighOPR', or None for other stats
+        """
+        if stat_type in cls.COMPONENT_STATS:
+            return cls.COMPONENT_STATS[stat_type]
+        if len(stat_type) > 7 and stat_type[:4].isdigit() and stat_type.endswith('OPR'):
+            return [stat_type[4:-3]]
+        return None
+
+    @classmethod
+    def build_stat_matrix(cls, alliance_values, stat_types, year):
+        """
+        Returns B (alliances x stats) where B[r, k] is stat_types[k] for alliance r
+        """
+        scores, opponent_scores, field_ids, C = alliance_values
+        component_ids = dict((cls.COMPONENT_STAT_FORMAT.format(year, field), field_id) for field, field_id in field_ids.items())
+
+        B = np.zeros([len(scores), len(stat_types)])
+        for k, stat_type in enumerate(stat_types):
+            if stat_type == 'oprs':
+                B[:, k] = scores
+            elif stat_type == 'dprs':
+                B[:, k] = opponent_scores
+            elif stat_type == 'ccwms':
+                B[:, k] = scores - opponent_scores
+            elif stat_type in cls.COMPONENT_STATS:
+                field_cols = [field_ids[field] for field in cls.COMPONENT_STATS[stat_type] if field in field_ids]
+                if field_cols:
+                    B[:, k] = C[:, field_cols].sum(axis=1)
+            elif stat_type in component_ids:
+                B[:, k] = C[:, component_ids[stat_type]]
+        return B
+
+    @classmethod
+    def cholesky_factor(cls, M):
+        """
+        Returns the lower triangular Cholesky factor L of M, or None if M is rank deficient
+        """
+        if M.shape[0] == 0:
+            return None
+        try:
+            L = np.linalg.cholesky(M)
+        except np.linalg.LinAlgError:
+            return None
+        if np.diag(L).min() ** 2 <= cls.CHOLESKY_PIVOT_TOL * np.diag(M).max():
+            return None
+        return L
+
+    @classmethod
+    def solve_normal_equations(cls, M, S):
+        """
+        Solves [M][X]=[S] for every column of S at once.
+        Uses a Cholesky factorization of M, falling back to the minimum norm
+        least squares solution (equivalent to pinv(M) * S) if M is rank deficient,
+        e.g. when some teams haven't played yet.
+        """
+        L = cls.cholesky_factor(M)
+        if L is None:
+            return np.linalg.lstsq(M, S, rcond=cls.RCOND)[0]
+        return np.linalg.solve(L.T, np.linalg.solve(L, S))
+
+    @classmethod
+    def solve_normal_equations_cg(cls, alliance_teams, S, n, X0=None):
+        """
+        Iteratively solves [A'A][X]=[S] for every column of S at once with
+        Jacobi preconditioned conjugate gradients. A and A' are applied through
+        the sparse incidence, so M is never formed. Meant for season-wide
+        problems where a dense n x n M is too big.
+        Returns (X, iterations)
+        """
+        sizes = np.array([len(teams) for teams in alliance_teams])
+        cols = np.concatenate(alliance_teams)
+        rows = np.repeat(np.arange(len(alliance_teams)), sizes)
+
+        def apply_M(P):
+            MP = np.zeros(P.shape)
+            for k in xrange(P.shape[1]):
+                AP = np.bincount(rows, weights=P[cols, k], minlength=len(alliance_teams))
+                MP[:, k] = np.bincount(cols, weights=AP[rows], minlength=n)
+            return MP
+
+        # diag(M) is the number of alliances each team was on
+        diag = np.bincount(cols, minlength=n).astype(np.float64)
+        diag[diag == 0] = 1
+        diag = diag[:, np.newaxis]
+
+        X = np.zeros(S.shape) if X0 is None else np.array(X0, dtype=np.float64)
+        R = S - apply_M(X)
+        Z = R / diag
+        P = Z.copy()
+        rz = (R * Z).sum(axis=0)
+        stop_norms = cls.CG_TOL * np.maximum(np.sqrt((S * S).sum(axis=0)), 1)
+
+        iterations = 0
+        while iterations < cls.CG_MAX_ITERATIONS:
+            if np.all(np.sqrt((R * R).sum(axis=0)) <= stop_norms):
+                break
+            MP = apply_M(P)
+            pMp = (P * MP).sum(axis=0)
+            alpha = np.where(pMp > 0, rz / np.where(pMp > 0, pMp, 1), 0)
+            X += alpha * P
+            R -= alpha * MP
+            Z = R / diag
+            rz_new = (R * Z).sum(axis=0)
+            beta = np.where(rz > 0, rz_new / np.where(rz > 0, rz, 1), 0)
+            P = Z + beta * P
+            rz = rz_new
+            iterations += 1
+
+        return X, iterations
+
+    @classmethod
+    def calc_stats(cls, matches, team_list, team_id_map, stat_types=None, year=None):
+        """
+        Returns {stat_type: {team: value}} for every stat in stat_types,
+        solving all of them together against played quals matches.
+        If stat_types is None, calculates everything from get_stat_types.
+        """
+        if year is None:
+            year = matches[0].year
+        n = len(team_list)
+        alliance_teams, alliances = cls.build_alliance_incidence(matches, team_id_map, played_only=True)
+        alliance_values = cls.build_alliance_values(alliances)
+        if stat_types is None:
+            stat_types = cls.get_stat_types(alliance_values, year)
+
+        M = cls.build_normal_matrix(alliance_teams, n)
+        S = cls.build_rhs_matrix(alliance_teams, cls.build_stat_matrix(alliance_values, stat_types, year), n)
+        X = cls.solve_normal_equations(M, S)
+        return cls._build_stats_dict(team_list, stat_types, X)
+
+    @classmethod
+    def _build_stats_dict(cls, team_list, stat_types, X):
+        stats = {}
+        for k, stat_type in enumerate(stat_types):
+            stats[stat_type] = dict(zip(team_list, X[:, k].tolist()))
+        return stats
+
     @classmethod
     def build_s_matrix(cls, matches, team_id_map, stat_type, init_stats=None, init_stats_default=0, limit_matches=None):
         n = len(team_id_map.keys())
@@ -106,23 +385,10 @@ class MatchstatsHelper(object):
                     other_alliance_color = 'red'
                 return match.alliances[alliance_color]['score'] - match.alliances[other_alliance_color]['score']
 
-            # 2016 specific
-            if stat_type == '2016autoPointsOPR':
+            if stat_type in cls.COMPONENT_STATS:
                 if match.score_breakdown and alliance_color in match.score_breakdown:
-                    return match.score_breakdown[alliance_color].get('autoPoints', 0)
-            elif stat_type == '2016bouldersOPR':
-                if match.score_breakdown and alliance_color in match.score_breakdown:
-                    return (match.score_breakdown[alliance_color].get('autoBouldersLow', 0) +
-                        match.score_breakdown[alliance_color].get('autoBouldersHigh', 0) +
-                        match.score_breakdown[alliance_color].get('teleopBouldersLow', 0) +
-                        match.score_breakdown[alliance_color].get('teleopBouldersHigh', 0))
-            elif stat_type == '2016crossingsOPR':
-                if match.score_breakdown and alliance_color in match.score_breakdown:
-                    return (match.score_breakdown[alliance_color].get('position1crossings', 0) +
-                        match.score_breakdown[alliance_color].get('position2crossings', 0) +
-                        match.score_breakdown[alliance_color].get('position3crossings', 0) +
-                        match.score_breakdown[alliance_color].get('position4crossings', 0) +
-                        match.score_breakdown[alliance_color].get('position5crossings', 0))
+                    breakdown = match.score_breakdown[alliance_color]
+                    return sum(breakdown.get(field, 0) for field in cls.COMPONENT_STATS[stat_type])
 
         # None of the above cases were met. Return default.
         if init_stats and stat_type in init_stats:
@@ -144,61 +410,275 @@ class MatchstatsHelper(object):
         team_list, team_id_map = cls.build_team_mapping(matches)
         if not team_list:
             return {}
-        last_event_stats = cls.get_last_event_stats(team_list, matches[0].event)
 
-        Minv = cls.build_Minv_matrix(matches, team_id_map, played_only=True)
+        return cls.calc_stats(matches, team_list, team_id_map, year=year)
 
-        oprs_dict = cls.calc_stat(matches, team_list, team_id_map, Minv, 'oprs')
-        dprs_dict = cls.calc_stat(matches, team_list, team_id_map, Minv, 'dprs')
-        ccwms_dict = cls.calc_stat(matches, team_list, team_id_map, Minv, 'ccwms')
+    @classmethod
+    def calculate_matchstats_incremental(cls, matches, year, state=None):
+        """
+        Same results as calculate_matchstats, but keeps the inverse of M in an
+        EventMatchstatsState so each newly played quals match is applied as a
+        rank-k (Woodbury) update over its alliances instead of a full solve.
+        Does a full resolve if there is no usable state, M is still rank
+        deficient, the teams or stats changed, an applied match was removed or
+        had its teams changed, or every RESOLVE_INTERVAL updates.
+        Returns (stats, state)
+        """
+        if not matches:
+            return {}, state
 
-        stats = {'oprs': oprs_dict, 'dprs': dprs_dict, 'ccwms': ccwms_dict}
+        team_list, team_id_map = cls.build_team_mapping(matches)
+        if not team_list:
+            return {}, state
+
+        if state is None:
+            state = EventMatchstatsState(id=matches[0].event.id())
+        elif set(state.team_list or []) == set(team_list):
+            # Keep the row order the stored matrices were built with
+            team_list = state.team_list
+            team_id_map = dict((team, i) for i, team in enumerate(team_list))
+
+        alliance_teams, alliances = cls.build_alliance_incidence(matches, team_id_map, played_only=True)
+        alliance_values = cls.build_alliance_values(alliances)
+        stat_types = cls.get_stat_types(alliance_values, year)
+        B = cls.build_stat_matrix(alliance_values, stat_types, year)
+        alliance_rows = cls._build_alliance_rows(alliances, B)
+
+        X = None
+        if (state.minv_blob is not None and state.team_list == team_list and state.stat_types == stat_types and
+                state.updates_since_resolve < cls.RESOLVE_INTERVAL):
+            X = cls._update_incremental_state(state, alliance_rows, team_id_map)
+        if X is None:
+            X = cls._resolve_incremental_state(state, team_list, stat_types, alliance_teams, B, alliance_rows)
+
+        return cls._build_stats_dict(team_list, stat_types, X), state
 
-        if year == 2016:
-            # First ranking tiebreaker
-            stats['2016autoPointsOPR'] = cls.calc_stat(matches, team_list, team_id_map, Minv, '2016autoPointsOPR')
+    @classmethod
+    def _build_alliance_rows(cls, alliances, B):
+        alliance_rows = defaultdict(dict)
+        for (match, alliance_color), stats in zip(alliances, B.tolist()):
+            alliance_rows[match.key.id()][alliance_color] = {
+                'teams': [team[3:] for team in match.alliances[alliance_color]['teams']],
+                'stats': stats,
+            }
+        return dict(alliance_rows)
 
-            # For RP calculation
-            stats['2016crossingsOPR'] = cls.calc_stat(matches, team_list, team_id_map, Minv, '2016crossingsOPR')
-            stats['2016bouldersOPR'] = cls.calc_stat(matches, team_list, team_id_map, Minv, '2016bouldersOPR')
+    @classmethod
+    def _resolve_incremental_state(cls, state, team_list, stat_types, alliance_teams, B, alliance_rows):
+        """
+        Rebuilds state from scratch. Returns X.
+        """
+        n = len(team_list)
+        M = cls.build_normal_matrix(alliance_teams, n)
+        S = cls.build_rhs_matrix(alliance_teams, B, n)
+
+        L = cls.cholesky_factor(M)
+        if L is None:
+            Minv = None
+            X = np.linalg.lstsq(M, S, rcond=cls.RCOND)[0]
+        else:
+            Linv = np.linalg.solve(L, np.eye(n))
+            Minv = np.dot(Linv.T, Linv)
+            X = np.dot(Minv, S)
+
+        state.team_list = team_list
+        state.stat_types = stat_types
+        state.alliance_rows = alliance_rows
+        state.minv = Minv
+        state.rhs = S
+        state.updates_since_resolve = 0
+        return X
 
-        return stats
+    @classmethod
+    def _update_incremental_state(cls, state, alliance_rows, team_id_map):
+        """
+        Applies the difference between the stored and current alliance rows to state.
+        Returns X, or None if the difference can't be applied incrementally.
+        """
+        old_alliance_rows = state.alliance_rows or {}
+        Minv = state.minv
+        S = state.rhs
+
+        # Score corrections to applied matches only change the right hand side
+        for match_key, old_rows in old_alliance_rows.items():
+            new_rows = alliance_rows.get(match_key)
+            if new_rows is None:
+                return None
+            for alliance_color, old_row in old_rows.items():
+                new_row = new_rows[alliance_color]
+                if new_row['teams'] != old_row['teams']:
+                    return None
+                if new_row['stats'] != old_row['stats']:
+                    team_ids = [team_id_map[team] for team in new_row['teams']]
+                    S[team_ids, :] += np.array(new_row['stats']) - np.array(old_row['stats'])
+
+        # Newly played matches add one rank-1 term per alliance: M + UU'
+        added_rows = [rows for match_key, rows in alliance_rows.items() if match_key not in old_alliance_rows]
+        if added_rows:
+            U = np.zeros([len(team_id_map), 2 * len(added_rows)])
+            col = 0
+            for rows in added_rows:
+                for row in rows.values():
+                    team_ids = [team_id_map[team] for team in row['teams']]
+                    U[team_ids, col] = 1
+                    S[team_ids, :] += np.array(row['stats'])
+                    col += 1
+            U = U[:, :col]
+
+            MinvU = np.dot(Minv, U)
+            C = np.eye(col) + np.dot(U.T, MinvU)
+            Minv = Minv - np.dot(MinvU, np.linalg.solve(C, MinvU.T))
+
+        state.alliance_rows = alliance_rows
+        state.minv = Minv
+        state.rhs = S
+        state.updates_since_resolve += len(added_rows)
+        return np.dot(Minv, S)
+
+    @classmethod
+    def calculate_year_matchstats(cls, year, event_states, old_year_matchstats=None):
+        """
+        Solves stats across every quals alliance in event_states, the
+        EventMatchstatsStates of a year's official events, with the sparse
+        conjugate gradient solver. Warm starts from old_year_matchstats so
+        refreshing after an event finishes only takes a few iterations.
+        Returns a YearMatchstats, or None if there is nothing to solve.
+        """
+        stat_types = cls.DEFAULT_STATS + cls.YEAR_STATS.get(year, [])
+
+        team_list = []
+        team_id_map = {}
+        alliance_teams = []
+        alliance_stats = []
+        event_keys = []
+        for state in event_states:
+            if state is None or not state.alliance_rows or not set(stat_types).issubset(state.stat_types):
+                continue
+            stat_cols = [state.stat_types.index(stat_type) for stat_type in stat_types]
+            event_keys.append(state.key.id())
+            for rows in state.alliance_rows.values():
+                for row in rows.values():
+                    for team in row['teams']:
+                        if team not in team_id_map:
+                            team_id_map[team] = len(team_list)
+                            team_list.append(team)
+                    alliance_teams.append(np.array([team_id_map[team] for team in row['teams']], dtype=np.int64))
+                    alliance_stats.append([row['stats'][col] for col in stat_cols])
+
+        if not team_list:
+            return None
+
+        n = len(team_list)
+        S = cls.build_rhs_matrix(alliance_teams, np.array(alliance_stats, dtype=np.float64), n)
+
+        X0 = None
+        if old_year_matchstats is not None and old_year_matchstats.stat_types == stat_types and old_year_matchstats.stats_blob is not None:
+            X0 = np.zeros([n, len(stat_types)])
+            old_X = old_year_matchstats.stats_matrix
+            for i, team in enumerate(old_year_matchstats.team_list):
+                if team in team_id_map:
+                    X0[team_id_map[team]] = old_X[i]
+
+        X, iterations = cls.solve_normal_equations_cg(alliance_teams, S, n, X0=X0)
+
+        year_matchstats = YearMatchstats(
+            id=str(year),
+            year=year,
+            team_list=team_list,
+            stat_types=stat_types,
+            event_keys=sorted(event_keys),
+            solver_iterations=iterations,
+        )
+        year_matchstats.stats_matrix = X
+        return year_matchstats
 
     @classmethod
     def get_last_event_stats(cls, team_list, event_key):
+        """
+        Returns each team's stats from their most recent official event before
+        event_key, formatted like EventDetails.matchstats: {stat_type: {team: value}}
+        The current event and every team's TeamYearStats index are read in one batch get.
+        """
         year = int(event_key.id()[:4])
-        cur_event = event_key.get()
 
         # Check cache for stored OPRs
-        cache_key = '{}:last_event_stats'.format(event_key.id())
-        last_event_stats = memcache.get(cache_key)
-        if last_event_stats is None:
-            last_event_stats = defaultdict(dict)
-
-        # Make necessary queries for missing stats
-        futures = []
-        for team in team_list:
-            if team not in last_event_stats:
-                events_future = event_query.TeamYearEventsQuery('frc{}'.format(team), year).fetch_async()
-                futures.append((team, events_future))
-
-        # Add missing stats to last_event_stats
-        for team, events_future in futures:
-            events = events_future.get_result()
-
-            # Find last event before current event
+        cache_key = '{}:last_event_stats:v2'.format(event_key.id())
+        cached = memcache.get(cache_key)
+        if cached is not None:
+            cached_teams, last_event_stats = cached
+            if cached_teams.issuperset(team_list):
+                return last_event_stats
+
+        index_keys = [ndb.Key(TeamYearStats, TeamYearStats.renderKeyName(team, year)) for team in team_list]
+        results = ndb.get_multi([event_key] + index_keys)
+        cur_event, team_year_stats_list = results[0], results[1:]
+
+        last_event_stats = defaultdict(dict)
+        if cur_event is None or cur_event.start_date is None:
+            return last_event_stats
+        cur_start_date = cur_event.start_date.date().isoformat()
+
+        for team, team_year_stats in zip(team_list, team_year_stats_list):
+            if team_year_stats is None:
+                continue
+            # Find last event before current event. Index is sorted chronologically
             last_event = None
-            last_event_start = None
-            for event in events:
-                if event.official and event.start_date < cur_event.start_date and event.event_type_enum != EventType.CMP_FINALS:
-                    if last_event is None or event.start_date > last_event_start:
-                        last_event = event
-                        last_event_start = event.start_date
-
-            if last_event is not None and last_event.matchstats:
-                for stat, values in last_event.matchstats.items():
-                    if values and team in values:
-                        last_event_stats[stat][team] = values[team]
-
-        memcache.set(cache_key, last_event_stats, 60*60*24)
+            for event in team_year_stats.events:
+                if event['start_date'] >= cur_start_date:
+                    break
+                if event['official'] and event['event_type_enum'] != EventType.CMP_FINALS:
+                    last_event = event
+
+            if last_event is not None:
+                for stat, value in last_event['stats'].items():
+                    last_event_stats[stat][team] = value
+
+        memcache.set(cache_key, (set(team_list), last_event_stats), 60*60*24)
         return last_event_stats
+
+    @classmethod
+    def update_team_year_stats(cls, events_matchstats):
+        """
+        Writes each team's stats snapshot at each event into its TeamYearStats index.
+        events_matchstats is a list of (event, matchstats) tuples.
+        Returns the list of TeamYearStats that were changed.
+        """
+        new_entries = defaultdict(dict)  # {key_name: {event_key: entry}}
+        years = {}
+        for event, matchstats in events_matchstats:
+            if event.start_date is None or not matchstats:
+                continue
+            team_stats = defaultdict(dict)
+            for stat, values in matchstats.items():
+                for team, value in (values or {}).items():
+                    team_stats[team][stat] = value
+
+            for team, stats in team_stats.items():
+                key_name = TeamYearStats.renderKeyName(team, event.year)
+                years[key_name] = event.year
+                new_entries[key_name][event.key.id()] = {
+                    'event_key': event.key.id(),
+                    'start_date': event.start_date.date().isoformat(),
+                    'official': event.official,
+                    'event_type_enum': event.event_type_enum,
+                    'stats': stats,
+                }
+
+        key_names = sorted(new_entries.keys())
+        old_team_year_stats_list = ndb.get_multi([ndb.Key(TeamYearStats, key_name) for key_name in key_names])
+
+        changed = []
+        for key_name, team_year_stats in zip(key_names, old_team_year_stats_list):
+            if team_year_stats is None:
+                team_year_stats = TeamYearStats(id=key_name, year=years[key_name], events=[])
+
+            entries = new_entries[key_name]
+            events = [event for event in team_year_stats.events if event['event_key'] not in entries]
+            events.extend(entries.values())
+            events.sort(key=lambda event: (event['start_date'], event['event_key']))
+            if events != team_year_stats.events:
+                team_year_stats.events = events
+                changed.append(team_year_stats)
+
+        ndb.put_multi(changed)
+        return changed
@@ -0,0 +1,76 @@
+import time
+
+from google.appengine.api import memcache
+
+
+class MetricsBucketHelper(object):
+    """
+    Per-minute request, error and latency counters in memcache, so they're
+    shared by every instance. Each set of counters lives under its own
+    memcache key prefix, and old buckets expire on their own.
+    """
+    BUCKET_SECONDS = 60
+    BUCKETS = 60  # Minutes of metrics kept
+
+    @classmethod
+    def _bucket_keys(cls, bucket):
+        return ['{}_requests'.format(bucket), '{}_errors'.format(bucket), '{}_latency_ms'.format(bucket)]
+
+    @classmethod
+    def record(cls, key_prefix, requests, errors, latency, other_offsets=None):
+        """
+        Adds to the current bucket's counters.
+        Returns the new values of the offset counters, like memcache.offset_multi
+        :param key_prefix: Memcache key prefix of the counters, like 'fmsapi_health:'
+        :param latency: Total seconds the requests took
+        :param other_offsets: Other counters under key_prefix to offset in the same memcache call
+        """
+        requests_key, errors_key, latency_key = cls._bucket_keys(int(time.time() / cls.BUCKET_SECONDS))
+        offsets = dict(other_offsets or {})
+        offsets.update({
+            requests_key: requests,
+            errors_key: errors,
+            latency_key: int(latency * 1000),
+        })
+        # So old buckets expire
+        memcache.add_multi(
+            dict((key, 0) for key in [requests_key, errors_key, latency_key]),
+            time=cls.BUCKETS * cls.BUCKET_SECONDS, key_prefix=key_prefix)
+        return memcache.offset_multi(offsets, key_prefix=key_prefix, initial_value=0)
+
+    @classmethod
+    def get_metrics_multi(cls, key_prefixes, minutes=15):
+        """
+        Returns {key prefix: metrics} for each set of counters, read in one memcache call.
+        Metrics are the request count, error count, error rate and average
+        latency over the last few minutes.
+        """
+        minutes = min(minutes, cls.BUCKETS)
+        current_bucket = int(time.time() / cls.BUCKET_SECONDS)
+        buckets = range(current_bucket - minutes + 1, current_bucket + 1)
+        keys = []
+        for key_prefix in key_prefixes:
+            for bucket in buckets:
+                keys += [key_prefix + key for key in cls._bucket_keys(bucket)]
+        counts = memcache.get_multi(keys)
+
+        metrics = {}
+        for key_prefix in key_prefixes:
+            requests = errors = latency_ms = 0
+            for bucket in buckets:
+                requests_key, errors_key, latency_key = [key_prefix + key for key in cls._bucket_keys(bucket)]
+                requests += counts.get(requests_key, 0)
+                errors += counts.get(errors_key, 0)
+                latency_ms += counts.get(latency_key, 0)
+            metrics[key_prefix] = {
+                'minutes': minutes,
+                'requests': requests,
+                'errors': errors,
+                'error_rate': float(errors) / requests if requests else 0,
+                'average_latency_ms': float(latency_ms) / requests if requests else 0,
+            }
+        return metrics
+
+    @classmethod
+    def get_metrics(cls, key_prefix, minutes=15):
+        return cls.get_metrics_multi([key_prefix], minutes)[key_prefix]
@@ -1,14 +1,23 @@
 import hashlib
 import json
 import logging
-import urllib2
+import time
 
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import urlfetch
+
+from consts.notification_type import NotificationType
 from controllers.gcm.gcm import GCMConnection
+from helpers.metrics_bucket_helper import MetricsBucketHelper
 
 
 class NotificationSender(object):
 
     WEBHOOK_VERSION = 1
+    WEBHOOK_DEADLINE = 10  # Seconds a single webhook gets to respond
+    MAX_CONCURRENT_WEBHOOKS = 10  # Async urlfetch calls in flight at once
+
+    WEBHOOK_METRICS_KEY_PREFIX = 'webhook_metrics:{}:'  # (notification type). See MetricsBucketHelper
 
     @classmethod
     def send_gcm(cls, notification):
@@ -19,45 +28,141 @@ class NotificationSender(object):
     def send_ios(cls, notification):
         pass
 
+    @classmethod
+    def _webhook_checksum(cls, secret, payload):
+        ch = hashlib.sha1()
+        ch.update(secret)
+        ch.update(payload)
+        return ch.hexdigest()
+
     @classmethod
     def send_webhook(cls, message, keys):
+        """
+        Returns False if any of the URLs was invalid
+        :param keys: List of (url, secret)
+        """
+        invalid_urls = cls.send_webhooks(message, keys)
+        if invalid_urls:
+            logging.warning("Invalid urls while sending webhook: {}".format(str(invalid_urls)))
+            return False
+        return True
+
+    @classmethod
+    def send_webhooks(cls, message, keys):
+        """
+        POSTs the message to every webhook, MAX_CONCURRENT_WEBHOOKS at a time,
+        so a slow endpoint only holds up its own delivery.
+        Returns the URLs that were invalid.
+        :param keys: List of (url, secret)
+        """
         payload = json.dumps(message, ensure_ascii=True)
+        checksums = {}  # secret: checksum. Many webhooks share a secret.
 
         invalid_urls = []
-        for client in keys:
-
-            url = client[0]
-            secret = client[1]
-
-            ch = hashlib.sha1()
-            ch.update(secret)
-            ch.update(payload)
-            checksum = ch.hexdigest()
-
-            request = urllib2.Request(url, payload)
-            request.add_header("Content-Type", 'application/json; charset="utf-8"')
-            request.add_header("X-TBA-Checksum", checksum)
-            request.add_header("X-TBA-Version", '{}'.format(cls.WEBHOOK_VERSION))
-            try:
-                resp = urllib2.urlopen(request)
-            except urllib2.HTTPError, e:
-                if e.code == 400:
-                    logging.warning('400, Bad request for URL: {}'.format(url))
-                elif e.code == 401:
-                    logging.warning('401, Webhook unauthorized for URL: {}'.format(url))
-                elif e.code == 404:
+        requests = 0
+        latencies = []
+        errors = 0
+        pending = {}  # rpc: (url, start time)
+        clients = iter(keys)
+        while True:
+            # Keep the pool full
+            for url, secret in clients:
+                if secret not in checksums:
+                    checksums[secret] = cls._webhook_checksum(secret, payload)
+                requests += 1
+                rpc = urlfetch.create_rpc(deadline=cls.WEBHOOK_DEADLINE)
+                headers = {
+                    'Content-Type': 'application/json; charset="utf-8"',
+                    'X-TBA-Checksum': checksums[secret],
+                    'X-TBA-Version': '{}'.format(cls.WEBHOOK_VERSION),
+                }
+                try:
+                    urlfetch.make_fetch_call(rpc, url, payload=payload, method=urlfetch.POST, headers=headers)
+                except Exception, ex:
+                    # Malformed URLs fail here, before anything is sent
                     invalid_urls.append(url)
-                elif e.code == 500:
-                    logging.warning('500, Internal error on server sending message')
-                else:
-                    logging.warning('Unexpected HTTPError: ' + str(e.code) + " " + e.msg + " " + e.read())
-            except urllib2.URLError, e:
+                    errors += 1
+                    logging.warning("Couldn't send webhook to {}: {}".format(url, ex))
+                    continue
+                pending[rpc] = (url, time.time())
+                if len(pending) >= cls.MAX_CONCURRENT_WEBHOOKS:
+                    break
+            if not pending:
+                break
+
+            rpc = apiproxy_stub_map.UserRPC.wait_any(pending.keys())
+            url, start_time = pending.pop(rpc)
+            is_invalid, is_error = cls._check_webhook_result(rpc, url)
+            latencies.append(time.time() - start_time)
+            if is_invalid:
                 invalid_urls.append(url)
-                logging.warning('URLError: ' + str(e.code) + " " + e.msg + " " + e.read())
-            except Exception, ex:
-                logging.warning("Other Exception: {}".format(str(ex)))
+            if is_error:
+                errors += 1
 
-        if invalid_urls:
-            logging.warning("Invalid urls while sending webhook: {}".format(str(invalid_urls)))
-            return False
-        return True
+        cls._record_webhook_metrics(message.get('message_type'), requests, latencies, errors)
+        return invalid_urls
+
+    @classmethod
+    def _check_webhook_result(cls, rpc, url):
+        """
+        Returns (is_invalid, is_error) for a finished webhook call.
+        404s and URLs that can't be reached are invalid, slow ones aren't.
+        """
+        try:
+            result = rpc.get_result()
+        except urlfetch.DeadlineExceededError:
+            logging.warning('Webhook timed out after {}s for URL: {}'.format(cls.WEBHOOK_DEADLINE, url))
+            return False, True
+        except urlfetch.DownloadError, e:
+            logging.warning('DownloadError for URL {}: {}'.format(url, e))
+            return True, True
+        except Exception, ex:
+            logging.warning("Other Exception: {}".format(str(ex)))
+            return False, True
+
+        if result.status_code / 100 == 2:
+            return False, False
+        elif result.status_code == 400:
+            logging.warning('400, Bad request for URL: {}'.format(url))
+        elif result.status_code == 401:
+            logging.warning('401, Webhook unauthorized for URL: {}'.format(url))
+        elif result.status_code == 404:
+            return True, True
+        elif result.status_code == 500:
+            logging.warning('500, Internal error on server sending message')
+        else:
+            logging.warning('Unexpected status code: {} {}'.format(result.status_code, result.content))
+        return False, True
+
+    @classmethod
+    def _record_webhook_metrics(cls, notification_type, requests, latencies, errors):
+        """
+        Adds one send's deliveries to the per-minute counters for its
+        notification type
+        :param latencies: Seconds each delivery that got sent took
+        """
+        if not requests:
+            return
+        logging.info("Sent {} webhooks for {}, {} failed, slowest {:.0f}ms".format(
+            requests, notification_type, errors, max(latencies) * 1000 if latencies else 0))
+        MetricsBucketHelper.record(cls.WEBHOOK_METRICS_KEY_PREFIX.format(notification_type), requests, errors, sum(latencies))
+
+    @classmethod
+    def get_webhook_metrics(cls, notification_type, minutes=15):
+        """
+        Returns webhook delivery count, error count, error rate and average
+        latency for a notification type over the last few minutes.
+        Deliveries that failed before being sent count towards the average as 0ms.
+        :param notification_type: Name of the type, like 'match_score'
+        """
+        return MetricsBucketHelper.get_metrics(cls.WEBHOOK_METRICS_KEY_PREFIX.format(notification_type), minutes)
+
+    @classmethod
+    def get_all_webhook_metrics(cls, minutes=15):
+        """
+        Returns [(notification type name, metrics like get_webhook_metrics)] for every notification type
+        """
+        type_names = [NotificationType.type_names[notification_type] for notification_type in sorted(NotificationType.type_names)]
+        metrics = MetricsBucketHelper.get_metrics_multi(
+            [cls.WEBHOOK_METRICS_KEY_PREFIX.format(type_name) for type_name in type_names], minutes)
+        return [(type_name, metrics[cls.WEBHOOK_METRICS_KEY_PREFIX.format(type_name)]) for type_name in type_names]
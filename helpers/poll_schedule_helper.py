@@ -0,0 +1,118 @@
+import datetime
+import time
+
+from google.appengine.api import memcache
+
+from helpers.match_helper import MatchHelper
+
+
+class PollScheduleHelper(object):
+    """
+    Decides when to next poll the FMS API for a live event, from its match
+    schedule. Polls every minute around when the next match's result is
+    expected, and backs off during lunch, overnight, and while waiting on a
+    schedule.
+    """
+    MIN_INTERVAL = datetime.timedelta(minutes=1)  # Cron granularity
+    MAX_INTERVAL = datetime.timedelta(minutes=15)  # Still catches unscheduled changes, like score edits
+    IDLE_INTERVAL = datetime.timedelta(minutes=5)  # No schedule yet, or no unplayed matches (e.g. before playoffs)
+    DEFAULT_CYCLE_TIME = datetime.timedelta(minutes=7)
+    MAX_CYCLE_TIME = datetime.timedelta(minutes=20)  # Longer gaps between matches are breaks
+    RESULTS_DELAY = datetime.timedelta(minutes=4)  # From match start until the FMS API has its score
+    FAST_WINDOW = datetime.timedelta(minutes=10)  # Poll every minute for this long after a result is expected
+    DUE_SLACK = 30  # Seconds. Polls due a bit after a cron tick go out on it.
+
+    @classmethod
+    def cycle_time(cls, played_matches):
+        """
+        Median time between the starts of consecutive played matches,
+        ignoring breaks
+        :param played_matches: Played matches in play order
+        """
+        cycle_times = []
+        for last_match, match in zip(played_matches, played_matches[1:]):
+            if last_match.actual_time and match.actual_time:
+                cycle_time = match.actual_time - last_match.actual_time
+                if datetime.timedelta(0) < cycle_time <= cls.MAX_CYCLE_TIME:
+                    cycle_times.append(cycle_time)
+        if not cycle_times:
+            return cls.DEFAULT_CYCLE_TIME
+        return sorted(cycle_times)[len(cycle_times) / 2]
+
+    @classmethod
+    def expected_result_time(cls, matches):
+        """
+        Returns when the next unplayed match's score should be available,
+        or None if there's no unplayed match or not enough times to tell
+        """
+        upcoming_matches = MatchHelper.upcomingMatches(matches, num=1)
+        if not upcoming_matches:
+            return None
+        next_match = upcoming_matches[0]
+
+        played_matches = MatchHelper.recentMatches(matches, num=len(matches))
+        last_match = played_matches[-1] if played_matches else None
+        if next_match.time:
+            expected_start = next_match.time
+            if last_match and last_match.time and last_match.actual_time and \
+                    last_match.actual_time.date() == next_match.time.date():
+                # Carry over how far ahead or behind schedule the event is running today
+                expected_start += last_match.actual_time - last_match.time
+        elif last_match and last_match.actual_time:
+            expected_start = last_match.actual_time + cls.cycle_time(played_matches)
+        else:
+            return None
+        return expected_start + cls.RESULTS_DELAY
+
+    @classmethod
+    def next_poll_time(cls, matches, now):
+        """
+        Returns when an event with the given matches should next be polled
+        :param matches: All of the event's matches
+        :param now: Current UTC datetime
+        """
+        expected_result_time = cls.expected_result_time(matches)
+        if expected_result_time is None:
+            if matches and MatchHelper.upcomingMatches(matches, num=1):
+                return now + cls.MIN_INTERVAL  # Unplayed matches without times
+            return now + cls.IDLE_INTERVAL
+        if now < expected_result_time:
+            # Waiting on a match, or on a break
+            return min(expected_result_time, now + cls.MAX_INTERVAL)
+        if now < expected_result_time + cls.FAST_WINDOW:
+            return now + cls.MIN_INTERVAL
+        # Well past due, so the event is probably delayed. Back off the longer it's been.
+        return now + min(max((now - expected_result_time) / 4, cls.MIN_INTERVAL), cls.MAX_INTERVAL)
+
+    @classmethod
+    def _cache_key(cls, event_key, kind):
+        return 'poll_schedule_{}_{}'.format(kind, event_key)
+
+    @classmethod
+    def events_to_poll(cls, events, kind):
+        """
+        Returns the events due for a poll, and schedules their next one
+        :param events: Live events
+        :param kind: What's being polled, 'matches' or 'rankings'. Each kind is scheduled separately.
+        """
+        now = datetime.datetime.utcnow()
+        cache_keys = [cls._cache_key(event.key_name, kind) for event in events]
+        next_polls = memcache.get_multi(cache_keys)
+
+        due_events = []
+        new_next_polls = {}
+        for event, cache_key in zip(events, cache_keys):
+            next_poll = next_polls.get(cache_key)
+            if next_poll is not None and time.time() + cls.DUE_SLACK < next_poll:
+                continue
+            due_events.append(event)
+            matches = event.matches
+            if kind == 'rankings':
+                # Only quals change rankings
+                matches = [match for match in matches if match.comp_level == 'qm']
+            next_poll_time = cls.next_poll_time(matches, now)
+            new_next_polls[cache_key] = time.time() + (next_poll_time - now).total_seconds()
+
+        if new_next_polls:
+            memcache.set_multi(new_next_polls, time=int(cls.MAX_INTERVAL.total_seconds()))
+        return due_events
@@ -0,0 +1,122 @@
+from helpers.prediction_helper import PredictionHelper
+
+
+class PredictionEvaluationHelper(object):
+    """
+    Scores match predictions against results.
+    Evaluations are plain dicts of counts and sums, so evaluations of
+    separate events can be merged and summarized into a season report.
+    """
+    CALIBRATION_BUCKET_WIDTH = 10  # Percent of predicted winner win probability, which ranges from 50 to 100
+
+    @classmethod
+    def new_evaluation(cls):
+        return {
+            'matches': 0,
+            'brier_sum': 0.0,
+            'correct': 0,
+            'matches_75': 0,
+            'correct_75': 0,
+            'calibration': [[0, 0.0, 0] for _ in xrange(50 / cls.CALIBRATION_BUCKET_WIDTH)],  # [count, predicted prob sum, correct]
+            'bonus': {},  # {prediction key: [count, brier sum]}
+            'residuals': {},  # {quantity: [count, sum of squared residuals]}
+        }
+
+    @classmethod
+    def evaluate_match_predictions(cls, matches, predictions, model_state=None):
+        """
+        Returns an evaluation of the predictions of played quals matches,
+        including the residuals collected in model_state
+        """
+        evaluation = cls.new_evaluation()
+        if not matches or not predictions:
+            return evaluation
+        model = PredictionHelper.get_prediction_model(matches[0].year)
+
+        for match in matches:
+            if not match.has_been_played or match.key.id() not in predictions:
+                continue
+            prediction = predictions[match.key.id()]
+            prob = prediction['prob'] / 100.0
+            correct = match.winning_alliance == prediction['winning_alliance']
+
+            # Brier score of the red win probability, with ties as half a win
+            red_prob = prob if prediction['winning_alliance'] == 'red' else 1 - prob
+            if match.winning_alliance == 'red':
+                red_outcome = 1.0
+            elif match.winning_alliance == 'blue':
+                red_outcome = 0.0
+            else:
+                red_outcome = 0.5
+
+            evaluation['matches'] += 1
+            evaluation['brier_sum'] += (red_prob - red_outcome) ** 2
+            evaluation['correct'] += int(correct)
+            if prediction['prob'] > 75:
+                evaluation['matches_75'] += 1
+                evaluation['correct_75'] += int(correct)
+
+            bucket = min(int((prediction['prob'] - 50) / cls.CALIBRATION_BUCKET_WIDTH), len(evaluation['calibration']) - 1)
+            bucket = evaluation['calibration'][max(bucket, 0)]
+            bucket[0] += 1
+            bucket[1] += prob
+            bucket[2] += int(correct)
+
+            if not match.score_breakdown:
+                continue
+            for (key, _, _), field in zip(model.BONUS_RANKING_POINTS, model.BONUS_RANKING_POINT_FIELDS):
+                for alliance_color in ['red', 'blue']:
+                    if key not in prediction[alliance_color] or field not in match.score_breakdown.get(alliance_color, {}):
+                        continue
+                    outcome = float(bool(match.score_breakdown[alliance_color][field]))
+                    count, brier_sum = evaluation['bonus'].get(key, [0, 0.0])
+                    evaluation['bonus'][key] = [count + 1, brier_sum + (prediction[alliance_color][key] / 100.0 - outcome) ** 2]
+
+        if model_state:
+            for quantity, residual in model_state['residuals'].items():
+                evaluation['residuals'][quantity] = list(residual)
+
+        return evaluation
+
+    @classmethod
+    def merge_evaluations(cls, evaluations):
+        merged = cls.new_evaluation()
+        for evaluation in evaluations:
+            for key in ['matches', 'brier_sum', 'correct', 'matches_75', 'correct_75']:
+                merged[key] += evaluation[key]
+            for merged_bucket, bucket in zip(merged['calibration'], evaluation['calibration']):
+                for i, value in enumerate(bucket):
+                    merged_bucket[i] += value
+            for field in ['bonus', 'residuals']:
+                for key, (count, total) in evaluation[field].items():
+                    merged_count, merged_total = merged[field].get(key, [0, 0])
+                    merged[field][key] = [merged_count + count, merged_total + total]
+        return merged
+
+    @classmethod
+    def summarize(cls, evaluation):
+        """
+        Returns the accuracy report for an evaluation. Variances are the mean
+        squared residual of each predicted quantity, which is what the
+        models' DEFAULT_VARIANCES should be tuned to.
+        """
+        matches = evaluation['matches']
+        calibration = []
+        for i, (count, prob_sum, correct) in enumerate(evaluation['calibration']):
+            low = 50 + i * cls.CALIBRATION_BUCKET_WIDTH
+            calibration.append({
+                'bucket': '{}-{}'.format(low, low + cls.CALIBRATION_BUCKET_WIDTH),
+                'count': count,
+                'predicted': None if count == 0 else 100 * prob_sum / count,
+                'observed': None if count == 0 else 100 * float(correct) / count,
+            })
+
+        return {
+            'matches': matches,
+            'brier': None if matches == 0 else evaluation['brier_sum'] / matches,
+            'wl_accuracy': None if matches == 0 else 100 * float(evaluation['correct']) / matches,
+            'wl_accuracy_75': None if evaluation['matches_75'] == 0 else 100 * float(evaluation['correct_75']) / evaluation['matches_75'],
+            'calibration': calibration,
+            'bonus_brier': dict((key, brier_sum / count) for key, (count, brier_sum) in evaluation['bonus'].items() if count),
+            'variances': dict((quantity, float(sum_sq) / count) for quantity, (count, sum_sq) in evaluation['residuals'].items() if count),
+        }
@@ -1,189 +1,203 @@
 from collections import defaultdict
-import math
 import numpy as np
-import time
 
-from consts.event_type import EventType
 from helpers.matchstats_helper import MatchstatsHelper
+from helpers.prediction_models import PredictionModel, PredictionModel2016, PredictionModel2017
 
 
 class PredictionHelper(object):
     """
-    Only works for 2016
+    Predicts matches and rankings with the score model registered for the
+    event's year in PREDICTION_MODELS, or the generic PredictionModel
     """
+    PREDICTION_MODELS = {
+        2016: PredictionModel2016,
+        2017: PredictionModel2017,
+    }
+    IXOPR_REFINEMENT_PASSES = 2
+    RANKING_SAMPLES_CHUNK = 1000
+
     @classmethod
-    def _normcdf(cls, x):
-        return (1.0 + math.erf(x / np.sqrt(2.0))) / 2.0
+    def get_prediction_model(cls, year):
+        return cls.PREDICTION_MODELS.get(year, PredictionModel)
 
     @classmethod
-    def _build_s_matrix(cls, matches, team_id_map, n, init_oprs, init_oprs_boulder, played_match_keys, init_opr=0, init_boulders=0):
-        s = np.zeros([n, 1])
-        s_boulder = np.zeros([n, 1])
-        for match in matches:
-            for alliance_color in ['red', 'blue']:
-                if match.has_been_played and match.key.id() in played_match_keys:
-                    score = match.alliances[alliance_color]['score']
-                    boulders = match.score_breakdown[alliance_color]['2016bouldersOPR']
-                else:
-                    score = 0
-                    boulders = 0
-                    for team in match.alliances[alliance_color]['teams']:
-                        team = team[3:]  # turns "frc254B" into "254B"
-                        score += init_oprs.get(team, init_opr)
-                        boulders += init_oprs_boulder.get(team, init_boulders)
+    def get_predictions(cls, matches, old_predictions=None):
+        """
+        Returns the EventDetails.predictions dict for quals matches, or None if
+        there are none. The model state and played match predictions in
+        old_predictions are reused and updated.
+        """
+        if not matches:
+            return None
+        old_predictions = old_predictions or {}
+
+        match_predictions, match_prediction_stats, model_state = cls.get_match_predictions(
+            matches, old_predictions.get('model_state'), old_predictions.get('match_predictions'))
+        ranking_predictions, ranking_prediction_stats = cls.get_ranking_predictions(matches, match_predictions)
+
+        return {
+            'match_predictions': match_predictions,
+            'match_prediction_stats': match_prediction_stats,
+            'ranking_predictions': ranking_predictions,
+            'ranking_prediction_stats': ranking_prediction_stats,
+            'model_state': model_state,
+        }
 
-                for team in match.alliances[alliance_color]['teams']:
-                    team_id = team_id_map[team[3:]]
-                    s[team_id] += score
-                    s_boulder[team_id] += boulders
+    @classmethod
+    def calc_ixoprs(cls, matches, team_list, team_id_map, last_event_stats, stats, skip_match_keys=None, require_score_breakdown=True):
+        """
+        Returns a list with the ixOPRs to predict each of matches with, formatted
+        like {stat: {team: value}}, using only the results of earlier matches.
+        Matches in skip_match_keys get None instead. With require_score_breakdown,
+        played matches without a score breakdown don't count towards the average
+        score teams without last event stats start from.
+
+        Alliances without a result count as the sum of their teams' current
+        estimates, so each stat solves x = Minv * (s_played + M_unplayed * x),
+        starting from last event stats and refined IXOPR_REFINEMENT_PASSES times.
+        s_played and M_unplayed are updated as each match becomes played
+        instead of being rebuilt from every match, and Minv is computed once.
+        """
+        n = len(team_list)
+        k = len(stats)
+        component_fields = [MatchstatsHelper.get_component_fields(stat) for stat in stats]
+        alliance_teams, alliances = MatchstatsHelper.build_alliance_incidence(matches, team_id_map)
+        M = MatchstatsHelper.build_normal_matrix(alliance_teams, n)
+        Minv = np.linalg.pinv(M)
+
+        # Alliances in the order they become played as the horizon advances
+        order = sorted(xrange(len(alliances)), key=lambda a: alliances[a][0].match_number)
+
+        S_played = np.zeros([n, k])
+        M_unplayed = np.array([M] * k)  # One unplayed normal matrix per stat
+        score_sum = 0
+        num_revealed = 0
+        all_ixoprs_list = []
+        for i, match in enumerate(matches):
+            # Matches numbered up to i are played
+            while num_revealed < len(order) and alliances[order[num_revealed]][0].match_number <= i:
+                a = order[num_revealed]
+                num_revealed += 1
+                played_match, alliance_color = alliances[a]
+                if not played_match.has_been_played:
+                    continue
+                teams = alliance_teams[a]
+                breakdown = played_match.score_breakdown
+                for j, stat in enumerate(stats):
+                    if stat == 'oprs':
+                        value = played_match.alliances[alliance_color]['score']
+                    elif component_fields[j] and breakdown and alliance_color in breakdown:
+                        value = sum(breakdown[alliance_color].get(field, 0) for field in component_fields[j])
+                    else:
+                        continue
+                    S_played[teams, j] += value
+                    M_unplayed[j][teams[:, np.newaxis], teams] -= 1
+
+            if skip_match_keys and match.key.id() in skip_match_keys:
+                all_ixoprs_list.append(None)
+            else:
+                all_ixoprs_list.append(cls._solve_ixoprs(team_list, team_id_map, stats, last_event_stats, Minv, S_played, M_unplayed, i, score_sum))
+
+            if match.has_been_played and (match.score_breakdown or not require_score_breakdown):
+                for alliance_color in ['red', 'blue']:
+                    score_sum += match.alliances[alliance_color]['score']
+
+        return all_ixoprs_list
 
-        return s, s_boulder
+    @classmethod
+    def _solve_ixoprs(cls, team_list, team_id_map, stats, last_event_stats, Minv, S_played, M_unplayed, i, score_sum):
+        # Initialize with last event stats, or 1/3 of average scores (2 alliances per match)
+        X = np.zeros([len(team_list), len(stats)])
+        if i > 0 and 'oprs' in stats:
+            X[:, stats.index('oprs')] = float(score_sum) / i / 6
+        for j, stat in enumerate(stats):
+            if stat in last_event_stats:
+                for team, value in last_event_stats[stat].items():
+                    if team in team_id_map:
+                        X[team_id_map[team], j] = value
+
+        for _ in xrange(1 + cls.IXOPR_REFINEMENT_PASSES):
+            X = np.dot(Minv, S_played + np.einsum('kij,jk->ik', M_unplayed, X))
+
+        all_ixoprs = {}
+        for j, stat in enumerate(stats):
+            all_ixoprs[stat] = dict(zip(team_list, X[:, j].tolist()))
+        return all_ixoprs
 
     @classmethod
-    def _predict_match(cls, match, all_stats, tower_strength):
-        score_var = 40**2  # TODO temporary set variance to be huge
-        boulder_var = 5**2  # TODO get real value
-        crossing_var = 4**2  # TODO get real value
-
-        red_score = 0
-        red_auto_points = 0  # Used for tiebreaking
-        red_boulders = 0
-        red_num_crossings = 0
-        for team in match.alliances['red']['teams']:
-            red_score += all_stats['oprs'][team[3:]]
-            red_auto_points += all_stats['2016autoPointsOPR'][team[3:]]
-            red_boulders += all_stats['2016bouldersOPR'][team[3:]]
-            # Crossing OPR usually underestimates. hacky fix to make numbers more believable
-            red_num_crossings += max(0, all_stats['2016crossingsOPR'][team[3:]]) * 1.2
-
-        blue_score = 0
-        blue_auto_points = 0  # Used for tiebreaking
-        blue_boulders = 0
-        blue_num_crossings = 0
-        for team in match.alliances['blue']['teams']:
-            blue_score += all_stats['oprs'][team[3:]]
-            blue_auto_points += all_stats['2016autoPointsOPR'][team[3:]]
-            blue_boulders += all_stats['2016bouldersOPR'][team[3:]]
-            # Crossing OPR usually underestimates. hacky fix to make numbers more believable
-            blue_num_crossings += max(0, all_stats['2016crossingsOPR'][team[3:]]) * 1.2
-
-        # Prob win
-        mu = abs(red_score - blue_score)
-        var = 2 * score_var
-        prob = 1 - cls._normcdf(-mu / np.sqrt(var))
-        if math.isnan(prob):
-            prob = 0.5
-
-        # Prob capture
-        mu = red_boulders - tower_strength
-        red_prob_capture = 1 - cls._normcdf(-mu / np.sqrt(boulder_var))
-
-        mu = blue_boulders - tower_strength
-        blue_prob_capture = 1 - cls._normcdf(-mu / np.sqrt(boulder_var))
-
-        if red_score > blue_score:
-            winning_alliance = 'red'
-        elif blue_score > red_score:
-            winning_alliance = 'blue'
-        else:
-            winning_alliance = ''
-
-        # Prob breach
-        crossings_to_breach = 8
-        mu = red_num_crossings - crossings_to_breach
-        red_prob_breach = 1 - cls._normcdf(-mu / np.sqrt(crossing_var))
-
-        mu = blue_num_crossings - crossings_to_breach
-        blue_prob_breach = 1 - cls._normcdf(-mu / np.sqrt(crossing_var))
-
-        # Artificially limit prob breach range
-        red_prob_breach = min(max(red_prob_breach, 0.1), 0.95)
-        blue_prob_breach = min(max(blue_prob_breach, 0.1), 0.95)
-
-        prediction = {
-            'red': {
-                'score': red_score,
-                'auto_points': red_auto_points,
-                'boulders': red_boulders,
-                'prob_capture': red_prob_capture * 100,
-                'prob_breach': red_prob_breach * 100
-            },
-            'blue': {
-                'score': blue_score,
-                'auto_points': blue_auto_points,
-                'boulders': blue_boulders,
-                'prob_capture': blue_prob_capture * 100,
-                'prob_breach': blue_prob_breach * 100
-            },
-            'winning_alliance': winning_alliance,
-            'prob': prob * 100,
+    def build_model_state(cls, model, year, team_list, event_key):
+        """
+        Returns a fresh model state for an event, with the prior event stats
+        the model's ixOPRs start from and no residuals yet
+        """
+        last_event_stats = MatchstatsHelper.get_last_event_stats(team_list, event_key)
+        return {
+            'year': year,
+            'teams': team_list,
+            'priors': dict((stat, last_event_stats[stat]) for stat in model.STATS if stat in last_event_stats),
+            'residuals': {},  # {quantity: [count, sum of squared residuals]}
+            'residual_matches': [],  # Keys of matches whose residuals have been counted
         }
-        return prediction
 
     @classmethod
-    def get_match_predictions(cls, matches):
+    def get_match_predictions(cls, matches, model_state=None, old_match_predictions=None, event=None):
+        """
+        Returns (predictions, prediction_stats, model_state).
+        Pass the event if it has already been fetched.
+        model_state and old_match_predictions come from the event's previous
+        predictions. Played matches keep their old prediction, so only
+        unplayed and newly played matches are predicted. Each newly played
+        match's residuals are folded into model_state, and the variances
+        learned from them are used for the following predictions.
+        """
         if not matches:
-            return None, None
+            return None, None, model_state
 
         event_key = matches[0].event
-        event = event_key.get()
+        if event is None:
+            event = event_key.get()
+        year = matches[0].year
+        model = cls.get_prediction_model(year)
 
         # Setup
         team_list, team_id_map = MatchstatsHelper.build_team_mapping(matches)
-        last_event_stats = MatchstatsHelper.get_last_event_stats(team_list, event_key)
-        Minv = MatchstatsHelper.build_Minv_matrix(matches, team_id_map)
-
-        init_stats_sums = defaultdict(int)
-        init_stats_totals = defaultdict(int)
-        for _, stats in last_event_stats.items():
-            for stat, stat_value in stats.items():
-                init_stats_sums[stat] += stat_value
-                init_stats_totals[stat] += 1
-
-        init_stats_default = defaultdict(int)
-        for stat, stat_sum in init_stats_sums.items():
-            init_stats_default[stat] = float(stat_sum) / init_stats_totals[stat]
-
-        relevant_stats = [
-            'oprs',
-            '2016autoPointsOPR',
-            '2016crossingsOPR',
-            '2016bouldersOPR'
-        ]
+        if model_state is None or model_state['year'] != year or model_state['teams'] != team_list:
+            model_state = cls.build_model_state(model, year, team_list, event_key)
+            old_match_predictions = None
+        old_match_predictions = old_match_predictions or {}
+        residual_matches = set(model_state['residual_matches'])
+
+        reused_match_keys = set(
+            match.key.id() for match in matches
+            if match.has_been_played and match.key.id() in old_match_predictions)
+        all_ixoprs_list = cls.calc_ixoprs(
+            matches, team_list, team_id_map, model_state['priors'], model.STATS,
+            skip_match_keys=reused_match_keys, require_score_breakdown=model.REQUIRES_SCORE_BREAKDOWN)
 
         # Make predictions before each match
         predictions = {}
+        for match, all_ixoprs in zip(matches, all_ixoprs_list):
+            if all_ixoprs is None:
+                prediction = old_match_predictions[match.key.id()]
+            else:
+                prediction = model.predict_match(match, all_ixoprs, event, model.get_variances(model_state))
+            predictions[match.key.id()] = prediction
+
+            if match.has_been_played and match.key.id() not in residual_matches:
+                model.add_residuals(model_state, match, prediction)
+                model_state['residual_matches'].append(match.key.id())
+                residual_matches.add(match.key.id())
+
+        # Benchmark predictions
         played_matches = 0
         played_matches_75 = 0
         correct_predictions = 0
         correct_predictions_75 = 0
         score_differences = []
-        stats_sum = defaultdict(int)
-        for i, match in enumerate(matches):
-            # Calculate ixOPR
-            all_ixoprs = {}
-            for stat in relevant_stats:
-                all_ixoprs[stat] = MatchstatsHelper.calc_stat(
-                    matches, team_list, team_id_map, Minv, stat,
-                    init_stats=last_event_stats,
-                    init_stats_default=init_stats_default[stat],
-                    limit_matches=i)
-            for _ in xrange(2):
-                for stat in relevant_stats:
-                    start = time.time()
-                    all_ixoprs[stat] = MatchstatsHelper.calc_stat(
-                        matches, team_list, team_id_map, Minv, stat,
-                        init_stats=all_ixoprs,
-                        init_stats_default=init_stats_default[stat],
-                        limit_matches=i)
-
-            # Make prediction
-            tower_strength = 10 if (event.event_type_enum in EventType.CMP_EVENT_TYPES or event.key.id() == '2016cc') else 8
-            prediction = cls._predict_match(match, all_ixoprs, tower_strength)
-            predictions[match.key.id()] = prediction
-
-            # Benchmark prediction
+        for match in matches:
             if match.has_been_played:
+                prediction = predictions[match.key.id()]
                 played_matches += 1
                 if prediction['prob'] > 75:
                     played_matches_75 += 1
@@ -194,33 +208,6 @@ class PredictionHelper(object):
                     for alliance_color in ['red', 'blue']:
                         score_differences.append(abs(match.alliances[alliance_color]['score'] - prediction[alliance_color]['score']))
 
-            # Update init_stats
-            if match.has_been_played and match.score_breakdown:
-                for alliance_color in ['red', 'blue']:
-                    stats_sum['score'] += match.alliances[alliance_color]['score']
-
-                    for stat in relevant_stats:
-                        if stat == '2016autoPointsOPR':
-                            init_stats_default[stat] += match.score_breakdown[alliance_color]['autoPoints']
-                        elif stat == '2016bouldersOPR':
-                            init_stats_default[stat] += (
-                                match.score_breakdown[alliance_color].get('autoBouldersLow', 0) +
-                                match.score_breakdown[alliance_color].get('autoBouldersHigh', 0) +
-                                match.score_breakdown[alliance_color].get('teleopBouldersLow', 0) +
-                                match.score_breakdown[alliance_color].get('teleopBouldersHigh', 0))
-                        elif stat == '2016crossingsOPR':
-                            init_stats_default[stat] += (
-                                match.score_breakdown[alliance_color].get('position1crossings', 0) +
-                                match.score_breakdown[alliance_color].get('position2crossings', 0) +
-                                match.score_breakdown[alliance_color].get('position3crossings', 0) +
-                                match.score_breakdown[alliance_color].get('position4crossings', 0) +
-                                match.score_breakdown[alliance_color].get('position5crossings', 0))
-
-            init_stats_default['oprs'] = float(stats_sum['score']) / (i + 1) / 6  # Initialize with 1/3 of average scores (2 alliances per match)
-            for stat in relevant_stats:
-                if stat != 'oprs':
-                    init_stats_default[stat] = float(stats_sum[stat]) / (i + 1) / 6  # Initialize with 1/3 of average scores (2 alliances per match)
-
         prediction_stats = {
             'wl_accuracy': None if played_matches == 0 else 100 * float(correct_predictions) / played_matches,
             'wl_accuracy_75': None if played_matches_75 == 0 else 100 * float(correct_predictions_75) / played_matches_75,
@@ -228,15 +215,23 @@ class PredictionHelper(object):
             'err_var': np.var(score_differences) if score_differences else None,
         }
 
-        return predictions, prediction_stats
+        return predictions, prediction_stats, model_state
 
     @classmethod
-    def get_ranking_predictions(cls, matches, match_predictions, n=1000):
+    def get_ranking_predictions(cls, matches, match_predictions, n=1000, seed=None, model=None):
         """
-        Only works for 2016
+        Simulates the rest of the event n times, drawing the results of unplayed
+        matches and their bonus ranking points from match_predictions, with the
+        event year's model unless one is given. Samples are simulated
+        RANKING_SAMPLES_CHUNK at a time as (samples x teams) arrays and folded
+        into running aggregates and per-team rank histograms, so memory doesn't
+        grow with n.
+        Pass a seed for reproducible results.
         """
         if not matches:
             return None, None
+        if model is None:
+            model = cls.get_prediction_model(matches[0].year)
 
         # Calc surrogates
         match_counts = defaultdict(int)
@@ -250,88 +245,118 @@ class PredictionHelper(object):
             if v > num_matches:
                 surrogate_teams.add(k)
 
-        # Calculate ranking points and tiebreakers
-        all_rankings = defaultdict(lambda: [0] * n)
-        all_ranking_points = defaultdict(lambda: [0] * n)
+        team_list = sorted(match_counts.keys())
+        team_ids = dict((team, i) for i, team in enumerate(team_list))
+        num_teams = len(team_list)
+
+        # Played matches and tiebreakers are the same in every sample.
+        # Unplayed alliances get a row in W, which scatters their sampled RP onto the teams they count for.
+        fixed_ranking_points = np.zeros(num_teams)
+        tiebreakers = np.zeros(num_teams)
+        unplayed_rows = []
+        predicted_winners = []  # Per unplayed match
+        win_probs = []  # Per unplayed match
+        bonus_probs = []  # Per unplayed alliance, one per bonus ranking point
+        num_played = defaultdict(int)
         last_played_match = None
-        for i in xrange(n):
-            team_ranking_points = defaultdict(int)
-            team_rank_tiebreaker = defaultdict(int)
-            num_played = defaultdict(int)
-            for match in matches:
-                for alliance_color in ['red', 'blue']:
-                    for team in match.alliances[alliance_color]['teams']:
-                        num_played[team] += 1
-
-                sampled_breach = {}
-                sampled_capture = {}
-                sampled_tiebreaker = {}
-                # Get actual results or sampled results, depending if match has been played
-                if match.has_been_played:
-                    if not match.score_breakdown:  # Can't do rankings without score breakdown
-                        return None, None
-                    last_played_match = match.key.id()
-                    sampled_winner = match.winning_alliance
-                    for alliance_color in ['red', 'blue']:
-                        sampled_breach[alliance_color] = match.score_breakdown[alliance_color]['teleopDefensesBreached']
-                        sampled_capture[alliance_color] = match.score_breakdown[alliance_color]['teleopTowerCaptured']
-                        sampled_tiebreaker[alliance_color] = match.score_breakdown[alliance_color]['autoPoints']
-                else:
-                    prediction = match_predictions[match.key.id()]
-                    if np.random.uniform(high=100) < prediction['prob']:
-                        sampled_winner = prediction['winning_alliance']
-                    else:
-                        if prediction['winning_alliance'] == 'red':
-                            sampled_winner = 'blue'
-                        elif prediction['winning_alliance'] == 'blue':
-                            sampled_winner = 'red'
+        for match in matches:
+            for alliance_color in ['red', 'blue']:
+                for team in match.alliances[alliance_color]['teams']:
+                    num_played[team] += 1
 
-                    for alliance_color in ['red', 'blue']:
-                        sampled_breach[alliance_color] = np.random.uniform(high=100) < prediction[alliance_color]['prob_breach']
-                        sampled_capture[alliance_color] = np.random.uniform(high=100) < prediction[alliance_color]['prob_capture']
-                        sampled_tiebreaker[alliance_color] = prediction[alliance_color]['auto_points']
+            counted_teams = {}
+            for alliance_color in ['red', 'blue']:
+                counted_teams[alliance_color] = [
+                    team_ids[team] for team in match.alliances[alliance_color]['teams']
+                    if not (team in surrogate_teams and num_played[team] == 3)]
 
-                # Using match results, update RP and tiebreaker
+            if match.has_been_played:
+                if model.REQUIRES_SCORE_BREAKDOWN and not match.score_breakdown:  # Can't do rankings without score breakdown
+                    return None, None
+                last_played_match = match.key.id()
                 for alliance_color in ['red', 'blue']:
-                    for team in match.alliances[alliance_color]['teams']:
-                        if team in surrogate_teams and num_played[team] == 3:
-                            continue
-                        if sampled_breach[alliance_color]:
-                            team_ranking_points[team] += 1
-                        if sampled_capture[alliance_color]:
-                            team_ranking_points[team] += 1
-                        team_rank_tiebreaker[team] += sampled_tiebreaker[alliance_color]
-
-                if sampled_winner == '':
-                    for alliance_color in ['red', 'blue']:
-                        for team in match.alliances[alliance_color]['teams']:
-                            if team in surrogate_teams and num_played[team] == 3:
-                                continue
-                            team_ranking_points[team] += 1
-                else:
-                    for team in match.alliances[sampled_winner]['teams']:
-                        if team in surrogate_teams and num_played[team] == 3:
-                            continue
-                        team_ranking_points[team] += 2
-
-            # Compute ranks for this sample
-            sample_rankings = sorted(team_ranking_points.items(), key=lambda x: -team_rank_tiebreaker[x[0]])  # Sort by tiebreaker.
-            sample_rankings = sorted(sample_rankings, key=lambda x: -x[1])  # Sort by RP. Sort is stable.
-            for rank, (team, ranking_points) in enumerate(sample_rankings):
-                all_rankings[team][i] = rank + 1
-                all_ranking_points[team][i] = ranking_points
+                    ranking_points = 0
+                    if model.BONUS_RANKING_POINT_FIELDS:
+                        ranking_points += model.actual_bonus_ranking_points(match, alliance_color)
+                    if match.winning_alliance == '':
+                        ranking_points += model.TIE_RANKING_POINTS
+                    elif match.winning_alliance == alliance_color:
+                        ranking_points += model.WIN_RANKING_POINTS
+                    fixed_ranking_points[counted_teams[alliance_color]] += ranking_points
+                    tiebreakers[counted_teams[alliance_color]] += model.actual_tiebreaker(match, alliance_color)
+            else:
+                prediction = match_predictions[match.key.id()]
+                predicted_winners.append(prediction['winning_alliance'])
+                win_probs.append(prediction['prob'] / 100.0)
+                for alliance_color in ['red', 'blue']:
+                    unplayed_rows.append(counted_teams[alliance_color])
+                    bonus_probs.append(model.predicted_bonus_probs(prediction[alliance_color]))
+                    tiebreakers[counted_teams[alliance_color]] += model.predicted_tiebreaker(prediction[alliance_color])
+
+        W = np.zeros([len(unplayed_rows), num_teams])
+        for row, team_ids_in_row in enumerate(unplayed_rows):
+            W[row, team_ids_in_row] = 1
+        predicted_red = np.array([winner == 'red' for winner in predicted_winners], dtype=bool)
+        predicted_tie = np.array([winner == '' for winner in predicted_winners], dtype=bool)
+        win_probs = np.array(win_probs)
+        bonus_probs = np.array(bonus_probs).reshape(len(unplayed_rows), len(model.BONUS_RANKING_POINTS))
+
+        # Rank by RP, then tiebreaker. Tiebreakers don't vary, so presort them once.
+        tiebreaker_order = np.zeros(num_teams)
+        tiebreaker_order[np.argsort(-tiebreakers, kind='mergesort')] = np.arange(num_teams)
+
+        random_state = np.random.RandomState(seed)
+        rank_sum = np.zeros(num_teams)
+        rank_min = np.empty(num_teams)
+        rank_min.fill(num_teams)
+        rank_max = np.zeros(num_teams)
+        rank_hist = np.zeros(num_teams * (num_teams + 1), dtype=np.int64)  # (team, rank) counts
+        rp_sum = np.zeros(num_teams)
+        rp_min = np.empty(num_teams)
+        rp_min.fill(np.inf)
+        rp_max = np.zeros(num_teams)
+        for chunk_start in xrange(0, n, cls.RANKING_SAMPLES_CHUNK):
+            samples = min(cls.RANKING_SAMPLES_CHUNK, n - chunk_start)
+
+            # Sampled winners, with predicted ties staying ties
+            predicted_winner_won = random_state.uniform(size=(samples, len(win_probs))) < win_probs
+            red_won = np.where(predicted_red, predicted_winner_won, ~predicted_winner_won) & ~predicted_tie
+            blue_won = ~red_won & ~predicted_tie
+            alliance_ranking_points = np.zeros([samples, len(unplayed_rows)])
+            alliance_ranking_points[:, 0::2] = model.WIN_RANKING_POINTS * red_won + model.TIE_RANKING_POINTS * predicted_tie
+            alliance_ranking_points[:, 1::2] = model.WIN_RANKING_POINTS * blue_won + model.TIE_RANKING_POINTS * predicted_tie
+            if bonus_probs.shape[1]:
+                alliance_ranking_points += (random_state.uniform(size=(samples,) + bonus_probs.shape) < bonus_probs).sum(axis=2)
+
+            ranking_points = fixed_ranking_points + np.dot(alliance_ranking_points, W)
+            order = np.lexsort((np.tile(tiebreaker_order, (samples, 1)), -ranking_points), axis=1)
+            ranks = np.empty([samples, num_teams], dtype=np.int64)
+            ranks[np.arange(samples)[:, np.newaxis], order] = np.arange(1, num_teams + 1)
+
+            rank_sum += ranks.sum(axis=0)
+            rank_min = np.minimum(rank_min, ranks.min(axis=0))
+            rank_max = np.maximum(rank_max, ranks.max(axis=0))
+            rank_hist += np.bincount((np.arange(num_teams) * (num_teams + 1) + ranks).ravel(), minlength=len(rank_hist))
+            rp_sum += ranking_points.sum(axis=0)
+            rp_min = np.minimum(rp_min, ranking_points.min(axis=0))
+            rp_max = np.maximum(rp_max, ranking_points.max(axis=0))
+
+        # Median from the rank histograms, averaging the middle two samples like np.median
+        rank_cdf = np.cumsum(rank_hist.reshape(num_teams, num_teams + 1), axis=1)
+        lower_median = np.argmax(rank_cdf > (n - 1) / 2, axis=1)
+        upper_median = np.argmax(rank_cdf > n / 2, axis=1)
 
         rankings = {}
-        for team, team_rankings in all_rankings.items():
-            avg_rank = np.mean(team_rankings)
-            min_rank = min(team_rankings)
-            median_rank = np.median(team_rankings)
-            max_rank = max(team_rankings)
-            avg_rp = np.mean(all_ranking_points[team])
-            min_rp = min(all_ranking_points[team])
-            max_rp = max(all_ranking_points[team])
-
-            rankings[team] = (avg_rank, min_rank, median_rank, max_rank, avg_rp, min_rp, max_rp)
+        for i, team in enumerate(team_list):
+            rankings[team] = (
+                rank_sum[i] / n,
+                int(rank_min[i]),
+                (lower_median[i] + upper_median[i]) / 2.0,
+                int(rank_max[i]),
+                rp_sum[i] / n,
+                int(rp_min[i]),
+                int(rp_max[i]),
+            )
 
         ranking_predictions = sorted(rankings.items(), key=lambda x: x[1][0])  # Sort by avg_rank
 
@@ -0,0 +1,262 @@
+import math
+import numpy as np
+
+from consts.event_type import EventType
+from helpers.matchstats_helper import MatchstatsHelper
+
+
+class PredictionModel(object):
+    """
+    Score model used to predict matches and rankings for a game year.
+    The base model is the fallback for years without their own model: it
+    predicts alliance scores from OPR, gives 2 ranking points per win and 1
+    per tie, and breaks ranking ties by score. Year models add the score
+    breakdown components that drive bonus ranking points and tiebreakers.
+
+    Each model predicts a set of per-alliance quantities from ixOPRs. The
+    variance of each quantity's residual is learned from played matches and
+    kept in the model state stored with the event's predictions.
+    """
+    STATS = ['oprs']  # ixOPR stats the quantities are predicted from
+
+    # Variance of each quantity's residual until MIN_RESIDUALS played alliances have been seen
+    DEFAULT_VARIANCES = {
+        'score': 40**2,  # TODO temporary set variance to be huge
+    }
+    MIN_RESIDUALS = 12
+
+    # (prediction key, quantity, threshold) for each bonus ranking point, which is
+    # earned when the quantity reaches the threshold. Prediction keys hold the probability in %.
+    BONUS_RANKING_POINTS = []
+    # Score breakdown fields recording each bonus ranking point, in BONUS_RANKING_POINTS order
+    BONUS_RANKING_POINT_FIELDS = []
+    REQUIRES_SCORE_BREAKDOWN = False  # Whether played matches can be ranked without a score breakdown
+
+    TIEBREAKER = 'score'  # Quantity that breaks ranking ties
+    WIN_RANKING_POINTS = 2
+    TIE_RANKING_POINTS = 1
+
+    @classmethod
+    def _normcdf(cls, x):
+        return (1.0 + math.erf(x / np.sqrt(2.0))) / 2.0
+
+    @classmethod
+    def predict_quantities(cls, teams, ixoprs, event):
+        """
+        Returns {quantity: predicted value} for an alliance of teams like '254'
+        """
+        return {
+            'score': sum(ixoprs['oprs'][team] for team in teams),
+        }
+
+    @classmethod
+    def actual_quantities(cls, match, alliance_color):
+        """
+        Returns {quantity: value} for an alliance of a played match. Quantities
+        missing from the score breakdown are left out.
+        """
+        return {
+            'score': match.alliances[alliance_color]['score'],
+        }
+
+    @classmethod
+    def predict_alliance(cls, quantities, event, variances):
+        prediction = dict(quantities)
+        for key, quantity, threshold in cls.BONUS_RANKING_POINTS:
+            mu = quantities[quantity] - threshold
+            prediction[key] = (1 - cls._normcdf(-mu / np.sqrt(variances[quantity]))) * 100
+        return prediction
+
+    @classmethod
+    def predict_match(cls, match, ixoprs, event, variances):
+        quantities = {}
+        for alliance_color in ['red', 'blue']:
+            teams = [team[3:] for team in match.alliances[alliance_color]['teams']]  # turns "frc254B" into "254B"
+            quantities[alliance_color] = cls.predict_quantities(teams, ixoprs, event)
+        red_score = quantities['red']['score']
+        blue_score = quantities['blue']['score']
+
+        # Prob win
+        mu = abs(red_score - blue_score)
+        var = 2 * variances['score']
+        prob = 1 - cls._normcdf(-mu / np.sqrt(var))
+        if math.isnan(prob):
+            prob = 0.5
+
+        if red_score > blue_score:
+            winning_alliance = 'red'
+        elif blue_score > red_score:
+            winning_alliance = 'blue'
+        else:
+            winning_alliance = ''
+
+        return {
+            'red': cls.predict_alliance(quantities['red'], event, variances),
+            'blue': cls.predict_alliance(quantities['blue'], event, variances),
+            'winning_alliance': winning_alliance,
+            'prob': prob * 100,
+        }
+
+    @classmethod
+    def predicted_bonus_probs(cls, alliance_prediction):
+        return [alliance_prediction[key] / 100.0 for key, _, _ in cls.BONUS_RANKING_POINTS]
+
+    @classmethod
+    def actual_bonus_ranking_points(cls, match, alliance_color):
+        breakdown = match.score_breakdown[alliance_color]
+        return sum(int(bool(breakdown[field])) for field in cls.BONUS_RANKING_POINT_FIELDS)
+
+    @classmethod
+    def predicted_tiebreaker(cls, alliance_prediction):
+        return alliance_prediction[cls.TIEBREAKER]
+
+    @classmethod
+    def actual_tiebreaker(cls, match, alliance_color):
+        return cls.actual_quantities(match, alliance_color)[cls.TIEBREAKER]
+
+    @classmethod
+    def get_variances(cls, model_state):
+        variances = dict(cls.DEFAULT_VARIANCES)
+        for quantity, (count, sum_sq) in model_state['residuals'].items():
+            if quantity in variances and count >= cls.MIN_RESIDUALS and sum_sq > 0:
+                variances[quantity] = float(sum_sq) / count
+        return variances
+
+    @classmethod
+    def add_residuals(cls, model_state, match, prediction):
+        """
+        Folds the residuals of a played match's pre-match prediction into model_state
+        """
+        for alliance_color in ['red', 'blue']:
+            for quantity, value in cls.actual_quantities(match, alliance_color).items():
+                if quantity not in cls.DEFAULT_VARIANCES or quantity not in prediction[alliance_color]:
+                    continue
+                count, sum_sq = model_state['residuals'].get(quantity, [0, 0])
+                model_state['residuals'][quantity] = [count + 1, sum_sq + (value - prediction[alliance_color][quantity]) ** 2]
+
+
+class PredictionModel2016(PredictionModel):
+    """
+    FIRST Stronghold: bonus ranking points for breaching the defenses and
+    capturing the tower. Ranking ties are broken by auto points.
+    """
+    STATS = [
+        'oprs',
+        '2016autoPointsOPR',
+        '2016crossingsOPR',
+        '2016bouldersOPR'
+    ]
+
+    DEFAULT_VARIANCES = {
+        'score': 40**2,  # TODO temporary set variance to be huge
+        'boulders': 5**2,
+        'crossings': 4**2,
+    }
+
+    CROSSINGS_TO_BREACH = 8
+    BONUS_RANKING_POINTS = [
+        ('prob_breach', 'crossings', CROSSINGS_TO_BREACH),
+        ('prob_capture', 'boulders', None),  # Tower strength depends on the event
+    ]
+    BONUS_RANKING_POINT_FIELDS = ['teleopDefensesBreached', 'teleopTowerCaptured']
+    REQUIRES_SCORE_BREAKDOWN = True
+
+    TIEBREAKER = 'auto_points'
+
+    @classmethod
+    def predict_quantities(cls, teams, ixoprs, event):
+        return {
+            'score': sum(ixoprs['oprs'][team] for team in teams),
+            'auto_points': sum(ixoprs['2016autoPointsOPR'][team] for team in teams),
+            'boulders': sum(ixoprs['2016bouldersOPR'][team] for team in teams),
+            # Crossing OPR usually underestimates. hacky fix to make numbers more believable
+            'crossings': sum(max(0, ixoprs['2016crossingsOPR'][team]) * 1.2 for team in teams),
+        }
+
+    @classmethod
+    def actual_quantities(cls, match, alliance_color):
+        quantities = {
+            'score': match.alliances[alliance_color]['score'],
+        }
+        if match.score_breakdown and alliance_color in match.score_breakdown:
+            breakdown = match.score_breakdown[alliance_color]
+            quantities['auto_points'] = breakdown.get('autoPoints', 0)
+            quantities['boulders'] = sum(breakdown.get(field, 0) for field in MatchstatsHelper.COMPONENT_STATS['2016bouldersOPR'])
+            quantities['crossings'] = sum(breakdown.get(field, 0) for field in MatchstatsHelper.COMPONENT_STATS['2016crossingsOPR'])
+        return quantities
+
+    @classmethod
+    def predict_alliance(cls, quantities, event, variances):
+        tower_strength = 10 if (event.event_type_enum in EventType.CMP_EVENT_TYPES or event.key.id() == '2016cc') else 8
+
+        # Prob capture
+        mu = quantities['boulders'] - tower_strength
+        prob_capture = 1 - cls._normcdf(-mu / np.sqrt(variances['boulders']))
+
+        # Prob breach
+        mu = quantities['crossings'] - cls.CROSSINGS_TO_BREACH
+        prob_breach = 1 - cls._normcdf(-mu / np.sqrt(variances['crossings']))
+        # Artificially limit prob breach range
+        prob_breach = min(max(prob_breach, 0.1), 0.95)
+
+        prediction = dict(quantities)
+        prediction['prob_capture'] = prob_capture * 100
+        prediction['prob_breach'] = prob_breach * 100
+        return prediction
+
+
+class PredictionModel2017(PredictionModel):
+    """
+    FIRST Steamworks: bonus ranking points for reaching 40 kPa of pressure
+    and turning all 4 rotors. Ranking ties are broken by match points.
+    """
+    FUEL_KPA = {
+        'autoFuelHigh': 1.0,
+        'autoFuelLow': 1.0 / 3,
+        'teleopFuelHigh': 1.0 / 3,
+        'teleopFuelLow': 1.0 / 9,
+    }
+    ROTOR_FIELDS = ['rotor1Engaged', 'rotor2Engaged', 'rotor3Engaged', 'rotor4Engaged']
+
+    STATS = ['oprs'] + \
+        [MatchstatsHelper.COMPONENT_STAT_FORMAT.format(2017, field) for field in sorted(FUEL_KPA.keys())] + \
+        [MatchstatsHelper.COMPONENT_STAT_FORMAT.format(2017, field) for field in ROTOR_FIELDS]
+
+    DEFAULT_VARIANCES = {
+        'score': 40**2,
+        'pressure': 10**2,
+        'rotors': 1**2,
+    }
+
+    BONUS_RANKING_POINTS = [
+        ('prob_pressure', 'pressure', 40),
+        ('prob_rotors', 'rotors', 4),
+    ]
+    BONUS_RANKING_POINT_FIELDS = ['kPaRankingPointAchieved', 'rotorRankingPointAchieved']
+    REQUIRES_SCORE_BREAKDOWN = True
+
+    @classmethod
+    def predict_quantities(cls, teams, ixoprs, event):
+        pressure = 0
+        for field, kpa in cls.FUEL_KPA.items():
+            pressure += kpa * sum(ixoprs[MatchstatsHelper.COMPONENT_STAT_FORMAT.format(2017, field)][team] for team in teams)
+        rotors = 0
+        for field in cls.ROTOR_FIELDS:
+            rotors += sum(ixoprs[MatchstatsHelper.COMPONENT_STAT_FORMAT.format(2017, field)][team] for team in teams)
+
+        return {
+            'score': sum(ixoprs['oprs'][team] for team in teams),
+            'pressure': pressure,
+            'rotors': rotors,
+        }
+
+    @classmethod
+    def actual_quantities(cls, match, alliance_color):
+        quantities = {
+            'score': match.alliances[alliance_color]['score'],
+        }
+        if match.score_breakdown and alliance_color in match.score_breakdown:
+            breakdown = match.score_breakdown[alliance_color]
+            quantities['pressure'] = sum(kpa * breakdown.get(field, 0) for field, kpa in cls.FUEL_KPA.items())
+            quantities['rotors'] = sum(int(bool(breakdown.get(field, False))) for field in cls.ROTOR_FIELDS)
+        return quantities
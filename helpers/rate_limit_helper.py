@@ -0,0 +1,37 @@
+import time
+
+from google.appengine.ext import ndb
+
+
+class RateLimitHelper(object):
+    """
+    A token bucket shared by every instance through memcache.
+    Each bucket holds `rate` tokens and is refilled every second, which
+    memcache can do atomically with an incr on a per-second key.
+    """
+    CACHE_KEY_FORMAT = 'rate_limit_{}_{}'  # (name, second)
+
+    @classmethod
+    @ndb.tasklet
+    def acquire_async(cls, name, rate):
+        """
+        Waits until a token is available in the named bucket and takes it.
+        Doesn't wait if memcache is unavailable.
+        :param name: Name of the bucket, like 'fmsapi'
+        :param rate: Tokens per second
+        """
+        context = ndb.get_context()
+        while True:
+            now = time.time()
+            cache_key = cls.CACHE_KEY_FORMAT.format(name, int(now))
+            count = yield context.memcache_incr(cache_key)
+            if count is None:
+                # First token this second
+                added = yield context.memcache_add(cache_key, 1, time=10)
+                if added:
+                    count = 1
+                else:
+                    count = yield context.memcache_incr(cache_key)
+            if count is None or count <= rate:
+                return
+            yield ndb.sleep(int(now) + 1 - now)
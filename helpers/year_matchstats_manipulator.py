@@ -0,0 +1,35 @@
+from helpers.cache_clearer import CacheClearer
+from helpers.manipulator_base import ManipulatorBase
+
+
+class YearMatchstatsManipulator(ManipulatorBase):
+    """
+    Handle YearMatchstats database writes.
+    """
+    @classmethod
+    def getCacheKeysAndControllers(cls, affected_refs):
+        return CacheClearer.get_year_matchstats_cache_keys_and_controllers(affected_refs)
+
+    @classmethod
+    def updateMerge(self, new_year_matchstats, old_year_matchstats, auto_union=True):
+        """
+        Given an "old" and a "new" YearMatchstats object, replace the fields in the
+        "old" YearMatchstats that are present in the "new" YearMatchstats, but keep
+        fields from the "old" YearMatchstats that are null in the "new" YearMatchstats.
+        """
+        attrs = [
+            'year',
+            'team_list',
+            'stat_types',
+            'event_keys',
+            'stats_blob',
+            'solver_iterations',
+        ]
+
+        for attr in attrs:
+            if getattr(new_year_matchstats, attr) is not None:
+                if getattr(new_year_matchstats, attr) != getattr(old_year_matchstats, attr):
+                    setattr(old_year_matchstats, attr, getattr(new_year_matchstats, attr))
+                    old_year_matchstats.dirty = True
+
+        return old_year_matchstats
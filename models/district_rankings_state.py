@@ -0,0 +1,20 @@
+from google.appengine.ext import ndb
+
+
+class DistrictRankingsState(ndb.Model):
+    """
+    DistrictRankingsState holds per-team district point aggregates, so a
+    change to one event's district points can be applied to the teams at
+    that event instead of recalculating the whole district.
+    key_name is the district key, like '2016ne'
+    """
+    # Keyed by team key. Event entries are sorted in the order events count towards the total. Formatted as:
+    # {'frc254': {'events': [[event sort key, '2016casj', district_cmp, points, tiebreakers], ...],
+    #             'rookie_bonus': 10, 'totals': {'event_points': [...], 'point_total': 90, 'tiebreakers': [...]}}, ...}
+    teams = ndb.JsonProperty(compressed=True)
+
+    event_teams = ndb.JsonProperty(compressed=True)  # Teams with points at each event, like {'2016casj': ['frc254', ...]}
+    order = ndb.JsonProperty()  # Team keys in rank order
+
+    created = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+    updated = ndb.DateTimeProperty(auto_now=True, indexed=False)
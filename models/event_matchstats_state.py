@@ -0,0 +1,46 @@
+import numpy as np
+
+from google.appengine.ext import ndb
+
+
+class EventMatchstatsState(ndb.Model):
+    """
+    EventMatchstatsState holds the working state of the incremental matchstats
+    solver for an event, so each newly played match can be applied as an
+    update instead of recomputing everything from scratch.
+    key_name is the event key, like '2010ct'
+    """
+    team_list = ndb.JsonProperty()  # Row order of minv and rhs, like ['254', '604B', ...]
+    stat_types = ndb.JsonProperty()  # Column order of rhs, like ['oprs', 'dprs', 'ccwms']
+
+    # Per alliance stat rows that have been applied, keyed by match key. Formatted as:
+    # {'2016casj_qm1': {'red': {'teams': ['254', ...], 'stats': [120, 80, 40]}, 'blue': {...}}, ...}
+    alliance_rows = ndb.JsonProperty(compressed=True)
+
+    minv_blob = ndb.BlobProperty(compressed=True)  # Inverse of the normal matrix, float64 n x n. None if M is singular.
+    rhs_blob = ndb.BlobProperty(compressed=True)  # A'B, float64 n x k
+    updates_since_resolve = ndb.IntegerProperty(default=0, indexed=False)
+
+    created = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+    updated = ndb.DateTimeProperty(auto_now=True, indexed=False)
+
+    @property
+    def minv(self):
+        if self.minv_blob is None:
+            return None
+        n = len(self.team_list)
+        return np.fromstring(self.minv_blob, dtype=np.float64).reshape(n, n)
+
+    @minv.setter
+    def minv(self, minv):
+        self.minv_blob = None if minv is None else np.asarray(minv, dtype=np.float64).tostring()
+
+    @property
+    def rhs(self):
+        if self.rhs_blob is None:
+            return None
+        return np.fromstring(self.rhs_blob, dtype=np.float64).reshape(len(self.team_list), len(self.stat_types))
+
+    @rhs.setter
+    def rhs(self, rhs):
+        self.rhs_blob = None if rhs is None else np.asarray(rhs, dtype=np.float64).tostring()
@@ -0,0 +1,19 @@
+from google.appengine.ext import ndb
+
+
+class EventTeamStatuses(ndb.Model):
+    """
+    EventTeamStatuses holds the team@event status of every team at an event
+    in one document, so clients can get them all without loading each
+    EventTeam. The version goes up every time any status changes.
+    key_name is the event key, like '2016nytr'
+    """
+    statuses = ndb.JsonProperty(compressed=True)  # Keyed by team key, same format as EventTeam.status
+    version = ndb.IntegerProperty(default=0, indexed=False)
+
+    created = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+    updated = ndb.DateTimeProperty(auto_now=True, indexed=False)
+
+    @property
+    def etag(self):
+        return '{}_{}'.format(self.key.id(), self.version)
@@ -0,0 +1,16 @@
+from google.appengine.ext import ndb
+
+
+class InsightsAccumulatorShard(ndb.Model):
+    """
+    One shard of the running totals that a year's insights are rendered from.
+    Matches are spread over the shards by a hash of their key so concurrent
+    writers rarely contend for the same entity. A year's shards are summed
+    when rendering.
+    key_name is like '2016_matches_3', or '2016_awards' for a year's award insights partial
+    """
+    state = ndb.JsonProperty(compressed=True)  # Nested dicts of numbers, see InsightsAccumulatorHelper
+    contributions = ndb.JsonProperty(compressed=True)  # Match shards only. {match key name: contribution in state}
+
+    created = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+    updated = ndb.DateTimeProperty(auto_now=True, indexed=False)
@@ -131,6 +131,15 @@ class Match(ndb.Model):
 
         return self._score_breakdown
 
+    @score_breakdown.setter
+    def score_breakdown(self, score_breakdown):
+        """
+        Sets score_breakdown_json to the canonical serialization, with sorted keys,
+        and keeps the parsed dict so it isn't parsed again
+        """
+        self._score_breakdown = score_breakdown
+        self.score_breakdown_json = json.dumps(score_breakdown, sort_keys=True) if score_breakdown is not None else None
+
     @property
     def winning_alliance(self):
         from helpers.event_helper import EventHelper
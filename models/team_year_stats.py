@@ -0,0 +1,27 @@
+from google.appengine.ext import ndb
+
+
+class TeamYearStats(ndb.Model):
+    """
+    TeamYearStats indexes the events a team has matchstats for in a year, in
+    chronological order, with a snapshot of the team's stats at each event.
+    Lets prior-event stats for a whole event be looked up with one batch get.
+    Rebuilt nightly by TeamYearStatsDo, so events show up the day after they're played.
+    key_name is like 'frc254_2016' or 'frc604B_2016'
+    """
+    year = ndb.IntegerProperty(required=True)
+
+    # Sorted by start_date. Formatted as:
+    # [{'event_key': '2016casj', 'start_date': '2016-03-24', 'official': True, 'event_type_enum': 0,
+    #   'stats': {'oprs': 120.5, 'dprs': 40.1, ...}}, ...]
+    events = ndb.JsonProperty(compressed=True)
+
+    created = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+    updated = ndb.DateTimeProperty(auto_now=True, indexed=False)
+
+    @classmethod
+    def renderKeyName(cls, team, year):
+        """
+        team is a matchstats team number like '254' or '604B'
+        """
+        return 'frc{}_{}'.format(team, year)
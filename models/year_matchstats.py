@@ -0,0 +1,52 @@
+import numpy as np
+
+from google.appengine.ext import ndb
+
+
+class YearMatchstats(ndb.Model):
+    """
+    YearMatchstats are OPR/DPR/CCWM and component stats solved together across
+    every official quals match in a year, so teams can be compared across events.
+    key_name is the year, like '2016'
+    """
+    year = ndb.IntegerProperty(required=True)
+    team_list = ndb.JsonProperty(compressed=True)  # Row order of stats_blob, like ['254', '604B', ...]
+    stat_types = ndb.JsonProperty()  # Column order of stats_blob, like ['oprs', 'dprs', 'ccwms']
+    event_keys = ndb.JsonProperty()  # Events included in the solve
+    stats_blob = ndb.BlobProperty(compressed=True)  # float32 n x k
+    solver_iterations = ndb.IntegerProperty(indexed=False)
+
+    created = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+    updated = ndb.DateTimeProperty(auto_now=True, indexed=False)
+
+    def __init__(self, *args, **kw):
+        # store set of affected references referenced keys for cache clearing
+        # keys must be model properties
+        self._affected_references = {
+            'year': set(),
+        }
+        self._stats = None
+        super(YearMatchstats, self).__init__(*args, **kw)
+
+    @property
+    def stats_matrix(self):
+        if self.stats_blob is None:
+            return None
+        return np.fromstring(self.stats_blob, dtype=np.float32).reshape(len(self.team_list), len(self.stat_types))
+
+    @stats_matrix.setter
+    def stats_matrix(self, stats_matrix):
+        self.stats_blob = np.asarray(stats_matrix, dtype=np.float32).tostring()
+        self._stats = None
+
+    @property
+    def stats(self):
+        """
+        Formatted like EventDetails.matchstats: {stat_type: {team: value}}
+        """
+        if self._stats is None and self.stats_blob is not None:
+            X = self.stats_matrix
+            self._stats = {}
+            for k, stat_type in enumerate(self.stat_types):
+                self._stats[stat_type] = dict(zip(self.team_list, X[:, k].tolist()))
+        return self._stats
@@ -0,0 +1,45 @@
+from google.appengine.api import apiproxy_stub
+from google.appengine.api import apiproxy_stub_map
+
+
+class FakeURLFetchStub(apiproxy_stub.APIProxyStub):
+    """
+    Answers urlfetch calls with canned responses instead of the network,
+    and records every request made.
+    Responses with an ETag answer a matching If-None-Match with a 304, and
+    unknown URLs get a 404.
+    """
+    def __init__(self):
+        super(FakeURLFetchStub, self).__init__('urlfetch')
+        self.responses = {}  # url: (status code, content, headers)
+        self.requests = []  # (url, headers) of every fetch, in order
+
+    @classmethod
+    def install(cls):
+        """
+        Registers a new stub with the active testbed, in place of init_urlfetch_stub()
+        """
+        stub = cls()
+        apiproxy_stub_map.apiproxy.RegisterStub('urlfetch', stub)
+        return stub
+
+    def set_response(self, url, content, status_code=200, headers=None):
+        self.responses[url] = (status_code, content, headers or {})
+
+    def requested_urls(self):
+        return [url for url, _ in self.requests]
+
+    def _Dynamic_Fetch(self, request, response):
+        request_headers = dict((header.key(), header.value()) for header in request.header_list())
+        self.requests.append((request.url(), request_headers))
+
+        status_code, content, headers = self.responses.get(request.url(), (404, '', {}))
+        if status_code == 200 and headers.get('ETag') and request_headers.get('If-None-Match') == headers['ETag']:
+            status_code, content = 304, ''
+
+        response.set_statuscode(status_code)
+        response.set_content(content)
+        for key, value in headers.items():
+            header = response.add_header()
+            header.set_key(key)
+            header.set_value(value)
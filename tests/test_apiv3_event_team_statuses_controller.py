@@ -0,0 +1,68 @@
+import json
+import unittest2
+import webapp2
+import webtest
+
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from controllers.apiv3.api_event_controller import ApiEventTeamsStatusesController
+from helpers.event_team_status_helper import EventTeamStatusHelper
+from models.event_team_statuses import EventTeamStatuses
+
+
+class TestApiEventTeamsStatusesController(unittest2.TestCase):
+    def setUp(self):
+        app = webapp2.WSGIApplication([webapp2.Route(r'/<event_key:>', ApiEventTeamsStatusesController, methods=['GET'])], debug=True)
+        self.testapp = webtest.TestApp(app)
+
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_urlfetch_stub()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+        self.statuses = {
+            'frc254': {'qual': {'rank': 1, 'total': 2}, 'alliance': None, 'playoff': None},
+            'frc604': {'qual': {'rank': 2, 'total': 2}, 'alliance': None, 'playoff': None},
+        }
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_update_statuses(self):
+        self.assertTrue(EventTeamStatusHelper.update_event_team_statuses('2016casj', self.statuses))
+        self.assertEqual(EventTeamStatuses.get_by_id('2016casj').version, 1)
+
+        # Unchanged statuses don't bump the version
+        self.assertFalse(EventTeamStatusHelper.update_event_team_statuses('2016casj', self.statuses))
+        self.assertEqual(EventTeamStatuses.get_by_id('2016casj').version, 1)
+
+        self.statuses['frc604']['qual']['rank'] = 1
+        self.assertTrue(EventTeamStatusHelper.update_event_team_statuses('2016casj', self.statuses))
+        self.assertEqual(EventTeamStatuses.get_by_id('2016casj').version, 2)
+
+    def test_etag(self):
+        EventTeamStatusHelper.update_event_team_statuses('2016casj', self.statuses)
+
+        response = self.testapp.get('/2016casj')
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(json.loads(response.body), self.statuses)
+        etag = response.headers['ETag']
+
+        response = self.testapp.get('/2016casj', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(response.body, '')
+
+        self.statuses['frc604']['qual']['rank'] = 1
+        EventTeamStatusHelper.update_event_team_statuses('2016casj', self.statuses)
+        response = self.testapp.get('/2016casj', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_int, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(json.loads(response.body), self.statuses)
+
+    def test_no_statuses(self):
+        response = self.testapp.get('/2016casj')
+        self.assertEqual(json.loads(response.body), {})
+        self.assertFalse('ETag' in response.headers)
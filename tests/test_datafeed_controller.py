@@ -1,17 +1,33 @@
+import json
 import unittest2
 import datetime
+import webapp2
+import webtest
 
+from google.appengine.api import memcache
 from google.appengine.api import urlfetch
+from google.appengine.datastore import datastore_stub_util
 from google.appengine.ext import db
 from google.appengine.ext import ndb
 from google.appengine.ext import testbed
 from google.appengine.ext.webapp import Response
 
 # from controllers.datafeed_controller import UsfirstEventDetailsGet
+from consts.event_type import EventType
+from controllers.datafeed_controller import FMSAPIEventAlliancesGet, FMSAPIEventRankingsGet, FMSAPIMatchesGet, TeamDetailsBatchGet
+from datafeeds.datafeed_fms_api import DatafeedFMSAPI
+from helpers.event_details_manipulator import EventDetailsManipulator
+from helpers.match_manipulator import MatchManipulator
 
 from models.event import Event
+from models.event_details import EventDetails
+from models.match import Match
+from models.robot import Robot
+from models.sitevar import Sitevar
 from models.team import Team
 
+from tests.fake_urlfetch_stub import FakeURLFetchStub
+
 
 class TestUsfirstEventDetailsGet(unittest2.TestCase):
     def setUp(self):
@@ -47,3 +63,167 @@ class TestUsfirstEventDetailsGet(unittest2.TestCase):
     #    frc177 = Team.get_by_id("frc177")
     #    self.assertEqual(frc177.team_number, 177)
     #    self.assertEqual(frc177.first_tpid, 41633)
+
+
+class TestTeamDetailsBatchGet(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub(root_path=".")
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+        self.urlfetch = FakeURLFetchStub.install()
+        self.taskqueue_stub = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+
+        app = webapp2.WSGIApplication([
+            ('/backend-tasks/get/team_details_batch/([0-9]+)/([0-9]+)', TeamDetailsBatchGet),
+        ])
+        self.testapp = webtest.TestApp(app)
+
+        Sitevar(id='fmsapi.secrets', contents={'username': 'user', 'authkey': 'key'}).put()
+        Team(id='frc254', team_number=254, first_tpid=12345, first_tpid_year=2016).put()
+        Team(id='frc1124', team_number=1124).put()
+        Team(id='frc2000', team_number=2000).put()  # Outside the batch
+
+        year = datetime.date.today().year
+        with open('test_data/fms_api/2015_frc254.json', 'r') as f:
+            self.urlfetch.set_response(
+                DatafeedFMSAPI.FMS_API_DOMAIN + '/v2.0/{}/teams/?teamNumber=254'.format(year), f.read())
+        self.urlfetch.set_response(
+            'http://es01.usfirst.org/teams/_search?size=1&source={"query":{"query_string":{"query":"_id:12345"}}}',
+            json.dumps({'hits': {'hits': [{'_id': '12345', '_source': {
+                'team_number_yearly': 254,
+                'team_nickname': 'Poofs',
+                'team_motto': 'Nothing but net',
+            }}]}}))
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_get(self):
+        response = self.testapp.get('/backend-tasks/get/team_details_batch/0/2000')
+        self.assertEqual(response.status_int, 200)
+
+        # FMSAPI is trusted over FIRSTElasticSearch, which fills in the rest
+        team = Team.get_by_id('frc254')
+        self.assertEqual(team.nickname, 'The Cheesy Poofs')
+        self.assertEqual(team.city, 'San Jose')
+        self.assertEqual(team.motto, 'Nothing but net')
+        self.assertEqual(Robot.get_by_id(Robot.renderKeyName('frc254', datetime.date.today().year)).robot_name, 'Deadlift')
+
+        # FMSAPI didn't return frc1124, so it gets its own TeamDetailsGet task
+        tasks = self.taskqueue_stub.get_filtered_tasks(queue_names='datafeed')
+        self.assertEqual([task.url for task in tasks], ['/backend-tasks/get/team_details/frc1124'])
+        self.assertEqual(len([url for url in self.urlfetch.requested_urls() if 'teamNumber=2000' in url]), 0)
+
+
+class TestFMSAPIDatafeedGet(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1)
+        self.testbed.init_datastore_v3_stub(consistency_policy=self.policy)  # For cross-group transactions
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub(root_path=".")
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+        self.urlfetch = FakeURLFetchStub.install()
+
+        app = webapp2.WSGIApplication([
+            ('/tasks/get/fmsapi_event_alliances/(.*)', FMSAPIEventAlliancesGet),
+            ('/tasks/get/fmsapi_event_rankings/(.*)', FMSAPIEventRankingsGet),
+            ('/tasks/get/fmsapi_matches/(.*)', FMSAPIMatchesGet),
+        ])
+        self.testapp = webtest.TestApp(app)
+
+        Sitevar(id='fmsapi.secrets', contents={'username': 'user', 'authkey': 'key'}).put()
+        Event(
+            id="2016nyny",
+            name="NYC Regional",
+            event_type_enum=EventType.REGIONAL,
+            short_name="NYC",
+            event_short="nyny",
+            year=2016,
+            end_date=datetime.datetime(2016, 03, 27),
+            official=True,
+            start_date=datetime.datetime(2016, 03, 24),
+            timezone_id="America/New_York"
+        ).put()
+
+        url_base = DatafeedFMSAPI.FMS_API_DOMAIN + '/v2.0/2016/'
+        self.alliances_url = url_base + 'alliances/nyny'
+        self.rankings_url = url_base + 'rankings/nyny'
+        self.match_urls = [
+            url_base + 'schedule/nyny/qual/hybrid',
+            url_base + 'schedule/nyny/playoff/hybrid',
+            url_base + 'scores/nyny/qual',
+            url_base + 'scores/nyny/playoff',
+        ]
+        for url, file_name in [
+                (self.alliances_url, '2016_nyny_alliances'),
+                (self.match_urls[0], '2016_nyny_hybrid_schedule_qual'),
+                (self.match_urls[1], '2016_nyny_hybrid_schedule_playoff'),
+                (self.match_urls[2], '2016_nyny_qual_breakdown'),
+                (self.match_urls[3], '2016_nyny_playoff_breakdown')]:
+            with open('test_data/fms_api/{}.json'.format(file_name), 'r') as f:
+                self.urlfetch.set_response(url, f.read(), headers={'ETag': '"{}"'.format(file_name)})
+        self.urlfetch.set_response(self.rankings_url, json.dumps({'Rankings': [{
+            'rank': rank,
+            'teamNumber': team_number,
+            'sortOrder1': 40 - rank, 'sortOrder2': 100, 'sortOrder3': 50, 'sortOrder4': 20, 'sortOrder5': 10, 'sortOrder6': 0,
+            'wins': 9 - rank, 'losses': rank, 'ties': 0,
+            'qualAverage': 0, 'dq': 0, 'matchesPlayed': 9,
+        } for rank, team_number in [(1, 375), (2, 1796)]]}), headers={'ETag': '"rankings"'})
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def _get(self, url, status=200):
+        return self.testapp.get(url, headers={'X-Appengine-Taskname': 'test'}, status=status)
+
+    def _fail_merges(self, manipulator):
+        def create_or_update(cls, *args, **kwargs):
+            raise Exception("Merge failed")
+        manipulator.createOrUpdate = classmethod(create_or_update)
+        self.addCleanup(delattr, manipulator, 'createOrUpdate')
+
+    def _saved_validators(self, url):
+        return memcache.get(DatafeedFMSAPI._validators_cache_key(url))
+
+    def test_alliances_validators_saved_after_merge(self):
+        self._get('/tasks/get/fmsapi_event_alliances/2016nyny')
+        self.assertEqual(len(EventDetails.get_by_id('2016nyny').alliance_selections), 8)
+        self.assertEqual(self._saved_validators(self.alliances_url)['etag'], '"2016_nyny_alliances"')
+
+    def test_alliances_validators_not_saved_if_merge_fails(self):
+        self._fail_merges(EventDetailsManipulator)
+        self._get('/tasks/get/fmsapi_event_alliances/2016nyny', status=500)
+        self.assertIsNone(self._saved_validators(self.alliances_url))
+
+    def test_rankings_validators_saved_after_merge(self):
+        self._get('/tasks/get/fmsapi_event_rankings/2016nyny')
+        self.assertIsNotNone(EventDetails.get_by_id('2016nyny').rankings)
+        self.assertEqual(self._saved_validators(self.rankings_url)['etag'], '"rankings"')
+
+    def test_rankings_validators_not_saved_if_merge_fails(self):
+        self._fail_merges(EventDetailsManipulator)
+        self._get('/tasks/get/fmsapi_event_rankings/2016nyny', status=500)
+        self.assertIsNone(self._saved_validators(self.rankings_url))
+
+    def test_matches_validators_saved_after_merge(self):
+        self._get('/tasks/get/fmsapi_matches/2016nyny')
+        self.assertEqual(Match.query(Match.event == ndb.Key(Event, '2016nyny')).count(), 88 + 15)
+        for url in self.match_urls:
+            self.assertIsNotNone(self._saved_validators(url))
+
+        # Nothing changed, so the next poll only gets 304s
+        self._get('/tasks/get/fmsapi_matches/2016nyny')
+        self.assertEqual(len(self.urlfetch.requests), 2 * len(self.match_urls))
+        for url, headers in self.urlfetch.requests[len(self.match_urls):]:
+            self.assertIn('If-None-Match', headers)
+
+    def test_matches_validators_not_saved_if_merge_fails(self):
+        self._fail_merges(MatchManipulator)
+        self._get('/tasks/get/fmsapi_matches/2016nyny', status=500)
+        for url in self.match_urls:
+            self.assertIsNone(self._saved_validators(url))
@@ -0,0 +1,185 @@
+import json
+import unittest2
+from datetime import datetime
+
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from consts.event_type import EventType
+from datafeeds.datafeed_fms_api import DatafeedFMSAPI
+from datafeeds.parsers.fms_api.fms_api_event_alliances_parser import FMSAPIEventAlliancesParser
+from datafeeds.parsers.fms_api.fms_api_team_details_parser import FMSAPITeamDetailsParser
+from models.event import Event
+from models.sitevar import Sitevar
+
+from tests.fake_urlfetch_stub import FakeURLFetchStub
+
+
+class TestDatafeedFMSAPI(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+        self.urlfetch = FakeURLFetchStub.install()
+
+        Sitevar(id='fmsapi.secrets', contents={'username': 'user', 'authkey': 'key'}).put()
+        self.datafeed = DatafeedFMSAPI('v2.0')
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def _team_url(self, team_number):
+        return self.datafeed.FMS_API_TEAM_DETAILS_URL_PATTERN % (2017, team_number)
+
+    def _team_json(self, team_number):
+        return json.dumps({
+            'teams': [{
+                'teamNumber': team_number,
+                'nameFull': 'Team {} Sponsors'.format(team_number),
+                'nameShort': 'Team {}'.format(team_number),
+                'city': 'San Jose',
+                'stateProv': 'California',
+                'country': 'USA',
+                'website': None,
+                'rookieYear': 2000,
+                'districtCode': None,
+                'robotName': None,
+            }],
+            'pageCurrent': 1,
+            'pageTotal': 1,
+        })
+
+    def test_parse_pool(self):
+        self.datafeed.MAX_IN_FLIGHT = 3
+        team_numbers = range(1, 11)
+        for team_number in team_numbers:
+            if team_number != 5:
+                self.urlfetch.set_response(self._team_url(team_number), self._team_json(team_number))
+
+        results = self.datafeed._parse_pool([
+            (self._team_url(team_number), FMSAPITeamDetailsParser(2017)) for team_number in team_numbers])
+
+        # Results come back in order, with None for the fetch that failed
+        self.assertEqual(len(results), len(team_numbers))
+        for team_number, result in zip(team_numbers, results):
+            if team_number == 5:
+                self.assertIsNone(result)
+            else:
+                models, more_pages = result
+                self.assertEqual(models[0][0].key.id(), 'frc{}'.format(team_number))
+                self.assertFalse(more_pages)
+        self.assertEqual(sorted(self.urlfetch.requested_urls()), sorted(self._team_url(team_number) for team_number in team_numbers))
+
+    def test_parse_pool_empty(self):
+        self.assertEqual(self.datafeed._parse_pool([]), [])
+        self.assertEqual(self.urlfetch.requests, [])
+
+    def test_get_team_details_multi(self):
+        self.urlfetch.set_response(self._team_url(254), self._team_json(254))
+
+        team_details = self.datafeed.getTeamDetailsMulti(2017, ['frc254', 'frc604'])
+        team, district_team, robot = team_details['frc254']
+        self.assertEqual(team.nickname, 'Team 254')
+        self.assertIsNone(team_details['frc604'])
+
+    def _set_nyny_responses(self, datafeed):
+        """
+        Returns the schedule and details URLs of 2016nyny, in getMatches order
+        """
+        Event(
+            id="2016nyny",
+            name="NYC Regional",
+            event_type_enum=EventType.REGIONAL,
+            short_name="NYC",
+            event_short="nyny",
+            year=2016,
+            end_date=datetime(2016, 03, 27),
+            official=True,
+            start_date=datetime(2016, 03, 24),
+            timezone_id="America/New_York"
+        ).put()
+
+        urls_and_files = [
+            (datafeed.FMS_API_HYBRID_SCHEDULE_QUAL_URL_PATTERN % (2016, 'nyny'), '2016_nyny_hybrid_schedule_qual'),
+            (datafeed.FMS_API_HYBRID_SCHEDULE_PLAYOFF_URL_PATTERN % (2016, 'nyny'), '2016_nyny_hybrid_schedule_playoff'),
+            (datafeed.FMS_API_MATCH_DETAILS_QUAL_URL_PATTERN % (2016, 'nyny'), '2016_nyny_qual_breakdown'),
+            (datafeed.FMS_API_MATCH_DETAILS_PLAYOFF_URL_PATTERN % (2016, 'nyny'), '2016_nyny_playoff_breakdown'),
+        ]
+        for url, file_name in urls_and_files:
+            with open('test_data/fms_api/{}.json'.format(file_name), 'r') as f:
+                self.urlfetch.set_response(url, f.read(), headers={'ETag': '"{}"'.format(file_name)})
+        return [url for url, _ in urls_and_files]
+
+    def test_coalesced_fetch(self):
+        url = self.datafeed.FMS_API_EVENT_ALLIANCES_URL_PATTERN % (2016, 'nyny')
+        with open('test_data/fms_api/2016_nyny_alliances.json', 'r') as f:
+            self.urlfetch.set_response(url, f.read())
+
+        alliances, same_alliances = self.datafeed._parse_multi([
+            (url, FMSAPIEventAlliancesParser()),
+            (url, FMSAPIEventAlliancesParser()),
+        ])
+        self.assertEqual(len(alliances), 8)
+        self.assertEqual(alliances, same_alliances)
+        self.assertEqual(self.urlfetch.requested_urls(), [url])
+
+        # A conditional fetch of the same URL is a different request
+        self.datafeed._parse(url, FMSAPIEventAlliancesParser(), conditional=True)
+        self.assertEqual(self.urlfetch.requested_urls(), [url, url])
+
+    def test_conditional_fetch(self):
+        url = self.datafeed.FMS_API_EVENT_ALLIANCES_URL_PATTERN % (2016, 'nyny')
+        with open('test_data/fms_api/2016_nyny_alliances.json', 'r') as f:
+            content = f.read()
+        self.urlfetch.set_response(url, content, headers={'ETag': '"1"'})
+
+        self.assertEqual(len(self.datafeed.getEventAlliances('2016nyny')), 8)
+
+        # Nothing was saved yet, so the next datafeed fetches everything again
+        self.assertEqual(len(DatafeedFMSAPI('v2.0').getEventAlliances('2016nyny')), 8)
+        self.assertNotIn('If-None-Match', self.urlfetch.requests[-1][1])
+
+        self.datafeed.save_validators()
+        datafeed = DatafeedFMSAPI('v2.0')
+        self.assertIs(datafeed._parse(url, FMSAPIEventAlliancesParser(), conditional=True), DatafeedFMSAPI.NOT_MODIFIED)
+        self.assertEqual(self.urlfetch.requests[-1][1]['If-None-Match'], '"1"')
+        self.assertEqual(datafeed.bytes_saved, len(content))
+
+    def test_not_modified_without_validators(self):
+        url = self.datafeed.FMS_API_EVENT_ALLIANCES_URL_PATTERN % (2016, 'nyny')
+        self.urlfetch.set_response(url, '', status_code=304)
+
+        self.assertIs(self.datafeed._parse(url, FMSAPIEventAlliancesParser(), conditional=True), DatafeedFMSAPI.NOT_MODIFIED)
+        self.assertEqual(self.datafeed.bytes_saved, 0)
+
+    def test_get_matches_not_modified(self):
+        urls = self._set_nyny_responses(self.datafeed)
+        matches = self.datafeed.getMatches('2016nyny')
+        self.assertEqual(len(matches), 88 + 15)
+        self.datafeed.save_validators()
+
+        datafeed = DatafeedFMSAPI('v2.0')
+        self.assertEqual(datafeed.getMatches('2016nyny'), [])
+        self.assertEqual(self.urlfetch.requested_urls(), urls + urls)
+
+    def test_get_matches_partial_refetch(self):
+        urls = self._set_nyny_responses(self.datafeed)
+        matches = self.datafeed.getMatches('2016nyny')
+        self.datafeed.save_validators()
+
+        # Only the qual scores changed
+        status_code, content, headers = self.urlfetch.responses[urls[2]]
+        self.urlfetch.set_response(urls[2], content, headers={'ETag': '"changed"'})
+
+        datafeed = DatafeedFMSAPI('v2.0')
+        refetched_matches = datafeed.getMatches('2016nyny')
+
+        # The unchanged schedules and details are refetched unconditionally, so they can be merged
+        self.assertEqual(self.urlfetch.requested_urls(), urls + urls + [urls[0], urls[1], urls[3]])
+        for url, headers in self.urlfetch.requests[-3:]:
+            self.assertNotIn('If-None-Match', headers)
+        self.assertEqual(
+            sorted((match.key.id(), match.score_breakdown_json) for match in refetched_matches),
+            sorted((match.key.id(), match.score_breakdown_json) for match in matches))
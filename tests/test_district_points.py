@@ -0,0 +1,73 @@
+import unittest2
+from appengine_fixture_loader.loader import load_fixture
+from google.appengine.ext import testbed
+from google.appengine.ext import ndb
+
+from helpers.district_helper import DistrictHelper
+from models.event import Event
+from models.event_details import EventDetails
+from models.match import Match
+
+
+class TestDistrictPoints(unittest2.TestCase):
+    def event_key_adder(self, obj):
+        obj.event = ndb.Key(Event, '2016nytr')
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+        load_fixture('test_data/fixtures/2016nytr_event_team_status.json',
+                      kind={'EventDetails': EventDetails, 'Event': Event, 'Match': Match},
+                      post_processor=self.event_key_adder)
+        self.event = Event.get_by_id('2016nytr')
+        self.assertIsNotNone(self.event)
+
+        # Legacy style rankings table for rank-based qual points
+        event_details = EventDetails.get_by_id('2016nytr')
+        event_details.rankings = [['Rank', 'Team']] + [
+            [ranking['rank'], ranking['team_key'][3:]] for ranking in event_details.rankings2]
+        event_details.put()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_qual_points_table(self):
+        for num_teams in [24, 40, 64]:
+            table = DistrictHelper.qual_points_table(num_teams)
+            self.assertEqual(len(table), num_teams + 1)
+            self.assertEqual(table[1], 22)
+            self.assertEqual(table[1:], sorted(table[1:], reverse=True))
+            for rank in xrange(1, num_teams + 1):
+                self.assertEqual(table[rank], DistrictHelper._qual_points(num_teams, rank))
+        self.assertEqual(DistrictHelper.qual_points_table(40)[40], 4)
+
+    def test_event_points(self):
+        district_points = DistrictHelper.calculate_event_points(self.event)
+
+        num_teams = len(self.event.rankings) - 1
+        table = DistrictHelper.qual_points_table(num_teams)
+        for rank, team_number in self.event.rankings[1:]:
+            team_points = district_points['points']['frc{}'.format(team_number)]
+            self.assertEqual(team_points['qual_points'], table[rank])
+            self.assertEqual(
+                team_points['total'],
+                team_points['qual_points'] + team_points['elim_points'] + team_points['alliance_points'] + team_points['award_points'])
+
+        for team, tiebreakers in district_points['tiebreakers'].items():
+            self.assertTrue(len(tiebreakers['highest_qual_scores']) <= 3)
+            self.assertEqual(tiebreakers['highest_qual_scores'], sorted(tiebreakers['highest_qual_scores'], reverse=True))
+
+        # Elim winners get points
+        self.assertTrue(any(team_points['elim_points'] > 0 for team_points in district_points['points'].values()))
+
+    def test_batch_matches_single(self):
+        single = DistrictHelper.calculate_event_points(self.event)
+        ndb.get_context().clear_cache()
+        batch = DistrictHelper.calculate_events_points([Event.get_by_id('2016nytr')])
+        self.assertEqual(batch.keys(), ['2016nytr'])
+        self.assertEqual(dict(batch['2016nytr']['points']), dict(single['points']))
+        self.assertEqual(dict(batch['2016nytr']['tiebreakers']), dict(single['tiebreakers']))
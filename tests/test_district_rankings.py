@@ -0,0 +1,103 @@
+import datetime
+import random
+import unittest2
+from google.appengine.ext import testbed
+from google.appengine.ext import ndb
+
+from consts.event_type import EventType
+from helpers.district_helper import DistrictHelper
+from helpers.event_helper import EventHelper
+from models.event import Event
+from models.event_details import EventDetails
+from models.team import Team
+
+
+class TestDistrictRankings(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+        self.rand = random.Random(0)
+        self.teams = [
+            Team(id='frc{}'.format(i + 1), team_number=i + 1, rookie_year=self.rand.choice([2016, 2015, 2010]))
+            for i in xrange(30)]
+        self.events = []
+        for i in xrange(6):
+            start_date = datetime.datetime(2016, 3, 1) + datetime.timedelta(days=7 * (i / 2))
+            event = Event(
+                id='2016ev{}'.format(i),
+                year=2016,
+                event_short='ev{}'.format(i),
+                event_type_enum=EventType.DISTRICT_CMP if i == 5 else EventType.DISTRICT,
+                start_date=start_date,
+                end_date=start_date + datetime.timedelta(days=2),
+            )
+            event._details = EventDetails(id=event.key.id(), district_points=None)
+            self.events.append(event)
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def _set_random_points(self, event):
+        points = {}
+        tiebreakers = {}
+        for team in self.rand.sample(self.teams, 15):
+            qual_points = self.rand.randint(0, 22)
+            elim_points = self.rand.choice([0, 10, 20, 30])
+            alliance_points = self.rand.randint(0, 16)
+            points[team.key.id()] = {
+                'qual_points': qual_points,
+                'elim_points': elim_points,
+                'alliance_points': alliance_points,
+                'award_points': 0,
+                'total': qual_points + elim_points + alliance_points,
+            }
+            tiebreakers[team.key.id()] = {
+                'qual_wins': self.rand.randint(0, 10),
+                'highest_qual_scores': sorted(self.rand.randint(0, 200) for _ in xrange(3)),
+            }
+        event.details.district_points = {'points': points, 'tiebreakers': tiebreakers}
+
+    def _rankings_from_scratch(self):
+        events = list(self.events)
+        EventHelper.sort_events(events)
+        team_totals = DistrictHelper.calculate_rankings(events, self.teams, 2016)
+        return [(key, totals['point_total']) for key, totals in team_totals]
+
+    def test_incremental_matches_full(self):
+        rankings_state = DistrictHelper.build_rankings_state('2016ne', self.events, self.teams, 2016)
+
+        for _ in xrange(20):
+            event = self.rand.choice(self.events)
+            self._set_random_points(event)
+            self.assertTrue(DistrictHelper.update_rankings_state(rankings_state, event))
+
+            rankings = DistrictHelper.render_rankings(rankings_state)
+            rebuilt_state = DistrictHelper.build_rankings_state('2016ne', self.events, self.teams, 2016)
+            self.assertEqual(rankings, DistrictHelper.render_rankings(rebuilt_state))
+            self.assertEqual(
+                sorted((ranking['team_key'], ranking['point_total']) for ranking in rankings),
+                sorted(self._rankings_from_scratch()))
+            self.assertEqual([ranking['rank'] for ranking in rankings], range(1, len(rankings) + 1))
+
+        # Unchanged points don't change the state
+        self.assertFalse(DistrictHelper.update_rankings_state(rankings_state, event))
+
+    def test_only_first_two_events_and_cmp_count(self):
+        for event in self.events:
+            event.details.district_points = {
+                'points': {'frc1': {'qual_points': 10, 'elim_points': 0, 'alliance_points': 0, 'award_points': 0, 'total': 10}},
+                'tiebreakers': {},
+            }
+        self.teams[0].rookie_year = 2000
+        rankings_state = DistrictHelper.build_rankings_state('2016ne', self.events, self.teams, 2016)
+        rankings = dict((ranking['team_key'], ranking) for ranking in DistrictHelper.render_rankings(rankings_state))
+
+        self.assertEqual(rankings['frc1']['point_total'], 30)
+        self.assertEqual(
+            [event_points['event_key'] for event_points in rankings['frc1']['event_points']],
+            ['2016ev0', '2016ev1', '2016ev5'])
+        self.assertTrue(rankings['frc1']['event_points'][2]['district_cmp'])
@@ -116,6 +116,16 @@ class TestEventController(unittest2.TestCase):
         response = self.testapp.get("/event/2016necmp/insights")
         self.assertEqual(response.status_int, 200)
 
+    def testEventInsightsCurrentYear(self):
+        response = self.testapp.get("/event/{}necmp/insights".format(datetime.now().year))
+        self.assertEqual(response.status_int, 200)
+
     def testEventInsightsNotFound(self):
         response = self.testapp.get("/event/2016meow/insights", status=404)
         self.assertEqual(response.status_int, 404)
+
+    def testEventInsightsNoPredictions(self):
+        self.event1_details.predictions = None
+        self.event1_details.put()
+        response = self.testapp.get("/event/2016necmp/insights", status=404)
+        self.assertEqual(response.status_int, 404)
@@ -360,6 +360,22 @@ class Test2016nytrEventTeamStatusHelper(unittest2.TestCase):
         status = EventTeamStatusHelper.generate_team_at_event_status('frc1124', self.event)
         self.assertDictEqual(status, self.status_1124)
 
+    def testAllTeams(self):
+        statuses = EventTeamStatusHelper.generate_event_team_statuses(
+            self.event, ['frc359', 'frc5240', 'frc229', 'frc1665', 'frc5964', 'frc1124'])
+        self.assertDictEqual(statuses['frc359'], self.status_359)
+        self.assertDictEqual(statuses['frc5240'], self.status_5240)
+        self.assertDictEqual(statuses['frc229'], self.status_229)
+        self.assertDictEqual(statuses['frc1665'], self.status_1665)
+        self.assertDictEqual(statuses['frc5964'], self.status_5964)
+        self.assertDictEqual(statuses['frc1124'], self.status_1124)
+
+        # Statuses don't share objects
+        statuses['frc359']['qual']['ranking_sort_orders'][0]['value'] = None
+        statuses['frc359']['playoff']['record']['wins'] = None
+        self.assertDictEqual(EventTeamStatusHelper.generate_team_at_event_status('frc5240', self.event), self.status_5240)
+        self.assertDictEqual(statuses['frc5240'], self.status_5240)
+
 
 class Test2016nytrEventTeamStatusHelperNoEventDetails(unittest2.TestCase):
     status_359 = {
@@ -0,0 +1,72 @@
+import unittest2
+from google.appengine.ext import testbed
+from google.appengine.ext import ndb
+
+from helpers.fms_api_health_helper import FMSAPIHealthHelper
+from models.sitevar import Sitevar
+
+
+class TestFMSAPIHealthHelper(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+        FMSAPIHealthHelper._is_down = None  # Drop in-memory state from other tests
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def _is_down_sitevar_contents(self):
+        sitevar = Sitevar.get_by_id('apistatus.fmsapi_down')
+        return sitevar.contents if sitevar else None
+
+    def test_hysteresis(self):
+        for _ in xrange(FMSAPIHealthHelper.FAILURES_TO_DOWN - 1):
+            FMSAPIHealthHelper.record_response(0.1, 500)
+        self.assertFalse(FMSAPIHealthHelper.is_down())
+        self.assertIsNone(self._is_down_sitevar_contents())
+
+        # A success breaks the streak
+        FMSAPIHealthHelper.record_response(0.1, 200)
+        for _ in xrange(FMSAPIHealthHelper.FAILURES_TO_DOWN - 1):
+            FMSAPIHealthHelper.record_response(0.1)
+        self.assertFalse(FMSAPIHealthHelper.is_down())
+
+        FMSAPIHealthHelper.record_response(0.1, 503)
+        self.assertTrue(FMSAPIHealthHelper.is_down())
+        self.assertEqual(self._is_down_sitevar_contents(), True)
+
+        # Other errors don't count either way
+        for _ in xrange(FMSAPIHealthHelper.SUCCESSES_TO_UP):
+            FMSAPIHealthHelper.record_response(0.1, 404)
+        self.assertTrue(FMSAPIHealthHelper.is_down())
+
+        for _ in xrange(FMSAPIHealthHelper.SUCCESSES_TO_UP - 1):
+            FMSAPIHealthHelper.record_response(0.1, 304)
+        self.assertTrue(FMSAPIHealthHelper.is_down())
+        FMSAPIHealthHelper.record_response(0.1, 200)
+        self.assertFalse(FMSAPIHealthHelper.is_down())
+        self.assertEqual(self._is_down_sitevar_contents(), False)
+
+    def test_state_shared_through_memcache(self):
+        for _ in xrange(FMSAPIHealthHelper.FAILURES_TO_DOWN):
+            FMSAPIHealthHelper.record_response(0.1, 500)
+        FMSAPIHealthHelper._is_down = None  # Another instance
+        self.assertTrue(FMSAPIHealthHelper.is_down())
+
+    def test_metrics(self):
+        FMSAPIHealthHelper.record_response(0.1, 200)
+        FMSAPIHealthHelper.record_response(0.3, 200)
+        FMSAPIHealthHelper.record_response(0.2, 500)
+        FMSAPIHealthHelper.record_response(0.2, 404)
+
+        metrics = FMSAPIHealthHelper.get_metrics()
+        self.assertEqual(metrics['requests'], 4)
+        self.assertEqual(metrics['errors'], 1)
+        self.assertAlmostEqual(metrics['error_rate'], 0.25)
+        self.assertAlmostEqual(metrics['average_latency_ms'], 200)
+        self.assertEqual(metrics['consecutive_failures'], 1)
+        self.assertFalse(metrics['is_down'])
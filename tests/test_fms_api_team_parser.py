@@ -2,7 +2,7 @@ import datetime
 import json
 import unittest2
 
-from datafeeds.parsers.fms_api.fms_api_team_details_parser import FMSAPITeamDetailsParser
+from datafeeds.parsers.fms_api.fms_api_team_details_parser import FMSAPITeamDetailsParser, FMSAPITeamDetailsPageParser
 
 from google.appengine.ext import ndb
 from google.appengine.ext import testbed
@@ -114,3 +114,12 @@ class TestFMSAPITeamParser(unittest2.TestCase):
                 self.assertEqual(team.country, "USA")
                 self.assertEqual(team.rookie_year, 2003)
                 self.assertEqual(team.website, expected)
+
+    def test_parsePageTotal(self):
+        with open('test_data/fms_api/2015_frc1124.json', 'r') as f:
+            response = json.loads(f.read())
+            models, total_pages = FMSAPITeamDetailsPageParser(2015).parse(response)
+
+            self.assertEqual(total_pages, response['pageTotal'])
+            self.assertEqual(len(models), 1)
+            self.assertEqual(models[0][0].key_name, "frc1124")
@@ -0,0 +1,75 @@
+import unittest2
+
+from datafeeds.html_table_backends import BeautifulSoupTableBackend, LxmlTableBackend, etree
+from datafeeds.parser_base import ParserBase
+from datafeeds.usfirst_alliances_parser import UsfirstAlliancesParser
+from datafeeds.usfirst_event_awards_parser import UsfirstEventAwardsParser
+from datafeeds.usfirst_event_awards_parser_02 import UsfirstEventAwardsParser_02
+from datafeeds.usfirst_event_awards_parser_03_04 import UsfirstEventAwardsParser_03_04
+from datafeeds.usfirst_event_rankings_parser import UsfirstEventRankingsParser
+from datafeeds.usfirst_match_schedule_parser import UsfirstMatchScheduleParser
+from datafeeds.usfirst_matches_parser import UsfirstMatchesParser
+from datafeeds.usfirst_matches_parser_2002 import UsfirstMatchesParser2002
+from datafeeds.usfirst_matches_parser_2003 import UsfirstMatchesParser2003
+
+
+@unittest2.skipIf(etree is None, "lxml isn't installed")
+class TestHtmlTableBackends(unittest2.TestCase):
+    PARSER_PAGES = [
+        (UsfirstAlliancesParser, ['matches_2014curie', 'matches_2014test']),
+        (UsfirstEventRankingsParser, ['rankings_2012ct', 'rankings_2012ct_bad', 'rankings_2014casj']),
+        (UsfirstMatchesParser, ['matches_2012ct', 'matches_2013cama', 'matches_2013casd', 'matches_2014test']),
+        (UsfirstMatchScheduleParser, ['match_schedule_2013casj_qual', 'match_schedule_2014cmp_elim']),
+        (UsfirstMatchesParser2002, ['matches_2002sj', 'matches_2002tx', 'matches_2002va']),
+        (UsfirstMatchesParser2003, ['matches_2003cmp', 'matches_2003sj']),
+        (UsfirstEventAwardsParser, ['awards_2007sj', 'awards_2012galileo', 'awards_2013cmp']),
+        (UsfirstEventAwardsParser_02, ['awards_2002sj']),
+        (UsfirstEventAwardsParser_03_04, ['awards_2003cmp', 'awards_2004sj']),
+    ]
+
+    def setUp(self):
+        self.table_backend = ParserBase.TABLE_BACKEND
+
+    def tearDown(self):
+        ParserBase.TABLE_BACKEND = self.table_backend
+
+    def _parse(self, parser, html, backend):
+        ParserBase.TABLE_BACKEND = backend
+        return parser.parse(html)
+
+    def test_same_output_as_beautifulsoup(self):
+        for parser, pages in self.PARSER_PAGES:
+            for page in pages:
+                with open('test_data/usfirst_html/usfirst_event_{}.html'.format(page), 'r') as f:
+                    html = f.read()
+                self.assertEqual(
+                    self._parse(parser, html, LxmlTableBackend),
+                    self._parse(parser, html, BeautifulSoupTableBackend),
+                    "{} differs on {}".format(parser.__name__, page))
+
+    def test_only_wanted_tables(self):
+        html = '<html><body><table id="a"></table><table id="b"><tr><td>1</td></tr></table><table id="c"></table></body></html>'
+        tables = LxmlTableBackend.find_tables(html, [1])
+        self.assertIsNone(tables[0])
+        self.assertEqual(tables[1].findAll('td')[0].string, '1')
+
+    def test_nested_tables(self):
+        html = '<table><tr><td><table><tr><td>inner</td></tr></table></td></tr></table>'
+        tables = LxmlTableBackend.find_tables(html, [0, 1])
+        self.assertEqual(len(tables[0].findAll('table')), 1)
+        self.assertEqual(tables[1].findAll('td')[0].string, 'inner')
+
+    def test_whitespace_like_beautifulsoup(self):
+        html = '<table><tr>\n  <td> a </td>  <td><b>b</b></td></tr></table>'
+        lxml_tr = LxmlTableBackend.find_tables(html, [0])[0].findAll('tr')[0]
+        soup_tr = BeautifulSoupTableBackend.find_tables(html, [0])[0].findAll('tr')[0]
+        self.assertEqual(
+            [unicode(content) if isinstance(content, basestring) else content.name for content in lxml_tr.contents],
+            [unicode(content) if isinstance(content, basestring) else content.name for content in soup_tr.contents])
+        self.assertEqual(lxml_tr.findAll('td')[0].string, u' a ')
+        self.assertIsNone(lxml_tr.findAll('td')[1].string)
+
+    def test_falls_back_without_enough_tables(self):
+        html = '<html><body><table><tr><td>only</td></tr></table></body></html>'
+        self.assertEqual(len(LxmlTableBackend.find_tables(html, [2])), 1)
+        self.assertEqual(LxmlTableBackend.find_tables('', [0]), [])
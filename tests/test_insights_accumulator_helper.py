@@ -0,0 +1,152 @@
+import json
+import unittest2
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import testbed
+from google.appengine.ext import ndb
+
+from helpers.insights_accumulator_helper import InsightsAccumulatorHelper
+from models.event import Event
+from models.match import Match
+
+
+class TestInsightsAccumulatorHelper(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1)
+        self.testbed.init_datastore_v3_stub(consistency_policy=self.policy)  # For cross-group transactions
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub(root_path=".")
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def _match(self, comp_level, match_number, red_score, blue_score):
+        return Match(
+            id=Match.renderKeyName('2016test', comp_level, 1, match_number),
+            event=ndb.Key(Event, '2016test'),
+            year=2016,
+            comp_level=comp_level,
+            set_number=1,
+            match_number=match_number,
+            alliances_json=json.dumps({
+                'red': {'teams': ['frc1', 'frc2', 'frc3'], 'score': red_score},
+                'blue': {'teams': ['frc4', 'frc5', 'frc6'], 'score': blue_score},
+            }),
+        )
+
+    def test_match_contribution(self):
+        self.assertEqual(
+            InsightsAccumulatorHelper.match_contribution(self._match('sf', 1, 40, 40)),
+            {'2016test': {
+                'score_sum': 80,
+                'num_matches': 1,
+                'elim_score_sum': 80,
+                'elim_num_matches': 1,
+                'max_scores': {'40': {'2016test_sf1m1': 1}},
+                'score_counts': {'40': 2},
+                'elim_score_counts': {'40': 2},
+            }})
+
+        # Unplayed matches only count towards the averages
+        self.assertEqual(
+            InsightsAccumulatorHelper.match_contribution(self._match('qm', 1, -1, -1)),
+            {'2016test': {'score_sum': -2, 'num_matches': 1}})
+
+    def _expected_state(self, matches):
+        expected = {}
+        for match in matches:
+            InsightsAccumulatorHelper.add_into(expected, InsightsAccumulatorHelper.match_contribution(match))
+        return expected
+
+    def test_update_matches(self):
+        matches = [self._match('qm', i + 1, -1, -1) for i in xrange(3)]
+        ndb.put_multi(matches)
+        InsightsAccumulatorHelper.update_matches([match.key for match in matches])
+        self.assertEqual(InsightsAccumulatorHelper.get_state(2016), self._expected_state(matches))
+
+        # Scores come in for one match
+        match = matches[0]
+        match.alliances_json = json.dumps({
+            'red': {'teams': ['frc1', 'frc2', 'frc3'], 'score': 50},
+            'blue': {'teams': ['frc4', 'frc5', 'frc6'], 'score': 20},
+        })
+        match._alliances = None
+        match.put()
+        InsightsAccumulatorHelper.update_matches([match.key])
+
+        # Retried hooks and racing writers apply the same update again
+        InsightsAccumulatorHelper.update_matches([match.key])
+        InsightsAccumulatorHelper.update_matches([match.key, match.key])
+
+        expected = self._expected_state(matches)
+        self.assertEqual(InsightsAccumulatorHelper.get_state(2016), expected)
+        self.assertEqual(expected['2016test']['max_scores'], {'50': {'2016test_qm1': 1}})
+
+        match_contributions = dict((match.key_name, InsightsAccumulatorHelper.match_contribution(match)) for match in matches)
+        self.assertTrue(InsightsAccumulatorHelper.check_state(2016, match_contributions))
+
+        # Deleted matches are taken out
+        matches[1].key.delete()
+        InsightsAccumulatorHelper.update_matches([matches[1].key])
+        InsightsAccumulatorHelper.update_matches([matches[1].key])
+        self.assertEqual(InsightsAccumulatorHelper.get_state(2016), self._expected_state([matches[0], matches[2]]))
+
+    def test_check_state(self):
+        matches = [self._match('qm', i + 1, 10 * i, 5) for i in xrange(3)]
+        ndb.put_multi(matches)
+        match_contributions = dict((match.key_name, InsightsAccumulatorHelper.match_contribution(match)) for match in matches)
+
+        # Drifted shards are reset to the full recompute, along with what each match last applied
+        self.assertFalse(InsightsAccumulatorHelper.check_state(2016, match_contributions))
+        self.assertEqual(InsightsAccumulatorHelper.get_state(2016), self._expected_state(matches))
+        self.assertTrue(InsightsAccumulatorHelper.check_state(2016, match_contributions))
+
+        InsightsAccumulatorHelper.update_matches([match.key for match in matches])
+        self.assertEqual(InsightsAccumulatorHelper.get_state(2016), self._expected_state(matches))
+
+    def test_check_state_keeps_concurrent_updates(self):
+        matches = [self._match('qm', i + 1, 10 * i, 5) for i in xrange(20)]
+        ndb.put_multi(matches)
+        InsightsAccumulatorHelper.update_matches([match.key for match in matches])
+        match_contributions = dict((match.key_name, InsightsAccumulatorHelper.match_contribution(match)) for match in matches)
+
+        # A match is corrected after the full recompute read it
+        match = matches[0]
+        match.alliances_json = json.dumps({
+            'red': {'teams': ['frc1', 'frc2', 'frc3'], 'score': 99},
+            'blue': {'teams': ['frc4', 'frc5', 'frc6'], 'score': 20},
+        })
+        match._alliances = None
+        match.put()
+        InsightsAccumulatorHelper.update_matches([match.key])
+
+        # And every shard has drifted
+        for shard in ndb.get_multi(InsightsAccumulatorHelper._shard_keys(2016)):
+            if shard is not None:
+                shard.state = {}
+                shard.put()
+
+        self.assertFalse(InsightsAccumulatorHelper.check_state(2016, match_contributions))
+        self.assertEqual(InsightsAccumulatorHelper.get_state(2016), self._expected_state(matches))
+        self.assertEqual(InsightsAccumulatorHelper.get_state(2016)['2016test']['max_scores']['99'], {'2016test_qm1': 1})
+
+    def test_award_partials(self):
+        InsightsAccumulatorHelper.set_award_partial(2015, {'blue_banners': {'frc254': 2, 'frc971': 1}})
+        InsightsAccumulatorHelper.set_award_partial(2016, {'blue_banners': {'frc254': 1}})
+        self.assertIsNone(InsightsAccumulatorHelper.get_overall_award_partial())
+
+        partials = InsightsAccumulatorHelper.get_award_partials([2014, 2015, 2016])
+        self.assertIsNone(partials[2014])
+        overall = {}
+        for partial in partials.values():
+            if partial is not None:
+                InsightsAccumulatorHelper.add_into(overall, partial)
+        InsightsAccumulatorHelper.set_overall_award_partial(overall)
+
+        # Replacing a year's partial swaps it in the merge
+        InsightsAccumulatorHelper.set_award_partial(2015, {'blue_banners': {'frc971': 1}, 'years_with_elim_teamups': 1})
+        self.assertEqual(
+            InsightsAccumulatorHelper.get_overall_award_partial(),
+            {'blue_banners': {'frc254': 1, 'frc971': 1}, 'years_with_elim_teamups': 1})
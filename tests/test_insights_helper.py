@@ -0,0 +1,113 @@
+import datetime
+import json
+import unittest2
+from google.appengine.ext import testbed
+from google.appengine.ext import ndb
+
+from consts.event_type import EventType
+from helpers.insights_accumulator_helper import InsightsAccumulatorHelper
+from helpers.insights_helper import InsightsHelper
+from models.event import Event
+from models.insight import Insight
+from models.match import Match
+
+
+class TestInsightsHelper(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+        # (event short, event type, start date, [(comp level, red score, blue score), ...])
+        events = [
+            ('wk1a', EventType.REGIONAL, datetime.datetime(2015, 3, 5), [('qm', 50, 40), ('qm', 80, 10), ('f', 70, 60)]),
+            ('wk1b', EventType.REGIONAL, datetime.datetime(2015, 3, 6), [('qm', 20, 80), ('qm', -1, -1)]),
+            ('wk2a', EventType.DISTRICT, datetime.datetime(2015, 3, 12), [('qm', 30, 30), ('sf', 100, 90)]),
+            ('off', EventType.OFFSEASON, datetime.datetime(2015, 8, 1), [('qm', 500, 0)]),
+        ]
+        for event_short, event_type, start_date, results in events:
+            event = Event(
+                id='2015{}'.format(event_short),
+                year=2015,
+                event_short=event_short,
+                event_type_enum=event_type,
+                official=event_type != EventType.OFFSEASON,
+                start_date=start_date,
+                end_date=start_date + datetime.timedelta(days=2),
+            )
+            event.put()
+            for i, (comp_level, red_score, blue_score) in enumerate(results):
+                Match(
+                    id=Match.renderKeyName(event.key.id(), comp_level, 1, i + 1),
+                    event=event.key,
+                    year=2015,
+                    comp_level=comp_level,
+                    set_number=1,
+                    match_number=i + 1,
+                    team_key_names=[],
+                    alliances_json=json.dumps({
+                        'red': {'teams': ['frc1', 'frc2', 'frc3'], 'score': red_score},
+                        'blue': {'teams': ['frc4', 'frc5', 'frc6'], 'score': blue_score},
+                    }),
+                ).put()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def _insights_data(self):
+        ndb.get_context().clear_cache()
+        return dict((insight.name, insight.data) for insight in InsightsHelper.doMatchInsights(2015))
+
+    def test_match_insights(self):
+        insights = self._insights_data()
+
+        highscores_by_week = insights[Insight.INSIGHT_NAMES[Insight.MATCH_HIGHSCORE_BY_WEEK]]
+        self.assertEqual(
+            [(week, [match['key_name'] for match in matches]) for week, matches in highscores_by_week],
+            [('Week 1', ['2015wk1a_qm2', '2015wk1b_qm1']), ('Week 2', ['2015wk2a_sf1m2'])])
+        self.assertEqual(
+            [match['key_name'] for match in insights[Insight.INSIGHT_NAMES[Insight.MATCH_HIGHSCORE]]],
+            ['2015wk2a_sf1m2'])
+
+        # Unplayed matches count towards the averages
+        self.assertEqual(
+            insights[Insight.INSIGHT_NAMES[Insight.MATCH_AVERAGES_BY_WEEK]],
+            [['Week 1', (90 + 90 + 130 + 100 - 2) / 10.0], ['Week 2', 250 / 4.0]])
+        self.assertEqual(
+            insights[Insight.INSIGHT_NAMES[Insight.ELIM_MATCH_AVERAGES_BY_WEEK]],
+            [['Week 1', 65.0], ['Week 2', 95.0]])
+        self.assertEqual(insights[Insight.INSIGHT_NAMES[Insight.NUM_MATCHES]], 7)
+
+        # Played matches only, in bins of 5 points
+        score_distribution = insights[Insight.INSIGHT_NAMES[Insight.SCORE_DISTRIBUTION]]
+        self.assertAlmostEqual(sum(score_distribution.values()), 100.0)
+        self.assertAlmostEqual(score_distribution['82.5'], 2 * 100.0 / 12)
+        elim_score_distribution = insights[Insight.INSIGHT_NAMES[Insight.ELIM_SCORE_DISTRIBUTION]]
+        self.assertEqual(sorted(float(score) for score in elim_score_distribution.keys()), [62.5, 72.5, 92.5, 102.5])
+
+        self.assertFalse(Insight.INSIGHT_NAMES[Insight.YEAR_SPECIFIC] in insights)
+
+    def test_paging(self):
+        insights = self._insights_data()
+        page_size = InsightsHelper.MATCH_PAGE_SIZE
+        try:
+            InsightsHelper.MATCH_PAGE_SIZE = 2
+            self.assertEqual(self._insights_data(), insights)
+        finally:
+            InsightsHelper.MATCH_PAGE_SIZE = page_size
+
+    def test_from_accumulator_state(self):
+        match_contributions = {}
+        ndb.get_context().clear_cache()
+        insights = InsightsHelper.doMatchInsights(2015, match_contributions)
+        accumulator_state = {}
+        for contribution in match_contributions.values():
+            InsightsAccumulatorHelper.add_into(accumulator_state, contribution)
+        self.assertEqual(sorted(accumulator_state.keys()), ['2015off', '2015wk1a', '2015wk1b', '2015wk2a'])
+
+        state_insights = InsightsHelper.doMatchInsightsFromState(2015, accumulator_state)
+        self.assertEqual(
+            [(insight.name, insight.data) for insight in state_insights],
+            [(insight.name, insight.data) for insight in insights])
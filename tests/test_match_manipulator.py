@@ -107,3 +107,26 @@ class TestMatchManipulator(unittest2.TestCase):
 
     def test_updateMerge_no_auto_union(self):
         self.assertMergedMatch(MatchManipulator.updateMerge(self.new_match, self.old_match, auto_union=False), False)
+
+    def test_updateMerge_score_breakdown(self):
+        self.new_match.score_breakdown = {
+            'red': {'auto': 80, 'assist': 40, 'truss+catch': 20, 'teleop_goal+foul': 20},
+            'blue': {'auto': 40, 'assist': 60, 'truss+catch': 10, 'teleop_goal+foul': 40},
+        }
+        self.assertEqual(json.loads(self.new_match.score_breakdown_json), self.new_match.score_breakdown)
+
+        match = MatchManipulator.updateMerge(self.new_match, self.old_match)
+        self.assertIn('score_breakdown_json', match._updated_attrs)
+        self.assertEqual(match.score_breakdown_json, self.new_match.score_breakdown_json)
+        self.assertIs(match.score_breakdown, self.new_match.score_breakdown)
+
+    def test_updateMerge_same_score_breakdown(self):
+        # Stored before score breakdowns were serialized canonically
+        self.old_match.score_breakdown_json = json.dumps(json.loads(self.old_match.score_breakdown_json), indent=2)
+        self.new_match.score_breakdown = json.loads(self.old_match.score_breakdown_json)
+        self.assertNotEqual(self.new_match.score_breakdown_json, self.old_match.score_breakdown_json)
+        self.new_match.alliances_json = self.old_match.alliances_json
+        self.new_match.youtube_videos = self.old_match.youtube_videos
+
+        match = MatchManipulator.updateMerge(self.new_match, self.old_match)
+        self.assertEqual(match._updated_attrs, [])
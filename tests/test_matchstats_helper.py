@@ -0,0 +1,228 @@
+import datetime
+import numpy as np
+
+import unittest2
+from appengine_fixture_loader.loader import load_fixture
+from google.appengine.ext import testbed
+from google.appengine.ext import ndb
+
+from consts.event_type import EventType
+from helpers.matchstats_helper import MatchstatsHelper
+from models.event import Event
+from models.event_matchstats_state import EventMatchstatsState
+from models.match import Match
+from models.team_year_stats import TeamYearStats
+
+
+class TestMatchstatsHelper(unittest2.TestCase):
+    def event_key_adder(self, obj):
+        obj.event = ndb.Key(Event, '2016nytr')
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+        load_fixture('test_data/fixtures/2016nytr_event_team_status.json',
+                      kind={'Event': Event, 'Match': Match},
+                      post_processor=self.event_key_adder)
+        self.event = Event.get_by_id('2016nytr')
+        self.assertIsNotNone(self.event)
+        self.matches = self.event.matches
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def _legacy_stats(self, matches, stat_types):
+        team_list, team_id_map = MatchstatsHelper.build_team_mapping(matches)
+        Minv = MatchstatsHelper.build_Minv_matrix(matches, team_id_map, played_only=True)
+        stats = {}
+        for stat_type in stat_types:
+            stats[stat_type] = MatchstatsHelper.calc_stat(matches, team_list, team_id_map, Minv, stat_type)
+        return stats
+
+    def _assertStatsAlmostEqual(self, stats1, stats2):
+        self.assertEqual(set(stats1.keys()), set(stats2.keys()))
+        for stat_type in stats1.keys():
+            self.assertEqual(set(stats1[stat_type].keys()), set(stats2[stat_type].keys()))
+            for team, value in stats1[stat_type].items():
+                self.assertAlmostEqual(value, stats2[stat_type][team], places=6)
+
+    def test_normal_matrix(self):
+        team_list, team_id_map = MatchstatsHelper.build_team_mapping(self.matches)
+        n = len(team_list)
+
+        M_legacy = np.zeros([n, n])
+        for match in self.matches:
+            if match.comp_level != 'qm':
+                continue
+            for alliance_color in ['red', 'blue']:
+                for team1 in match.alliances[alliance_color]['teams']:
+                    for team2 in match.alliances[alliance_color]['teams']:
+                        M_legacy[team_id_map[team1[3:]], team_id_map[team2[3:]]] += 1
+
+        alliance_teams, _ = MatchstatsHelper.build_alliance_incidence(self.matches, team_id_map)
+        M = MatchstatsHelper.build_normal_matrix(alliance_teams, n)
+        self.assertTrue(np.array_equal(M, M_legacy))
+
+    def test_matches_legacy_all_played(self):
+        stat_types = MatchstatsHelper.DEFAULT_STATS
+        team_list, team_id_map = MatchstatsHelper.build_team_mapping(self.matches)
+        stats = MatchstatsHelper.calc_stats(self.matches, team_list, team_id_map, stat_types)
+        self._assertStatsAlmostEqual(stats, self._legacy_stats(self.matches, stat_types))
+
+    def test_matches_legacy_partially_played(self):
+        # Unplay all but the first few quals matches so M is rank deficient
+        for match in self.matches:
+            if match.comp_level == 'qm' and match.match_number > 5:
+                match.alliances['red']['score'] = -1
+                match.alliances['blue']['score'] = -1
+
+        stat_types = MatchstatsHelper.DEFAULT_STATS
+        team_list, team_id_map = MatchstatsHelper.build_team_mapping(self.matches)
+        stats = MatchstatsHelper.calc_stats(self.matches, team_list, team_id_map, stat_types)
+        self._assertStatsAlmostEqual(stats, self._legacy_stats(self.matches, stat_types))
+
+    def test_component_stats(self):
+        # Give every quals match a score breakdown
+        for match in self.matches:
+            if match.comp_level != 'qm':
+                continue
+            match._score_breakdown = {}
+            for alliance_color in ['red', 'blue']:
+                score = match.alliances[alliance_color]['score']
+                match._score_breakdown[alliance_color] = {
+                    'autoPoints': score / 4,
+                    'autoBouldersHigh': score / 10,
+                    'teleopBouldersLow': score % 10,
+                    'position1crossings': 2,
+                    'teleopTowerCaptured': score > 80,
+                    'towerFaceA': 'Challenged',
+                }
+
+        team_list, team_id_map = MatchstatsHelper.build_team_mapping(self.matches)
+        stats = MatchstatsHelper.calc_stats(self.matches, team_list, team_id_map, year=2016)
+
+        # Every numeric field gets a component OPR, strings are skipped
+        for field in ['autoPoints', 'autoBouldersHigh', 'teleopBouldersLow', 'position1crossings', 'teleopTowerCaptured']:
+            self.assertIn('2016{}OPR'.format(field), stats)
+        self.assertNotIn('2016towerFaceAOPR', stats)
+
+        legacy_stat_types = MatchstatsHelper.DEFAULT_STATS + MatchstatsHelper.YEAR_STATS[2016]
+        legacy_stats = self._legacy_stats(self.matches, legacy_stat_types)
+        for stat_type in legacy_stat_types:
+            for team, value in legacy_stats[stat_type].items():
+                self.assertAlmostEqual(stats[stat_type][team], value, places=6)
+
+        # Component OPRs are linear, so they add up like the fields do
+        for team in team_list:
+            self.assertAlmostEqual(
+                stats['2016bouldersOPR'][team],
+                stats['2016autoBouldersHighOPR'][team] + stats['2016teleopBouldersLowOPR'][team],
+                places=6)
+
+    def test_solve_normal_equations_singular(self):
+        M = np.array([[2.0, 1.0, 0.0], [1.0, 2.0, 0.0], [0.0, 0.0, 0.0]])
+        S = np.array([[3.0, 1.0], [3.0, 2.0], [0.0, 0.0]])
+        X = MatchstatsHelper.solve_normal_equations(M, S)
+        self.assertTrue(np.allclose(X, np.dot(np.linalg.pinv(M), S)))
+
+    def test_incremental_matches_full_solve(self):
+        qual_matches = sorted([match for match in self.matches if match.comp_level == 'qm'], key=lambda m: m.match_number)
+        scores = {}
+        for match in qual_matches:
+            scores[match.key.id()] = (match.alliances['red']['score'], match.alliances['blue']['score'])
+            match.alliances['red']['score'] = -1
+            match.alliances['blue']['score'] = -1
+
+        stat_types = MatchstatsHelper.DEFAULT_STATS + MatchstatsHelper.YEAR_STATS[2016]
+        state = None
+        for match in qual_matches:
+            match.alliances['red']['score'], match.alliances['blue']['score'] = scores[match.key.id()]
+            stats, state = MatchstatsHelper.calculate_matchstats_incremental(self.matches, 2016, state)
+
+            team_list, team_id_map = MatchstatsHelper.build_team_mapping(self.matches)
+            self._assertStatsAlmostEqual(stats, MatchstatsHelper.calc_stats(self.matches, team_list, team_id_map, stat_types))
+
+        # Score corrections to already applied matches
+        qual_matches[0].alliances['red']['score'] += 10
+        stats, state = MatchstatsHelper.calculate_matchstats_incremental(self.matches, 2016, state)
+        self._assertStatsAlmostEqual(stats, MatchstatsHelper.calc_stats(self.matches, team_list, team_id_map, stat_types))
+
+    def test_incremental_state_roundtrip(self):
+        _, state = MatchstatsHelper.calculate_matchstats_incremental(self.matches, 2016)
+        state.put()
+
+        stored_state = EventMatchstatsState.get_by_id('2016nytr')
+        self.assertEqual(stored_state.team_list, state.team_list)
+        self.assertTrue(np.array_equal(stored_state.minv, state.minv))
+        self.assertTrue(np.array_equal(stored_state.rhs, state.rhs))
+
+    def test_cg_matches_direct_solve(self):
+        stat_types = MatchstatsHelper.DEFAULT_STATS
+        team_list, team_id_map = MatchstatsHelper.build_team_mapping(self.matches)
+        n = len(team_list)
+        alliance_teams, alliances = MatchstatsHelper.build_alliance_incidence(self.matches, team_id_map, played_only=True)
+        alliance_values = MatchstatsHelper.build_alliance_values(alliances)
+        S = MatchstatsHelper.build_rhs_matrix(alliance_teams, MatchstatsHelper.build_stat_matrix(alliance_values, stat_types, 2016), n)
+
+        X_direct = MatchstatsHelper.solve_normal_equations(MatchstatsHelper.build_normal_matrix(alliance_teams, n), S)
+        X_cg, iterations = MatchstatsHelper.solve_normal_equations_cg(alliance_teams, S, n)
+        self.assertTrue(np.allclose(X_cg, X_direct, atol=1e-5))
+
+        # Warm starting from the solution converges immediately
+        _, iterations = MatchstatsHelper.solve_normal_equations_cg(alliance_teams, S, n, X0=X_direct)
+        self.assertLessEqual(iterations, 1)
+
+    def test_year_matchstats(self):
+        stats, state = MatchstatsHelper.calculate_matchstats_incremental(self.matches, 2016)
+        state.put()
+
+        year_matchstats = MatchstatsHelper.calculate_year_matchstats(2016, [state, None])
+        self.assertEqual(year_matchstats.key.id(), '2016')
+        self.assertEqual(year_matchstats.event_keys, ['2016nytr'])
+        for stat_type, values in stats.items():
+            for team, value in values.items():
+                self.assertAlmostEqual(year_matchstats.stats[stat_type][team], value, places=2)
+
+    def _prior_event(self, event_short, start_date, official=True, event_type_enum=EventType.REGIONAL):
+        event = Event(
+            id='2016{}'.format(event_short),
+            event_short=event_short,
+            event_type_enum=event_type_enum,
+            start_date=start_date,
+            end_date=start_date + datetime.timedelta(days=2),
+            year=2016,
+            official=official,
+        )
+        event.put()
+        return event
+
+    def test_last_event_stats(self):
+        early = self._prior_event('nyny', self.event.start_date - datetime.timedelta(days=21))
+        late = self._prior_event('ctha', self.event.start_date - datetime.timedelta(days=7))
+        offseason = self._prior_event('off', self.event.start_date - datetime.timedelta(days=3), official=False)
+        future = self._prior_event('nyro', self.event.start_date + datetime.timedelta(days=7))
+
+        # Indexed out of order, as events finish in any order
+        changed = MatchstatsHelper.update_team_year_stats([
+            (late, {'oprs': {'20': 30.0}, 'dprs': {'20': 5.0}}),
+            (future, {'oprs': {'20': 90.0, '5254': 40.0}}),
+            (early, {'oprs': {'20': 10.0, '5254': 20.0}}),
+            (offseason, {'oprs': {'20': 70.0}}),
+        ])
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(
+            [event['event_key'] for event in TeamYearStats.get_by_id('frc20_2016').events],
+            ['2016nyny', '2016ctha', '2016off', '2016nyro'])
+
+        # Rewriting the same stats doesn't touch the index
+        self.assertEqual(MatchstatsHelper.update_team_year_stats([(early, {'oprs': {'20': 10.0, '5254': 20.0}})]), [])
+
+        last_event_stats = MatchstatsHelper.get_last_event_stats(['20', '5254', '250'], self.event.key)
+        self.assertEqual(dict(last_event_stats), {
+            'oprs': {'20': 30.0, '5254': 20.0},
+            'dprs': {'20': 5.0},
+        })
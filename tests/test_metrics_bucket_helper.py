@@ -0,0 +1,40 @@
+import unittest2
+from google.appengine.ext import testbed
+
+from helpers.metrics_bucket_helper import MetricsBucketHelper
+
+
+class TestMetricsBucketHelper(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_record(self):
+        MetricsBucketHelper.record('a:', 3, 1, 0.6)
+        counts = MetricsBucketHelper.record('a:', 1, 0, 0.2, other_offsets={'streak': 1})
+        self.assertEqual(counts['streak'], 1)
+
+        metrics = MetricsBucketHelper.get_metrics('a:')
+        self.assertEqual(metrics['requests'], 4)
+        self.assertEqual(metrics['errors'], 1)
+        self.assertAlmostEqual(metrics['error_rate'], 0.25)
+        self.assertAlmostEqual(metrics['average_latency_ms'], 200)
+
+    def test_get_metrics_multi(self):
+        MetricsBucketHelper.record('a:', 2, 0, 0.2)
+        MetricsBucketHelper.record('b:', 1, 1, 0.5)
+
+        metrics = MetricsBucketHelper.get_metrics_multi(['a:', 'b:', 'c:'], minutes=5)
+        self.assertEqual(metrics['a:']['requests'], 2)
+        self.assertEqual(metrics['b:']['errors'], 1)
+        self.assertEqual(metrics['c:'], {
+            'minutes': 5,
+            'requests': 0,
+            'errors': 0,
+            'error_rate': 0,
+            'average_latency_ms': 0,
+        })
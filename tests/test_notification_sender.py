@@ -0,0 +1,71 @@
+import BaseHTTPServer
+import hashlib
+import json
+import threading
+import unittest2
+
+from google.appengine.ext import testbed
+
+from helpers.notification_sender import NotificationSender
+
+
+class WebhookRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((self.path, self.headers['X-TBA-Checksum'], body))
+        self.send_response(404 if self.path == '/gone' else 200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestNotificationSender(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_urlfetch_stub()
+
+        self.server = BaseHTTPServer.HTTPServer(('localhost', 0), WebhookRequestHandler)
+        self.server.received = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://localhost:{}'.format(self.server.server_port)
+
+        self.message = {'message_type': 'ping', 'message_data': {'title': 'Test', 'desc': 'Test'}}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.testbed.deactivate()
+
+    def test_send_webhook(self):
+        keys = [('{}/hook{}'.format(self.url, i), 'secret{}'.format(i % 2)) for i in range(NotificationSender.MAX_CONCURRENT_WEBHOOKS + 5)]
+        self.assertTrue(NotificationSender.send_webhook(self.message, keys))
+
+        payload = json.dumps(self.message, ensure_ascii=True)
+        self.assertEqual(len(self.server.received), len(keys))
+        for path, checksum, body in self.server.received:
+            secret = 'secret{}'.format(int(path[len('/hook'):]) % 2)
+            self.assertEqual(body, payload)
+            self.assertEqual(checksum, hashlib.sha1(secret + payload).hexdigest())
+
+        metrics = NotificationSender.get_webhook_metrics('ping')
+        self.assertEqual(metrics['requests'], len(keys))
+        self.assertEqual(metrics['errors'], 0)
+
+    def test_send_webhook_invalid(self):
+        keys = [('{}/ok'.format(self.url), 'secret'), ('{}/gone'.format(self.url), 'secret')]
+        self.assertFalse(NotificationSender.send_webhook(self.message, keys))
+        self.assertEqual(NotificationSender.send_webhooks(self.message, keys), ['{}/gone'.format(self.url)])
+
+        metrics = NotificationSender.get_webhook_metrics('ping')
+        self.assertEqual(metrics['requests'], 4)
+        self.assertEqual(metrics['errors'], 2)
+        self.assertEqual(NotificationSender.get_webhook_metrics('match_score')['requests'], 0)
+
+        all_metrics = dict(NotificationSender.get_all_webhook_metrics())
+        self.assertEqual(all_metrics['ping'], metrics)
+        self.assertEqual(all_metrics['match_score']['requests'], 0)
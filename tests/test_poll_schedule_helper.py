@@ -0,0 +1,95 @@
+import datetime
+import json
+import unittest2
+from google.appengine.ext import testbed
+from google.appengine.ext import ndb
+
+from helpers.poll_schedule_helper import PollScheduleHelper
+from models.event import Event
+from models.match import Match
+
+
+class TestPollScheduleHelper(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+        # 10 quals scheduled 7 minutes apart, with a break after the 5th
+        self.start = datetime.datetime(2016, 3, 5, 16, 0)
+        self.matches = []
+        for i in xrange(10):
+            time = self.start + datetime.timedelta(minutes=7 * i)
+            if i >= 5:
+                time += datetime.timedelta(hours=1)
+            self.matches.append(Match(
+                id=Match.renderKeyName('2016nytr', 'qm', 1, i + 1),
+                event=ndb.Key(Event, '2016nytr'),
+                year=2016,
+                comp_level='qm',
+                set_number=1,
+                match_number=i + 1,
+                team_key_names=[],
+                time=time,
+                alliances_json=json.dumps({
+                    'red': {'teams': ['frc1', 'frc2', 'frc3'], 'score': -1},
+                    'blue': {'teams': ['frc4', 'frc5', 'frc6'], 'score': -1},
+                }),
+            ))
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def _play(self, num_matches, delay):
+        for match in self.matches[:num_matches]:
+            match.alliances_json = json.dumps({
+                'red': {'teams': ['frc1', 'frc2', 'frc3'], 'score': 50},
+                'blue': {'teams': ['frc4', 'frc5', 'frc6'], 'score': 40},
+            })
+            match._alliances = None
+            match.actual_time = match.time + delay if match.time else None
+
+    def test_waits_for_next_result(self):
+        delay = datetime.timedelta(minutes=10)
+        self._play(2, delay)
+        expected_result_time = self.matches[2].time + delay + PollScheduleHelper.RESULTS_DELAY
+        self.assertEqual(PollScheduleHelper.expected_result_time(self.matches), expected_result_time)
+
+        now = self.matches[1].actual_time + datetime.timedelta(minutes=5)
+        self.assertEqual(PollScheduleHelper.next_poll_time(self.matches, now), expected_result_time)
+
+        # Every minute once the result is due
+        now = expected_result_time + datetime.timedelta(seconds=30)
+        self.assertEqual(PollScheduleHelper.next_poll_time(self.matches, now), now + PollScheduleHelper.MIN_INTERVAL)
+
+        # Backs off once it's long overdue
+        now = expected_result_time + datetime.timedelta(minutes=40)
+        self.assertEqual(PollScheduleHelper.next_poll_time(self.matches, now), now + datetime.timedelta(minutes=10))
+
+    def test_break(self):
+        self._play(5, datetime.timedelta(0))
+        now = self.matches[4].actual_time + datetime.timedelta(minutes=10)
+        self.assertEqual(PollScheduleHelper.next_poll_time(self.matches, now), now + PollScheduleHelper.MAX_INTERVAL)
+
+    def test_no_schedule(self):
+        now = self.start
+        self.assertEqual(PollScheduleHelper.next_poll_time([], now), now + PollScheduleHelper.IDLE_INTERVAL)
+
+        self._play(10, datetime.timedelta(0))
+        self.assertEqual(PollScheduleHelper.next_poll_time(self.matches, now), now + PollScheduleHelper.IDLE_INTERVAL)
+
+    def test_no_times(self):
+        for match in self.matches:
+            match.time = None
+        now = self.start
+        self.assertEqual(PollScheduleHelper.next_poll_time(self.matches, now), now + PollScheduleHelper.MIN_INTERVAL)
+
+        # Falls back to the cycle time of played matches
+        self._play(3, datetime.timedelta(0))
+        for i, match in enumerate(self.matches[:3]):
+            match.actual_time = self.start + datetime.timedelta(minutes=6 * i)
+        self.assertEqual(
+            PollScheduleHelper.expected_result_time(self.matches),
+            self.start + datetime.timedelta(minutes=18) + PollScheduleHelper.RESULTS_DELAY)
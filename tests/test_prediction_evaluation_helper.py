@@ -0,0 +1,83 @@
+import json
+import unittest2
+from google.appengine.ext import testbed
+from google.appengine.ext import ndb
+
+from helpers.prediction_evaluation_helper import PredictionEvaluationHelper
+from models.event import Event
+from models.match import Match
+
+
+class TestPredictionEvaluationHelper(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+        # (red score, blue score, predicted winner, prob, red breached)
+        results = [
+            (50, 40, 'red', 80, True),
+            (30, 40, 'red', 60, False),
+            (45, 45, 'blue', 55, False),
+            (-1, -1, 'blue', 90, False),  # Unplayed
+        ]
+        self.matches = []
+        self.predictions = {}
+        for i, (red_score, blue_score, winner, prob, breached) in enumerate(results):
+            match = Match(
+                id=Match.renderKeyName('2016test', 'qm', 1, i + 1),
+                event=ndb.Key(Event, '2016test'),
+                year=2016,
+                comp_level='qm',
+                set_number=1,
+                match_number=i + 1,
+                alliances_json=json.dumps({
+                    'red': {'teams': ['frc1', 'frc2', 'frc3'], 'score': red_score},
+                    'blue': {'teams': ['frc4', 'frc5', 'frc6'], 'score': blue_score},
+                }),
+                score_breakdown_json=json.dumps({
+                    'red': {'teleopDefensesBreached': breached, 'teleopTowerCaptured': False},
+                    'blue': {'teleopDefensesBreached': False, 'teleopTowerCaptured': False},
+                }),
+            )
+            self.matches.append(match)
+            self.predictions[match.key.id()] = {
+                'winning_alliance': winner,
+                'prob': prob,
+                'red': {'score': 0, 'prob_breach': 50, 'prob_capture': 10},
+                'blue': {'score': 0, 'prob_breach': 50, 'prob_capture': 10},
+            }
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_evaluate(self):
+        model_state = {'residuals': {'score': [6, 600.0]}}
+        evaluation = PredictionEvaluationHelper.evaluate_match_predictions(self.matches, self.predictions, model_state)
+        summary = PredictionEvaluationHelper.summarize(evaluation)
+
+        self.assertEqual(summary['matches'], 3)
+        self.assertAlmostEqual(summary['wl_accuracy'], 100.0 / 3)
+        self.assertEqual(summary['wl_accuracy_75'], 100.0)
+        # Red win probabilities 0.8, 0.6 and 0.45 against outcomes 1, 0 and a tie
+        self.assertAlmostEqual(summary['brier'], (0.2 ** 2 + 0.6 ** 2 + 0.05 ** 2) / 3)
+        self.assertAlmostEqual(summary['bonus_brier']['prob_breach'], 0.25)
+        self.assertAlmostEqual(summary['bonus_brier']['prob_capture'], 0.01)
+        self.assertEqual(summary['variances'], {'score': 100.0})
+
+        buckets = dict((bucket['bucket'], bucket) for bucket in summary['calibration'])
+        self.assertEqual(buckets['50-60']['count'], 1)
+        self.assertEqual(buckets['50-60']['observed'], 0)
+        self.assertEqual(buckets['60-70']['count'], 1)
+        self.assertEqual(buckets['80-90']['count'], 1)
+        self.assertAlmostEqual(buckets['80-90']['predicted'], 80)
+        self.assertIsNone(buckets['70-80']['predicted'])
+
+    def test_merge(self):
+        evaluations = [
+            PredictionEvaluationHelper.evaluate_match_predictions([match], self.predictions)
+            for match in self.matches]
+        merged = PredictionEvaluationHelper.merge_evaluations(evaluations)
+        self.assertEqual(merged, PredictionEvaluationHelper.evaluate_match_predictions(self.matches, self.predictions))
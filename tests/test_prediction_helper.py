@@ -0,0 +1,203 @@
+import unittest2
+from appengine_fixture_loader.loader import load_fixture
+from google.appengine.ext import testbed
+from google.appengine.ext import ndb
+
+from helpers.match_helper import MatchHelper
+from helpers.matchstats_helper import MatchstatsHelper
+from helpers.prediction_helper import PredictionHelper
+from helpers.prediction_models import PredictionModel, PredictionModel2016, PredictionModel2017
+from models.event import Event
+from models.match import Match
+
+
+class TestPredictionHelper(unittest2.TestCase):
+    def event_key_adder(self, obj):
+        obj.event = ndb.Key(Event, '2016nytr')
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+        load_fixture('test_data/fixtures/2016nytr_event_team_status.json',
+                      kind={'Event': Event, 'Match': Match},
+                      post_processor=self.event_key_adder)
+        self.event = Event.get_by_id('2016nytr')
+        self.assertIsNotNone(self.event)
+        self.matches = MatchHelper.organizeMatches(self.event.matches)['qm']
+
+        # Give quals matches a score breakdown, except one, and unplay the second half
+        for match in self.matches:
+            if match.match_number == 3:
+                continue
+            match._score_breakdown = {}
+            for alliance_color in ['red', 'blue']:
+                score = match.alliances[alliance_color]['score']
+                match._score_breakdown[alliance_color] = {
+                    'autoPoints': score / 4,
+                    'autoBouldersHigh': score / 10,
+                    'teleopBouldersLow': score % 10,
+                    'position1crossings': 2,
+                    'position4crossings': score % 3,
+                }
+        for match in self.matches[len(self.matches) / 2:]:
+            match.alliances['red']['score'] = -1
+            match.alliances['blue']['score'] = -1
+
+        team_list, _ = MatchstatsHelper.build_team_mapping(self.matches)
+        self.last_event_stats = {
+            'oprs': dict((team, 20.0 + i) for i, team in enumerate(team_list[::2])),
+            '2016bouldersOPR': dict((team, 3.0) for team in team_list[::3]),
+        }
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def _legacy_ixoprs(self, matches, team_list, team_id_map, last_event_stats):
+        """
+        ixOPRs the way they were computed before calc_ixoprs: every stat and
+        pass rebuilds s from all matches
+        """
+        Minv = MatchstatsHelper.build_Minv_matrix(matches, team_id_map)
+        init_stats_default = dict((stat, 0) for stat in PredictionModel2016.STATS)
+        score_sum = 0
+        all_ixoprs_list = []
+        for i, match in enumerate(matches):
+            all_ixoprs = {}
+            for stat in PredictionModel2016.STATS:
+                all_ixoprs[stat] = MatchstatsHelper.calc_stat(
+                    matches, team_list, team_id_map, Minv, stat,
+                    init_stats=last_event_stats,
+                    init_stats_default=init_stats_default[stat],
+                    limit_matches=i)
+            for _ in xrange(2):
+                for stat in PredictionModel2016.STATS:
+                    all_ixoprs[stat] = MatchstatsHelper.calc_stat(
+                        matches, team_list, team_id_map, Minv, stat,
+                        init_stats=all_ixoprs,
+                        init_stats_default=init_stats_default[stat],
+                        limit_matches=i)
+            all_ixoprs_list.append(all_ixoprs)
+
+            if match.has_been_played and match.score_breakdown:
+                for alliance_color in ['red', 'blue']:
+                    score_sum += match.alliances[alliance_color]['score']
+            init_stats_default['oprs'] = float(score_sum) / (i + 1) / 6
+        return all_ixoprs_list
+
+    def test_ixoprs_match_legacy(self):
+        team_list, team_id_map = MatchstatsHelper.build_team_mapping(self.matches)
+        all_ixoprs_list = PredictionHelper.calc_ixoprs(self.matches, team_list, team_id_map, self.last_event_stats, PredictionModel2016.STATS)
+        legacy_ixoprs_list = self._legacy_ixoprs(self.matches, team_list, team_id_map, self.last_event_stats)
+
+        self.assertEqual(len(all_ixoprs_list), len(self.matches))
+        for all_ixoprs, legacy_ixoprs in zip(all_ixoprs_list, legacy_ixoprs_list):
+            self.assertEqual(set(all_ixoprs.keys()), set(PredictionModel2016.STATS))
+            for stat in PredictionModel2016.STATS:
+                for team in team_list:
+                    self.assertAlmostEqual(all_ixoprs[stat][team], legacy_ixoprs[stat][team], places=6)
+
+    def test_match_predictions(self):
+        predictions, prediction_stats, model_state = PredictionHelper.get_match_predictions(self.matches)
+
+        self.assertEqual(set(predictions.keys()), set(match.key.id() for match in self.matches))
+        for prediction in predictions.values():
+            self.assertIn(prediction['winning_alliance'], ['red', 'blue', ''])
+            self.assertTrue(0 <= prediction['prob'] <= 100)
+            for alliance_color in ['red', 'blue']:
+                self.assertTrue(10 <= prediction[alliance_color]['prob_breach'] <= 95)
+        self.assertIsNotNone(prediction_stats['wl_accuracy'])
+
+        played_keys = [match.key.id() for match in self.matches if match.has_been_played]
+        self.assertEqual(model_state['year'], 2016)
+        self.assertEqual(model_state['residual_matches'], played_keys)
+        self.assertEqual(model_state['residuals']['score'][0], 2 * len(played_keys))
+
+    def test_match_predictions_reuse_model_state(self):
+        predictions, _, model_state = PredictionHelper.get_match_predictions(self.matches)
+        num_played = len(self.matches) / 2
+        score_count = model_state['residuals']['score'][0]
+
+        # Play the next match
+        next_match = self.matches[num_played]
+        next_match.alliances['red']['score'] = 50
+        next_match.alliances['blue']['score'] = 40
+        next_match._winning_alliance = None
+        old_prediction = predictions[next_match.key.id()]
+
+        new_predictions, _, new_model_state = PredictionHelper.get_match_predictions(self.matches, model_state, predictions)
+        for match in self.matches[:num_played]:
+            self.assertEqual(new_predictions[match.key.id()], predictions[match.key.id()])
+        self.assertEqual(new_predictions[next_match.key.id()], old_prediction)
+        self.assertEqual(new_model_state['residual_matches'][-1], next_match.key.id())
+        self.assertEqual(new_model_state['residuals']['score'][0], score_count + 2)
+
+        # A different team list starts over
+        fresh_state = dict(new_model_state, teams=[])
+        _, _, rebuilt_state = PredictionHelper.get_match_predictions(self.matches, fresh_state, new_predictions)
+        self.assertEqual(len(rebuilt_state['residual_matches']), num_played + 1)
+
+    def test_prediction_model_registry(self):
+        self.assertEqual(PredictionHelper.get_prediction_model(2016), PredictionModel2016)
+        self.assertEqual(PredictionHelper.get_prediction_model(2017), PredictionModel2017)
+        self.assertEqual(PredictionHelper.get_prediction_model(2015), PredictionModel)
+
+    def test_generic_model_predictions(self):
+        for match in self.matches:
+            match.year = 2015
+            match._score_breakdown = None
+
+        predictions = PredictionHelper.get_predictions(self.matches)
+        self.assertEqual(predictions['model_state']['year'], 2015)
+        for prediction in predictions['match_predictions'].values():
+            self.assertEqual(set(prediction['red'].keys()), set(['score']))
+        team_list, _ = MatchstatsHelper.build_team_mapping(self.matches)
+        self.assertEqual(len(predictions['ranking_predictions']), len(team_list))
+
+    def test_ranking_predictions(self):
+        for match in self.matches:
+            if match.score_breakdown:
+                for alliance_color in ['red', 'blue']:
+                    match.score_breakdown[alliance_color]['teleopDefensesBreached'] = match.match_number % 2 == 0
+                    match.score_breakdown[alliance_color]['teleopTowerCaptured'] = False
+        self.matches[2]._score_breakdown = self.matches[3].score_breakdown
+        match_predictions, _, _ = PredictionHelper.get_match_predictions(self.matches)
+
+        ranking_predictions, ranking_stats = PredictionHelper.get_ranking_predictions(self.matches, match_predictions, n=2500, seed=1)
+        self.assertEqual(ranking_stats['last_played_match'], self.matches[len(self.matches) / 2 - 1].key.id())
+
+        team_list, _ = MatchstatsHelper.build_team_mapping(self.matches)
+        self.assertEqual(len(ranking_predictions), len(team_list))
+        avg_ranks = [ranking[0] for _, ranking in ranking_predictions]
+        self.assertEqual(avg_ranks, sorted(avg_ranks))
+        for team, (avg_rank, min_rank, median_rank, max_rank, avg_rp, min_rp, max_rp) in ranking_predictions:
+            self.assertTrue(1 <= min_rank <= avg_rank <= max_rank <= len(team_list))
+            self.assertTrue(min_rank <= median_rank <= max_rank)
+            self.assertTrue(min_rp <= avg_rp <= max_rp)
+
+        # Seeded results are reproducible
+        self.assertEqual(
+            PredictionHelper.get_ranking_predictions(self.matches, match_predictions, n=2500, seed=1),
+            (ranking_predictions, ranking_stats))
+
+    def test_ranking_predictions_all_played(self):
+        for match in self.matches[len(self.matches) / 2:]:
+            match.alliances['red']['score'] = 0
+            match.alliances['blue']['score'] = 0
+            match._winning_alliance = None
+        self.matches[2]._score_breakdown = self.matches[3].score_breakdown
+        for match in self.matches:
+            for alliance_color in ['red', 'blue']:
+                match.score_breakdown[alliance_color]['teleopDefensesBreached'] = False
+                match.score_breakdown[alliance_color]['teleopTowerCaptured'] = False
+
+        # Nothing left to simulate, so every sample ranks the same
+        ranking_predictions, _ = PredictionHelper.get_ranking_predictions(self.matches, {}, n=10)
+        for team, (avg_rank, min_rank, median_rank, max_rank, avg_rp, min_rp, max_rp) in ranking_predictions:
+            self.assertEqual(min_rank, max_rank)
+            self.assertEqual(median_rank, min_rank)
+            self.assertEqual(min_rp, max_rp)
+        self.assertEqual([ranking[0] for _, ranking in ranking_predictions], range(1, len(ranking_predictions) + 1))
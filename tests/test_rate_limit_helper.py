@@ -0,0 +1,48 @@
+import time
+import unittest2
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from helpers.rate_limit_helper import RateLimitHelper
+
+
+class TestRateLimitHelper(unittest2.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()  # Prevent data from leaking between tests
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def _tokens_taken(self, name, start_second, end_second):
+        return sum(memcache.get(RateLimitHelper.CACHE_KEY_FORMAT.format(name, second)) or 0
+                   for second in xrange(start_second, end_second + 1))
+
+    def test_acquire_under_rate(self):
+        start_second = int(time.time())
+        for _ in xrange(5):
+            RateLimitHelper.acquire_async('test', 10).get_result()
+        end_second = int(time.time())
+
+        self.assertEqual(self._tokens_taken('test', start_second, end_second), 5)
+
+    def test_acquire_waits_for_next_second(self):
+        full_second = int(time.time())
+        memcache.set(RateLimitHelper.CACHE_KEY_FORMAT.format('test', full_second), 3)
+
+        RateLimitHelper.acquire_async('test', 3).get_result()
+
+        # The token came from the next second's bucket
+        self.assertGreater(int(time.time()), full_second)
+        self.assertEqual(self._tokens_taken('test', full_second + 1, int(time.time())), 1)
+
+    def test_buckets_are_separate(self):
+        second = int(time.time())
+        memcache.set(RateLimitHelper.CACHE_KEY_FORMAT.format('full', second), 3)
+
+        RateLimitHelper.acquire_async('other', 3).get_result()
+        self.assertEqual(self._tokens_taken('other', second, int(time.time())), 1)